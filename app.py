@@ -1,6 +1,7 @@
 import os
 import time
 import logging
+from functools import lru_cache
 from datetime import datetime
 from flask import Flask, jsonify, redirect, url_for, request
 from flask_sqlalchemy import SQLAlchemy
@@ -44,6 +45,9 @@ from models import (
     RentalEquipment, RentalHorometerReading, RentalFailure,
 )
 from utils.crud_helpers import create_entry, get_entries, update_entry, delete_entry
+from utils.schema_migrations import Migration, apply_migrations
+from utils.job_queue import init_job_queue
+from utils.static_assets import init_static_assets
 from utils.reporting_helpers import (
     _parse_date_flexible,
     _is_in_window,
@@ -86,6 +90,8 @@ from routes.weekly_plan_routes import register_weekly_plan_routes
 from routes.insights_routes import register_insights_routes
 from routes.diagnostico_routes import register_diagnostico_routes
 from routes.pf_analysis_routes import register_pf_analysis_routes
+from routes.changes_routes import register_changes_routes
+from routes.jobs_routes import register_jobs_routes
 from routes.rental_routes import register_rental_routes
 from routes.whatsapp_routes import register_whatsapp_routes
 
@@ -245,7 +251,10 @@ print(f"----> BUILD TAG: {APP_BUILD_TAG} <----")
 db.init_app(app)
 
 # ── Cache busting: inject version into all templates ────────────────────────
+# `v` queda para referencias sueltas; los templates usan asset('js/x.js'),
+# URLs con huella de contenido y cache de un ano (utils/static_assets.py).
 _ASSET_VERSION = datetime.now().strftime('%Y%m%d%H%M%S')
+init_static_assets(app)
 
 @app.context_processor
 def inject_globals():
@@ -271,7 +280,7 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 # ── Auth guard: require login for all routes except /login and /static ────────
-_AUTH_EXEMPT = {'login', 'logout', 'static', 'health_check'}
+_AUTH_EXEMPT = {'login', 'logout', 'static', 'static_asset', 'health_check'}
 
 # ── Dynamic role-based access control ─────────────────────────────────────────
 
@@ -619,8 +628,12 @@ for _role_perms in _DEFAULT_PERMS.values():
         if _mod not in _role_perms and _src in _role_perms:
             _role_perms[_mod] = dict(_role_perms[_src])
 
+# Cache de permisos por rol: role -> (version, timestamp, perms). Una entrada
+# vale mientras coincida con app_settings.permissions_version (que suben los
+# endpoints de la matriz de permisos) y no supere el TTL, que queda solo como
+# red para cambios hechos directo en la BD.
 _perms_cache = {}
-_perms_cache_ts = 0
+_PERMS_CACHE_TTL = 300
 
 _PERM_ACTIONS = ('view', 'create', 'edit', 'delete', 'export', 'import',
                  'close', 'approve', 'edit_ot', 'adjust_hours')
@@ -650,21 +663,22 @@ def _expand_legacy_perm(p):
 
 def _load_role_perms(role):
     """Load permissions for a role from DB, fallback to defaults.
-    Devuelve {modulo: {accion: bool, ...}} con las 8 acciones."""
-    import time
-    global _perms_cache, _perms_cache_ts
+    Devuelve {modulo: {accion: bool, ...}} con las 10 acciones.
+    Un solo query por rol; cache por rol invalidado por permissions_version."""
+    from utils.app_settings import get_permissions_version
     now = time.time()
-    # Cache for 60 seconds
-    if now - _perms_cache_ts < 60 and role in _perms_cache:
-        return _perms_cache[role]
+    version = get_permissions_version()
+    hit = _perms_cache.get(role)
+    if hit and hit[0] == version and now - hit[1] < _PERMS_CACHE_TTL:
+        return hit[2]
 
     defaults = _DEFAULT_PERMS.get(role, {})
     result = {}
     try:
         from models import RolePermission
+        rows = {p.module: p for p in RolePermission.query.filter_by(role=role).all()}
         for mod_key in _MODULE_ROUTES:
-            perm = RolePermission.query.filter_by(role=role, module=mod_key).first()
-            default_perm = _expand_legacy_perm(defaults.get(mod_key, {}))
+            perm = rows.get(mod_key)
             if perm:
                 result[mod_key] = {
                     'view':         perm.can_view,
@@ -679,14 +693,13 @@ def _load_role_perms(role):
                     'adjust_hours': getattr(perm, 'can_adjust_hours', perm.can_close),
                 }
             else:
-                result[mod_key] = default_perm
+                result[mod_key] = _expand_legacy_perm(defaults.get(mod_key, {}))
     except Exception:
         # Si la BD no esta disponible o aun no migrada, usar defaults legados
         for mod_key in _MODULE_ROUTES:
             result[mod_key] = _expand_legacy_perm(defaults.get(mod_key, {}))
 
-    _perms_cache[role] = result
-    _perms_cache_ts = now
+    _perms_cache[role] = (version, now, result)
     return result
 
 
@@ -723,20 +736,48 @@ def _action_for_request(method, path):
     return 'view'
 
 
-def _find_module_for_path(path):
-    """Find which module a request path belongs to. More specific paths match first."""
-    best_match = None
-    best_len = 0
-    for mod_key, routes in _MODULE_ROUTES.items():
+def _compile_module_matcher(module_routes, cache_size=2048):
+    """Compila la tabla de prefijos de _MODULE_ROUTES una sola vez.
+
+    Devuelve match(path) -> (modulo, 'page'|'api') o (None, None), con la
+    misma regla que el escaneo lineal original: gana el prefijo mas largo
+    (empate: el primero en orden de _MODULE_ROUTES); las paginas calzan
+    exacto o como carpeta (p + '/'), las APIs por prefijo simple. En vez de
+    recorrer todos los prefijos se prueban solo las longitudes existentes
+    (de mayor a menor) contra dicts, y los paths resueltos quedan en un LRU.
+    """
+    pages, apis = {}, {}
+    for mod_key, routes in module_routes.items():
         for p in routes.get('pages', []):
-            if (path == p or path.startswith(p + '/')) and len(p) > best_len:
-                best_match = (mod_key, 'page')
-                best_len = len(p)
+            pages.setdefault(p, mod_key)
         for a in routes.get('api', []):
-            if path.startswith(a) and len(a) > best_len:
-                best_match = (mod_key, 'api')
-                best_len = len(a)
-    return best_match if best_match else (None, None)
+            apis.setdefault(a, mod_key)
+    lengths = sorted({len(p) for p in pages} | {len(a) for a in apis}, reverse=True)
+
+    @lru_cache(maxsize=cache_size)
+    def match(path):
+        n = len(path)
+        for size in lengths:
+            if size > n:
+                continue
+            head = path[:size]
+            mod_key = pages.get(head)
+            if mod_key and (size == n or path[size] == '/'):
+                return mod_key, 'page'
+            mod_key = apis.get(head)
+            if mod_key:
+                return mod_key, 'api'
+        return None, None
+
+    return match
+
+
+_module_matcher = _compile_module_matcher(_MODULE_ROUTES)
+
+
+def _find_module_for_path(path):
+    """Find which module a request path belongs to. More specific paths match first."""
+    return _module_matcher(path)
 
 
 @app.before_request
@@ -792,6 +833,13 @@ def require_login():
 @app.after_request
 def add_build_header(response):
     response.headers['X-CMMS-Build'] = APP_BUILD_TAG
+    if request.path.startswith('/assets/'):
+        # Cache-Control lo fija serve_asset (immutable si la huella es la vigente)
+        return response
+    if request.path.startswith('/static/'):
+        # Sin huella: el navegador revalida (ETag / Last-Modified -> 304)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
@@ -842,7 +890,7 @@ try:
         default_limits=["300 per minute"],
         storage_uri="memory://",
         # No aplicar el default en rutas estaticas o healthcheck
-        default_limits_exempt_when=lambda: request.path.startswith('/static/') or request.path == '/health',
+        default_limits_exempt_when=lambda: request.path.startswith(('/static/', '/assets/')) or request.path == '/health',
     )
     _LIMITER_AVAILABLE = True
     logger.info("Flask-Limiter activo (memory storage).")
@@ -1143,6 +1191,21 @@ register_diagnostico_routes(app=app, db=db, logger=logger)
 
 register_pf_analysis_routes(app=app, db=db, logger=logger)
 
+register_changes_routes(app=app, db=db, logger=logger)
+
+register_jobs_routes(app=app, db=db, logger=logger)
+# scripts/migrate.py importa este modulo solo para el engine y _MIGRATIONS:
+# con CMMS_MIGRATE_ONLY no se aplica schema al importar ni se arrancan hilos
+# (job workers, keep-alive, bot de Telegram).
+_MIGRATE_ONLY = (os.getenv('CMMS_MIGRATE_ONLY', '0') or '0').strip().lower() in {
+    '1', 'true', 'yes', 'on'
+}
+
+# Workers de la cola de trabajos (narrativa, RCA, indexado RAG): arrancan con
+# el primer request; en TESTING no arrancan (run_pending_jobs en linea)
+if not _MIGRATE_ONLY:
+    init_job_queue(app)
+
 register_rotative_assets_routes(
     app=app,
     db=db,
@@ -1285,28 +1348,54 @@ _ENSURE_INDEXES_SQL = [
     "CREATE INDEX IF NOT EXISTS ix_po_external_rq ON purchase_orders(external_rq_code)",
     # Predictivos: punto de monitoreo puede seguir a un activo rotativo
     "ALTER TABLE monitoring_points ADD COLUMN IF NOT EXISTS rotative_asset_id INTEGER REFERENCES rotative_assets(id)",
+    # Sombras DATE de las fechas texto de OT/aviso (utils/date_shadows.py) +
+    # indices compuestos para filtrar ventanas de KPI como rangos en SQL.
+    "ALTER TABLE work_orders ADD COLUMN IF NOT EXISTS scheduled_on DATE",
+    "ALTER TABLE work_orders ADD COLUMN IF NOT EXISTS real_start_on DATE",
+    "ALTER TABLE work_orders ADD COLUMN IF NOT EXISTS real_end_on DATE",
+    "ALTER TABLE maintenance_notices ADD COLUMN IF NOT EXISTS request_on DATE",
+    "CREATE INDEX IF NOT EXISTS ix_wo_status_real_end_on    ON work_orders(status, real_end_on)",
+    "CREATE INDEX IF NOT EXISTS ix_wo_status_real_start_on  ON work_orders(status, real_start_on)",
+    "CREATE INDEX IF NOT EXISTS ix_wo_status_scheduled_on   ON work_orders(status, scheduled_on)",
+    "CREATE INDEX IF NOT EXISTS ix_wo_equipment_real_end_on ON work_orders(equipment_id, real_end_on)",
+    "CREATE INDEX IF NOT EXISTS ix_notices_status_request_on ON maintenance_notices(status, request_on)",
+    # Change tracking (utils/change_feed.py): updated_at indexado en las tablas
+    # del feed /api/changes. El DEFAULT now() rellena las filas existentes.
+    "ALTER TABLE areas ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE lines ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE equipments ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE work_orders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE maintenance_notices ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE ot_personnel ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE ot_materials ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE lubrication_points ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE lubrication_executions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE monitoring_points ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE monitoring_readings ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE inspection_routes ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE inspection_executions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE warehouse_items ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE warehouse_movements ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "ALTER TABLE shutdowns ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_areas_updated_at ON areas(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_lines_updated_at ON lines(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_equipments_updated_at ON equipments(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_work_orders_updated_at ON work_orders(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_maintenance_notices_updated_at ON maintenance_notices(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_ot_personnel_updated_at ON ot_personnel(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_ot_materials_updated_at ON ot_materials(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_lubrication_points_updated_at ON lubrication_points(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_lubrication_executions_updated_at ON lubrication_executions(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_monitoring_points_updated_at ON monitoring_points(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_monitoring_readings_updated_at ON monitoring_readings(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_inspection_routes_updated_at ON inspection_routes(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_inspection_executions_updated_at ON inspection_executions(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_items_updated_at ON warehouse_items(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_movements_updated_at ON warehouse_movements(updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_shutdowns_updated_at ON shutdowns(updated_at)",
 ]
 
 
-def _create_default_admin():
-    """Create the initial admin user if no users exist."""
-    try:
-        with app.app_context():
-            if User.query.count() == 0:
-                admin = User(
-                    username='admin',
-                    role='admin',
-                    full_name='Administrador',
-                )
-                admin.set_password('admin123')
-                db.session.add(admin)
-                db.session.commit()
-                logger.info("Default admin user created: admin / admin123  — CHANGE THIS PASSWORD.")
-                print("----> DEFAULT USER CREATED: admin / admin123  <---- CHANGE THIS PASSWORD!")
-    except Exception as e:
-        logger.error(f"Error creating default admin: {e}")
-
-
 _ENSURE_COLUMNS = [
     ("work_orders", "caused_downtime", "BOOLEAN DEFAULT false"),
     ("work_orders", "downtime_hours", "FLOAT"),
@@ -1368,7 +1457,7 @@ _ENSURE_COLUMNS = [
     # Permisos granulares por accion (ver, crear, editar, eliminar,
     # exportar, importar, cerrar, aprobar). can_view/can_edit/can_export
     # ya existian; las 5 nuevas se inicializan derivando de can_edit
-    # mediante el bloque post-create-all (ver _backfill_perm_actions).
+    # mediante la migracion 4 (ver _m_backfill_perm_actions).
     ("role_permissions", "can_create",  "BOOLEAN DEFAULT false"),
     ("role_permissions", "can_delete",  "BOOLEAN DEFAULT false"),
     ("role_permissions", "can_import",  "BOOLEAN DEFAULT false"),
@@ -1421,140 +1510,142 @@ _ENSURE_COLUMNS = [
     ("rotative_assets", "last_measure_date", "VARCHAR(20)"),
     ("rotative_assets", "next_measure_due", "VARCHAR(20)"),
     ("rotative_assets", "measure_status", "VARCHAR(10)"),
+    # Sombras DATE (en PostgreSQL ya las agrega _ENSURE_INDEXES_SQL; aqui
+    # quedan para SQLite, que no soporta ADD COLUMN IF NOT EXISTS).
+    ("work_orders", "scheduled_on", "DATE"),
+    ("work_orders", "real_start_on", "DATE"),
+    ("work_orders", "real_end_on", "DATE"),
+    ("maintenance_notices", "request_on", "DATE"),
+    # Metricas del pool de workers del bot (service='queue')
+    ("bot_usage", "queue_wait_ms", "INTEGER"),
+    ("bot_usage", "queue_depth", "INTEGER"),
+    # updated_at del feed de cambios (SQLite: sin default no constante).
+    ("areas", "updated_at", "TIMESTAMP"),
+    ("lines", "updated_at", "TIMESTAMP"),
+    ("equipments", "updated_at", "TIMESTAMP"),
+    ("work_orders", "updated_at", "TIMESTAMP"),
+    ("maintenance_notices", "updated_at", "TIMESTAMP"),
+    ("ot_personnel", "updated_at", "TIMESTAMP"),
+    ("ot_materials", "updated_at", "TIMESTAMP"),
+    ("lubrication_points", "updated_at", "TIMESTAMP"),
+    ("lubrication_executions", "updated_at", "TIMESTAMP"),
+    ("monitoring_points", "updated_at", "TIMESTAMP"),
+    ("monitoring_readings", "updated_at", "TIMESTAMP"),
+    ("inspection_routes", "updated_at", "TIMESTAMP"),
+    ("inspection_executions", "updated_at", "TIMESTAMP"),
+    ("warehouse_items", "updated_at", "TIMESTAMP"),
+    ("warehouse_movements", "updated_at", "TIMESTAMP"),
+    ("shutdowns", "updated_at", "TIMESTAMP"),
+    # Hash del texto indexado (RAG): el re-indexado saltea lo que no cambio.
+    # bot_embeddings solo existe en PostgreSQL con pgvector.
+    ("bot_embeddings", "content_hash", "VARCHAR(64)"),
 ]
 
 
-def _init_schema_on_startup():
-    auto_create = (os.getenv('CMMS_AUTO_CREATE_TABLES', 'true') or 'true').strip().lower() in {
-        '1', 'true', 'yes', 'on'
-    }
-    if not auto_create:
-        logger.info("CMMS_AUTO_CREATE_TABLES disabled; skipping db.create_all() on startup.")
-        return
-    try:
-        with app.app_context():
-            db.create_all()
-            # Cada CREATE INDEX en su propia transacción: en PostgreSQL un error
-            # aborta toda la transacción y las siguientes sentencias fallan.
-            for stmt in _ENSURE_INDEXES_SQL:
-                try:
-                    db.session.execute(text(stmt))
-                    db.session.commit()
-                except Exception as idx_err:
-                    db.session.rollback()
-                    logger.warning(f"Index creation skipped: {idx_err}")
-            # Auto-add missing columns to existing tables — cada ALTER en su
-            # propia transacción para no envenenar la sesión si la columna ya existe.
-            for table, col, col_type in _ENSURE_COLUMNS:
+# ── Migraciones de schema (utils/schema_migrations.py) ──────────────────────
+# Cada paso corre UNA vez por base de datos y queda en schema_migrations.
+# _ENSURE_INDEXES_SQL y _ENSURE_COLUMNS quedan congelados como baseline:
+# los cambios nuevos van en una Migration nueva al final de _MIGRATIONS.
+
+def _m_create_tables(db):
+    db.create_all()
+
+
+def _ensure_columns_sql():
+    return [f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"
+            for table, col, col_type in _ENSURE_COLUMNS] + [
+        "ALTER TABLE rotative_asset_bom ALTER COLUMN warehouse_item_id DROP NOT NULL",
+    ]
+
+
+def _m_backfill_perm_actions(db):
+    """Deriva can_create/can_delete/can_close/can_approve de can_edit en filas
+    que aun los tengan en NULL/false tras la primera migracion, sin pisar
+    configuraciones manuales."""
+    db.session.execute(text("""
+        UPDATE role_permissions
+        SET can_create  = COALESCE(can_create, false),
+            can_delete  = COALESCE(can_delete, false),
+            can_import  = COALESCE(can_import, false),
+            can_close   = COALESCE(can_close, false),
+            can_approve = COALESCE(can_approve, false)
+        WHERE can_create IS NULL OR can_delete IS NULL OR can_import IS NULL
+           OR can_close IS NULL OR can_approve IS NULL
+    """))
+    db.session.execute(text("""
+        UPDATE role_permissions
+        SET can_create  = true,
+            can_delete  = true,
+            can_close   = true,
+            can_approve = true
+        WHERE can_edit = true
+          AND can_create = false
+          AND can_delete = false
+          AND can_close  = false
+          AND can_approve = false
+    """))
+
+
+def _m_backfill_perm_ot_flags(db):
+    """can_edit_ot deriva de can_edit; can_adjust_hours de can_close (solo
+    filas en NULL o false)."""
+    db.session.execute(text("""
+        UPDATE role_permissions
+        SET can_edit_ot = COALESCE(can_edit_ot, false),
+            can_adjust_hours = COALESCE(can_adjust_hours, false)
+        WHERE can_edit_ot IS NULL OR can_adjust_hours IS NULL
+    """))
+    db.session.execute(text("""
+        UPDATE role_permissions
+        SET can_edit_ot = can_edit
+        WHERE can_edit_ot = false AND can_edit = true
+    """))
+    db.session.execute(text("""
+        UPDATE role_permissions
+        SET can_adjust_hours = can_close
+        WHERE can_adjust_hours = false AND can_close = true
+    """))
+
+
+def _m_backfill_date_shadows(db):
+    # Las altas posteriores las mantienen los eventos de models.py
+    from utils.date_shadows import backfill_date_shadows
+    backfill_date_shadows(db, logger=logger)
+
+
+def _m_load_kpi_facts(db):
+    # Depende de las sombras DATE; despues la mantienen los eventos de WorkOrder
+    from utils.kpi_facts import ensure_kpi_facts
+    ensure_kpi_facts(db, logger=logger)
+
+
+def _m_backfill_shutdown_codes(db):
+    """Codigos de parada (PP-YYYY-MM-NNN) para registros legacy."""
+    from models import Shutdown
+    legacy_shutdowns = Shutdown.query.filter(
+        (Shutdown.code.is_(None)) | (Shutdown.code == '')
+    ).order_by(Shutdown.shutdown_date, Shutdown.id).all()
+    counters = {}
+    for sh in legacy_shutdowns:
+        ym = (sh.shutdown_date or '')[:7] or datetime.now().strftime('%Y-%m')
+        prefix = f"PP-{ym}-"
+        if ym not in counters:
+            existing = Shutdown.query.filter(Shutdown.code.like(f"{prefix}%")).all()
+            max_n = 0
+            for s in existing:
                 try:
-                    db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"))
-                    db.session.commit()
-                    logger.info(f"Column {table}.{col} added.")
+                    n = int((s.code or '').rsplit('-', 1)[-1])
+                    max_n = max(max_n, n)
                 except Exception:
-                    db.session.rollback()  # CRÍTICO en PostgreSQL
-            # Make warehouse_item_id nullable in BOM
-            try:
-                db.session.execute(text("ALTER TABLE rotative_asset_bom ALTER COLUMN warehouse_item_id DROP NOT NULL"))
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
-
-            # Backfill: derivar can_create/can_delete/can_close/can_approve
-            # de can_edit en filas existentes que aun los tengan en NULL/false
-            # tras la primera migracion. Solo se ejecuta una vez por instalacion;
-            # si todos ya estan inicializados queda como no-op.
-            try:
-                db.session.execute(text("""
-                    UPDATE role_permissions
-                    SET can_create  = COALESCE(can_create, false),
-                        can_delete  = COALESCE(can_delete, false),
-                        can_import  = COALESCE(can_import, false),
-                        can_close   = COALESCE(can_close, false),
-                        can_approve = COALESCE(can_approve, false)
-                    WHERE can_create IS NULL OR can_delete IS NULL OR can_import IS NULL
-                       OR can_close IS NULL OR can_approve IS NULL
-                """))
-                # Solo derivar de can_edit cuando los flags estan en false
-                # y can_edit es true, evitando pisar configuraciones manuales.
-                db.session.execute(text("""
-                    UPDATE role_permissions
-                    SET can_create  = true,
-                        can_delete  = true,
-                        can_close   = true,
-                        can_approve = true
-                    WHERE can_edit = true
-                      AND can_create = false
-                      AND can_delete = false
-                      AND can_close  = false
-                      AND can_approve = false
-                """))
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
-
-            # Backfill especifico de los 2 flags granulares nuevos:
-            # can_edit_ot deriva de can_edit; can_adjust_hours de can_close.
-            # Solo se aplica a filas con can_edit_ot/can_adjust_hours en NULL
-            # o false (preserva ajustes manuales). Idempotente.
-            try:
-                db.session.execute(text("""
-                    UPDATE role_permissions
-                    SET can_edit_ot = COALESCE(can_edit_ot, false),
-                        can_adjust_hours = COALESCE(can_adjust_hours, false)
-                    WHERE can_edit_ot IS NULL OR can_adjust_hours IS NULL
-                """))
-                db.session.execute(text("""
-                    UPDATE role_permissions
-                    SET can_edit_ot = can_edit
-                    WHERE can_edit_ot = false AND can_edit = true
-                """))
-                db.session.execute(text("""
-                    UPDATE role_permissions
-                    SET can_adjust_hours = can_close
-                    WHERE can_adjust_hours = false AND can_close = true
-                """))
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
-
-            # Backfill de códigos de parada (PP-YYYY-MM-NNN) para registros legacy
-            try:
-                from models import Shutdown
-                legacy_shutdowns = Shutdown.query.filter(
-                    (Shutdown.code.is_(None)) | (Shutdown.code == '')
-                ).order_by(Shutdown.shutdown_date, Shutdown.id).all()
-                counters = {}
-                for sh in legacy_shutdowns:
-                    ym = (sh.shutdown_date or '')[:7] or datetime.now().strftime('%Y-%m')
-                    prefix = f"PP-{ym}-"
-                    if ym not in counters:
-                        existing = Shutdown.query.filter(Shutdown.code.like(f"{prefix}%")).all()
-                        max_n = 0
-                        for s in existing:
-                            try:
-                                n = int((s.code or '').rsplit('-', 1)[-1])
-                                max_n = max(max_n, n)
-                            except Exception:
-                                pass
-                        counters[ym] = max_n
-                    counters[ym] += 1
-                    sh.code = f"{prefix}{counters[ym]:03d}"
-                db.session.commit()
-                if legacy_shutdowns:
-                    logger.info(f"Backfilled codes for {len(legacy_shutdowns)} shutdowns.")
-            except Exception as bf_err:
-                logger.warning(f"Shutdown code backfill skipped: {bf_err}")
-                db.session.rollback()
-        logger.info("Database schema and indexes checked/created on startup.")
-    except Exception as e:
-        logger.error(f"DB startup schema check error: {e}")
-
+                    pass
+            counters[ym] = max_n
+        counters[ym] += 1
+        sh.code = f"{prefix}{counters[ym]:03d}"
+    if legacy_shutdowns:
+        logger.info(f"Backfilled codes for {len(legacy_shutdowns)} shutdowns.")
 
-_init_schema_on_startup()
-_create_default_admin()
 
-
-def _seed_area_process_order():
+def _m_seed_area_process_order(db):
     """Asigna process_order a areas conocidas si aun esta NULL.
 
     Solo toca filas con process_order IS NULL — respeta cualquier valor que
@@ -1562,29 +1653,126 @@ def _seed_area_process_order():
     de la planta de aceite/harina de pescado:
     COCCION -> SECADO -> MOLINO -> CALDERAS (auxiliar).
     """
+    defaults = {
+        'COCCION':   10,
+        'COCINADO':  10,
+        'SECADO':    20,
+        'MOLINO':    30,
+        'MOLIENDA':  30,
+        'CALDERAS':  100,
+        'CALDERA':   100,
+    }
+    for name, order in defaults.items():
+        db.session.execute(text("""
+            UPDATE areas SET process_order = :o
+            WHERE UPPER(name) = :n AND process_order IS NULL
+        """), {"o": order, "n": name})
+
+
+def _m_create_default_admin(db):
+    """Create the initial admin user if no users exist."""
+    if User.query.count() == 0:
+        admin = User(
+            username='admin',
+            role='admin',
+            full_name='Administrador',
+        )
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        logger.info("Default admin user created: admin / admin123  — CHANGE THIS PASSWORD.")
+        print("----> DEFAULT USER CREATED: admin / admin123  <---- CHANGE THIS PASSWORD!")
+
+
+def _m_resync_schedule_due_dates(db):
+    """Los dashboards de lubricacion y monitoreo filtran y ordenan en SQL por
+    next_due_date: se recalcula una vez desde la ultima ejecucion/lectura
+    para las filas legacy que quedaron desalineadas."""
+    for Model, last_attr, calc in (
+        (LubricationPoint, 'last_service_date', _calculate_lubrication_schedule),
+        (MonitoringPoint, 'last_measurement_date', _calculate_monitoring_schedule),
+    ):
+        for p in Model.query.all():
+            next_due, _ = calc(getattr(p, last_attr), p.frequency_days, p.warning_days)
+            if p.next_due_date != next_due:
+                p.next_due_date = next_due
+
+
+def _m_create_background_jobs(db):
+    """Cola de trabajos persistente (utils/job_queue.py)."""
+    from models import BackgroundJob
+    BackgroundJob.__table__.create(db.engine, checkfirst=True)
+
+
+def _m_search_index(db):
+    """Indice de la busqueda global (utils/search_index.py): tabla, FTS del
+    motor y carga inicial de documentos."""
+    from utils.search_index import ensure_search_schema, rebuild_search_index
+    ensure_search_schema(db, logger)
+    rebuild_search_index(db)
+
+
+def _m_create_embedding_tables(db):
+    """Cache de vectores y almacen sin pgvector (utils/embeddings.py)."""
+    from models import EmbeddingCache, LocalEmbedding
+    EmbeddingCache.__table__.create(db.engine, checkfirst=True)
+    LocalEmbedding.__table__.create(db.engine, checkfirst=True)
+
+
+_MIGRATIONS = [
+    Migration(1, 'create_tables', func=_m_create_tables),
+    # Cada sentencia en su propia transaccion (en PostgreSQL un error aborta
+    # la transaccion); las que fallan (ya aplicadas, solo-PG en SQLite) se omiten.
+    Migration(2, 'ensure_indexes', sql=_ENSURE_INDEXES_SQL),
+    Migration(3, 'ensure_columns', sql=_ensure_columns_sql()),
+    Migration(4, 'backfill_perm_actions', func=_m_backfill_perm_actions),
+    Migration(5, 'backfill_perm_ot_flags', func=_m_backfill_perm_ot_flags),
+    Migration(6, 'backfill_date_shadows', func=_m_backfill_date_shadows),
+    Migration(7, 'load_kpi_facts', func=_m_load_kpi_facts),
+    Migration(8, 'backfill_shutdown_codes', func=_m_backfill_shutdown_codes),
+    Migration(9, 'seed_area_process_order', func=_m_seed_area_process_order),
+    Migration(10, 'create_default_admin', func=_m_create_default_admin),
+    # Ultima inspeccion por equipo (row_number) del dashboard de espesores
+    Migration(11, 'thickness_inspection_equip_date_index', sql=[
+        "CREATE INDEX IF NOT EXISTS ix_thk_insp_equip_date "
+        "ON thickness_inspections(equipment_id, inspection_date)",
+    ]),
+    Migration(12, 'schedule_due_date_indexes', sql=[
+        "CREATE INDEX IF NOT EXISTS ix_lp_active_next_due ON lubrication_points(is_active, next_due_date)",
+        "CREATE INDEX IF NOT EXISTS ix_mp_active_next_due ON monitoring_points(is_active, next_due_date)",
+    ], func=_m_resync_schedule_due_dates),
+    Migration(13, 'background_jobs', func=_m_create_background_jobs),
+    Migration(14, 'search_documents', func=_m_search_index),
+    # RAG: HNSW en lugar del IVFFlat de migrate_pgvector.py (creado con la
+    # tabla vacia, listas mal entrenadas). El IVFFlat solo se borra si el
+    # HNSW quedo creado (pgvector >= 0.5); sin pgvector ambas se omiten.
+    Migration(15, 'rag_vector_index', sql=[
+        "CREATE INDEX IF NOT EXISTS ix_bot_emb_vec_hnsw ON bot_embeddings "
+        "USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)",
+        "DO $$ BEGIN IF to_regclass('ix_bot_emb_vec_hnsw') IS NOT NULL THEN "
+        "DROP INDEX IF EXISTS ix_bot_emb_vec_cosine; END IF; END $$",
+    ], func=_m_create_embedding_tables),
+]
+
+
+def _init_schema_on_startup():
+    auto_create = (os.getenv('CMMS_AUTO_CREATE_TABLES', 'true') or 'true').strip().lower() in {
+        '1', 'true', 'yes', 'on'
+    }
+    if not auto_create:
+        logger.info("CMMS_AUTO_CREATE_TABLES disabled; run scripts/migrate.py to apply schema changes.")
+        return
     try:
         with app.app_context():
-            from sqlalchemy import text
-            defaults = {
-                'COCCION':   10,
-                'COCINADO':  10,
-                'SECADO':    20,
-                'MOLINO':    30,
-                'MOLIENDA':  30,
-                'CALDERAS':  100,
-                'CALDERA':   100,
-            }
-            for name, order in defaults.items():
-                db.session.execute(text("""
-                    UPDATE areas SET process_order = :o
-                    WHERE UPPER(name) = :n AND process_order IS NULL
-                """), {"o": order, "n": name})
-            db.session.commit()
+            applied = apply_migrations(db, _MIGRATIONS, logger=logger)
+        if applied:
+            logger.info(f"Schema migrations applied: {[m.version for m in applied]}")
     except Exception as e:
-        logger.warning(f"Area process_order seed skipped: {e}")
+        logger.error(f"DB startup schema migration error: {e}")
 
 
-_seed_area_process_order()
+if not _MIGRATE_ONLY:
+    _init_schema_on_startup()
 
 
 # ── Supabase keep-alive: ping DB every 24h to prevent free-tier suspension ────
@@ -1609,15 +1797,16 @@ def _start_keepalive():
     logger.info("Supabase keep-alive thread started (24h interval)")
 
 
-if resolved_db_mode == 'supabase':
+if resolved_db_mode == 'supabase' and not _MIGRATE_ONLY:
     _start_keepalive()
 
 # ── Telegram Bot ──────────────────────────────────────────────────────────────
-try:
-    from bot.telegram_bot import start_telegram_bot
-    start_telegram_bot(app)
-except Exception as e:
-    logger.warning(f"Telegram bot not started: {e}")
+if not _MIGRATE_ONLY:
+    try:
+        from bot.telegram_bot import start_telegram_bot
+        start_telegram_bot(app)
+    except Exception as e:
+        logger.warning(f"Telegram bot not started: {e}")
 
 
 if __name__ == '__main__':
@@ -2,6 +2,8 @@
 import logging
 from datetime import datetime, date
 
+from utils.date_shadows import parse_shadow
+
 logger = logging.getLogger(__name__)
 
 
@@ -127,14 +129,15 @@ def register_inspection(app, data):
                     desc += f" {comments}"
                 _db.session.execute(text("""
                     INSERT INTO maintenance_notices
-                    (code, description, criticality, priority, request_date,
+                    (code, description, criticality, priority, request_date, request_on,
                      maintenance_type, status, reporter_name, reporter_type,
                      area_id, line_id, equipment_id, scope)
-                    VALUES (:code, :desc, 'Media', 'Normal', :rd, 'Preventivo',
+                    VALUES (:code, :desc, 'Media', 'Normal', :rd, :rd_on, 'Preventivo',
                             'Pendiente', :rep, 'INSPECCION',
                             :ar, :ln, :eq, 'PLAN')
                 """), {
                     "code": notice_code, "desc": desc, "rd": execution_date,
+                    "rd_on": parse_shadow(execution_date),
                     "rep": executed_by, "ar": ar_id, "ln": ln_id, "eq": eq_id,
                 })
                 nid = _db.session.execute(text(
@@ -148,7 +151,8 @@ def register_inspection(app, data):
             next_due, semaphore = _calculate_lubrication_schedule(execution_date, freq_days, warn_days)
             _db.session.execute(text("""
                 UPDATE inspection_routes
-                SET last_execution_date = :led, next_due_date = :nd, semaphore_status = :ss
+                SET last_execution_date = :led, next_due_date = :nd, semaphore_status = :ss,
+                    updated_at = CURRENT_TIMESTAMP
                 WHERE id = :id
             """), {"led": execution_date, "nd": next_due, "ss": semaphore, "id": rid})
 
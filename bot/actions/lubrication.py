@@ -216,13 +216,15 @@ def refresh_lub_point_from_executions(_db, text, point_id):
         next_due, semaphore = _calculate_lubrication_schedule(latest[0], point[1], point[2])
         _db.session.execute(text("""
             UPDATE lubrication_points
-            SET last_service_date = :lsd, next_due_date = :nd, semaphore_status = :ss
+            SET last_service_date = :lsd, next_due_date = :nd, semaphore_status = :ss,
+                updated_at = CURRENT_TIMESTAMP
             WHERE id = :id
         """), {"lsd": latest[0], "nd": next_due, "ss": semaphore, "id": point_id})
     else:
         _db.session.execute(text("""
             UPDATE lubrication_points
-            SET last_service_date = NULL, next_due_date = NULL, semaphore_status = 'PENDIENTE'
+            SET last_service_date = NULL, next_due_date = NULL, semaphore_status = 'PENDIENTE',
+                updated_at = CURRENT_TIMESTAMP
             WHERE id = :id
         """), {"id": point_id})
 
@@ -300,7 +302,8 @@ def register_lubrication(app, data):
                 next_due, semaphore = _calculate_lubrication_schedule(execution_date, freq_days, warn_days)
                 _db.session.execute(text("""
                     UPDATE lubrication_points
-                    SET last_service_date = :lsd, next_due_date = :nd, semaphore_status = :ss
+                    SET last_service_date = :lsd, next_due_date = :nd, semaphore_status = :ss,
+                        updated_at = CURRENT_TIMESTAMP
                     WHERE id = :id
                 """), {"lsd": execution_date, "nd": next_due, "ss": semaphore, "id": pid})
 
@@ -336,16 +339,16 @@ def register_lubrication(app, data):
                     INSERT INTO maintenance_notices
                     (reporter_name, reporter_type, area_id, line_id, equipment_id,
                      system_id, component_id, description, maintenance_type,
-                     priority, status, request_date, scope)
+                     priority, status, request_date, request_on, scope)
                     VALUES (:rn, 'MANTENIMIENTO', :a, :l, :e, :s, :c, :d, :mt,
-                            :p, 'Pendiente', :rd, 'PLAN')
+                            :p, 'Pendiente', :rd, :rd_on, 'PLAN')
                     RETURNING id
                 """), {
                     "rn": executed_by or 'Tecnico Lubricacion',
                     "a": area_id, "l": line_id, "e": equipment_id,
                     "s": system_id, "c": component_id,
                     "d": description, "mt": mtto_type, "p": priority,
-                    "rd": date.today().isoformat(),
+                    "rd": date.today().isoformat(), "rd_on": date.today(),
                 })
                 new_notice_id = ins.scalar()
                 if new_notice_id:
@@ -437,7 +440,7 @@ def edit_lubrication(app, data):
             set_clause = ', '.join(f"{k} = :{k}" for k in updates)
             params = dict(updates)
             params['id'] = exec_id
-            _db.session.execute(text(f"UPDATE lubrication_executions SET {set_clause} WHERE id = :id"), params)
+            _db.session.execute(text(f"UPDATE lubrication_executions SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = :id"), params)
 
             refresh_lub_point_from_executions(_db, text, row[1])
             _db.session.commit()
@@ -459,6 +462,7 @@ def delete_lubrication(app, data):
     with app.app_context():
         from database import db as _db
         from sqlalchemy import text
+        from utils.change_feed import record_deletion
         try:
             exec_id = data.get('exec_id') or data.get('execution_id')
             if not exec_id:
@@ -473,6 +477,7 @@ def delete_lubrication(app, data):
                 return None, None, f"Ejecucion exec_id:{exec_id} no encontrada"
 
             _db.session.execute(text("DELETE FROM lubrication_executions WHERE id = :id"), {"id": exec_id})
+            record_deletion(_db.session.connection(), 'lubrication_executions', exec_id)
             refresh_lub_point_from_executions(_db, text, row[1])
             _db.session.commit()
             _db.session.remove()
@@ -5,6 +5,8 @@ Cubre: crear, promover/degradar (cambiar scope), editar campos whitelisted.
 import logging
 from datetime import date
 
+from utils.date_shadows import parse_shadow
+
 logger = logging.getLogger(__name__)
 
 
@@ -54,18 +56,18 @@ def create_notice(app, data):
             data['_resolved_event_date'] = req_date
 
             _db.session.execute(text("""
-                INSERT INTO maintenance_notices (code, description, criticality, priority, request_date,
+                INSERT INTO maintenance_notices (code, description, criticality, priority, request_date, request_on,
                     maintenance_type, status, reporter_name, reporter_type,
                     reported_at, report_channel,
                     area_id, line_id, equipment_id, system_id, component_id, rotative_asset_id, shift,
                     scope, free_location, failure_mode, failure_category, blockage_object)
-                VALUES (:code, :desc, :crit, :prio, :rdate, :mtype, 'Pendiente', :reporter, :rtype,
+                VALUES (:code, :desc, :crit, :prio, :rdate, :rdate_on, :mtype, 'Pendiente', :reporter, :rtype,
                     :rep_at, :rep_ch,
                     :ar, :ln, :eq, :sys, :comp, :ra, :shift, :scope, :loc, :fm, :fc, :bo)
             """), {
                 "code": code, "desc": ' | '.join(desc_parts),
                 "crit": data.get('criticality', 'Media'), "prio": data.get('priority', 'Normal'),
-                "rdate": req_date, "mtype": data.get('maintenance_type', 'Correctivo'),
+                "rdate": req_date, "rdate_on": parse_shadow(req_date), "mtype": data.get('maintenance_type', 'Correctivo'),
                 "reporter": data.get('reporter_name', 'Bot Telegram'),
                 "rtype": data.get('reporter_type', 'telegram'),
                 "rep_at": data.get('reported_at'), "rep_ch": data.get('report_channel'),
@@ -151,7 +153,7 @@ def promote_notice(app, data):
             set_clause = ', '.join(f"{k} = :{k}" for k in updates)
             params = dict(updates)
             params['nid'] = nid
-            _db.session.execute(text(f"UPDATE maintenance_notices SET {set_clause} WHERE id = :nid"), params)
+            _db.session.execute(text(f"UPDATE maintenance_notices SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = :nid"), params)
 
             wo_updates = {k: v for k, v in updates.items() if k in {
                 'area_id', 'line_id', 'equipment_id', 'system_id', 'component_id', 'rotative_asset_id'
@@ -160,7 +162,7 @@ def promote_notice(app, data):
                 wo_set = ', '.join(f"{k} = :{k}" for k in wo_updates)
                 wo_params = dict(wo_updates)
                 wo_params['nid'] = nid
-                _db.session.execute(text(f"UPDATE work_orders SET {wo_set} WHERE notice_id = :nid"), wo_params)
+                _db.session.execute(text(f"UPDATE work_orders SET {wo_set}, updated_at = CURRENT_TIMESTAMP WHERE notice_id = :nid"), wo_params)
 
             _db.session.commit()
             n_ots = _db.session.execute(text("SELECT count(*) FROM work_orders WHERE notice_id = :nid"), {"nid": nid}).scalar() or 0
@@ -205,7 +207,7 @@ def edit_notice(app, data):
             set_clause = ', '.join(f"{k} = :{k}" for k in updates)
             params = dict(updates)
             params['c'] = code
-            _db.session.execute(text(f"UPDATE maintenance_notices SET {set_clause} WHERE code = :c"), params)
+            _db.session.execute(text(f"UPDATE maintenance_notices SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE code = :c"), params)
 
             tax_keys = {'equipment_id', 'system_id', 'component_id', 'line_id', 'area_id'}
             tax_updates = {k: v for k, v in updates.items() if k in tax_keys}
@@ -213,7 +215,7 @@ def edit_notice(app, data):
                 ot_set = ', '.join(f"{k} = :{k}" for k in tax_updates)
                 tax_params = dict(tax_updates)
                 tax_params['nid'] = notice_id
-                _db.session.execute(text(f"UPDATE work_orders SET {ot_set} WHERE notice_id = :nid"), tax_params)
+                _db.session.execute(text(f"UPDATE work_orders SET {ot_set}, updated_at = CURRENT_TIMESTAMP WHERE notice_id = :nid"), tax_params)
 
             _db.session.commit()
             _db.session.remove()
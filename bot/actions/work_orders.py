@@ -5,6 +5,9 @@ Cubre: cerrar, iniciar, agregar log, reprogramar, editar.
 import logging
 from datetime import datetime, date
 
+from utils.date_shadows import parse_shadow, with_date_shadows
+from utils.kpi_facts import ot_fact_key, refresh_kpi_facts_for_ot
+
 logger = logging.getLogger(__name__)
 
 
@@ -44,12 +47,15 @@ def close_ot(app, data):
 
             comments = data.get('comments', 'Cerrada desde Telegram')
             _db.session.execute(text("""
-                UPDATE work_orders SET status = 'Cerrada', real_end_date = :now, execution_comments = :c WHERE code = :code
-            """), {"now": end_ts, "c": comments, "code": ot_code})
+                UPDATE work_orders SET status = 'Cerrada', real_end_date = :now, real_end_on = :now_on,
+                    execution_comments = :c, updated_at = CURRENT_TIMESTAMP WHERE code = :code
+            """), {"now": end_ts, "now_on": parse_shadow(end_ts), "c": comments, "code": ot_code})
+            refresh_kpi_facts_for_ot(_db.session.connection(), row[0])
 
             if row[2]:
                 _db.session.execute(text(
-                    "UPDATE maintenance_notices SET status = 'Cerrado', closed_date = :d WHERE id = :id"
+                    "UPDATE maintenance_notices SET status = 'Cerrado', closed_date = :d,"
+                    " updated_at = CURRENT_TIMESTAMP WHERE id = :id"
                 ), {"id": row[2], "d": closed_date})
 
             _db.session.commit()
@@ -109,9 +115,12 @@ def start_ot(app, data):
             if not row:
                 return None, f"OT {ot_code} no encontrada"
             now = datetime.utcnow().isoformat()[:19]
-            _db.session.execute(text("UPDATE work_orders SET status = 'En Progreso', real_start_date = :now WHERE code = :c"), {"now": now, "c": ot_code})
+            _db.session.execute(text(
+                "UPDATE work_orders SET status = 'En Progreso', real_start_date = :now, real_start_on = :now_on,"
+                " updated_at = CURRENT_TIMESTAMP WHERE code = :c"
+            ), {"now": now, "now_on": parse_shadow(now), "c": ot_code})
             if row[1]:
-                _db.session.execute(text("UPDATE maintenance_notices SET status = 'En Progreso', treatment_date = :d WHERE id = :id"), {"d": date.today().isoformat(), "id": row[1]})
+                _db.session.execute(text("UPDATE maintenance_notices SET status = 'En Progreso', treatment_date = :d, updated_at = CURRENT_TIMESTAMP WHERE id = :id"), {"d": date.today().isoformat(), "id": row[1]})
             _db.session.commit()
             _db.session.remove()
             return ot_code, None
@@ -137,7 +146,10 @@ def reschedule_ot(app, data):
             row = _db.session.execute(text("SELECT id FROM work_orders WHERE code = :c"), {"c": ot_code}).fetchone()
             if not row:
                 return None, f"OT {ot_code} no encontrada"
-            _db.session.execute(text("UPDATE work_orders SET scheduled_date = :d, status = 'Programada' WHERE code = :c"), {"d": new_date, "c": ot_code})
+            _db.session.execute(text(
+                "UPDATE work_orders SET scheduled_date = :d, scheduled_on = :d_on, status = 'Programada',"
+                " updated_at = CURRENT_TIMESTAMP WHERE code = :c"
+            ), {"d": new_date, "d_on": parse_shadow(new_date), "c": ot_code})
             _db.session.commit()
             _db.session.remove()
             return ot_code, None
@@ -178,10 +190,13 @@ def edit_ot(app, data):
             if not updates:
                 return None, None, "No hay campos validos para actualizar"
 
-            set_clause = ', '.join(f"{k} = :{k}" for k in updates)
-            params = dict(updates)
+            old_fact_key = ot_fact_key(_db.session.connection(), ot_id)
+            row_updates = with_date_shadows('work_orders', updates)
+            set_clause = ', '.join(f"{k} = :{k}" for k in row_updates)
+            params = dict(row_updates)
             params['c'] = code
-            _db.session.execute(text(f"UPDATE work_orders SET {set_clause} WHERE code = :c"), params)
+            _db.session.execute(text(f"UPDATE work_orders SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE code = :c"), params)
+            refresh_kpi_facts_for_ot(_db.session.connection(), ot_id, old_key=old_fact_key)
 
             tax_keys = {'equipment_id', 'system_id', 'component_id', 'line_id', 'area_id'}
             tax_updates = {k: v for k, v in updates.items() if k in tax_keys}
@@ -189,7 +204,7 @@ def edit_ot(app, data):
                 n_set = ', '.join(f"{k} = :{k}" for k in tax_updates)
                 tax_params = dict(tax_updates)
                 tax_params['nid'] = notice_id
-                _db.session.execute(text(f"UPDATE maintenance_notices SET {n_set} WHERE id = :nid"), tax_params)
+                _db.session.execute(text(f"UPDATE maintenance_notices SET {n_set}, updated_at = CURRENT_TIMESTAMP WHERE id = :nid"), tax_params)
 
             _db.session.commit()
             _db.session.remove()
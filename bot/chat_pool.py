@@ -0,0 +1,129 @@
+"""Pool de workers por chat para el poller de Telegram.
+
+El poller ya no procesa los mensajes en linea (DeepSeek, Whisper y subida
+de fotos pueden tardar decenas de segundos): los encola aca y sigue
+leyendo updates.
+
+Garantias:
+  - Orden por chat: como maximo UN mensaje en vuelo por chat_id; los
+    siguientes del mismo chat esperan su turno, en orden de llegada.
+  - Concurrencia entre chats: hasta `workers` chats distintos a la vez.
+    Un chat con cola larga cede el worker tras cada mensaje (round-robin),
+    asi no acapara el pool.
+  - Backpressure: con `max_pending` mensajes en espera, `submit` bloquea al
+    poller. Telegram retiene los updates no pedidos hasta que haya lugar.
+  - Metricas: `on_done(chat_id, wait_ms, run_ms, depth, status, error)` por
+    cada mensaje (el bot lo conecta a bot.metrics.track_queue).
+"""
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWorkerPool:
+    def __init__(self, workers=4, max_pending=100, on_done=None, name='tg-worker'):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.on_done = on_done
+        self._name = name
+        self._cond = threading.Condition()
+        self._queues = {}                      # chat_id -> deque[(job, enqueued_at, depth)]
+        self._ready = collections.deque()      # chats con trabajo y sin mensaje en vuelo
+        self._busy = set()                     # chats con un mensaje en vuelo
+        self._pending = 0
+        self._threads = []
+        self._stopped = False
+
+    # ── API ──────────────────────────────────────────────────────────────
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f'{self._name}-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def submit(self, chat_id, job, timeout=None):
+        """Encola `job()` para `chat_id`. Bloquea mientras la cola este llena;
+        con `timeout` devuelve False si no hubo lugar a tiempo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending >= self.max_pending and not self._stopped:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            if self._stopped:
+                return False
+            self._pending += 1
+            q = self._queues.setdefault(chat_id, collections.deque())
+            q.append((job, time.monotonic(), self._pending))
+            if chat_id not in self._busy and len(q) == 1:
+                self._ready.append(chat_id)
+            self._cond.notify_all()
+            return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': self._pending,
+                'in_flight': len(self._busy),
+                'chats_waiting': len(self._ready),
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+            }
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+
+    # ── Workers ──────────────────────────────────────────────────────────
+    def _take(self):
+        with self._cond:
+            while not self._ready and not self._stopped:
+                self._cond.wait()
+            if self._stopped:
+                return None
+            chat_id = self._ready.popleft()
+            job, enqueued_at, depth = self._queues[chat_id].popleft()
+            self._busy.add(chat_id)
+            return chat_id, job, enqueued_at, depth
+
+    def _release(self, chat_id):
+        with self._cond:
+            self._busy.discard(chat_id)
+            self._pending -= 1
+            q = self._queues.get(chat_id)
+            if q:
+                self._ready.append(chat_id)   # al final: turno para otros chats
+            else:
+                self._queues.pop(chat_id, None)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            item = self._take()
+            if item is None:
+                return
+            chat_id, job, enqueued_at, depth = item
+            started = time.monotonic()
+            status, error = 'success', None
+            try:
+                job()
+            except Exception as e:
+                status, error = 'error', str(e)[:500]
+                logger.error(f"Bot worker error (chat {chat_id}): {e}")
+            finally:
+                finished = time.monotonic()
+                self._release(chat_id)
+            if self.on_done:
+                try:
+                    self.on_done(chat_id, int((started - enqueued_at) * 1000),
+                                 int((finished - started) * 1000), depth, status, error)
+                except Exception as e:
+                    logger.warning(f"Bot worker metrics fallo: {e}")
@@ -9,10 +9,10 @@ a markdown, prosa adicional y JSONs malformados (best-effort).
 """
 import json
 import logging
-import requests
 from datetime import date, timedelta
 
 from bot.context import _load_cmms_guide
+from utils import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -429,7 +429,7 @@ DATOS ACTUALES:
     from bot.metrics import track_deepseek, Stopwatch
     try:
         with Stopwatch() as sw:
-            r = requests.post(_DEEPSEEK_URL, headers=headers, json=payload, timeout=60)
+            r = http_client.post('deepseek', _DEEPSEEK_URL, headers=headers, json=payload)
         if r.status_code != 200:
             track_deepseek(app, chat_id, 'deepseek-chat', None, sw.elapsed_ms,
                            status='error', error_msg=f"HTTP {r.status_code}")
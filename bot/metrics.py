@@ -1,6 +1,7 @@
 """Telemetria del bot Telegram: tokens, latencia, costo USD.
 
-Cada llamada a Whisper o DeepSeek se persiste como `BotUsage`. Las
+Cada llamada a Whisper o DeepSeek se persiste como `BotUsage`, igual que
+cada mensaje que pasa por el pool de workers (service='queue'). Las
 funciones aca son no-bloqueantes (best-effort): si la DB no responde,
 loggea warning y sigue — nunca rompe el flujo del bot.
 
@@ -93,6 +94,21 @@ def track_deepseek(app, chat_id, model_name, usage_dict, latency_ms, status='suc
     ))
 
 
+def track_queue(app, chat_id, wait_ms, run_ms, depth, status='success', error_msg=None):
+    """Registra un mensaje procesado por el pool de workers del bot:
+    espera en cola, tiempo de proceso y profundidad al encolar."""
+    _persist(app, dict(
+        chat_id=chat_id,
+        service='queue',
+        latency_ms=run_ms,
+        queue_wait_ms=wait_ms,
+        queue_depth=depth,
+        cost_usd=0.0,
+        status=status,
+        error_msg=error_msg,
+    ))
+
+
 def _persist(app, fields):
     """Inserta una fila en bot_usage. Best-effort (no rompe el flujo)."""
     if app is None:
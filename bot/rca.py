@@ -30,7 +30,8 @@ import logging
 import threading
 from datetime import date, timedelta
 
-import requests
+from utils import http_client
+from utils.job_queue import job_handler, submit_job
 
 logger = logging.getLogger(__name__)
 
@@ -75,8 +76,9 @@ def ensure_rca_tables(app):
                     f"{id_col}, "
                     "to_jid VARCHAR(80) NOT NULL, "
                     "body TEXT NOT NULL, "
-                    "media_base64 TEXT, "
+                    "media_ref VARCHAR(200), "
                     "media_type VARCHAR(10), "
+                    "media_mimetype VARCHAR(80), "
                     "context VARCHAR(60), "
                     "status VARCHAR(12) DEFAULT 'pending', "
                     "attempts INTEGER DEFAULT 0, "
@@ -95,6 +97,7 @@ def ensure_rca_tables(app):
                     "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
                 ))
                 _db.session.commit()
+                _upgrade_outbox_media(_db, text)
             _tables_ready = True
             return True
         except Exception as e:
@@ -102,11 +105,110 @@ def ensure_rca_tables(app):
             return False
 
 
+def _upgrade_outbox_media(_db, text):
+    """wa_outbox de instalaciones previas: agrega media_ref/media_mimetype y
+    saca del row los base64 que quedaron (los pendientes pasan al media
+    store; en los ya enviados solo se vacia la columna)."""
+    from sqlalchemy import inspect
+    cols = {c['name'] for c in inspect(_db.engine).get_columns('wa_outbox')}
+    for col, ddl in (('media_ref', 'VARCHAR(200)'), ('media_mimetype', 'VARCHAR(80)')):
+        if col not in cols:
+            _db.session.execute(text(f"ALTER TABLE wa_outbox ADD COLUMN {col} {ddl}"))
+    _db.session.commit()
+    if 'media_base64' not in cols:
+        return
+    import base64
+    from utils.media_store import put_media
+    pending = _db.session.execute(text(
+        "SELECT id, media_base64, media_type FROM wa_outbox "
+        "WHERE media_base64 IS NOT NULL AND status IN ('pending', 'sending')")).fetchall()
+    for mid, b64, mtype in pending:
+        try:
+            ref = put_media(base64.b64decode(b64), media_type=mtype)
+        except Exception as e:
+            logger.warning(f"wa_outbox #{mid}: no se pudo mover la media: {e}")
+            continue
+        _db.session.execute(text(
+            "UPDATE wa_outbox SET media_ref = :r, media_base64 = NULL WHERE id = :id"),
+            {"r": ref, "id": mid})
+    _db.session.execute(text(
+        "UPDATE wa_outbox SET media_base64 = NULL "
+        "WHERE media_base64 IS NOT NULL AND status NOT IN ('pending', 'sending')"))
+    _db.session.commit()
+
+
 # ── Cola de salida de WhatsApp (para envíos asíncronos al grupo mtto) ────────
+#
+# El gateway hace long-poll (GET /api/public/whatsapp/outbox?wait=20): si no
+# hay nada pendiente, la request espera hasta que se encole un mensaje.
+# enqueue despierta a las esperas del mismo proceso con una Condition y, en
+# PostgreSQL, emite NOTIFY wa_outbox: un hilo con LISTEN en cada proceso
+# despierta a las suyas (el RCA se genera en un worker y el long-poll puede
+# estar en otro). Si el LISTEN no esta disponible (p.ej. pooler en modo
+# transaccion) la espera re-chequea cada _OUTBOX_RECHECK_SECONDS.
+
+_OUTBOX_CHANNEL = 'wa_outbox'
+_OUTBOX_RECHECK_SECONDS = 5
+_outbox_cond = threading.Condition()
+_outbox_seq = 0
+_listener_started = False
+
+
+def _signal_outbox():
+    global _outbox_seq
+    with _outbox_cond:
+        _outbox_seq += 1
+        _outbox_cond.notify_all()
+
+
+def _start_outbox_listener(app):
+    """Arranca (una vez por proceso) el hilo LISTEN de PostgreSQL."""
+    global _listener_started
+    with _outbox_cond:
+        if _listener_started:
+            return
+        _listener_started = True
+
+    def _listen():
+        import select
+        from database import db as _db
+        while True:
+            conn = None
+            try:
+                with app.app_context():
+                    conn = _db.engine.raw_connection()
+                # Fuera del pool: autocommit y LISTEN no deben volver al pool
+                conn.detach()
+                raw = conn.dbapi_connection
+                raw.autocommit = True
+                raw.cursor().execute(f"LISTEN {_OUTBOX_CHANNEL}")
+                while True:
+                    if select.select([raw], [], [], 60) == ([], [], []):
+                        continue
+                    raw.poll()
+                    if raw.notifies:
+                        raw.notifies.clear()
+                        _signal_outbox()
+            except Exception as e:
+                logger.warning(f"outbox LISTEN caido, reintento en 30s: {e}")
+                time.sleep(30)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    threading.Thread(target=_listen, name='wa-outbox-listen', daemon=True).start()
+
 
 def enqueue_wa_message(app, to_jid, body, context=None,
-                       media_base64=None, media_type=None):
-    """Encola un mensaje para que el gateway lo envíe por WhatsApp. Devuelve id o None."""
+                       media_base64=None, media_type=None, media_bytes=None, mimetype=None):
+    """Encola un mensaje para que el gateway lo envíe por WhatsApp. Devuelve id o None.
+
+    La media (bytes, o base64 por compatibilidad) se guarda en el media
+    store (utils/media_store.py); la fila solo lleva la referencia.
+    """
     if not to_jid or not body:
         return None
     if not ensure_rca_tables(app):
@@ -114,22 +216,55 @@ def enqueue_wa_message(app, to_jid, body, context=None,
     try:
         from sqlalchemy import text
         from database import db as _db
+        media_ref = None
+        if media_bytes is None and media_base64:
+            import base64
+            media_bytes = base64.b64decode(media_base64)
+        if media_bytes:
+            from utils.media_store import put_media
+            media_ref = put_media(media_bytes, media_type=media_type, mimetype=mimetype)
         with app.app_context():
-            row = _db.session.execute(text(
-                "INSERT INTO wa_outbox (to_jid, body, media_base64, media_type, context, status) "
-                "VALUES (:to, :body, :mb, :mt, :ctx, 'pending')"
-            ), {"to": to_jid, "body": body, "mb": media_base64,
-                "mt": media_type, "ctx": context})
-            _db.session.commit()
-            # id del insert (portable): último pendiente a ese jid con ese context
             nid = _db.session.execute(text(
-                "SELECT MAX(id) FROM wa_outbox WHERE to_jid = :to"), {"to": to_jid}).scalar()
+                "INSERT INTO wa_outbox (to_jid, body, media_ref, media_type, media_mimetype, "
+                "context, status) VALUES (:to, :body, :mr, :mt, :mm, :ctx, 'pending') RETURNING id"
+            ), {"to": to_jid, "body": body, "mr": media_ref, "mt": media_type if media_ref else None,
+                "mm": mimetype if media_ref else None, "ctx": context}).scalar()
+            if _db.engine.dialect.name == 'postgresql':
+                # Se entrega al hacer commit (despierta long-polls de otros procesos)
+                _db.session.execute(text("SELECT pg_notify(:ch, '')"), {"ch": _OUTBOX_CHANNEL})
+            _db.session.commit()
+        _signal_outbox()
         return nid
     except Exception as e:
         logger.error(f"enqueue_wa_message error: {e}")
         return None
 
 
+# La media del outbox se baja por GET /api/public/whatsapp/media/<token>: el
+# token firma el id del mensaje con la SECRET_KEY y vence a los
+# OUTBOX_MEDIA_TTL segundos (holgado frente al reclaim de 180 s).
+OUTBOX_MEDIA_TTL = 1800
+_MEDIA_SALT = 'wa-outbox-media'
+
+
+def _media_serializer(app):
+    from itsdangerous import URLSafeTimedSerializer
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=_MEDIA_SALT)
+
+
+def outbox_media_url(app, outbox_id):
+    return f"/api/public/whatsapp/media/{_media_serializer(app).dumps(outbox_id)}"
+
+
+def outbox_media_id(app, token):
+    """Id del mensaje firmado en `token`, o None si es invalido o vencio."""
+    from itsdangerous import BadSignature
+    try:
+        return int(_media_serializer(app).loads(token, max_age=OUTBOX_MEDIA_TTL))
+    except (BadSignature, TypeError, ValueError):
+        return None
+
+
 def get_maint_group_jids(app):
     """JIDs de los grupos de MANTENIMIENTO activos a los que va el RCA.
 
@@ -160,8 +295,12 @@ def get_maint_group_jids(app):
 def claim_outbox(app, limit=5, reclaim_seconds=180):
     """Reclama mensajes pendientes para envío (los marca 'sending').
 
-    Devuelve lista de dicts {id, to, body, media_base64, media_type}. Antes
+    Devuelve lista de dicts {id, to, body, media_type, media_url}; media_url
+    (firmada, o None) es la ruta para bajar la media en streaming. Antes
     de reclamar, resetea a 'pending' los 'sending' colgados (gateway caído).
+    El claim es un solo UPDATE ... RETURNING: en PostgreSQL el subselect
+    toma las filas con FOR UPDATE SKIP LOCKED, asi dos gateways (o dos
+    workers) nunca reclaman el mismo mensaje; SQLite serializa escrituras.
     """
     if not ensure_rca_tables(app):
         return []
@@ -181,51 +320,90 @@ def claim_outbox(app, limit=5, reclaim_seconds=180):
                     "UPDATE wa_outbox SET status='pending' WHERE status='sending' "
                     "AND claimed_at < datetime('now', :s)"
                 ), {"s": f'-{reclaim_seconds} seconds'})
-            # 2. Seleccionar pendientes
+            # 2. Seleccionar y marcar 'sending' en la misma sentencia
             rows = _db.session.execute(text(
-                "SELECT id, to_jid, body, media_base64, media_type FROM wa_outbox "
-                "WHERE status='pending' ORDER BY id LIMIT :lim"
+                "UPDATE wa_outbox SET status='sending', claimed_at=CURRENT_TIMESTAMP, "
+                "attempts = attempts + 1 WHERE id IN ("
+                "SELECT id FROM wa_outbox WHERE status='pending' ORDER BY id LIMIT :lim"
+                + (" FOR UPDATE SKIP LOCKED" if is_pg else "") + ") "
+                "RETURNING id, to_jid, body, media_ref, media_type"
             ), {"lim": limit}).fetchall()
-            ids = [r[0] for r in rows]
-            if ids:
-                # 3. Marcarlos 'sending'
-                _db.session.execute(text(
-                    "UPDATE wa_outbox SET status='sending', claimed_at=CURRENT_TIMESTAMP, "
-                    "attempts = attempts + 1 WHERE id = ANY(:ids)" if is_pg else
-                    f"UPDATE wa_outbox SET status='sending', claimed_at=CURRENT_TIMESTAMP, "
-                    f"attempts = attempts + 1 WHERE id IN ({','.join(str(i) for i in ids)})"
-                ), ({"ids": ids} if is_pg else {}))
-                _db.session.commit()
-            return [{"id": r[0], "to": r[1], "body": r[2],
-                     "media_base64": r[3], "media_type": r[4]} for r in rows]
+            _db.session.commit()
+            return [{"id": r[0], "to": r[1], "body": r[2], "media_type": r[4],
+                     "media_url": outbox_media_url(app, r[0]) if r[3] else None}
+                    for r in sorted(rows, key=lambda r: r[0])]
     except Exception as e:
         logger.warning(f"claim_outbox error: {e}")
         return []
 
 
+def wait_outbox(app, limit=5, wait_seconds=0):
+    """claim_outbox con long-poll: si no hay pendientes espera hasta
+    `wait_seconds` a que se encole algo. Devuelve la lista reclamada."""
+    deadline = time.monotonic() + max(0, wait_seconds)
+    if wait_seconds > 0 and not _listener_started:
+        try:
+            from database import db as _db
+            with app.app_context():
+                is_pg = _db.engine.dialect.name == 'postgresql'
+            if is_pg:
+                _start_outbox_listener(app)
+        except Exception as e:
+            logger.warning(f"wait_outbox: sin LISTEN: {e}")
+    while True:
+        # Leer la secuencia antes del claim: un enqueue entre el claim y el
+        # wait cambia la secuencia y no se pierde el aviso
+        with _outbox_cond:
+            seq = _outbox_seq
+        msgs = claim_outbox(app, limit=limit)
+        remaining = deadline - time.monotonic()
+        if msgs or remaining <= 0:
+            return msgs
+        with _outbox_cond:
+            if _outbox_seq == seq:
+                _outbox_cond.wait(min(remaining, _OUTBOX_RECHECK_SECONDS))
+
+
 def ack_outbox(app, results):
-    """Marca el resultado de cada envío. results: [{id, ok}]."""
-    if not results:
+    """Marca el resultado de los envíos en una sola sentencia. results: [{id, ok}].
+
+    ok -> 'sent'; fallo -> 'pending' para reintentar, o 'error' tras 3 intentos.
+    """
+    ids, ok_ids = [], []
+    for r in results or []:
+        try:
+            mid = int(r.get('id'))
+        except (TypeError, ValueError):
+            continue
+        ids.append(mid)
+        if r.get('ok'):
+            ok_ids.append(mid)
+    if not ids:
         return
     try:
-        from sqlalchemy import text
+        from sqlalchemy import bindparam, text
         from database import db as _db
         with app.app_context():
-            for r in results:
-                mid = r.get('id')
-                if mid is None:
-                    continue
-                if r.get('ok'):
-                    _db.session.execute(text(
-                        "UPDATE wa_outbox SET status='sent', sent_at=CURRENT_TIMESTAMP WHERE id=:id"
-                    ), {"id": mid})
-                else:
-                    # Reintentar hasta 3 veces; luego marcar error
-                    _db.session.execute(text(
-                        "UPDATE wa_outbox SET status = CASE WHEN attempts >= 3 THEN 'error' ELSE 'pending' END "
-                        "WHERE id=:id"
-                    ), {"id": mid})
+            rows = _db.session.execute(text(
+                "UPDATE wa_outbox SET "
+                "status = CASE WHEN id IN :ok THEN 'sent' "
+                "WHEN attempts >= 3 THEN 'error' ELSE 'pending' END, "
+                "sent_at = CASE WHEN id IN :ok THEN CURRENT_TIMESTAMP ELSE sent_at END "
+                "WHERE id IN :ids RETURNING id, status, media_ref"
+            ).bindparams(bindparam('ok', expanding=True), bindparam('ids', expanding=True)),
+                {"ok": ok_ids, "ids": ids}).fetchall()
             _db.session.commit()
+            # La media de los mensajes cerrados (enviados o sin mas reintentos)
+            # ya no se necesita
+            done = [(r[0], r[2]) for r in rows if r[2] and r[1] in ('sent', 'error')]
+            if done:
+                from utils.media_store import delete_media
+                for _, ref in done:
+                    delete_media(ref)
+                _db.session.execute(text(
+                    "UPDATE wa_outbox SET media_ref = NULL WHERE id IN :ids"
+                ).bindparams(bindparam('ids', expanding=True)), {"ids": [d[0] for d in done]})
+                _db.session.commit()
     except Exception as e:
         logger.warning(f"ack_outbox error: {e}")
 
@@ -525,7 +703,7 @@ def _call_llm(ctx, cases, spares, tools, rec_action, specs=None):
         lines.append("\n(Sin herramientas registradas en el historial de este equipo.)")
 
     try:
-        r = requests.post(DEEPSEEK_URL, headers={
+        r = http_client.post('deepseek', DEEPSEEK_URL, headers={
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json',
         }, json={
@@ -756,8 +934,20 @@ def get_rca(app, notice_id):
         return None
 
 
+@job_handler('rca_generate', max_attempts=3, lease_seconds=600)
+def _rca_job(app, payload):
+    """Ejecutor en la cola de trabajos. generate_rca devuelve None solo si no
+    pudo armar el contexto (aviso borrado o sin datos): es terminal, reintentar
+    daria lo mismo, asi que se devuelve como resultado y no como excepcion."""
+    saved = generate_rca(app, payload['notice_id'], push=payload.get('push', True))
+    if saved is None:
+        logger.warning(f"RCA sin contexto para el aviso {payload['notice_id']}")
+        return {'notice_id': payload['notice_id'], 'status': 'sin_contexto'}
+    return {'notice_id': payload['notice_id'], 'status': saved.get('_status') or 'ok'}
+
+
 def trigger_rca_async(app, notice_id):
-    """Dispara la generación del RCA en un hilo, sin bloquear el flujo del aviso.
+    """Encola la generación del RCA (utils/job_queue), sin bloquear el flujo del aviso.
 
     No corre en tests (TESTING) ni sin DEEPSEEK_API_KEY: el diagnóstico es un
     extra que jamás debe romper la creación del aviso.
@@ -769,11 +959,8 @@ def trigger_rca_async(app, notice_id):
         pass
     if not os.getenv('DEEPSEEK_API_KEY'):
         return
-
-    def _run():
-        try:
-            generate_rca(app, notice_id, push=True)
-        except Exception as e:
-            logger.error(f"trigger_rca_async error (aviso {notice_id}): {e}")
-
-    threading.Thread(target=_run, daemon=True).start()
+    try:
+        with app.app_context():
+            submit_job('rca_generate', {'notice_id': notice_id, 'push': True})
+    except Exception as e:
+        logger.error(f"trigger_rca_async error (aviso {notice_id}): {e}")
@@ -5,8 +5,9 @@ import logging
 import threading
 import time
 import collections
-import requests
 from datetime import datetime, date, timedelta
+from utils import http_client
+from utils.job_queue import job_handler, submit_job
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +51,11 @@ def _parse_id_list_env(name):
     return ids
 
 
+# Pool de workers (bot/chat_pool.py): chats atendidos en paralelo y
+# mensajes en espera antes de frenar al poller (backpressure).
+BOT_WORKERS = max(1, _parse_int_env('TELEGRAM_BOT_WORKERS', 4))
+BOT_QUEUE_MAX = max(1, _parse_int_env('TELEGRAM_BOT_QUEUE_MAX', 100))
+
 # Authorized chat_ids — solo estos pueden usar el bot.
 # OWNER_CHAT_ID se lee de TELEGRAM_OWNER_CHAT_ID (variable de entorno).
 # La whitelist inicial sale de TELEGRAM_ALLOWED_CHAT_IDS (lista separada por comas).
@@ -228,7 +234,7 @@ def _send_typing(chat_id):
 
 def _tg_api(method, **kwargs):
     url = f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/{method}'
-    r = requests.post(url, json=kwargs, timeout=30)
+    r = http_client.post('telegram', url, json=kwargs)
     return r.json()
 
 
@@ -681,106 +687,115 @@ def _build_rag_context(app, query_text):
         return ''
 
 
+def _index_entity(app, entity_type, entity_id):
+    """Indexa una OT, un aviso o un documento en bot_embeddings (sincrono)."""
+    from utils.embeddings import upsert_embedding, build_ot_text, build_notice_text
+    with app.app_context():
+        from database import db as _db
+        from models import (
+            WorkOrder, MaintenanceNotice, Area, Line, Equipment, System, Component
+        )
+        if entity_type == 'work_order':
+            wo = WorkOrder.query.get(entity_id)
+            if not wo:
+                return
+            eq = Equipment.query.get(wo.equipment_id) if wo.equipment_id else None
+            ar = Area.query.get(wo.area_id) if wo.area_id else None
+            ln = Line.query.get(wo.line_id) if wo.line_id else None
+            sy = System.query.get(wo.system_id) if wo.system_id else None
+            co = Component.query.get(wo.component_id) if wo.component_id else None
+            notice = MaintenanceNotice.query.get(wo.notice_id) if wo.notice_id else None
+            text = build_ot_text(wo.to_dict(), equipment=eq, area=ar, line=ln,
+                                 system=sy, component=co, notice=notice)
+            metadata = {
+                'code': wo.code,
+                'equipment_tag': eq.tag if eq else None,
+                'failure_mode': wo.failure_mode,
+            }
+            upsert_embedding(_db.session, 'work_order', wo.id, text, metadata)
+            _db.session.commit()
+        elif entity_type == 'notice':
+            n = MaintenanceNotice.query.get(entity_id)
+            if not n:
+                return
+            eq = Equipment.query.get(n.equipment_id) if n.equipment_id else None
+            ar = Area.query.get(n.area_id) if n.area_id else None
+            ln = Line.query.get(n.line_id) if n.line_id else None
+            co = Component.query.get(n.component_id) if n.component_id else None
+            text = build_notice_text(n, equipment=eq, area=ar, line=ln, component=co)
+            metadata = {
+                'code': n.code,
+                'equipment_tag': eq.tag if eq else None,
+                'failure_mode': n.failure_mode,
+                'criticality': n.criticality,
+            }
+            upsert_embedding(_db.session, 'notice', n.id, text, metadata)
+            _db.session.commit()
+        elif entity_type == 'document_link':
+            from utils.embeddings import build_document_link_text
+            from models import DocumentLink, RotativeAsset
+            doc = DocumentLink.query.get(entity_id)
+            if not doc:
+                return
+            parent_name = None; parent_tag = None
+            category = None; brand = None; model = None
+            area_name = None; line_name = None
+            if doc.entity_type == 'rotative_asset':
+                ra = RotativeAsset.query.get(doc.entity_id)
+                if ra:
+                    parent_name = ra.name
+                    parent_tag = ra.code
+                    category = ra.category
+                    brand = ra.brand
+                    model = ra.model
+                    area_name = ra.area.name if ra.area else None
+                    line_name = ra.line.name if ra.line else None
+            elif doc.entity_type == 'equipment':
+                eq = Equipment.query.get(doc.entity_id)
+                if eq:
+                    parent_name = eq.name
+                    parent_tag = eq.tag
+                    area_name = eq.area.name if getattr(eq, 'area', None) else None
+                    line_name = eq.line.name if getattr(eq, 'line', None) else None
+            elif doc.entity_type == 'component':
+                co = Component.query.get(doc.entity_id)
+                if co:
+                    parent_name = co.name
+            text = build_document_link_text(
+                doc.to_dict(),
+                parent_name=parent_name, parent_tag=parent_tag,
+                parent_type=doc.entity_type,
+                category=category, brand=brand, model=model,
+                area=area_name, line=line_name,
+            )
+            metadata = {
+                'url': doc.url,
+                'title': doc.title,
+                'doc_type': doc.doc_type,
+                'parent_type': doc.entity_type,
+                'parent_id': doc.entity_id,
+                'parent_tag': parent_tag,
+                'parent_name': parent_name,
+            }
+            upsert_embedding(_db.session, 'document_link', doc.id, text, metadata)
+            _db.session.commit()
+
+
+@job_handler('rag_index', max_attempts=3, lease_seconds=120)
+def _index_entity_job(app, payload):
+    _index_entity(app, payload['entity_type'], payload['entity_id'])
+    return {'entity_type': payload['entity_type'], 'entity_id': payload['entity_id']}
+
+
 def _index_entity_async(app, entity_type, entity_id):
-    """Indexa una OT cerrada o un aviso en bot_embeddings. No bloquea."""
+    """Encola el indexado (utils/job_queue) de una OT cerrada o un aviso. No bloquea."""
     if not OPENAI_API_KEY:
         return
-    def _do():
-        try:
-            from utils.embeddings import upsert_embedding, build_ot_text, build_notice_text
-            with app.app_context():
-                from database import db as _db
-                from models import (
-                    WorkOrder, MaintenanceNotice, Area, Line, Equipment, System, Component
-                )
-                if entity_type == 'work_order':
-                    wo = WorkOrder.query.get(entity_id)
-                    if not wo:
-                        return
-                    eq = Equipment.query.get(wo.equipment_id) if wo.equipment_id else None
-                    ar = Area.query.get(wo.area_id) if wo.area_id else None
-                    ln = Line.query.get(wo.line_id) if wo.line_id else None
-                    sy = System.query.get(wo.system_id) if wo.system_id else None
-                    co = Component.query.get(wo.component_id) if wo.component_id else None
-                    notice = MaintenanceNotice.query.get(wo.notice_id) if wo.notice_id else None
-                    text = build_ot_text(wo.to_dict(), equipment=eq, area=ar, line=ln,
-                                         system=sy, component=co, notice=notice)
-                    metadata = {
-                        'code': wo.code,
-                        'equipment_tag': eq.tag if eq else None,
-                        'failure_mode': wo.failure_mode,
-                    }
-                    upsert_embedding(_db.session, 'work_order', wo.id, text, metadata)
-                    _db.session.commit()
-                elif entity_type == 'notice':
-                    n = MaintenanceNotice.query.get(entity_id)
-                    if not n:
-                        return
-                    eq = Equipment.query.get(n.equipment_id) if n.equipment_id else None
-                    ar = Area.query.get(n.area_id) if n.area_id else None
-                    ln = Line.query.get(n.line_id) if n.line_id else None
-                    co = Component.query.get(n.component_id) if n.component_id else None
-                    text = build_notice_text(n, equipment=eq, area=ar, line=ln, component=co)
-                    metadata = {
-                        'code': n.code,
-                        'equipment_tag': eq.tag if eq else None,
-                        'failure_mode': n.failure_mode,
-                        'criticality': n.criticality,
-                    }
-                    upsert_embedding(_db.session, 'notice', n.id, text, metadata)
-                    _db.session.commit()
-                elif entity_type == 'document_link':
-                    from utils.embeddings import build_document_link_text
-                    from models import DocumentLink, RotativeAsset
-                    doc = DocumentLink.query.get(entity_id)
-                    if not doc:
-                        return
-                    parent_name = None; parent_tag = None
-                    category = None; brand = None; model = None
-                    area_name = None; line_name = None
-                    if doc.entity_type == 'rotative_asset':
-                        ra = RotativeAsset.query.get(doc.entity_id)
-                        if ra:
-                            parent_name = ra.name
-                            parent_tag = ra.code
-                            category = ra.category
-                            brand = ra.brand
-                            model = ra.model
-                            area_name = ra.area.name if ra.area else None
-                            line_name = ra.line.name if ra.line else None
-                    elif doc.entity_type == 'equipment':
-                        eq = Equipment.query.get(doc.entity_id)
-                        if eq:
-                            parent_name = eq.name
-                            parent_tag = eq.tag
-                            area_name = eq.area.name if getattr(eq, 'area', None) else None
-                            line_name = eq.line.name if getattr(eq, 'line', None) else None
-                    elif doc.entity_type == 'component':
-                        co = Component.query.get(doc.entity_id)
-                        if co:
-                            parent_name = co.name
-                    text = build_document_link_text(
-                        doc.to_dict(),
-                        parent_name=parent_name, parent_tag=parent_tag,
-                        parent_type=doc.entity_type,
-                        category=category, brand=brand, model=model,
-                        area=area_name, line=line_name,
-                    )
-                    metadata = {
-                        'url': doc.url,
-                        'title': doc.title,
-                        'doc_type': doc.doc_type,
-                        'parent_type': doc.entity_type,
-                        'parent_id': doc.entity_id,
-                        'parent_tag': parent_tag,
-                        'parent_name': parent_name,
-                    }
-                    upsert_embedding(_db.session, 'document_link', doc.id, text, metadata)
-                    _db.session.commit()
-        except Exception as e:
-            logger.warning(f"_index_entity_async error ({entity_type}/{entity_id}): {e}")
-
-    threading.Thread(target=_do, daemon=True).start()
+    try:
+        with app.app_context():
+            submit_job('rag_index', {'entity_type': entity_type, 'entity_id': entity_id})
+    except Exception as e:
+        logger.warning(f"_index_entity_async error ({entity_type}/{entity_id}): {e}")
 
 
 def _download_telegram_file(file_id):
@@ -790,8 +805,8 @@ def _download_telegram_file(file_id):
         if not fi.get('ok'):
             return None, None
         fp = fi['result']['file_path']
-        data = requests.get(
-            f'https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{fp}', timeout=30
+        data = http_client.get(
+            'telegram', f'https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{fp}'
         ).content
         return data, fp
     except Exception as e:
@@ -823,9 +838,9 @@ def _transcribe_voice(file_id, app=None, chat_id=None):
         }
         headers = {'Authorization': f'Bearer {OPENAI_API_KEY}'}
         with Stopwatch() as sw:
-            r = requests.post(
-                'https://api.openai.com/v1/audio/transcriptions',
-                headers=headers, files=files, timeout=60,
+            r = http_client.post(
+                'openai', 'https://api.openai.com/v1/audio/transcriptions',
+                headers=headers, files=files,
             )
         if r.status_code != 200:
             logger.warning(f"Whisper API error {r.status_code}: {r.text[:200]}")
@@ -847,7 +862,7 @@ def _upload_telegram_photo(app, file_id, entity_type, entity_id):
         if not fi.get('ok'):
             return None
         fp = fi['result']['file_path']
-        photo_data = requests.get(f'https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{fp}', timeout=30).content
+        photo_data = http_client.get('telegram', f'https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{fp}').content
         from utils.photo_helpers import compress_photo, upload_to_supabase_storage
         compressed, _ = compress_photo(photo_data)
         url = upload_to_supabase_storage(compressed, f"telegram_{file_id}.jpg")
@@ -1990,59 +2005,82 @@ def start_telegram_bot(app):
         logger.info("Telegram bot not started: TELEGRAM_TOKEN or DEEPSEEK_API_KEY not set.")
         return
 
+    from bot.chat_pool import ChatWorkerPool
+    from bot.metrics import track_queue
+
+    def _handle_message(chat_id, msg):
+        """Proceso de un mensaje (corre en un worker del pool)."""
+        txt = msg.get('text', '')
+        photos = msg.get('photo')
+        caption = msg.get('caption', '')
+        voice = msg.get('voice') or msg.get('audio')
+        # Mensaje de voz: transcribir y procesar como texto
+        if voice and not (txt or photos):
+            try:
+                file_id = voice.get('file_id')
+                if not OPENAI_API_KEY:
+                    _send(chat_id, "🎤 Mensaje de voz recibido pero la transcripcion no esta configurada. "
+                                   "Pide al admin que setee OPENAI_API_KEY.")
+                else:
+                    _send(chat_id, "🎤 Transcribiendo mensaje de voz...")
+                    transcribed = _transcribe_voice(file_id, app=app, chat_id=chat_id)
+                    if not transcribed:
+                        _send(chat_id, "❌ No pude transcribir el audio. Intenta de nuevo o escribelo.")
+                    else:
+                        _send(chat_id, f"📝 _Transcripcion:_ {transcribed}")
+                        _process_message(app, chat_id, transcribed, photos=None)
+            except Exception as e:
+                _send(chat_id, f"Error procesando voz: {e}")
+                raise  # el pool lo loguea y lo cuenta como error en metricas
+        elif txt or photos:
+            try:
+                _process_message(app, chat_id, txt or caption, photos=[photos] if photos else None)
+            except Exception as e:
+                _send(chat_id, f"Error: {e}")
+                raise
+
+    pool = ChatWorkerPool(
+        workers=BOT_WORKERS, max_pending=BOT_QUEUE_MAX,
+        on_done=lambda chat_id, wait_ms, run_ms, depth, status, error: track_queue(
+            app, chat_id, wait_ms, run_ms, depth, status=status, error_msg=error),
+    ).start()
+
     def poll():
         global _last_activity_ts
-        logger.info("Telegram bot started. Polling for messages...")
+        logger.info(f"Telegram bot started. Polling for messages ({BOT_WORKERS} workers)...")
         offset = 0
         while True:
             try:
                 result = _tg_api('getUpdates', offset=offset, timeout=20)
-                if result.get('ok') and result.get('result'):
-                    for update in result['result']:
-                        update_id = update['update_id']
-                        offset = update_id + 1
-                        # Idempotencia: si ya procesamos este update, saltarlo
-                        # (evita duplicados cuando hay 2 instancias del bot).
-                        # Pasamos `app` para que coordine via DB entre procesos.
-                        if _seen_update(update_id, app=app):
-                            logger.info(f"Skipping duplicate update_id {update_id}")
-                            continue
-                        msg = update.get('message', {})
-                        chat_id = msg.get('chat', {}).get('id')
-                        if chat_id:
-                            _last_activity_ts = time.time()
-                        txt = msg.get('text', '')
-                        photos = msg.get('photo')
-                        caption = msg.get('caption', '')
-                        voice = msg.get('voice') or msg.get('audio')
-                        # Mensaje de voz: transcribir y procesar como texto
-                        if chat_id and voice and not (txt or photos):
-                            try:
-                                file_id = voice.get('file_id')
-                                if not OPENAI_API_KEY:
-                                    _send(chat_id, "🎤 Mensaje de voz recibido pero la transcripcion no esta configurada. "
-                                                   "Pide al admin que setee OPENAI_API_KEY.")
-                                else:
-                                    _send(chat_id, "🎤 Transcribiendo mensaje de voz...")
-                                    transcribed = _transcribe_voice(file_id, app=app, chat_id=chat_id)
-                                    if not transcribed:
-                                        _send(chat_id, "❌ No pude transcribir el audio. Intenta de nuevo o escribelo.")
-                                    else:
-                                        _send(chat_id, f"📝 _Transcripcion:_ {transcribed}")
-                                        _process_message(app, chat_id, transcribed, photos=None)
-                            except Exception as e:
-                                logger.error(f"Bot voice error: {e}")
-                                _send(chat_id, f"Error procesando voz: {e}")
-                        elif chat_id and (txt or photos):
-                            try:
-                                _process_message(app, chat_id, txt or caption, photos=[photos] if photos else None)
-                            except Exception as e:
-                                logger.error(f"Bot message error: {e}")
-                                _send(chat_id, f"Error: {e}")
+                if not result.get('ok'):
+                    # p.ej. 409 (otra instancia poleando): no martillar la API
+                    logger.warning(f"Bot getUpdates: {result.get('description')}")
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                for update in result.get('result') or []:
+                    update_id = update['update_id']
+                    offset = update_id + 1
+                    # Idempotencia: si ya procesamos este update, saltarlo
+                    # (evita duplicados cuando hay 2 instancias del bot).
+                    # Pasamos `app` para que coordine via DB entre procesos.
+                    if _seen_update(update_id, app=app):
+                        logger.info(f"Skipping duplicate update_id {update_id}")
+                        continue
+                    msg = update.get('message', {})
+                    chat_id = msg.get('chat', {}).get('id')
+                    if not chat_id:
+                        continue
+                    _last_activity_ts = time.time()
+                    if not (msg.get('text') or msg.get('photo') or msg.get('voice') or msg.get('audio')):
+                        continue
+                    # Bloquea si la cola esta llena: el siguiente getUpdates
+                    # espera y Telegram retiene los updates pendientes.
+                    pool.submit(chat_id, lambda c=chat_id, m=msg: _handle_message(c, m))
+                # Sin sleep fijo: el long-poll (timeout=20) ya espera en el
+                # servidor cuando no hay updates.
             except Exception as e:
                 logger.error(f"Bot poll error: {e}")
                 time.sleep(5)
-            time.sleep(POLL_INTERVAL)
 
     def daily_alerts():
         """Run daily summary at 7:00 AM, weekly report on Mondays."""
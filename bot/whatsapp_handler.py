@@ -33,7 +33,7 @@ import logging
 import threading
 from datetime import date, timedelta
 
-import requests
+from utils import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -256,7 +256,7 @@ def _call_deepseek_extraction(app, user, message):
         yesterday=(date.today() - timedelta(days=1)).isoformat(),
     )
     try:
-        r = requests.post(DEEPSEEK_URL, headers={
+        r = http_client.post('deepseek', DEEPSEEK_URL, headers={
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json',
         }, json={
@@ -267,7 +267,7 @@ def _call_deepseek_extraction(app, user, message):
             ],
             'max_tokens': 900, 'temperature': 0.2,
             'response_format': {'type': 'json_object'},
-        }, timeout=60)
+        })
         if r.status_code != 200:
             logger.error(f"DeepSeek extraccion HTTP {r.status_code}: {r.text[:200]}")
             return None
@@ -350,7 +350,8 @@ def _append_observation(app, notice_code, user, obs_text):
                  f"{now_lima_naive().strftime('%Y-%m-%d %H:%M')}]: {obs_text[:400]}")
         with app.app_context():
             _db.session.execute(text(
-                "UPDATE maintenance_notices SET description = description || :obs "
+                "UPDATE maintenance_notices SET description = description || :obs, "
+                "updated_at = CURRENT_TIMESTAMP "
                 "WHERE code = :code"
             ), {"obs": f"\n{stamp}", "code": notice_code})
             _db.session.commit()
@@ -1,7 +1,12 @@
 from typing import Optional
-from sqlalchemy import String, Integer, ForeignKey, Text, Boolean, Float, Date, DateTime, Index
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Integer, ForeignKey, Text, Boolean, Float, Date, DateTime, Index, LargeBinary, event, func, inspect
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 from database import db
+from utils.date_shadows import SHADOW_COLUMNS, sync_date_shadows
+from utils.change_feed import record_tombstone
+from utils.hierarchy import mark_hierarchy_changed
+from utils.search_index import index_search_documents
+from utils.kpi_facts import refresh_kpi_facts_guarded, shutdown_fact_keys, work_order_fact_keys
 from datetime import datetime, date
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -163,6 +168,8 @@ class AppSetting(db.Model):
       week_start_day: dia de inicio del corte semanal para reportes e
         indicadores (0=lunes ... 6=domingo). Ej: 4 = semana de viernes
         a jueves ("corte de viernes a viernes").
+      search_index_synced_at: watermark (ISO, UTC) del sync incremental del
+        indice de busqueda global (utils/search_index.py).
     """
     __tablename__ = 'app_settings'
     key: Mapped[str] = mapped_column(String(60), primary_key=True)
@@ -188,6 +195,8 @@ class Area(db.Model):
     # COCCION (10) -> SECADO (20) -> MOLINO (30) -> CALDERAS (100). NULL = al
     # final, alfabetico. Se puede editar libremente sin afectar nada mas.
     process_order: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     lines = relationship("Line", back_populates="area", cascade="all, delete-orphan")
 
@@ -202,6 +211,8 @@ class Line(db.Model):
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=True)
     area_id: Mapped[int] = mapped_column(ForeignKey('areas.id'), nullable=False)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
     
     area = relationship("Area", back_populates="lines")
     equipments = relationship("Equipment", back_populates="line", cascade="all, delete-orphan")
@@ -258,6 +269,8 @@ class Equipment(db.Model):
     in_service: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
     out_of_service_since: Mapped[str | None] = mapped_column(String(20), nullable=True)
     out_of_service_reason: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     line = relationship("Line", back_populates="equipments")
     systems = relationship("System", back_populates="equipment", cascade="all, delete-orphan")
@@ -465,6 +478,7 @@ class MaintenanceNotice(db.Model):
         Index('ix_notices_status', 'status'),
         Index('ix_notices_equipment_id', 'equipment_id'),
         Index('ix_notices_area_id', 'area_id'),
+        Index('ix_notices_status_request_on', 'status', 'request_on'),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
     code: Mapped[str | None] = mapped_column(String(20), unique=True, nullable=True) # AV-XXXX
@@ -491,6 +505,9 @@ class MaintenanceNotice(db.Model):
     criticality: Mapped[str | None] = mapped_column(String(20), nullable=True)
     priority: Mapped[str | None] = mapped_column(String(20), nullable=True)
     request_date: Mapped[str | None] = mapped_column(String(20), nullable=True)  # F.Solicitud - when created in CMMS
+    # Sombra DATE de request_date para filtros por rango en SQL (ver
+    # utils/date_shadows.py). Se sincroniza sola en cada flush.
+    request_on: Mapped[date | None] = mapped_column(Date, nullable=True)
     # reported_at: hora en que producción avisó realmente (puede ser anterior a
     # request_date si el aviso llegó por WhatsApp/verbal y se registró tarde).
     # Si NULL, el cálculo de tiempo de respuesta cae a request_date (retrocompat).
@@ -525,12 +542,15 @@ class MaintenanceNotice(db.Model):
 
     # Link to rotative asset
     rotative_asset_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     # Link to Work Order (One-to-One or One-to-Many? usually One)
     work_order = relationship("WorkOrder", back_populates="notice", uselist=False)
 
     def to_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns
+                if c.name not in SHADOW_COLUMNS}
 
 class WorkOrder(db.Model):
     __tablename__ = 'work_orders'
@@ -538,6 +558,10 @@ class WorkOrder(db.Model):
         Index('ix_wo_status', 'status'),
         Index('ix_wo_equipment_id', 'equipment_id'),
         Index('ix_wo_notice_id', 'notice_id'),
+        Index('ix_wo_status_real_end_on', 'status', 'real_end_on'),
+        Index('ix_wo_status_real_start_on', 'status', 'real_start_on'),
+        Index('ix_wo_status_scheduled_on', 'status', 'scheduled_on'),
+        Index('ix_wo_equipment_real_end_on', 'equipment_id', 'real_end_on'),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
     code: Mapped[str | None] = mapped_column(String(20), unique=True, nullable=True) # OT-XXXX
@@ -569,6 +593,11 @@ class WorkOrder(db.Model):
     # Execution
     real_start_date: Mapped[str | None] = mapped_column(String(20), nullable=True)
     real_end_date: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    # Sombras DATE de las tres fechas de texto (ver utils/date_shadows.py).
+    # Las rutas de KPI filtran la ventana en SQL sobre estas columnas.
+    scheduled_on: Mapped[date | None] = mapped_column(Date, nullable=True)
+    real_start_on: Mapped[date | None] = mapped_column(Date, nullable=True)
+    real_end_on: Mapped[date | None] = mapped_column(Date, nullable=True)
     execution_comments: Mapped[str | None] = mapped_column(Text, nullable=True)
     real_duration: Mapped[float | None] = mapped_column(nullable=True)
 
@@ -610,6 +639,63 @@ class WorkOrder(db.Model):
     # para pago. Sin URL = pendiente de conformidad.
     conformity_doc_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
     conformity_uploaded_at: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns
+                if c.name not in SHADOW_COLUMNS}
+
+
+@event.listens_for(MaintenanceNotice, 'before_insert')
+@event.listens_for(MaintenanceNotice, 'before_update')
+def _sync_notice_date_shadows(_mapper, _conn, target):
+    sync_date_shadows(target, 'maintenance_notices')
+
+
+@event.listens_for(WorkOrder, 'before_insert')
+@event.listens_for(WorkOrder, 'before_update')
+def _sync_work_order_date_shadows(_mapper, _conn, target):
+    sync_date_shadows(target, 'work_orders')
+
+
+@event.listens_for(WorkOrder, 'after_insert')
+@event.listens_for(WorkOrder, 'after_update')
+def _refresh_work_order_kpi_facts(_mapper, conn, target):
+    refresh_kpi_facts_guarded(conn, work_order_fact_keys(conn, target))
+
+
+@event.listens_for(WorkOrder, 'after_delete')
+def _refresh_deleted_work_order_kpi_facts(_mapper, conn, target):
+    refresh_kpi_facts_guarded(conn, work_order_fact_keys(conn, target, deleted=True))
+
+
+class KpiDailyEquipment(db.Model):
+    """Hechos diarios de confiabilidad por equipo (ver utils/kpi_facts.py).
+
+    Una fila por (equipo, dia de inicio/programacion) con lo acumulado de
+    sus OTs cerradas. La mantienen los eventos de WorkOrder; las rutas de
+    KPI solo la suman.
+    """
+    __tablename__ = 'kpi_daily_equipment'
+    __table_args__ = (
+        Index('ux_kpi_daily_equipment_day', 'equipment_id', 'day', unique=True),
+        Index('ix_kpi_daily_day', 'day'),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    equipment_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    preventive: Mapped[int] = mapped_column(Integer, default=0)
+    corrective: Mapped[int] = mapped_column(Integer, default=0)
+    # Correctivos que ademas cuentan como averia en disponibilidad inherente
+    failures_inherent: Mapped[int] = mapped_column(Integer, default=0)
+    repair_h: Mapped[float] = mapped_column(Float, default=0)
+    # Solo real_duration de correctivos (t_down de /api/reports/kpis)
+    corrective_repair_h: Mapped[float] = mapped_column(Float, default=0)
+    downtime_h: Mapped[float] = mapped_column(Float, default=0)
+    downtime_inherent_h: Mapped[float] = mapped_column(Float, default=0)
+    planned_down_h: Mapped[float] = mapped_column(Float, default=0)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     def to_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -664,6 +750,8 @@ class WarehouseItem(db.Model):
     min_order_qty: Mapped[int | None] = mapped_column(Integer, default=1)
     
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
     
     movements = relationship("WarehouseMovement", back_populates="item", cascade="all, delete-orphan")
 
@@ -685,6 +773,8 @@ class WarehouseMovement(db.Model):
     date: Mapped[str] = mapped_column(String(20), nullable=False) # ISO Date
     reference_id: Mapped[int | None] = mapped_column(Integer, nullable=True) # Work Order ID or other ref
     reason: Mapped[str | None] = mapped_column(String(200), nullable=True) # Description/Reason
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     item = relationship("WarehouseItem", back_populates="movements")
 
@@ -707,6 +797,8 @@ class OTPersonnel(db.Model):
     hours_worked: Mapped[float | None] = mapped_column(Float, nullable=True)  # Actual hours
     attended: Mapped[bool | None] = mapped_column(Boolean, nullable=True)  # NULL=sin confirmar, True=asistio, False=no vino
     replacement_for_id: Mapped[int | None] = mapped_column(ForeignKey('ot_personnel.id'), nullable=True)  # si reemplaza a otro
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     # Relationships
     work_order = relationship("WorkOrder", backref="assigned_personnel")
@@ -799,6 +891,8 @@ class OTMaterial(db.Model):
     item_name_free: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)  # name for free-text items
     unit: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
     is_installed: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True, default=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     # Relationship
     work_order = relationship("WorkOrder", backref="assigned_materials")
@@ -1014,6 +1108,7 @@ class LubricationPoint(db.Model):
     __table_args__ = (
         Index('ix_lp_equipment_id', 'equipment_id'),
         Index('ix_lp_is_active', 'is_active'),
+        Index('ix_lp_active_next_due', 'is_active', 'next_due_date'),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
     code: Mapped[str | None] = mapped_column(String(30), unique=True, nullable=True)
@@ -1048,6 +1143,8 @@ class LubricationPoint(db.Model):
     # diaria la hace mantenimiento interno).
     responsible_party_override: Mapped[str | None] = mapped_column(String(20), nullable=True)
     provider_id_override: Mapped[int | None] = mapped_column(ForeignKey('providers.id'), nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     area = relationship("Area")
     line = relationship("Line")
@@ -1116,6 +1213,8 @@ class LubricationExecution(db.Model):
     comments: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_notice_id: Mapped[int | None] = mapped_column(ForeignKey('maintenance_notices.id'), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     point = relationship("LubricationPoint", back_populates="executions")
     created_notice = relationship("MaintenanceNotice")
@@ -1144,6 +1243,7 @@ class MonitoringPoint(db.Model):
     __table_args__ = (
         Index('ix_mp_equipment_id', 'equipment_id'),
         Index('ix_mp_is_active', 'is_active'),
+        Index('ix_mp_active_next_due', 'is_active', 'next_due_date'),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
     code: Mapped[str | None] = mapped_column(String(30), unique=True, nullable=True)
@@ -1181,6 +1281,8 @@ class MonitoringPoint(db.Model):
     # Override de responsabilidad (NULL = hereda del Equipment)
     responsible_party_override: Mapped[str | None] = mapped_column(String(20), nullable=True)
     provider_id_override: Mapped[int | None] = mapped_column(ForeignKey('providers.id'), nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     area = relationship("Area")
     line = relationship("Line")
@@ -1246,6 +1348,8 @@ class MonitoringReading(db.Model):
     is_regularization: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     created_notice_id: Mapped[int | None] = mapped_column(ForeignKey('maintenance_notices.id'), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     point = relationship("MonitoringPoint", back_populates="readings")
     created_notice = relationship("MaintenanceNotice")
@@ -1486,6 +1590,8 @@ class InspectionRoute(db.Model):
     responsible_party_override: Mapped[str | None] = mapped_column(String(20), nullable=True)
     provider_id_override: Mapped[int | None] = mapped_column(ForeignKey('providers.id'), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     area = relationship("Area")
     line = relationship("Line")
@@ -1571,6 +1677,8 @@ class InspectionExecution(db.Model):
     comments: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_notice_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     route = relationship("InspectionRoute")
 
@@ -1841,6 +1949,7 @@ class ThicknessInspection(db.Model):
     __table_args__ = (
         Index('ix_thk_insp_equip', 'equipment_id'),
         Index('ix_thk_insp_date', 'inspection_date'),
+        Index('ix_thk_insp_equip_date', 'equipment_id', 'inspection_date'),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
     equipment_id: Mapped[int] = mapped_column(ForeignKey('equipments.id'), nullable=False)
@@ -1943,6 +2052,8 @@ class Shutdown(db.Model):
     observations: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     created_by: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                        server_default=func.now(), index=True)
 
     areas = relationship("ShutdownArea", backref="shutdown", cascade="all, delete-orphan")
 
@@ -1966,6 +2077,13 @@ class Shutdown(db.Model):
         }
 
 
+@event.listens_for(Shutdown, 'after_update')
+def _refresh_shutdown_kpi_facts(_mapper, conn, target):
+    # is_planned decide si los correctivos vinculados cuentan en inherente
+    if inspect(target).attrs.is_planned.history.has_changes():
+        refresh_kpi_facts_guarded(conn, shutdown_fact_keys(conn, target.id))
+
+
 class ShutdownArea(db.Model):
     """Áreas involucradas en una parada."""
     __tablename__ = 'shutdown_areas'
@@ -2408,7 +2526,7 @@ class BotUsage(db.Model):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     chat_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    service: Mapped[str] = mapped_column(String(20), nullable=False)  # whisper | deepseek
+    service: Mapped[str] = mapped_column(String(20), nullable=False)  # whisper | deepseek | queue
     model_name: Mapped[str | None] = mapped_column(String(50), nullable=True)
     tokens_in: Mapped[int | None] = mapped_column(Integer, nullable=True)
     tokens_out: Mapped[int | None] = mapped_column(Integer, nullable=True)
@@ -2419,6 +2537,10 @@ class BotUsage(db.Model):
     cost_usd: Mapped[float | None] = mapped_column(Float, nullable=True)
     status: Mapped[str] = mapped_column(String(20), nullable=False, default='success')  # success | error | timeout
     error_msg: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    # service='queue': espera en el pool de workers (latency_ms = proceso)
+    # y mensajes pendientes al encolar (bot/chat_pool.py).
+    queue_wait_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    queue_depth: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     def to_dict(self):
@@ -2436,6 +2558,8 @@ class BotUsage(db.Model):
             "cost_usd": self.cost_usd,
             "status": self.status,
             "error_msg": self.error_msg,
+            "queue_wait_ms": self.queue_wait_ms,
+            "queue_depth": self.queue_depth,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
 
@@ -2589,3 +2713,135 @@ class RentalFailure(db.Model):
             "created_by": self.created_by,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
+
+
+# ============= CHANGE FEED =============
+
+class ChangeTombstone(db.Model):
+    """Borrados en las tablas con updated_at (ver utils/change_feed.py):
+    una fila eliminada ya no aparece por updated_at en /api/changes."""
+    __tablename__ = 'change_tombstones'
+    __table_args__ = (
+        Index('ix_change_tombstones_table_at', 'table_name', 'deleted_at'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    table_name: Mapped[str] = mapped_column(String(64), nullable=False)
+    row_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+# ============= COLA DE TRABAJOS =============
+
+class BackgroundJob(db.Model):
+    """Trabajo en segundo plano (ver utils/job_queue.py): narrativas IA, RCA,
+    indexado RAG. Vive en la BD para que cualquier worker lo ejecute y
+    cualquier worker responda el estado."""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        Index('ix_background_jobs_claim', 'status', 'run_after'),
+        Index('ix_background_jobs_finished', 'finished_at'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # Id publico (se entrega al frontend para sondear)
+    job_key: Mapped[str] = mapped_column(String(32), unique=True, nullable=False)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
+    # PENDIENTE -> EN_CURSO -> OK | ERROR (vuelve a PENDIENTE si falla con
+    # reintentos disponibles; un EN_CURSO con el lease vencido se retoma)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='PENDIENTE')
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=3)
+    run_after: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    locked_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    result: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+# ============= BUSQUEDA GLOBAL =============
+
+class SearchDocument(db.Model):
+    """Documento de busqueda de la barra global (ver utils/search_index.py):
+    una fila por aviso, OT, equipo, actividad, OC o punto de lubricacion,
+    con el texto ya normalizado. En PostgreSQL lleva ademas la columna
+    generada `tsv` (GIN) y un indice trigram sobre search_text; en SQLite
+    la tabla FTS5 `search_fts` se mantiene por triggers."""
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        Index('ux_search_documents_entity', 'entity_type', 'entity_id', unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    entity_type: Mapped[str] = mapped_column(String(40), nullable=False)  # tabla de origen
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    section: Mapped[str] = mapped_column(String(20), nullable=False)  # avisos, ots, equipos...
+    label: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    subtitle: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    badge: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    href: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # Minusculas y sin tildes; empieza por el label (bonus por prefijo)
+    search_text: Mapped[str] = mapped_column(Text, nullable=False, default='')
+    active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    indexed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# ============= EMBEDDINGS (RAG) =============
+
+class EmbeddingCache(db.Model):
+    """Cache persistente content_hash -> vector (ver utils/embeddings.py):
+    antes de llamar a OpenAI se busca aca el mismo texto ya embebido (la
+    misma consulta del bot, la misma descripcion de falla del RCA)."""
+    __tablename__ = 'embedding_cache'
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 modelo + texto
+    embedding: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)  # float32 little-endian
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class LocalEmbedding(db.Model):
+    """Vectores del RAG cuando no hay pgvector (SQLite, despliegues
+    offline): mismo contenido que bot_embeddings, con el vector en float32
+    y la busqueda por fuerza bruta con numpy en el proceso."""
+    __tablename__ = 'bot_embeddings_local'
+    __table_args__ = (
+        Index('ux_bot_embeddings_local_entity', 'entity_type', 'entity_id', unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    entity_type: Mapped[str] = mapped_column(String(40), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    text_chunk: Mapped[str] = mapped_column(Text, nullable=False)
+    embedding: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    metadata_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+# Tablas del feed de cambios: updated_at lo mantiene el ORM (default /
+# onupdate; las escrituras por SQL crudo lo setean a mano) y los borrados
+# ORM dejan tombstone. Query.delete() masivo no dispara eventos.
+CHANGE_TRACKED_MODELS = (
+    Area, Line, Equipment, WorkOrder, MaintenanceNotice, OTPersonnel, OTMaterial,
+    LubricationPoint, LubricationExecution, MonitoringPoint, MonitoringReading,
+    InspectionRoute, InspectionExecution, WarehouseItem, WarehouseMovement, Shutdown,
+)
+for _model in CHANGE_TRACKED_MODELS:
+    event.listen(_model, 'after_delete', record_tombstone)
+
+
+# Jerarquia de activos: cualquier alta/edicion/baja por ORM cambia
+# app_settings.hierarchy_version en la misma transaccion (invalida el
+# snapshot en memoria de utils/hierarchy.py en todos los workers).
+HIERARCHY_MODELS = (Area, Line, Equipment, System, Component)
+event.listen(Session, 'before_flush', mark_hierarchy_changed)
+
+# Barra de busqueda global: las altas/ediciones/bajas por ORM de las fuentes
+# de utils/search_index.py reescriben su documento en la misma transaccion
+# (las escrituras por SQL crudo las recoge sync_search_index via updated_at).
+event.listen(Session, 'after_flush', index_search_documents)
@@ -1,9 +1,14 @@
 import os
+import time
 
 from flask import jsonify, request
 from flask_login import current_user, login_required
 from sqlalchemy import text
 
+from utils.db_backup import iter_dump, list_tables, restore_dump
+from utils.job_queue import job_handler, set_job_progress, submit_job
+from utils.media_store import delete_media, open_media_file, put_media
+
 
 def register_admin_routes(app, db, logger):
 
@@ -129,6 +134,8 @@ def register_admin_routes(app, db, logger):
                                 'ot_bitacora']:
                         safe_delete(f"DELETE FROM {dep}")
                     safe_delete("DELETE FROM photo_attachments WHERE entity_type = 'work_order'")
+                    # Hechos de KPI derivados de las OTs (utils/kpi_facts.py)
+                    safe_delete("DELETE FROM kpi_daily_equipment")
                 if table_name == 'maintenance_notices':
                     safe_delete("DELETE FROM photo_attachments WHERE entity_type = 'notice'")
                 db.session.execute(text(f"DELETE FROM {table_name}"))
@@ -168,7 +175,8 @@ def register_admin_routes(app, db, logger):
         return render_template('db_maintenance.html')
 
     # ── BACKUP DE BASE DE DATOS ──────────────────────────────────────────
-    # Genera un dump JSON comprimido (gzip) de TODAS las tablas. Util para:
+    # Genera un dump NDJSON comprimido (gzip) de TODAS las tablas, en
+    # streaming (utils/db_backup.py). Util para:
     #   - Snapshot manual antes de un cambio riesgoso.
     #   - Punto de restauracion local si algo se corrompe.
     # NO sustituye al backup automatico de Supabase (plan Pro), pero da
@@ -179,12 +187,7 @@ def register_admin_routes(app, db, logger):
 
     def _list_tables():
         """Lista todas las tablas reales (no vistas) en orden alfabetico."""
-        rows = db.session.execute(text("""
-            SELECT table_name FROM information_schema.tables
-            WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
-            ORDER BY table_name
-        """)).fetchall()
-        return [r[0] for r in rows]
+        return sorted(list_tables(db.engine))
 
     @app.route('/api/admin/backup/tables', methods=['GET'])
     @login_required
@@ -212,79 +215,72 @@ def register_admin_routes(app, db, logger):
     @app.route('/api/admin/backup/db-dump', methods=['GET'])
     @login_required
     def download_db_dump():
-        """Descarga un .json.gz con TODOS los datos. El admin puede pasar
-        ?tables=t1,t2 para restringir a un subconjunto."""
+        """Descarga un .ndjson.gz con TODOS los datos, generado y enviado por
+        bloques (memoria acotada). El admin puede pasar ?tables=t1,t2 para
+        restringir a un subconjunto."""
         if not _is_admin():
             return jsonify({"error": "Solo admin"}), 403
-        from flask import send_file
-        import json, gzip, io, datetime as _dt
+        from flask import Response
+        import datetime as _dt
+        requested = (request.args.get('tables') or '').strip()
+        include = [t.strip() for t in requested.split(',') if t.strip()] if requested else None
+        user = getattr(current_user, 'username', '?')
+
+        def _progress(table, rows):
+            logger.info(f"backup ({user}): {table} {rows} filas")
+
+        stamp = _dt.datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        return Response(
+            iter_dump(db.engine, tables=include, progress=_progress),
+            mimetype='application/gzip',
+            headers={'Content-Disposition': f'attachment; filename=cmms_backup_{stamp}.ndjson.gz',
+                     'X-Accel-Buffering': 'no'})
+
+    @job_handler('db_restore', max_attempts=1, lease_seconds=900)
+    def _restore_job(app, payload):
+        from utils.app_settings import bump_permissions_version
+        from utils.hierarchy import bump_hierarchy_version
+        from utils.search_index import rebuild_search_index
+        ref = payload['ref']
+        f = open_media_file(ref)
+        if f is None:
+            raise RuntimeError('Archivo de restauracion no encontrado')
+        last = [0.0]
+
+        def _progress(p):
+            # Como mucho cada 2 s (renueva ademas el lease del trabajo)
+            if time.monotonic() - last[0] >= 2 or p['tables_done'] == p['tables_total']:
+                last[0] = time.monotonic()
+                set_job_progress({'progress': p})
         try:
-            requested = (request.args.get('tables') or '').strip()
-            include = set(t.strip() for t in requested.split(',') if t.strip()) if requested else None
-            tables = _list_tables()
-            if include:
-                tables = [t for t in tables if t in include]
-            dump = {
-                'meta': {
-                    'generated_at': _dt.datetime.utcnow().isoformat() + 'Z',
-                    'app_build': app.config.get('CMMS_DB_MODE'),
-                    'tables_count': len(tables),
-                    'format': 'json.gz/v1',
-                    'note': 'Cada tabla es una lista de dicts. Para restaurar usa POST /api/admin/backup/restore.',
-                },
-                'data': {},
-            }
-            total_rows = 0
-            for t in tables:
-                try:
-                    rows = db.session.execute(text(f'SELECT * FROM "{t}"')).mappings().all()
-                    serialized = []
-                    for r in rows:
-                        d = {}
-                        for k, v in dict(r).items():
-                            # Serializar valores no-JSON
-                            if isinstance(v, (_dt.datetime, _dt.date)):
-                                d[k] = v.isoformat()
-                            elif hasattr(v, 'isoformat'):
-                                d[k] = v.isoformat()
-                            elif isinstance(v, (bytes, bytearray, memoryview)):
-                                # Saltamos blobs (no deberia haber, pero por seguridad)
-                                d[k] = None
-                            else:
-                                d[k] = v
-                        serialized.append(d)
-                    dump['data'][t] = serialized
-                    total_rows += len(serialized)
-                except Exception as te:
-                    logger.warning(f"backup: tabla {t} fallo: {te}")
-                    dump['data'][t] = {'_error': str(te)}
-            dump['meta']['total_rows'] = total_rows
-
-            buf = io.BytesIO()
-            with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as gz:
-                gz.write(json.dumps(dump, ensure_ascii=False, default=str).encode('utf-8'))
-            buf.seek(0)
-            stamp = _dt.datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            fname = f'cmms_backup_{stamp}.json.gz'
-            return send_file(buf, mimetype='application/gzip',
-                             as_attachment=True, download_name=fname)
-        except Exception as e:
-            logger.exception('download_db_dump error')
-            return jsonify({"error": str(e)}), 500
+            with f:
+                result = restore_dump(db.engine, f, wipe=payload.get('wipe', False), progress=_progress)
+        finally:
+            delete_media(ref)
+        # Las filas entran por SQL: caches de jerarquia y permisos de todos
+        # los workers, e indice de busqueda
+        bump_hierarchy_version(db.session)
+        bump_permissions_version()
+        db.session.commit()
+        rebuild_search_index(db)
+        logger.info(f"restore ({payload.get('user')}): {result['total_rows']} filas, wipe={result['wipe']}")
+        return result
 
     @app.route('/api/admin/backup/restore', methods=['POST'])
     @login_required
     def restore_db_dump():
-        """Restaura datos desde un .json.gz generado por download_db_dump.
+        """Restaura datos desde un dump de download_db_dump (.ndjson.gz, o
+        el .json.gz del formato anterior).
         SOLO MERGE (no DROP): inserta filas nuevas y omite las que ya
         existen por PK. Para restauracion total (limpia + reinserta) hay
         que pasar ?wipe=1, lo cual REQUIERE ALLOW_DB_RESET=true en env.
 
-        El upload va por multipart en campo 'file'.
+        El upload va por multipart en campo 'file'. La restauracion corre en
+        la cola de trabajos: responde 202 con job_id y el avance se consulta
+        en GET /api/jobs/<job_id>.
         """
         if not _is_admin():
             return jsonify({"error": "Solo admin"}), 403
-        import json, gzip
         wipe = request.args.get('wipe', '0') == '1'
         if wipe and (os.getenv('ALLOW_DB_RESET', 'false').strip().lower() != 'true'):
             return jsonify({"error": "wipe requiere ALLOW_DB_RESET=true en env"}), 403
@@ -292,49 +288,17 @@ def register_admin_routes(app, db, logger):
         if 'file' not in request.files:
             return jsonify({"error": "Falta archivo (campo 'file')"}), 400
         f = request.files['file']
+        if f.stream.read(2) != b'\x1f\x8b':
+            return jsonify({"error": "Archivo invalido: no es gzip"}), 400
+        f.stream.seek(0)
         try:
-            data = json.loads(gzip.decompress(f.read()).decode('utf-8'))
+            ref = put_media(f.stream, media_type='backup', mimetype='application/gzip', prefix='backup')
+            job_id = submit_job('db_restore', {
+                'ref': ref, 'wipe': wipe, 'user': getattr(current_user, 'username', None)})
         except Exception as e:
-            return jsonify({"error": f"Archivo invalido: {e}"}), 400
-
-        tables = data.get('data') or {}
-        if not isinstance(tables, dict):
-            return jsonify({"error": "Formato dump invalido"}), 400
-
-        # Obtener orden topologico aproximado: padres primero
-        # Estrategia simple: tablas sin FK primero, luego el resto.
-        # Si hay FK violation, capturamos y reportamos.
-        results = {}
-        existing = set(_list_tables())
-        for t, rows in tables.items():
-            if t not in existing:
-                results[t] = {'skipped': 'tabla no existe en BD destino', 'inserted': 0}
-                continue
-            if not isinstance(rows, list):
-                results[t] = {'skipped': 'no es lista', 'inserted': 0}
-                continue
-            inserted = 0
-            errors = 0
-            try:
-                if wipe:
-                    db.session.execute(text(f'DELETE FROM "{t}"'))
-                for row in rows:
-                    if not isinstance(row, dict):
-                        continue
-                    cols = ', '.join(f'"{k}"' for k in row.keys())
-                    placeholders = ', '.join(f':{k}' for k in row.keys())
-                    sql = f'INSERT INTO "{t}" ({cols}) VALUES ({placeholders}) ON CONFLICT DO NOTHING'
-                    try:
-                        db.session.execute(text(sql), row)
-                        inserted += 1
-                    except Exception:
-                        errors += 1
-                db.session.commit()
-                results[t] = {'inserted': inserted, 'errors': errors}
-            except Exception as te:
-                db.session.rollback()
-                results[t] = {'error': str(te)}
-        return jsonify({"ok": True, "wipe": wipe, "tables": results})
+            logger.exception('restore_db_dump error')
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"ok": True, "wipe": wipe, "job_id": job_id, "status": "PENDIENTE"}), 202
 
     @app.route('/admin/backup', methods=['GET'])
     @login_required
@@ -372,7 +336,7 @@ def register_admin_routes(app, db, logger):
                             'UTILITIES', 'RMP']
             for pat in area_patterns:
                 rows = db.session.execute(text("""
-                    UPDATE areas SET include_in_kpi = FALSE
+                    UPDATE areas SET include_in_kpi = FALSE, updated_at = CURRENT_TIMESTAMP
                     WHERE UPPER(name) LIKE :p AND include_in_kpi = TRUE
                     RETURNING id, name
                 """), {"p": f'%{pat.upper()}%'}).fetchall()
@@ -381,7 +345,7 @@ def register_admin_routes(app, db, logger):
 
             # Equipos: hidrolavadoras dentro del area COCCION
             rows = db.session.execute(text("""
-                UPDATE equipments e SET include_in_kpi = FALSE
+                UPDATE equipments e SET include_in_kpi = FALSE, updated_at = CURRENT_TIMESTAMP
                 FROM lines l, areas a
                 WHERE e.line_id = l.id AND l.area_id = a.id
                   AND UPPER(a.name) LIKE '%COCCION%'
@@ -392,6 +356,8 @@ def register_admin_routes(app, db, logger):
             for r in rows:
                 results['equipments_excluded'].append({'id': r[0], 'tag': r[1], 'name': r[2]})
 
+            from utils.hierarchy import bump_hierarchy_version
+            bump_hierarchy_version()
             db.session.commit()
             results['ok'] = True
             return jsonify(results)
@@ -400,6 +366,25 @@ def register_admin_routes(app, db, logger):
             logger.exception('apply_kpi_default_exclusions error')
             return jsonify({"error": str(e)}), 500
 
+    @app.route('/api/admin/kpi-facts/rebuild', methods=['POST'])
+    @login_required
+    def rebuild_kpi_facts_route():
+        """Reconstruye kpi_daily_equipment desde las OTs cerradas. Opcional
+        {"since": "YYYY-MM-DD"} para rehacer solo desde esa fecha (p.ej.
+        tras una carga masiva por SQL). Idempotente."""
+        if not _is_admin():
+            return jsonify({"error": "Solo admin"}), 403
+        try:
+            from utils.kpi_facts import rebuild_kpi_facts
+            since = (request.get_json(silent=True) or {}).get('since')
+            stats = rebuild_kpi_facts(db, since=since, logger=logger)
+            logger.warning(f"KPI facts rebuild (since={since}) por {current_user.username}: {stats}")
+            return jsonify({'ok': True, **stats})
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('rebuild_kpi_facts error')
+            return jsonify({"error": str(e)}), 500
+
     # ── BOT USAGE / TELEMETRIA DEL BOT TELEGRAM ──────────────────────────────
     @app.route('/api/admin/bot-usage', methods=['GET'])
     @login_required
@@ -407,7 +392,9 @@ def register_admin_routes(app, db, logger):
         """Resumen de uso del bot. Query: ?days=7 (default).
 
         Devuelve totales por dia, por servicio (whisper/deepseek), por chat,
-        y top errores. Util para auditar gasto y detectar abuso.
+        y top errores. Util para auditar gasto y detectar abuso. Las filas
+        service='queue' (pool de workers) van aparte en `queue`: no son
+        llamadas a proveedores.
         """
         if not _is_admin():
             return jsonify({"error": "Solo admin"}), 403
@@ -440,6 +427,8 @@ def register_admin_routes(app, db, logger):
             grand_cost = 0.0
             grand_calls = 0
             for r in totals:
+                if r[0] == 'queue':
+                    continue
                 cost = float(r[6] or 0)
                 grand_cost += cost
                 grand_calls += int(r[1] or 0)
@@ -464,6 +453,7 @@ def register_admin_routes(app, db, logger):
                            SUM(COALESCE(cost_usd, 0)) AS cost_usd
                     FROM bot_usage
                     WHERE created_at >= CURRENT_TIMESTAMP - INTERVAL :i
+                      AND service <> 'queue'
                     GROUP BY day, service
                     ORDER BY day DESC, service
                 """
@@ -476,6 +466,7 @@ def register_admin_routes(app, db, logger):
                            SUM(COALESCE(cost_usd, 0)) AS cost_usd
                     FROM bot_usage
                     WHERE created_at >= datetime('now', '-{days} days')
+                      AND service <> 'queue'
                     GROUP BY day, service
                     ORDER BY day DESC, service
                 """
@@ -488,7 +479,7 @@ def register_admin_routes(app, db, logger):
                        COUNT(*) AS calls,
                        SUM(COALESCE(cost_usd, 0)) AS cost_usd
                 FROM bot_usage
-                WHERE chat_id IS NOT NULL
+                WHERE chat_id IS NOT NULL AND service <> 'queue'
                   AND { 'created_at >= CURRENT_TIMESTAMP - INTERVAL :i' if db.engine.dialect.name == 'postgresql' else f"created_at >= datetime('now', '-{days} days')" }
                 GROUP BY chat_id
                 ORDER BY cost_usd DESC
@@ -500,6 +491,22 @@ def register_admin_routes(app, db, logger):
                 for r in db.session.execute(text(chat_q), chat_params).fetchall()
             ]
 
+            # Pool de workers: espera en cola, proceso y profundidad
+            q = db.session.execute(text(f"""
+                SELECT COUNT(*), AVG(queue_wait_ms), MAX(queue_wait_ms),
+                       AVG(latency_ms), MAX(queue_depth)
+                FROM bot_usage
+                WHERE service = 'queue'
+                  AND {base_filter.replace(':d days', f"{days} days")}
+            """), params).fetchone()
+            queue = {
+                'messages': int(q[0] or 0),
+                'avg_wait_ms': int(q[1] or 0),
+                'max_wait_ms': int(q[2] or 0),
+                'avg_run_ms': int(q[3] or 0),
+                'max_depth': int(q[4] or 0),
+            }
+
             return jsonify({
                 'period_days': days,
                 'grand_totals': {
@@ -509,11 +516,22 @@ def register_admin_routes(app, db, logger):
                 'by_service': by_service,
                 'by_day': by_day,
                 'by_chat': by_chat,
+                'queue': queue,
             })
         except Exception as e:
             logger.exception('bot_usage_summary error')
             return jsonify({"error": str(e)}), 500
 
+    @app.route('/api/admin/http-stats', methods=['GET'])
+    @login_required
+    def http_client_stats():
+        """Latencias de las llamadas salientes (Telegram, DeepSeek, OpenAI,
+        Supabase) de este proceso: llamadas, errores, reintentos e histograma."""
+        if not _is_admin():
+            return jsonify({"error": "Solo admin"}), 403
+        from utils.http_client import http_stats
+        return jsonify({'services': http_stats()})
+
     @app.route('/admin/bot-usage', methods=['GET'])
     @login_required
     def bot_usage_page():
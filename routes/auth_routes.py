@@ -3,6 +3,7 @@ from urllib.parse import urlparse
 from flask import jsonify, redirect, render_template, request, url_for
 from flask_login import current_user, login_required, login_user, logout_user
 
+from utils.app_settings import bump_permissions_version
 from utils.audit import audit_log
 from utils.rate_limit import limit_login
 
@@ -604,12 +605,13 @@ def register_auth_routes(app, db, logger, User, RolePermission=None):
         if not RolePermission:
             return {r: {m['key']: _expand_default(DEFAULTS.get(r, {}).get(m['key'], {}))
                         for m in MODULES} for r in ROLES}
+        rows = {(p.role, p.module): p for p in RolePermission.query.all()}
         result = {}
         for role in ROLES:
             result[role] = {}
             for mod in MODULES:
                 key = mod['key']
-                perm = RolePermission.query.filter_by(role=role, module=key).first()
+                perm = rows.get((role, key))
                 default_perm = _expand_default(DEFAULTS.get(role, {}).get(key, {}))
                 if perm:
                     result[role][key] = {
@@ -698,6 +700,8 @@ def register_auth_routes(app, db, logger, User, RolePermission=None):
         data = request.get_json() or {}
         # data = { role: { module: { view, create, edit, delete,
         #                            export, import, close, approve } } }
+        existing_rows = {(p.role, p.module): p for p in
+                         RolePermission.query.filter(RolePermission.role.in_(list(data.keys()))).all()}
         for role, modules in data.items():
             if role not in ROLES:
                 continue
@@ -714,7 +718,7 @@ def register_auth_routes(app, db, logger, User, RolePermission=None):
                     'can_edit_ot':      bool(perms.get('edit_ot', False)),
                     'can_adjust_hours': bool(perms.get('adjust_hours', False)),
                 }
-                existing = RolePermission.query.filter_by(role=role, module=module).first()
+                existing = existing_rows.get((role, module))
                 if existing:
                     for k, v in fields.items():
                         # Por compat: si la columna aun no existe en BD vieja,
@@ -724,14 +728,10 @@ def register_auth_routes(app, db, logger, User, RolePermission=None):
                             setattr(existing, k, v)
                 else:
                     db.session.add(RolePermission(role=role, module=module, **fields))
+        # Invalida el cache de permisos (app._load_role_perms) en todos los
+        # workers: cada uno compara su entrada contra este contador.
+        bump_permissions_version()
         db.session.commit()
-        # Invalidar el cache del middleware en app.py
-        try:
-            import app as _app_mod
-            _app_mod._perms_cache.clear()
-            _app_mod._perms_cache_ts = 0
-        except Exception:
-            pass
         audit_log('PERMISSION_CHANGE', module='users',
                   detail=f"roles_modified={list(data.keys())}")
         return jsonify({"ok": True})
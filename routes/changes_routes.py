@@ -0,0 +1,66 @@
+"""Feed de cambios para sincronizacion incremental (ver utils/change_feed.py).
+
+GET /api/changes?since=<ISO>[&tables=work_orders,maintenance_notices]
+                 [&limit=1000][&after_id=<id>]
+
+Devuelve por tabla los ids modificados (updated_at >= since) y los borrados
+(tombstones). Power BI, el mirror del VPS y el re-indexado RAG lo usan para
+pasar de recorridos completos a deltas. Cada tabla exige el permiso 'view'
+de su modulo, igual que su endpoint propio.
+"""
+from flask import jsonify, request
+from flask_login import current_user
+
+
+def _module_viewer():
+    """can_view(modulo) del usuario actual (admin ve todo)."""
+    role = getattr(current_user, 'role', None)
+    if role == 'admin':
+        return lambda module: True
+    from app import _load_role_perms
+    perms = _load_role_perms(role)
+    return lambda module: bool(module) and perms.get(module, {}).get('view', False)
+
+
+def register_changes_routes(app, db, logger):
+    from utils.change_feed import (
+        DEFAULT_LIMIT, changes_since, parse_since, prune_tombstones_if_due, tracked_tables,
+        visible_tables,
+    )
+
+    @app.route('/api/changes', methods=['GET'])
+    def change_feed():
+        try:
+            since = parse_since(request.args.get('since'))
+        except ValueError:
+            return jsonify({"error": "since invalido (ISO 8601)"}), 400
+        allowed = visible_tables(_module_viewer())
+        if since is None:
+            return jsonify({
+                "error": "Falta since (ISO 8601)",
+                "tables": sorted(allowed),
+            }), 400
+
+        tables = [t.strip() for t in (request.args.get('tables') or '').split(',') if t.strip()]
+        denied = [t for t in tables if t in tracked_tables() and t not in allowed]
+        if denied:
+            return jsonify({"error": f"No tienes permiso para ver: {', '.join(denied)}"}), 403
+        if not tables:
+            tables = sorted(allowed)
+            if not tables:
+                return jsonify({"error": "No tienes permiso para ver ninguna tabla del feed."}), 403
+        limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+        after_id = request.args.get('after_id', type=int)
+        try:
+            prune_tombstones_if_due(db, logger=logger)
+        except Exception as e:
+            logger.warning(f"Change tombstone prune skipped: {e}")
+            db.session.rollback()
+        try:
+            return jsonify(changes_since(db.session, since, tables=tables,
+                                         limit=limit, after_id=after_id))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.exception("Change feed error")
+            return jsonify({"error": str(e)}), 500
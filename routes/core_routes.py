@@ -30,9 +30,15 @@ def register_core_routes(app, db, logger, app_build_tag,
     @app.route('/sw.js', methods=['GET'])
     def serve_service_worker():
         """Sirve el Service Worker desde la RAIZ para que controle todo el sitio.
-        Si se sirve desde /static/ su scope queda limitado a /static/."""
-        from flask import send_from_directory, make_response
-        resp = make_response(send_from_directory('static', 'sw.js', mimetype='application/javascript'))
+        Si se sirve desde /static/ su scope queda limitado a /static/.
+        CACHE_NAME y la lista de pre-cache salen del manifiesto de assets con
+        huella: cualquier cambio de CSS/JS invalida la cache de los clientes."""
+        import os
+        from flask import make_response
+        from utils.static_assets import render_service_worker
+        with open(os.path.join(app.static_folder, 'sw.js'), encoding='utf-8') as f:
+            resp = make_response(render_service_worker(f.read()))
+        resp.mimetype = 'application/javascript'
         # No cachear el SW (debe verificar updates con cada visita)
         resp.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         resp.headers['Service-Worker-Allowed'] = '/'
@@ -46,126 +52,15 @@ def register_core_routes(app, db, logger, app_build_tag,
 
     @app.route('/api/global-search', methods=['GET'])
     def global_search():
-        """Busqueda global cross-modulo: avisos, OTs, equipos, componentes,
-        actividades, OCs, puntos de lubricacion, rutas de inspeccion. Devuelve
-        resultados agrupados por tipo con un enlace para navegar."""
-        from sqlalchemy import or_, text as _t
+        """Busqueda global cross-modulo: avisos, OTs, equipos, actividades,
+        OCs y puntos de lubricacion. Devuelve resultados agrupados por tipo
+        con un enlace para navegar (indice en utils/search_index.py)."""
+        from utils.search_index import search_documents
         try:
             q = (request.args.get('q') or '').strip()
             if len(q) < 2:
                 return jsonify({"error": "min 2 caracteres", "results": {}}), 400
-            like = f"%{q}%"
-            limit_per_section = 8
-            results = {}
-
-            # Avisos
-            try:
-                from models import MaintenanceNotice
-                rows = MaintenanceNotice.query.filter(or_(
-                    MaintenanceNotice.code.ilike(like),
-                    MaintenanceNotice.description.ilike(like),
-                )).order_by(MaintenanceNotice.id.desc()).limit(limit_per_section).all()
-                results['avisos'] = [{
-                    'label': r.code or f"AV-{r.id}",
-                    'subtitle': (r.description or '')[:80],
-                    'badge': r.status,
-                    'href': f'/avisos#{r.id}',
-                } for r in rows]
-            except Exception:
-                results['avisos'] = []
-
-            # OTs
-            try:
-                rows = WorkOrder.query.filter(or_(
-                    WorkOrder.code.ilike(like),
-                    WorkOrder.description.ilike(like),
-                )).order_by(WorkOrder.id.desc()).limit(limit_per_section).all()
-                results['ots'] = [{
-                    'label': r.code or f"OT-{r.id}",
-                    'subtitle': (r.description or '')[:80],
-                    'badge': r.status,
-                    'href': f'/ordenes#{r.id}',
-                } for r in rows]
-            except Exception:
-                results['ots'] = []
-
-            # Equipos
-            try:
-                rows = Equipment.query.filter(or_(
-                    Equipment.tag.ilike(like),
-                    Equipment.name.ilike(like),
-                )).order_by(Equipment.tag).limit(limit_per_section).all()
-                results['equipos'] = [{
-                    'label': f"{r.tag or ''} — {r.name}",
-                    'subtitle': r.description or '',
-                    'badge': r.criticality or '',
-                    'href': f'/equipo-historial?id={r.id}',
-                } for r in rows]
-            except Exception:
-                results['equipos'] = []
-
-            # Actividades (Seguimiento)
-            try:
-                from models import Activity
-                rows = Activity.query.filter(or_(
-                    Activity.title.ilike(like),
-                    Activity.description.ilike(like),
-                    Activity.responsible.ilike(like),
-                )).order_by(Activity.id.desc()).limit(limit_per_section).all()
-                results['actividades'] = [{
-                    'label': r.title,
-                    'subtitle': f"{r.activity_type} · {r.responsible or '-'}",
-                    'badge': r.status,
-                    'href': f'/seguimiento#{r.id}',
-                } for r in rows]
-            except Exception:
-                results['actividades'] = []
-
-            # OCs (con coincidencia por items via search endpoint)
-            try:
-                from models import PurchaseOrder, PurchaseRequest
-                rows = PurchaseOrder.query.filter(or_(
-                    PurchaseOrder.po_code.ilike(like),
-                    PurchaseOrder.external_rq_code.ilike(like),
-                    PurchaseOrder.provider_name.ilike(like),
-                )).order_by(PurchaseOrder.id.desc()).limit(limit_per_section).all()
-                # Tambien buscar OCs cuyos items matcheen
-                req_rows = PurchaseRequest.query.filter(or_(
-                    PurchaseRequest.req_code.ilike(like),
-                    PurchaseRequest.description.ilike(like),
-                )).filter(PurchaseRequest.purchase_order_id.isnot(None)).limit(20).all()
-                seen = {r.id for r in rows}
-                for rq in req_rows:
-                    if rq.purchase_order_id not in seen and rq.purchase_order:
-                        rows.append(rq.purchase_order)
-                        seen.add(rq.purchase_order_id)
-                results['compras'] = [{
-                    'label': r.po_code,
-                    'subtitle': f"{r.provider_name}{' · RQ ' + r.external_rq_code if r.external_rq_code else ''}",
-                    'badge': r.status,
-                    'href': '/compras',
-                } for r in rows[:limit_per_section]]
-            except Exception:
-                results['compras'] = []
-
-            # Puntos lubricacion
-            try:
-                from models import LubricationPoint
-                rows = LubricationPoint.query.filter(
-                    LubricationPoint.is_active == True,  # noqa: E712
-                ).filter(or_(
-                    LubricationPoint.code.ilike(like),
-                    LubricationPoint.name.ilike(like),
-                )).limit(limit_per_section).all()
-                results['lubricacion'] = [{
-                    'label': r.code or f"LUB-{r.id}",
-                    'subtitle': r.name,
-                    'badge': r.semaphore_status or '',
-                    'href': '/lubricacion',
-                } for r in rows]
-            except Exception:
-                results['lubricacion'] = []
-
+            results = search_documents(db, q, logger=logger)
             total = sum(len(v) for v in results.values())
             return jsonify({"q": q, "total": total, "results": results})
         except Exception as e:
@@ -489,135 +384,106 @@ def register_core_routes(app, db, logger, app_build_tag,
             mode_raw = (request.args.get('mode') or 'operativa').strip().lower()
             mode = mode_raw if mode_raw in ('operativa', 'inherente') else 'operativa'
 
-            # Pre-cargar IDs de paradas NO planificadas para filtro inherente.
-            unplanned_shutdown_ids = set()
-            if mode == 'inherente':
-                try:
-                    from models import Shutdown
-                    unplanned_shutdown_ids = {
-                        r[0] for r in Shutdown.query.filter_by(is_planned=False)
-                            .with_entities(Shutdown.id).all()
-                    }
-                except Exception as _e:
-                    logger.warning(f"Shutdown.is_planned no disponible: {_e}")
-
             cutoff = (dt.date.today() - dt.timedelta(days=days)).isoformat()
             calendar_hours = days * 24
 
-            # Pre-load hierarchy maps
-            areas_map = {a.id: a.name for a in Area.query.all()}
-            lines_map = {l.id: {'name': l.name, 'area_id': l.area_id} for l in Line.query.all()}
-            equips_all = Equipment.query.all()
+            # Jerarquia desde el snapshot del proceso (utils/hierarchy.py)
+            from utils.hierarchy import get_hierarchy
+            h = get_hierarchy()
             equips_map = {}
-            for e in equips_all:
-                l = lines_map.get(e.line_id, {})
+            for e in h.equipments.values():
+                l = h.lines.get(e.line_id)
+                a = h.areas.get(l.area_id) if l else None
                 equips_map[e.id] = {
                     'name': e.name, 'tag': e.tag, 'criticality': e.criticality,
-                    'line_id': e.line_id, 'line_name': l.get('name'),
-                    'area_id': l.get('area_id'), 'area_name': areas_map.get(l.get('area_id')),
+                    'line_id': e.line_id, 'line_name': l.name if l else None,
+                    'area_id': l.area_id if l else None, 'area_name': a.name if a else None,
                 }
 
-            # Fetch closed corrective OTs within window
-            query = WorkOrder.query.filter(
-                WorkOrder.status == 'Cerrada',
-                WorkOrder.equipment_id.isnot(None),
-            )
-            # Filter by date: use scheduled_date or real_start_date
-            all_ots = query.all()
-            ots_in_window = []
-            for ot in all_ots:
-                d = _parse_date_flexible(ot.real_start_date or ot.scheduled_date)
-                if d and d.isoformat() >= cutoff:
-                    ots_in_window.append(ot)
-
-            # Filter by hierarchy
-            if area_id:
-                ots_in_window = [ot for ot in ots_in_window
-                                 if equips_map.get(ot.equipment_id, {}).get('area_id') == area_id]
-            if line_id:
-                ots_in_window = [ot for ot in ots_in_window
-                                 if equips_map.get(ot.equipment_id, {}).get('line_id') == line_id]
+            # Agregados desde la tabla de hechos kpi_daily_equipment (una fila
+            # por equipo y dia, mantenida al cerrar/editar/borrar OTs; ver
+            # utils/kpi_facts.py): una suma por equipo en SQL.
+            from models import KpiDailyEquipment as F
+            from utils.kpi_facts import is_corrective_type, ot_equipment_source, ot_repair_hours
+            cutoff_d = dt.date.fromisoformat(cutoff)
+            inherent = (mode == 'inherente')
+            fact_rows = db.session.query(
+                F.equipment_id,
+                db.func.sum(F.failures_inherent if inherent else F.corrective).label('failures'),
+                db.func.sum(F.repair_h).label('repair_h'),
+                db.func.sum(F.downtime_inherent_h if inherent else F.downtime_h).label('downtime_h'),
+                db.func.sum(F.planned_down_h).label('planned_down_h'),
+                db.func.sum(F.preventive).label('preventive'),
+                db.func.sum(F.corrective).label('corrective'),
+            ).filter(F.day >= cutoff_d).group_by(F.equipment_id).all()
+
+            def _in_scope(eq_info):
+                if area_id and eq_info.get('area_id') != area_id:
+                    return False
+                if line_id and eq_info.get('line_id') != line_id:
+                    return False
+                return True
+
+            def _group_key(equipment_id, eq_info):
+                if level == 'equipment':
+                    label = f"{eq_info.get('tag') or ''} {eq_info.get('name', '?')}".strip()
+                    return equipment_id, label
+                if level == 'line':
+                    return eq_info.get('line_id'), eq_info.get('line_name') or '(Sin Linea)'
+                return eq_info.get('area_id'), eq_info.get('area_name') or '(Sin Area)'
 
             # ── Group by level ────────────────────────────────────────────
             groups = defaultdict(lambda: {
                 'failures': 0, 'total_repair_h': 0, 'downtime_h': 0,
                 'preventive': 0, 'corrective': 0, 'ots': [],
-                'downtime_events': 0, 'planned_down_h': 0,
+                'planned_down_h': 0,
             })
 
-            for ot in ots_in_window:
-                eq_info = equips_map.get(ot.equipment_id, {})
-                if level == 'equipment':
-                    key = ot.equipment_id
-                    label = f"{eq_info.get('tag') or ''} {eq_info.get('name', '?')}".strip()
-                elif level == 'line':
-                    key = eq_info.get('line_id')
-                    label = eq_info.get('line_name') or '(Sin Linea)'
-                else:
-                    key = eq_info.get('area_id')
-                    label = eq_info.get('area_name') or '(Sin Area)'
-
+            for row in fact_rows:
+                eq_info = equips_map.get(row.equipment_id, {})
+                if not _in_scope(eq_info):
+                    continue
+                key, label = _group_key(row.equipment_id, eq_info)
                 if not key:
                     continue
-
                 g = groups[key]
                 g['label'] = label
                 g['id'] = key
-
-                mtype = (ot.maintenance_type or '').lower()
-                is_corrective = 'correct' in mtype
-
-                # En modo INHERENTE: solo averias (paro NO planificado) cuentan
-                # como falla y aportan downtime. Manda el campo explicito
-                # downtime_planned de la OT; si es NULL se deriva: correctivo
-                # sin parada vinculada (o con parada por averia) = averia.
-                shutdown_id = getattr(ot, 'shutdown_id', None)
-                dp = getattr(ot, 'downtime_planned', None)
-                if dp is not None:
-                    qualifies_inherent = not dp
-                else:
-                    qualifies_inherent = (
-                        is_corrective and
-                        (not shutdown_id or shutdown_id in unplanned_shutdown_ids)
-                    )
-
-                if is_corrective:
-                    g['corrective'] += 1
-                    if mode == 'operativa' or qualifies_inherent:
-                        g['failures'] += 1
-                else:
-                    g['preventive'] += 1
-
-                # Repair time
-                repair_h = _safe_duration_hours(ot.real_duration)
-                if not repair_h:
-                    rs = _parse_date_flexible(ot.real_start_date)
-                    re = _parse_date_flexible(ot.real_end_date)
-                    if rs and re:
-                        repair_h = round((re - rs).total_seconds() / 3600, 2)
-                g['total_repair_h'] += (repair_h or 0)
-
-                # Downtime — en modo inherente solo cuentan las averias; el
-                # paro planificado se acumula aparte para descontarlo de la
-                # base de tiempo (T - Pp) de la disponibilidad inherente.
-                count_downtime = (mode == 'operativa') or qualifies_inherent
-                dh = getattr(ot, 'downtime_hours', None)
-                eff_dh = 0
-                if dh:
-                    eff_dh = dh
-                elif getattr(ot, 'caused_downtime', False) and repair_h:
-                    eff_dh = repair_h
-                elif is_corrective and repair_h:
-                    # Default: corrective OTs count as downtime
-                    eff_dh = repair_h
-                if eff_dh:
-                    if count_downtime:
-                        g['downtime_h'] += eff_dh
-                        g['downtime_events'] += 1
-                    elif not qualifies_inherent:
-                        g['planned_down_h'] += eff_dh
-
-                g['ots'].append({
+                g['failures'] += int(row.failures or 0)
+                g['total_repair_h'] += float(row.repair_h or 0)
+                g['downtime_h'] += float(row.downtime_h or 0)
+                # En operativa todo el paro ya esta en downtime_h; el
+                # planificado solo se descuenta de la base en inherente.
+                if inherent:
+                    g['planned_down_h'] += float(row.planned_down_h or 0)
+                g['preventive'] += int(row.preventive or 0)
+                g['corrective'] += int(row.corrective or 0)
+
+            # Detalle para el drill-down: solo columnas, misma ventana SQL
+            # (sombras DATE) y mismo equipo resuelto que la tabla de hechos.
+            ot_from, ot_equipment = ot_equipment_source(WorkOrder.__table__)
+            ot_rows = db.session.query(
+                WorkOrder.code, ot_equipment.label('equipment_id'), WorkOrder.maintenance_type,
+                WorkOrder.failure_mode, WorkOrder.description,
+                WorkOrder.real_start_date, WorkOrder.real_end_date,
+                WorkOrder.scheduled_date, WorkOrder.real_duration,
+                WorkOrder.downtime_hours,
+            ).select_from(ot_from).filter(
+                WorkOrder.status == 'Cerrada',
+                ot_equipment.isnot(None),
+                db.func.coalesce(WorkOrder.real_start_on, WorkOrder.scheduled_on) >= cutoff_d,
+            ).all()
+            for ot in ot_rows:
+                eq_info = equips_map.get(ot.equipment_id, {})
+                if not _in_scope(eq_info):
+                    continue
+                key, _label = _group_key(ot.equipment_id, eq_info)
+                if not key or key not in groups:
+                    continue
+                is_corrective = is_corrective_type(ot.maintenance_type)
+                repair_h = ot_repair_hours(ot)
+                dh = ot.downtime_hours
+                groups[key]['ots'].append({
                     'code': ot.code,
                     'date': ot.real_start_date or ot.scheduled_date,
                     'type': ot.maintenance_type,
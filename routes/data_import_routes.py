@@ -6,6 +6,7 @@ import pandas as pd
 from flask import jsonify, request, send_file
 from flask_login import login_required
 
+from utils.hierarchy_import import HierarchyImporter
 from utils.rate_limit import limit_export
 
 
@@ -35,11 +36,6 @@ def register_data_import_routes(
         text = str(value).strip()
         return text or None
 
-    def _default_tag(equipment_name, line_name):
-        eq = "".join(ch for ch in (equipment_name or "").upper() if ch.isalnum())[:4] or "EQ"
-        ln = "".join(ch for ch in (line_name or "").upper() if ch.isalnum())[:4] or "LN"
-        return f"{eq}-{ln}"
-
     def _map_hierarchy_columns(df):
         aliases = {
             "area": "area",
@@ -104,105 +100,43 @@ def register_data_import_routes(
             )
         return rows
 
-    def _upsert_hierarchy_row(row_data, stats):
-        required_values = ["area", "line", "equipment", "system", "component"]
-        missing = [k for k in required_values if not row_data.get(k)]
-        if missing:
-            return {"ok": False, "error": f"faltan valores: {', '.join(missing)}"}
-
-        area_name = row_data["area"]
-        line_name = row_data["line"]
-        equipment_name = row_data["equipment"]
-        equipment_tag = row_data.get("equipment_tag")
-        system_name = row_data["system"]
-        component_name = row_data["component"]
-        component_description = row_data.get("component_description")
-        component_criticality = row_data.get("component_criticality")
-
-        area = Area.query.filter_by(name=area_name).first()
-        if not area:
-            area = Area(name=area_name, description="")
-            db.session.add(area)
-            db.session.flush()
-            stats["created_areas"] += 1
-
-        line_obj = Line.query.filter_by(name=line_name, area_id=area.id).first()
-        if not line_obj:
-            line_obj = Line(name=line_name, description="", area=area)
-            db.session.add(line_obj)
-            db.session.flush()
-            stats["created_lines"] += 1
-
-        equip = Equipment.query.filter_by(name=equipment_name, line_id=line_obj.id).first()
-        if not equip:
-            equip = Equipment(
-                name=equipment_name,
-                tag=equipment_tag or _default_tag(equipment_name, line_name),
-                description="",
-                line=line_obj,
-            )
-            db.session.add(equip)
-            db.session.flush()
-            stats["created_equipments"] += 1
-        elif equipment_tag and (not equip.tag or equip.tag.strip() in {"", "-"}):
-            equip.tag = equipment_tag
-            stats["updated_equipments"] += 1
-
-        system = System.query.filter_by(name=system_name, equipment_id=equip.id).first()
-        if not system:
-            system = System(name=system_name, equipment=equip)
-            db.session.add(system)
-            db.session.flush()
-            stats["created_systems"] += 1
-
-        comp = Component.query.filter_by(name=component_name, system_id=system.id).first()
-        if not comp:
-            comp = Component(
-                name=component_name,
-                description=component_description or "",
-                criticality=component_criticality or "Media",
-                system=system,
-            )
-            db.session.add(comp)
-            stats["created_components"] += 1
-        else:
-            touched = False
-            if component_description and not (comp.description or "").strip():
-                comp.description = component_description
-                touched = True
-            if component_criticality and not (comp.criticality or "").strip():
-                comp.criticality = component_criticality
-                touched = True
-            if touched:
-                stats["updated_components"] += 1
-            else:
-                stats["skipped_existing"] += 1
-
-        return {"ok": True}
-
-    def _process_hierarchy_rows(rows):
-        stats = {
-            "rows_received": len(rows),
-            "rows_processed": 0,
-            "created_areas": 0,
-            "created_lines": 0,
-            "created_equipments": 0,
-            "created_systems": 0,
-            "created_components": 0,
-            "updated_equipments": 0,
-            "updated_components": 0,
-            "skipped_existing": 0,
-        }
-        errors = []
-
-        for row_data in rows:
-            result = _upsert_hierarchy_row(row_data, stats)
-            if result.get("ok"):
-                stats["rows_processed"] += 1
-            else:
-                errors.append({"row": row_data.get("row_num"), "error": result.get("error")})
-
-        return stats, errors
+    _IMPORT_MODELS = {
+        'area': Area, 'line': Line, 'equipment': Equipment,
+        'system': System, 'component': Component,
+    }
+
+    # entity_type -> ((columna, nivel), ...); el ultimo nivel es el que se crea
+    _BULK_PASTE_COLUMNS = {
+        'Areas': (('Name', 'area'),),
+        'Lines': (('AreaName', 'area'), ('Name', 'line')),
+        'Equipments': (('AreaName', 'area'), ('LineName', 'line'), ('Tag', 'equipment_tag'),
+                       ('Name', 'equipment')),
+        'Systems': (('AreaName', 'area'), ('LineName', 'line'), ('EquipmentName', 'equipment'),
+                    ('Name', 'system')),
+        'Components': (('AreaName', 'area'), ('LineName', 'line'), ('EquipmentName', 'equipment'),
+                       ('SystemName', 'system'), ('Name', 'component')),
+    }
+
+    def _validate_only():
+        # ?validate_only=1 (tambien en el form del upload o en el JSON)
+        raw = request.args.get('validate_only')
+        if raw is None:
+            raw = request.form.get('validate_only')
+        if raw is None and request.is_json:
+            raw = (request.get_json(silent=True) or {}).get('validate_only')
+        return str(raw).strip().lower() in ('1', 'true', 'yes', 'si')
+
+    def _process_hierarchy_rows(rows, leaf='component', create_parents=True, validate_only=False):
+        importer = HierarchyImporter(db.session, _IMPORT_MODELS, create_parents=create_parents)
+        return importer.run(rows, leaf=leaf, validate_only=validate_only)
+
+    def _import_response(message, stats, errors, validate_only):
+        if validate_only:
+            db.session.rollback()
+            return jsonify({"message": "Validacion completada (sin cambios)", "validate_only": True,
+                            "stats": stats, "errors": errors[:30]}), 200
+        db.session.commit()
+        return jsonify({"message": message, "stats": stats, "errors": errors[:30]}), 201
 
     @app.route('/api/upload-excel', methods=['POST'])
     def upload_excel():
@@ -234,15 +168,9 @@ def register_data_import_routes(
                     }
                 ), 400
 
-            stats, errors = _process_hierarchy_rows(hierarchy_rows)
-            db.session.commit()
-            return jsonify(
-                {
-                    "message": "Carga masiva completada",
-                    "stats": stats,
-                    "errors": errors[:30],
-                }
-            ), 201
+            validate_only = _validate_only()
+            stats, errors = _process_hierarchy_rows(hierarchy_rows, validate_only=validate_only)
+            return _import_response("Carga masiva completada", stats, errors, validate_only)
         except Exception as e:
             db.session.rollback()
             logger.error(f"Excel Upload Failed: {e}")
@@ -261,80 +189,23 @@ def register_data_import_routes(
             df = pd.read_csv(StringIO(raw_data), sep='\t')
             df = df.where(pd.notnull(df), None)
 
-            if entity_type == 'Areas':
-                for _, row in df.iterrows():
-                    name = _clean_text(row.get('Name'))
-                    if name and not Area.query.filter_by(name=name).first():
-                        db.session.add(Area(name=name, description=_clean_text(row.get('Description')) or ''))
-
-            elif entity_type == 'Lines':
-                for _, row in df.iterrows():
-                    area_name = _clean_text(row.get('AreaName'))
-                    line_name = _clean_text(row.get('Name'))
-                    area = Area.query.filter_by(name=area_name).first() if area_name else None
-                    if area and line_name and not Line.query.filter_by(name=line_name, area_id=area.id).first():
-                        db.session.add(Line(name=line_name, description=_clean_text(row.get('Description')) or '', area=area))
-
-            elif entity_type == 'Equipments':
-                for _, row in df.iterrows():
-                    area_name = _clean_text(row.get('AreaName'))
-                    line_name = _clean_text(row.get('LineName'))
-                    equip_name = _clean_text(row.get('Name'))
-                    tag = _clean_text(row.get('Tag'))
-                    if not (area_name and line_name and equip_name):
-                        continue
-                    area = Area.query.filter_by(name=area_name).first()
-                    line_obj = Line.query.filter_by(name=line_name, area_id=area.id).first() if area else None
-                    if line_obj and not Equipment.query.filter_by(name=equip_name, line_id=line_obj.id).first():
-                        db.session.add(
-                            Equipment(
-                                name=equip_name,
-                                tag=tag or _default_tag(equip_name, line_name),
-                                description=_clean_text(row.get('Description')) or '',
-                                line=line_obj,
-                            )
-                        )
-
-            elif entity_type == 'Systems':
-                for _, row in df.iterrows():
-                    area_name = _clean_text(row.get('AreaName'))
-                    line_name = _clean_text(row.get('LineName'))
-                    equip_name = _clean_text(row.get('EquipmentName'))
-                    sys_name = _clean_text(row.get('Name'))
-                    if not (area_name and line_name and equip_name and sys_name):
-                        continue
-                    area = Area.query.filter_by(name=area_name).first()
-                    line_obj = Line.query.filter_by(name=line_name, area_id=area.id).first() if area else None
-                    equip = Equipment.query.filter_by(name=equip_name, line_id=line_obj.id).first() if line_obj else None
-                    if equip and not System.query.filter_by(name=sys_name, equipment_id=equip.id).first():
-                        db.session.add(System(name=sys_name, equipment=equip))
-
-            elif entity_type == 'Components':
-                for _, row in df.iterrows():
-                    area_name = _clean_text(row.get('AreaName'))
-                    line_name = _clean_text(row.get('LineName'))
-                    equip_name = _clean_text(row.get('EquipmentName'))
-                    sys_name = _clean_text(row.get('SystemName'))
-                    comp_name = _clean_text(row.get('Name'))
-                    if not (area_name and line_name and equip_name and sys_name and comp_name):
-                        continue
-                    area = Area.query.filter_by(name=area_name).first()
-                    line_obj = Line.query.filter_by(name=line_name, area_id=area.id).first() if area else None
-                    equip = Equipment.query.filter_by(name=equip_name, line_id=line_obj.id).first() if line_obj else None
-                    system = System.query.filter_by(name=sys_name, equipment_id=equip.id).first() if equip else None
-                    if system and not Component.query.filter_by(name=comp_name, system_id=system.id).first():
-                        db.session.add(
-                            Component(
-                                name=comp_name,
-                                description=_clean_text(row.get('Description')) or '',
-                                system=system,
-                            )
-                        )
-            else:
+            # Columnas del pegado por entidad -> claves del motor de importacion
+            columns = _BULK_PASTE_COLUMNS.get(entity_type)
+            if columns is None:
                 return jsonify({"error": "Invalid Entity Type"}), 400
-
-            db.session.commit()
-            return jsonify({"message": f"Bulk paste for {entity_type} completed"}), 201
+            leaf = columns[-1][1]
+            rows = []
+            for idx, row in df.iterrows():
+                item = {"row_num": int(idx) + 2}
+                for col, key in columns:
+                    item[key] = _clean_text(row.get(col))
+                item[f"{leaf}_description"] = _clean_text(row.get('Description'))
+                rows.append(item)
+
+            validate_only = _validate_only()
+            stats, errors = _process_hierarchy_rows(
+                rows, leaf=leaf, create_parents=False, validate_only=validate_only)
+            return _import_response(f"Bulk paste for {entity_type} completed", stats, errors, validate_only)
         except Exception as e:
             db.session.rollback()
             logger.error(f"Bulk Paste Failed: {e}")
@@ -398,9 +269,9 @@ def register_data_import_routes(
                     }
                 rows.append(row)
 
-            stats, errors = _process_hierarchy_rows(rows)
-            db.session.commit()
-            return jsonify({"message": "Jerarquia procesada", "stats": stats, "errors": errors[:30]}), 201
+            validate_only = _validate_only()
+            stats, errors = _process_hierarchy_rows(rows, validate_only=validate_only)
+            return _import_response("Jerarquia procesada", stats, errors, validate_only)
         except Exception as e:
             db.session.rollback()
             logger.error(f"Hierarchy Paste Failed: {e}")
@@ -13,10 +13,14 @@ from collections import defaultdict
 
 from flask import jsonify, render_template, request
 
+from utils.hierarchy import get_hierarchy
+from utils.job_queue import (STATUS_ERROR, STATUS_OK, STATUS_PENDING, STATUS_RUNNING,
+                              get_job, job_handler, submit_job)
+
 
 def register_diagnostico_routes(app, db, logger):
     from models import (
-        WorkOrder, Equipment, Line, ProductionGoal,
+        WorkOrder, ProductionGoal,
         LubricationPoint, InspectionRoute, MonitoringPoint,
         RotativeAsset, WarehouseItem, Technician, Shutdown,
     )
@@ -82,20 +86,10 @@ def register_diagnostico_routes(app, db, logger):
         return (goal.monthly_avg_yield_tons / oh) if oh > 0 else 0.0
 
     def _area_resolver():
-        line_map = {l.id: l for l in Line.query.all()}
-        eq_map = {e.id: e for e in Equipment.query.all()}
-
-        def resolver(ot):
-            if ot.area_id:
-                return ot.area_id
-            if ot.line_id and ot.line_id in line_map:
-                return line_map[ot.line_id].area_id
-            if ot.equipment_id and ot.equipment_id in eq_map:
-                e = eq_map[ot.equipment_id]
-                if e.line_id and e.line_id in line_map:
-                    return line_map[e.line_id].area_id
-            return None
-        return resolver, eq_map
+        # OT -> area (directa, via linea o via equipo) desde el snapshot de
+        # jerarquia del proceso (utils/hierarchy.py)
+        h = get_hierarchy()
+        return h.area_id_for, h.equipments
 
     # ── Datos del diagnostico ─────────────────────────────────────────────
 
@@ -113,12 +107,29 @@ def register_diagnostico_routes(app, db, logger):
             prev = _prev_month(month)
             nxt = _next_month(month)
 
-            ots = WorkOrder.query.all()
+            # Solo se leen las OTs que pueden caer en la ventana del informe
+            # (12 meses hacia atras) + todo el backlog abierto. El rango se
+            # evalua en SQL sobre las sombras DATE; las OTs sin ninguna fecha
+            # interpretable entran igual para no perder el backlog sin fecha.
+            desde = dt.date.fromisoformat(_months_back(month, 12)[0] + '-01')
+            ots = WorkOrder.query.filter(db.or_(
+                WorkOrder.status.is_(None),
+                WorkOrder.status.notin_(('Cerrada', 'No Ejecutada')),
+                WorkOrder.real_end_on >= desde,
+                WorkOrder.real_start_on >= desde,
+                WorkOrder.scheduled_on >= desde,
+                db.and_(WorkOrder.real_end_on.is_(None),
+                        WorkOrder.real_start_on.is_(None),
+                        WorkOrder.scheduled_on.is_(None)),
+            )).all()
             closed = [o for o in ots if o.status == 'Cerrada']
             open_ots = [o for o in ots if (o.status or '') not in ('Cerrada', 'No Ejecutada')]
-            eq_map = {e.id: e for e in Equipment.query.all()}
+            eq_map = get_hierarchy().equipments
 
             # ── Stats por mes (incluye MTBF/Disp/Conf a nivel planta) ────
+            # No salen de kpi_daily_equipment: el mes es el de CIERRE, entran
+            # OTs sin equipo (planta) y el downtime solo cuenta con
+            # caused_downtime; los hechos no guardan nada de eso.
             # Planta tratada como un sistema en serie: uptime = horas del
             # periodo - downtime consolidado. Para el mes EN CURSO se usan
             # solo las horas transcurridas (KPIs parciales honestos).
@@ -349,11 +360,14 @@ def register_diagnostico_routes(app, db, logger):
                 'quiebres': len([i for i in items_alm
                                  if (i.stock or 0) == 0 and (i.min_stock or 0) > 0]),
             }
+            # Informes: foto de toda la historia (no solo de la ventana)
+            q_inf = WorkOrder.query.filter(WorkOrder.report_required.is_(True))
             informes = {
-                'requeridos': len([o for o in ots if o.report_required]),
-                'pendientes': len([o for o in ots if o.report_required
-                                   and (o.report_status or 'PENDIENTE') != 'RECIBIDO'
-                                   and not (o.report_url or '').strip()]),
+                'requeridos': q_inf.count(),
+                'pendientes': q_inf.filter(
+                    db.func.coalesce(WorkOrder.report_status, 'PENDIENTE') != 'RECIBIDO',
+                    db.func.trim(db.func.coalesce(WorkOrder.report_url, '')) == '',
+                ).count(),
             }
 
             # ── Impacto en produccion: TM y sacos no producidos ──────────
@@ -404,8 +418,7 @@ def register_diagnostico_routes(app, db, logger):
                         if g and g.monthly_target_tons:
                             meta_total += float(g.monthly_target_tons)
 
-                    from models import Area as _Area
-                    area_names = {a.id: a.name for a in _Area.query.all()}
+                    area_names = {a.id: a.name for a in get_hierarchy().areas.values()}
                     top_eq = sorted(eq_tons.items(), key=lambda x: -x[1])[:8]
 
                     # Metas y rendimientos vigentes por area (para la lamina
@@ -669,8 +682,7 @@ def register_diagnostico_routes(app, db, logger):
                 e = eq_map[equipment_id]
                 etiqueta = f"[{e.tag}] {e.name}" if e.tag else e.name
             elif area_id:
-                from models import Area as _Area
-                a = _Area.query.get(area_id)
+                a = get_hierarchy().areas.get(area_id)
                 etiqueta = a.name if a else f'Area {area_id}'
 
             return jsonify({'alcance': etiqueta, 'serie': serie})
@@ -711,7 +723,7 @@ def register_diagnostico_routes(app, db, logger):
             con_tons = request.args.get('tons') == '1'
 
             months = {month} if window == 'mes' else set(_months_back(month, 6))
-            eq_map = {e.id: e for e in Equipment.query.all()}
+            eq_map = get_hierarchy().equipments
             if con_tons:
                 goals_map = _goals_por_area()
                 resolver_area, _em = _area_resolver()
@@ -801,23 +813,47 @@ def register_diagnostico_routes(app, db, logger):
     # ── Narrativa ejecutiva con DeepSeek (asincrona) ──────────────────────
     # DeepSeek puede tardar 30-90s y los proxies (Render/gunicorn) cortan la
     # request devolviendo una pagina HTML -> "Unexpected token '<'" en el
-    # navegador. Por eso el POST lanza un hilo y responde al instante con un
-    # job_id; el frontend consulta GET /narrativa/<job_id> hasta tener el texto.
-    _narrativa_jobs = {}
-
-    def _limpiar_jobs():
-        import time as _t
-        ahora = _t.time()
-        viejos = [k for k, v in _narrativa_jobs.items() if ahora - v.get('ts', 0) > 1800]
-        for k in viejos:
-            _narrativa_jobs.pop(k, None)
+    # navegador. Por eso el POST encola un trabajo (utils/job_queue: tabla
+    # background_jobs, visible desde cualquier worker) y responde al instante
+    # con un job_id; el frontend consulta GET /narrativa/<job_id> hasta tener
+    # el texto. Un solo intento: los reintentos ante 429/503 los hace
+    # http_client; repetir el trabajo entero apilaria otra llamada de hasta 6
+    # minutos (y otro cobro) sobre esos reintentos.
+    @job_handler('diagnostico_narrativa', max_attempts=1, lease_seconds=420)
+    def _narrativa_job(app, payload):
+        from bot.llm import _get_deepseek_config
+        from utils import http_client
+        key, url = _get_deepseek_config()
+        if not key:
+            raise RuntimeError('DEEPSEEK_API_KEY no configurada en el servidor')
+        r = http_client.post('deepseek', url, headers={
+            'Authorization': f'Bearer {key}', 'Content-Type': 'application/json',
+        }, json={
+            'model': 'deepseek-chat',
+            'messages': [
+                {'role': 'system', 'content': payload['system']},
+                {'role': 'user', 'content': payload['prompt']},
+            ],
+            'max_tokens': 3000, 'temperature': 0.3,
+        }, timeout=360)
+        if r.status_code != 200:
+            raise RuntimeError(f'DeepSeek HTTP {r.status_code}: {r.text[:200]}')
+        return {'narrativa': r.json()['choices'][0]['message']['content']}
 
     @app.route('/api/diagnostico/narrativa/<job_id>', methods=['GET'])
     def diagnostico_narrativa_status(job_id):
-        job = _narrativa_jobs.get(job_id)
+        job = get_job(job_id, kind='diagnostico_narrativa')
         if not job:
             return jsonify({'error': 'Trabajo no encontrado (expiro o el servidor se reinicio). Vuelve a generar.'}), 404
-        return jsonify({k: v for k, v in job.items() if k != 'ts'})
+        out = {'status': job['status']}
+        if job['status'] == STATUS_OK:
+            out['narrativa'] = (job['result'] or {}).get('narrativa', '')
+        elif job['status'] == STATUS_ERROR:
+            out['error'] = (job['error'] or '')[:300]
+        elif job['status'] == STATUS_RUNNING:
+            # El frontend solo distingue OK / ERROR / otro
+            out['status'] = STATUS_PENDING
+        return jsonify(out)
 
     @app.route('/api/diagnostico/narrativa', methods=['POST'])
     def diagnostico_narrativa():
@@ -935,38 +971,8 @@ def register_diagnostico_routes(app, db, logger):
             if not key:
                 return jsonify({'error': 'DEEPSEEK_API_KEY no configurada en el servidor'}), 501
 
-            import threading
-            import time as _t
-            import uuid
-            _limpiar_jobs()
-            job_id = uuid.uuid4().hex[:12]
-            _narrativa_jobs[job_id] = {'status': 'PENDIENTE', 'ts': _t.time()}
-            prompt_usuario = "\n".join(resumen)
-
-            def _worker():
-                import requests as _rq
-                try:
-                    r = _rq.post(url, headers={
-                        'Authorization': f'Bearer {key}', 'Content-Type': 'application/json',
-                    }, json={
-                        'model': 'deepseek-chat',
-                        'messages': [
-                            {'role': 'system', 'content': system_prompt},
-                            {'role': 'user', 'content': prompt_usuario},
-                        ],
-                        'max_tokens': 3000, 'temperature': 0.3,
-                    }, timeout=360)
-                    if r.status_code != 200:
-                        _narrativa_jobs[job_id] = {
-                            'status': 'ERROR', 'ts': _t.time(),
-                            'error': f'DeepSeek HTTP {r.status_code}: {r.text[:200]}'}
-                        return
-                    texto = r.json()['choices'][0]['message']['content']
-                    _narrativa_jobs[job_id] = {'status': 'OK', 'narrativa': texto, 'ts': _t.time()}
-                except Exception as e:
-                    _narrativa_jobs[job_id] = {'status': 'ERROR', 'error': str(e)[:300], 'ts': _t.time()}
-
-            threading.Thread(target=_worker, daemon=True).start()
+            job_id = submit_job('diagnostico_narrativa', {
+                'system': system_prompt, 'prompt': "\n".join(resumen)})
             return jsonify({'job_id': job_id, 'status': 'PENDIENTE'})
         except Exception as e:
             logger.exception('diagnostico_narrativa error')
@@ -987,9 +993,9 @@ def register_diagnostico_routes(app, db, logger):
         try:
             d = _build_diagnostico(request.args.get('month'))
             narrativa = ''
-            job = _narrativa_jobs.get((request.args.get('narrativa_job') or '').strip())
-            if job and job.get('status') == 'OK':
-                narrativa = job.get('narrativa') or ''
+            job = get_job((request.args.get('narrativa_job') or '').strip(), kind='diagnostico_narrativa')
+            if job and job['status'] == STATUS_OK:
+                narrativa = (job['result'] or {}).get('narrativa') or ''
             html = render_template('informe_diagnostico.html', d=d, narrativa=narrativa)
             resp = app.make_response(html)
             resp.headers['Content-Type'] = 'text/html; charset=utf-8'
@@ -243,12 +243,13 @@ def register_indicators_routes(app, db, logger, WorkOrder, Area, Line, Equipment
             # Solo areas/equipos marcados como include_in_kpi=True. Esto excluye
             # cosas como "BAJA / FUERA DE SERVICIO", "UTILITIES", "RMP" o
             # equipos auxiliares (ej: hidrolavadora 4 de Coccion).
-            areas = Area.query.filter_by(include_in_kpi=True).all()
-            lines = Line.query.all()
-            equips = Equipment.query.filter_by(include_in_kpi=True).all()
-            line_map = {l.id: l for l in lines}
+            # Jerarquia desde el snapshot del proceso (utils/hierarchy.py)
+            from utils.hierarchy import get_hierarchy
+            h = get_hierarchy()
+            areas = [a for a in h.areas.values() if a.id in h.kpi_area_ids]
+            equips = [e for e in h.equipments.values() if e.id in h.kpi_equipment_ids]
+            line_map = h.lines
             equip_map = {e.id: e for e in equips}
-            area_map = {a.id: a for a in areas}
 
             # Cargar OTs cerradas en el periodo
             all_ots = WorkOrder.query.filter(
@@ -13,6 +13,7 @@ import datetime as dt
 import requests
 from flask import jsonify, request, render_template
 from sqlalchemy import func, text
+from utils import http_client
 
 
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
@@ -435,7 +436,7 @@ def register_insights_routes(
                 'max_tokens': 350,  # respuesta corta → menor latencia
             }
             # Timeout agresivo (15s) para no superar el gateway timeout de Render
-            r = requests.post(DEEPSEEK_URL, headers=headers, json=payload, timeout=15)
+            r = http_client.post('deepseek', DEEPSEEK_URL, headers=headers, json=payload, timeout=(5, 15))
             r.raise_for_status()
             j = r.json()
             return {'text': j['choices'][0]['message']['content'].strip(), 'source': 'ai'}
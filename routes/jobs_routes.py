@@ -0,0 +1,24 @@
+"""Estado de trabajos en segundo plano (ver utils/job_queue.py).
+
+GET /api/jobs/<job_id>
+
+Devuelve status (PENDIENTE / EN_CURSO / OK / ERROR), intentos y, al
+terminar, el resultado o el ultimo error. Lo lee desde la tabla
+background_jobs, asi que responde igual en cualquier worker de gunicorn.
+"""
+from flask import jsonify
+
+
+def register_jobs_routes(app, db, logger):
+    from utils.job_queue import get_job
+
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        try:
+            job = get_job(job_id)
+        except Exception as e:
+            logger.error(f"job_status error: {e}")
+            return jsonify({"error": str(e)}), 500
+        if job is None:
+            return jsonify({"error": "Trabajo no encontrado"}), 404
+        return jsonify(job)
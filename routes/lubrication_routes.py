@@ -1,14 +1,12 @@
 import datetime as dt
 import re
-from io import BytesIO
 
-import pandas as pd
-from flask import jsonify, request, send_file
+from flask import jsonify, request
 from flask_login import login_required
-from openpyxl.utils import get_column_letter
 from sqlalchemy import inspect, text
 
 from utils.audit import audit_log
+from utils.excel_stream import new_workbook, send_workbook, write_sheet
 from utils.rate_limit import limit_export
 
 
@@ -642,72 +640,88 @@ def register_lubrication_routes(
                 date_from = _safe_date_iso(args.get('date_from'))
                 date_to = _safe_date_iso(args.get('date_to'))
                 point_map = {p.id: p for p in points}
-                execs = []
-                if point_map:
+                # Ejecuciones leidas del cursor de a 500 y escritas al vuelo;
+                # el resumen por punto se acumula mientras tanto (contadores,
+                # intervalos y primera/ultima fecha, sin retener las filas).
+                intervals = _interval_map_for_points(set(point_map))
+                per_point = {}
+
+                def hist_rows():
+                    if not point_map:
+                        return
+                    from sqlalchemy.orm import selectinload
                     q = LubricationExecution.query.filter(
                         LubricationExecution.point_id.in_(point_map.keys()))
                     if date_from:
                         q = q.filter(LubricationExecution.execution_date >= date_from)
                     if date_to:
                         q = q.filter(LubricationExecution.execution_date <= date_to)
-                    execs = (q.order_by(LubricationExecution.execution_date.desc(),
-                                        LubricationExecution.id.desc()).all())
-                intervals = _interval_map_for_points({e.point_id for e in execs})
-
-                hist_rows = []
-                per_point = {}
-                for e in execs:
-                    p = point_map.get(e.point_id)
-                    if not p:
-                        continue
-                    row = {'Fecha': e.execution_date}
-                    row.update(taxonomy_cols(p))
-                    row.update({
-                        'Acción': _ACTION_LABELS.get(e.action_type, e.action_type),
-                        'Cantidad': e.quantity_used,
-                        'Unidad': e.quantity_unit,
-                        'Ejecutado Por': e.executed_by,
-                        'Intervalo (días)': intervals.get(e.id),
-                        'Fuga': 'Sí' if e.leak_detected else 'No',
-                        'Anomalía': 'Sí' if e.anomaly_detected else 'No',
-                        'Aviso': e.created_notice.code if e.created_notice else '',
-                        'Comentarios': e.comments or '',
-                    })
-                    hist_rows.append(row)
-                    per_point.setdefault(e.point_id, []).append(e)
-
-                summary_rows = []
-                for pid, plist in per_point.items():
-                    p = point_map[pid]
-                    ivals = [intervals[e.id] for e in plist if intervals.get(e.id) is not None]
-                    dates = sorted(d for d in (e.execution_date for e in plist) if d)
-                    total_changes = sum(1 for e in plist
-                                        if e.action_type in ('CAMBIO_TOTAL', 'SERVICIO'))
-                    avg = round(sum(ivals) / len(ivals), 1) if ivals else None
-                    row = taxonomy_cols(p)
-                    row.update({
-                        'Lubricante': p.lubricant_name,
-                        'N° Lubricaciones': len(plist),
-                        'N° Cambios Totales': total_changes,
-                        'N° Rellenos': len(plist) - total_changes,
-                        'Primera Fecha': dates[0] if dates else None,
-                        'Última Fecha': dates[-1] if dates else None,
-                        'Intervalo Real Prom. (días)': avg,
-                        'Intervalo Mín (días)': min(ivals) if ivals else None,
-                        'Intervalo Máx (días)': max(ivals) if ivals else None,
-                        'Frecuencia Teórica (días)': p.frequency_days,
-                        'Desviación (días)': (round(avg - p.frequency_days, 1)
-                                              if (avg is not None and p.frequency_days) else None),
-                    })
-                    summary_rows.append(row)
-                summary_rows.sort(key=lambda r: (str(r['Área']), str(r['Equipo']),
-                                                 str(r['Componente']),
-                                                 str(r['Punto de Lubricación'])))
-
-                sheets.append(('Historial', pd.DataFrame(hist_rows)))
-                sheets.append(('Resumen por Punto', pd.DataFrame(summary_rows)))
+                    q = (q.options(selectinload(LubricationExecution.created_notice))
+                         .order_by(LubricationExecution.execution_date.desc(),
+                                   LubricationExecution.id.desc()))
+                    for e in q.yield_per(500):
+                        p = point_map.get(e.point_id)
+                        if not p:
+                            continue
+                        row = {'Fecha': e.execution_date}
+                        row.update(taxonomy_cols(p))
+                        row.update({
+                            'Acción': _ACTION_LABELS.get(e.action_type, e.action_type),
+                            'Cantidad': e.quantity_used,
+                            'Unidad': e.quantity_unit,
+                            'Ejecutado Por': e.executed_by,
+                            'Intervalo (días)': intervals.get(e.id),
+                            'Fuga': 'Sí' if e.leak_detected else 'No',
+                            'Anomalía': 'Sí' if e.anomaly_detected else 'No',
+                            'Aviso': e.created_notice.code if e.created_notice else '',
+                            'Comentarios': e.comments or '',
+                        })
+                        acc = per_point.setdefault(e.point_id, {'n': 0, 'changes': 0, 'ivals': [],
+                                                                'first': None, 'last': None})
+                        acc['n'] += 1
+                        if e.action_type in ('CAMBIO_TOTAL', 'SERVICIO'):
+                            acc['changes'] += 1
+                        if intervals.get(e.id) is not None:
+                            acc['ivals'].append(intervals[e.id])
+                        if e.execution_date:
+                            if acc['first'] is None or e.execution_date < acc['first']:
+                                acc['first'] = e.execution_date
+                            if acc['last'] is None or e.execution_date > acc['last']:
+                                acc['last'] = e.execution_date
+                        yield row
+
+                def summary_rows():
+                    out = []
+                    for pid, acc in per_point.items():
+                        p = point_map[pid]
+                        ivals = acc['ivals']
+                        avg = round(sum(ivals) / len(ivals), 1) if ivals else None
+                        row = taxonomy_cols(p)
+                        row.update({
+                            'Lubricante': p.lubricant_name,
+                            'N° Lubricaciones': acc['n'],
+                            'N° Cambios Totales': acc['changes'],
+                            'N° Rellenos': acc['n'] - acc['changes'],
+                            'Primera Fecha': acc['first'],
+                            'Última Fecha': acc['last'],
+                            'Intervalo Real Prom. (días)': avg,
+                            'Intervalo Mín (días)': min(ivals) if ivals else None,
+                            'Intervalo Máx (días)': max(ivals) if ivals else None,
+                            'Frecuencia Teórica (días)': p.frequency_days,
+                            'Desviación (días)': (round(avg - p.frequency_days, 1)
+                                                  if (avg is not None and p.frequency_days) else None),
+                        })
+                        out.append(row)
+                    out.sort(key=lambda r: (str(r['Área']), str(r['Equipo']),
+                                            str(r['Componente']),
+                                            str(r['Punto de Lubricación'])))
+                    return out
+
+                # El resumen es una funcion: se arma despues de escribir el historial
+                sheets.append(('Historial', hist_rows()))
+                sheets.append(('Resumen por Punto', summary_rows))
                 filename = f"Lubricacion_Historial_{today.isoformat()}.xlsx"
-                audit_detail = f"scope=history rows={len(hist_rows)}"
+                audit_label = 'scope=history'
             else:
                 sema_filter = (args.get('sema') or '').strip().upper()
                 due_filter = (args.get('due') or '').strip().lower()
@@ -793,34 +807,20 @@ def register_lubrication_routes(
                         'Total': sum(r['Total'] for r in summary_rows),
                     })
 
-                sheets.append(('Pendientes', pd.DataFrame(pend_rows)))
-                sheets.append(('Resumen', pd.DataFrame(summary_rows)))
+                sheets.append(('Pendientes', pend_rows))
+                sheets.append(('Resumen', summary_rows))
                 filename = f"Lubricacion_Pendientes_{today.isoformat()}.xlsx"
-                audit_detail = f"scope=pending rows={len(pend_rows)}"
-
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                for sheet_name, df in sheets:
-                    if df.empty:
-                        df = pd.DataFrame({'Info': ['Sin registros para los filtros aplicados']})
-                    df.to_excel(writer, index=False, sheet_name=sheet_name)
-                    ws = writer.sheets[sheet_name]
-                    for idx, col in enumerate(df.columns, start=1):
-                        try:
-                            max_len = max([len(str(col))] +
-                                          [len(str(v)) for v in df[col].head(200).fillna('')])
-                        except Exception:
-                            max_len = len(str(col))
-                        ws.column_dimensions[get_column_letter(idx)].width = min(45, max(10, max_len + 2))
-            output.seek(0)
-
-            audit_log('EXPORT_MASS', module='lubricacion', detail=audit_detail)
-            return send_file(
-                output,
-                download_name=filename,
-                as_attachment=True,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            )
+                audit_label = 'scope=pending'
+
+            wb = new_workbook()
+            written = []
+            for sheet_name, rows in sheets:
+                written.append(write_sheet(
+                    wb, sheet_name, rows() if callable(rows) else rows, auto_width=True,
+                    empty_row={'Info': 'Sin registros para los filtros aplicados'}))
+
+            audit_log('EXPORT_MASS', module='lubricacion', detail=f"{audit_label} rows={written[0]}")
+            return send_workbook(wb, filename)
         except Exception as e:
             db.session.rollback()
             logger.exception('Lubrication export error')
@@ -828,15 +828,42 @@ def register_lubrication_routes(
 
     @app.route('/api/lubrication/dashboard', methods=['GET'])
     def get_lubrication_dashboard():
+        """KPIs + puntos ordenados por vencimiento, con consultas fijas.
+
+        Semaforo, filtros y orden van en SQL sobre next_due_date
+        (schedule_semaphore_case); los nombres de la jerarquia salen del
+        snapshot (utils/hierarchy.py), sin lazy loads por punto.
+        Filtros: area_id, line_id, equipment_id, semaphore=ROJO,AMARILLO.
+        Paginado: ?page=&per_page= (200 por defecto) -> 'pagination'.
+        """
+        from sqlalchemy import and_, case, func, literal, select
+        from utils.crud_helpers import paginate_query
+        from utils.hierarchy import get_hierarchy
+        from utils.schedule_helpers import schedule_semaphore_case
+        LP = LubricationPoint
         try:
             _ensure_lubrication_schema_compat()
             show_inactive = request.args.get('show_inactive', 'false').lower() == 'true'
-            if show_inactive:
-                points = LubricationPoint.query.all()
-            else:
-                points = LubricationPoint.query.filter_by(is_active=True).all()
+            h = get_hierarchy()
+            today = dt.date.today().isoformat()
+            warning_values = db.session.execute(select(LP.warning_days).distinct()).scalars().all()
+            semaphore = schedule_semaphore_case(LP.next_due_date, LP.warning_days, warning_values)
+
+            # Suspension derivada: el equipo esta fuera de servicio
+            # (overhaul) — el punto NO cuenta en el % de cumplimiento.
+            out_of_service = [eid for eid, e in h.equipments.items() if not e.in_service]
+            in_service = (case((LP.equipment_id.in_(out_of_service), 0), else_=1)
+                          if out_of_service else literal(1))
+
+            # KPIs: solo puntos activos (y con equipo en servicio), un GROUP BY
+            flags = select(
+                semaphore.label('sem'),
+                in_service.label('in_service'),
+                case((and_(LP.next_due_date != '', LP.next_due_date <= today), 1),
+                     else_=0).label('due_now'),
+            ).where(LP.is_active == True).subquery()  # noqa: E712
             kpi = {
-                'total': len(points),
+                'total': 0,
                 'green': 0,
                 'yellow': 0,
                 'red': 0,
@@ -845,66 +872,64 @@ def register_lubrication_routes(
                 'suspended': 0,
                 'compliance_percent': 100.0
             }
-            today = dt.date.today()
-            active_count = 0
-            items = []
-            for p in points:
-                next_due, semaphore = _calculate_lubrication_schedule(
-                    p.last_service_date,
-                    p.frequency_days,
-                    p.warning_days
-                )
-                due_date = _parse_date_flexible(next_due)
-
-                # Suspension derivada: el equipo esta fuera de servicio
-                # (overhaul) — el punto NO cuenta en el % de cumplimiento.
-                eq_in_service = p.equipment.in_service if p.equipment else True
-
-                # KPIs only count active points (y con equipo en servicio)
-                if p.is_active and not eq_in_service:
-                    kpi['suspended'] += 1
-                elif p.is_active:
-                    active_count += 1
-                    if semaphore == 'VERDE':
-                        kpi['green'] += 1
-                    elif semaphore == 'AMARILLO':
-                        kpi['yellow'] += 1
-                    elif semaphore == 'ROJO':
-                        kpi['red'] += 1
-                    else:
-                        kpi['pending'] += 1
-
-                    if due_date and due_date <= today:
-                        kpi['due_now'] += 1
+            kpi_keys = {'VERDE': 'green', 'AMARILLO': 'yellow', 'ROJO': 'red'}
+            for sem, ins, n, due_now in db.session.execute(
+                select(flags.c.sem, flags.c.in_service, func.count(), func.sum(flags.c.due_now))
+                .group_by(flags.c.sem, flags.c.in_service)
+            ):
+                if not ins:
+                    kpi['suspended'] += n
+                    continue
+                kpi['total'] += n
+                kpi[kpi_keys.get(sem, 'pending')] += n
+                kpi['due_now'] += int(due_now or 0)
+            if kpi['total'] > 0:
+                kpi['compliance_percent'] = round(((kpi['total'] - kpi['red']) / kpi['total']) * 100, 1)
 
+            query = db.session.query(LP, semaphore.label('semaphore_status'))
+            if not show_inactive:
+                query = query.filter(LP.is_active == True)  # noqa: E712
+            for arg in ('area_id', 'line_id', 'equipment_id'):
+                value = request.args.get(arg, type=int)
+                if value:
+                    query = query.filter(getattr(LP, arg) == value)
+            wanted = [x.strip().upper() for x in (request.args.get('semaphore') or '').split(',') if x.strip()]
+            if wanted:
+                query = query.filter(semaphore.in_(wanted))
+            no_due = case((func.coalesce(LP.next_due_date, '') == '', 1), else_=0)
+            query = query.order_by(no_due, LP.next_due_date, LP.id)
+            rows, pagination = paginate_query(query, default_per_page=200)
+
+            def _name(records, rid, attr='name'):
+                rec = records.get(rid) if rid else None
+                return getattr(rec, attr) if rec else None
+
+            items = []
+            for p, sem in rows:
+                eq = h.equipments.get(p.equipment_id) if p.equipment_id else None
                 items.append({
                     'id': p.id,
                     'code': p.code,
                     'name': p.name,
                     'is_active': p.is_active,
-                    'equipment_in_service': eq_in_service,
+                    'equipment_in_service': eq.in_service if eq else True,
                     'equipment_id': p.equipment_id,
-                    'equipment_name': p.equipment.name if p.equipment else None,
-                    'equipment_tag': p.equipment.tag if p.equipment else None,
-                    'system_name': p.system.name if p.system else None,
-                    'component_name': p.component.name if p.component else None,
-                    'line_name': p.line.name if p.line else None,
-                    'area_name': p.area.name if p.area else None,
+                    'equipment_name': eq.name if eq else None,
+                    'equipment_tag': eq.tag if eq else None,
+                    'system_name': _name(h.systems, p.system_id),
+                    'component_name': _name(h.components, p.component_id),
+                    'line_name': _name(h.lines, p.line_id),
+                    'area_name': _name(h.areas, p.area_id),
                     'lubricant_name': p.lubricant_name,
                     'last_service_date': p.last_service_date,
-                    'next_due_date': next_due,
-                    'semaphore_status': semaphore,
+                    'next_due_date': p.next_due_date or None,
+                    'semaphore_status': sem,
                     'frequency_days': p.frequency_days,
                     'warning_days': p.warning_days,
                     'system_id': p.system_id,
                     'component_id': p.component_id,
                 })
-
-            kpi['total'] = active_count
-            if kpi['total'] > 0:
-                kpi['compliance_percent'] = round(((kpi['total'] - kpi['red']) / kpi['total']) * 100, 1)
-            items.sort(key=lambda r: (r.get('next_due_date') or '9999-12-31'))
-            return jsonify({'kpi': kpi, 'items': items[:200]})
+            return jsonify({'kpi': kpi, 'items': items, 'pagination': pagination})
         except Exception as e:
             logger.exception('Lubrication dashboard error')
             return jsonify({"error": _friendly_error_message(e, 'dashboard de lubricacion')}), 500
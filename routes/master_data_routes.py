@@ -180,10 +180,12 @@ def register_master_data_routes(
             # Contar items antes para feedback
             n_equips = Equipment.query.filter_by(line_id=source_id).count()
 
-            # 1) Mover equipos
+            # 1) Mover equipos (SQL crudo: invalidar a mano el snapshot de jerarquia)
             db.session.execute(_text("""
-                UPDATE equipments SET line_id = :tgt WHERE line_id = :src
+                UPDATE equipments SET line_id = :tgt, updated_at = CURRENT_TIMESTAMP WHERE line_id = :src
             """), {"tgt": target_id, "src": source_id})
+            from utils.hierarchy import bump_hierarchy_version
+            bump_hierarchy_version()
 
             # 2) Actualizar tablas relacionadas (cada una en try porque puede que
             #    la tabla/columna no exista en instalaciones antiguas).
@@ -1,6 +1,10 @@
 ﻿import datetime as dt
 
 from flask import jsonify, request
+from sqlalchemy import and_, case, func, select
+
+from utils.hierarchy import get_hierarchy
+from utils.schedule_helpers import schedule_semaphore_case
 
 
 def register_monitoring_routes(
@@ -233,19 +237,39 @@ def register_monitoring_routes(
             equipment_id = request.args.get('equipment_id', type=int)
             selected_point_id = request.args.get('point_id', type=int)
 
-            query = MonitoringPoint.query.filter_by(is_active=True)
+            MP = MonitoringPoint
+            conds = [MP.is_active == True]  # noqa: E712
             if area_id:
-                query = query.filter_by(area_id=area_id)
+                conds.append(MP.area_id == area_id)
             if line_id:
-                query = query.filter_by(line_id=line_id)
+                conds.append(MP.line_id == line_id)
             if equipment_id:
-                query = query.filter_by(equipment_id=equipment_id)
+                conds.append(MP.equipment_id == equipment_id)
 
-            points = query.order_by(MonitoringPoint.id.asc()).all()
+            # Todo en SQL sobre next_due_date (texto ISO que mantienen las
+            # escrituras): un GROUP BY para los KPIs y la lista de pendientes
+            # ya filtrada/ordenada. Nombres desde el snapshot de jerarquia.
             today = dt.date.today()
+            t0 = today.isoformat()
+            t7 = (today + dt.timedelta(days=7)).isoformat()
+            warning_values = db.session.execute(
+                select(MP.warning_days).distinct().where(*conds)).scalars().all()
+            status = case(
+                (func.coalesce(MP.semaphore_status, '') == '',
+                 schedule_semaphore_case(MP.next_due_date, MP.warning_days, warning_values, today)),
+                else_=MP.semaphore_status,
+            )
+            has_due = func.coalesce(MP.next_due_date, '') != ''
+            flags = select(
+                MP.id.label('id'),
+                status.label('status'),
+                case((and_(has_due, MP.next_due_date < t0), 1), else_=0).label('overdue'),
+                case((and_(has_due, MP.next_due_date <= t0), 1), else_=0).label('due_today'),
+                case((and_(MP.next_due_date > t0, MP.next_due_date <= t7), 1), else_=0).label('upcoming'),
+            ).where(*conds).subquery()
 
             kpi = {
-                "total_points": len(points),
+                "total_points": 0,
                 "due_today": 0,
                 "overdue": 0,
                 "upcoming": 0,
@@ -254,48 +278,52 @@ def register_monitoring_routes(
                 "red": 0,
                 "pending": 0
             }
-            pending_rows = []
-            for p in points:
-                next_due, schedule_status = _calculate_monitoring_schedule(
-                    p.last_measurement_date, p.frequency_days, p.warning_days
-                )
-                due_date = _parse_date_flexible(next_due)
-                status = p.semaphore_status or schedule_status
-
-                if status == 'VERDE':
-                    kpi['green'] += 1
-                elif status == 'AMARILLO':
-                    kpi['yellow'] += 1
-                elif status == 'ROJO':
-                    kpi['red'] += 1
-                else:
-                    kpi['pending'] += 1
-
-                if due_date:
-                    if due_date < today:
-                        kpi['overdue'] += 1
-                    if due_date <= today:
-                        kpi['due_today'] += 1
-                        pending_rows.append({
-                            "point_id": p.id,
-                            "code": p.code,
-                            "name": p.name,
-                            "measurement_type": p.measurement_type,
-                            "axis": p.axis,
-                            "unit": p.unit,
-                            "next_due_date": next_due,
-                            "equipment_name": p.equipment.name if p.equipment else "-",
-                            "line_name": p.line.name if p.line else "-",
-                            "area_name": p.area.name if p.area else "-",
-                            "semaphore_status": status
-                        })
-                    elif due_date <= today + dt.timedelta(days=7):
-                        kpi['upcoming'] += 1
-
-            pending_rows.sort(key=lambda r: (r.get('next_due_date') or '9999-12-31', r.get('code') or ''))
-
-            if not selected_point_id and points:
-                selected_point_id = points[0].id
+            kpi_keys = {'VERDE': 'green', 'AMARILLO': 'yellow', 'ROJO': 'red'}
+            first_point_id = None
+            for st, n, overdue, due_today, upcoming, min_id in db.session.execute(
+                select(flags.c.status, func.count(), func.sum(flags.c.overdue),
+                       func.sum(flags.c.due_today), func.sum(flags.c.upcoming),
+                       func.min(flags.c.id))
+                .group_by(flags.c.status)
+            ):
+                kpi['total_points'] += n
+                kpi[kpi_keys.get(st, 'pending')] += n
+                kpi['overdue'] += int(overdue or 0)
+                kpi['due_today'] += int(due_today or 0)
+                kpi['upcoming'] += int(upcoming or 0)
+                if first_point_id is None or min_id < first_point_id:
+                    first_point_id = min_id
+
+            h = get_hierarchy()
+
+            def _name(records, rid):
+                rec = records.get(rid) if rid else None
+                return rec.name if rec else "-"
+
+            pending = db.session.execute(
+                select(MP.id, MP.code, MP.name, MP.measurement_type, MP.axis, MP.unit,
+                       MP.next_due_date, MP.equipment_id, MP.line_id, MP.area_id,
+                       status.label('status'))
+                .where(*conds, has_due, MP.next_due_date <= t0)
+                .order_by(MP.next_due_date, func.coalesce(MP.code, ''))
+                .limit(300)
+            ).all()
+            pending_rows = [{
+                "point_id": r.id,
+                "code": r.code,
+                "name": r.name,
+                "measurement_type": r.measurement_type,
+                "axis": r.axis,
+                "unit": r.unit,
+                "next_due_date": r.next_due_date,
+                "equipment_name": _name(h.equipments, r.equipment_id),
+                "line_name": _name(h.lines, r.line_id),
+                "area_name": _name(h.areas, r.area_id),
+                "semaphore_status": r.status
+            } for r in pending]
+
+            if not selected_point_id:
+                selected_point_id = first_point_id
 
             trend = []
             y_min = 0.0
@@ -327,7 +355,7 @@ def register_monitoring_routes(
 
             return jsonify({
                 "kpi": kpi,
-                "pending_rows": pending_rows[:300],
+                "pending_rows": pending_rows,
                 "selected_point_id": selected_point_id,
                 "trend": trend,
                 "trend_axis": {
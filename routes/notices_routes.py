@@ -159,84 +159,115 @@ def register_notices_routes(
                 logger.error(f"Error creating notice: {e}")
                 return jsonify({"error": str(e)}), 500
 
+        return _list_notices()
+
+    def _list_notices():
+        """Listado de avisos en un numero constante de consultas.
+
+        Los nombres de la jerarquia y el modo de falla de la OT vinculada
+        llegan por JOIN en la misma consulta de la pagina; las recurrencias
+        (OTs correctivas cerradas por equipo) salen de un solo GROUP BY sobre
+        los equipos de la pagina. El equipo efectivo del aviso es el propio,
+        o el del sistema, o el del sistema del componente.
+
+        Mismos parametros que el listado de OTs:
+          ?limit=100[&cursor=<id>]  keyset por id: {items, next_cursor}
+          ?page=1&per_page=50       legado (OFFSET + COUNT): {items, pagination}
+          sin parametros            todos los avisos (compat. con el frontend)
+          status, type (maintenance_type), criticality: uno o varios separados
+          por coma; area_id, line_id, equipment_id; date_from/date_to sobre
+          la fecha de solicitud (request_on).
+        """
+        from sqlalchemy.orm import aliased
+        from models import Area, Line, Equipment
+        from utils.reporting_helpers import _parse_date_flexible
+
         page = request.args.get('page', type=int)
-        query = MaintenanceNotice.query.order_by(MaintenanceNotice.id.desc())
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor', type=int)
+
+        N = MaintenanceNotice
+        CompSystem = aliased(System)
+        ot_failure_mode = (db.select(WorkOrder.failure_mode)
+                           .where(WorkOrder.notice_id == N.id)
+                           .order_by(WorkOrder.id).limit(1)
+                           .correlate(N).scalar_subquery())
+        query = (db.session.query(
+                    N, Area.name, Line.name, Equipment.name, Equipment.tag,
+                    System.name, Component.name,
+                    db.func.coalesce(N.equipment_id, System.equipment_id, CompSystem.equipment_id),
+                    ot_failure_mode)
+                 .outerjoin(Area, Area.id == N.area_id)
+                 .outerjoin(Line, Line.id == N.line_id)
+                 .outerjoin(Equipment, Equipment.id == N.equipment_id)
+                 .outerjoin(System, System.id == N.system_id)
+                 .outerjoin(Component, Component.id == N.component_id)
+                 .outerjoin(CompSystem, CompSystem.id == Component.system_id)
+                 .order_by(N.id.desc()))
+
+        for arg, col in (('status', N.status), ('type', N.maintenance_type),
+                         ('maintenance_type', N.maintenance_type), ('criticality', N.criticality)):
+            vals = [x.strip() for x in (request.args.get(arg) or '').split(',') if x.strip()]
+            if vals:
+                query = query.filter(col.in_(vals))
+        for arg, col in (('area_id', N.area_id), ('line_id', N.line_id),
+                         ('equipment_id', N.equipment_id)):
+            val = request.args.get(arg, type=int)
+            if val:
+                query = query.filter(col == val)
+        d_from = _parse_date_flexible(request.args.get('date_from'))
+        d_to = _parse_date_flexible(request.args.get('date_to'))
+        if d_from:
+            query = query.filter(N.request_on >= d_from)
+        if d_to:
+            query = query.filter(N.request_on <= d_to)
+
         pagination_meta = None
-        if page:
+        keyset_meta = None
+        if limit or cursor:
+            limit = max(1, min(limit or 100, 500))
+            if cursor:
+                query = query.filter(N.id < cursor)
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            keyset_meta = {'limit': limit,
+                           'next_cursor': rows[-1][0].id if (has_more and rows) else None}
+        elif page:
             from utils.crud_helpers import paginate_query
-            entries, pagination_meta = paginate_query(query)
+            rows, pagination_meta = paginate_query(query)
         else:
-            entries = query.all()
+            rows = query.all()
+
+        # Recurrencia: OTs correctivas cerradas por equipo, una sola consulta
+        equip_ids = {r[7] for r in rows if r[7]}
+        failure_counts = {}
+        if equip_ids:
+            failure_counts = dict(db.session.query(WorkOrder.equipment_id, db.func.count(WorkOrder.id))
+                                  .filter(WorkOrder.equipment_id.in_(equip_ids),
+                                          WorkOrder.maintenance_type == 'Correctivo',
+                                          WorkOrder.status == 'Cerrada')
+                                  .group_by(WorkOrder.equipment_id).all())
+
+        # Los nombres van en el response para que el frontend no necesite
+        # /api/areas, /api/lines, etc. (roles sin acceso a 'activos_config'
+        # verian solo numeros en la tabla de avisos).
         results = []
-
-        # Pre-cargar diccionarios de nombres para resolver IDs en el response.
-        # Asi el frontend no necesita /api/areas, /api/lines, etc. para mostrar
-        # nombres (eso evita que roles sin acceso a 'activos_config' vean solo
-        # numeros en la tabla de avisos).
-        from models import Area, Line, Equipment
-        areas_map      = {a.id: a.name for a in Area.query.all()}
-        lines_map      = {l.id: l.name for l in Line.query.all()}
-        # Separar nombre y tag — antes solo devolvia el tag y la tabla mostraba
-        # el codigo en lugar del nombre del equipo.
-        equipments_map = {e.id: {'name': e.name, 'tag': e.tag} for e in Equipment.query.all()}
-        systems_map    = {s.id: s.name for s in System.query.all()}
-        components_map = {c.id: c.name for c in Component.query.all()}
-
-        for notice in entries:
+        for (notice, area_name, line_name, eq_name, eq_tag, sys_name, comp_name,
+             equip_id, failure_mode) in rows:
             data = notice.to_dict()
-            data['area_name']      = areas_map.get(notice.area_id, '-') if notice.area_id else '-'
-            data['line_name']      = lines_map.get(notice.line_id, '-') if notice.line_id else '-'
-            eq_info = equipments_map.get(notice.equipment_id) if notice.equipment_id else None
-            data['equipment_name'] = (eq_info['name'] if eq_info else '-')
-            data['equipment_tag']  = (eq_info['tag'] if eq_info else None)
-            data['system_name']    = systems_map.get(notice.system_id, '-') if notice.system_id else '-'
-            data['component_name'] = components_map.get(notice.component_id, '-') if notice.component_id else '-'
-
-            # Resolve Equipment ID
-            equip_id = None
-            if notice.equipment_id:
-                equip_id = notice.equipment_id
-            elif notice.system_id:
-                # We need to import System/Component/Equipment if not available globally.
-                # Assuming they are available as they are models.
-                try:
-                    sys = System.query.get(notice.system_id)
-                    if sys:
-                        equip_id = sys.equipment_id
-                except Exception:
-                    pass
-            elif notice.component_id:
-                try:
-                    comp = Component.query.get(notice.component_id)
-                    if comp:
-                        sys = System.query.get(comp.system_id)
-                        if sys:
-                            equip_id = sys.equipment_id
-                except Exception:
-                    pass
-
-            # Calculate Failure Count (Corrective + Closed)
-            failure_count = 0
-            if equip_id:
-                try:
-                    failure_count = WorkOrder.query.filter_by(
-                        equipment_id=equip_id,
-                        maintenance_type='Correctivo',
-                        status='Cerrada',
-                    ).count()
-                except Exception as e:
-                    logger.error(f"Error counting failures for equip {equip_id}: {e}")
-                    logger.error(f"Error counting failures for equip {equip_id}: {e}")
-
-            data['failure_count'] = failure_count
-
-            # Include Failure Mode from linked OT if exists
-            data['failure_mode'] = '-'
-            if notice.work_order:
-                data['failure_mode'] = notice.work_order.failure_mode or '-'
-
+            data['area_name'] = area_name or '-'
+            data['line_name'] = line_name or '-'
+            data['equipment_name'] = eq_name or '-'
+            data['equipment_tag'] = eq_tag
+            data['system_name'] = sys_name or '-'
+            data['component_name'] = comp_name or '-'
+            data['failure_count'] = failure_counts.get(equip_id, 0) if equip_id else 0
+            data['failure_mode'] = failure_mode or '-'
             results.append(data)
 
+        if keyset_meta:
+            return jsonify({'items': results, **keyset_meta})
         if pagination_meta:
             return jsonify({'items': results, 'pagination': pagination_meta})
         return jsonify(results)
@@ -216,12 +216,23 @@ def register_plant_flow_routes(app, db, logger, Equipment, Area, Line, WorkOrder
             areas = {a.id: a for a in Area.query.all()}
             lines = {l.id: l for l in Line.query.all()}
 
-            # OTs cerradas en el periodo con downtime. Se cargan TODAS las
-            # OTs con caused_downtime=true y se filtran luego por ventana,
-            # porque una OT puede empezar antes del periodo y terminar dentro.
+            # OTs cerradas en el periodo con downtime. Una OT puede empezar
+            # antes del periodo y terminar dentro, asi que en SQL solo se
+            # descartan las que terminaron (o empezaron, o se programaron)
+            # antes del inicio, con 1 dia de holgura por la hora; el solape
+            # exacto se resuelve luego con overlaps_window. No se usa
+            # kpi_daily_equipment: la disponibilidad une los intervalos de
+            # paro con hora (solapes entre OTs), que una suma diaria pierde.
+            desde = start - dt.timedelta(days=1)
             all_ots = WorkOrder.query.filter(
                 WorkOrder.status == 'Cerrada',
                 WorkOrder.caused_downtime == True,  # noqa: E712
+                db.or_(
+                    WorkOrder.real_end_on.is_(None),
+                    WorkOrder.real_end_on >= desde,
+                    WorkOrder.real_start_on >= desde,
+                    WorkOrder.scheduled_on >= desde,
+                ),
             ).all()
 
             def overlaps_window(ot):
@@ -482,10 +493,15 @@ def register_plant_flow_routes(app, db, logger, Equipment, Area, Line, WorkOrder
             # Capacidad teorica = N equipos × horas del periodo (24/7 simplificado)
             total_capacity_hours = len(equipments) * total_hours
 
-            # OTs cerradas con downtime en el periodo
+            # OTs cerradas con downtime en el periodo (rango en SQL sobre la
+            # sombra DATE de la misma fecha que evalua in_window)
+            ref_on = db.func.coalesce(WorkOrder.real_end_on, WorkOrder.scheduled_on,
+                                      WorkOrder.real_start_on)
             all_ots = WorkOrder.query.filter(
                 WorkOrder.status == 'Cerrada',
                 WorkOrder.caused_downtime == True,  # noqa: E712
+                ref_on >= start,
+                ref_on <= end,
             ).all()
 
             def in_window(ot):
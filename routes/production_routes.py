@@ -14,9 +14,10 @@ import math
 import statistics
 from io import BytesIO
 
-import requests
 from flask import jsonify, request, render_template, send_file
 from flask_login import login_required
+from utils import http_client
+from utils.job_queue import STATUS_PENDING, job_handler, submit_job
 
 
 SACK_KG = 50  # 1 saco de harina procesada = 50 kg
@@ -452,20 +453,16 @@ def register_production_routes(app, db, logger, ProductionGoal, WorkOrder, Area,
 
     # ── Diagnóstico IA (DeepSeek) ────────────────────────────────────────────
 
-    @app.route('/api/production/ai-diagnosis', methods=['POST'])
-    def production_ai_diagnosis():
-        """Genera diagnóstico ejecutivo con DeepSeek sobre el estado actual."""
+    def _ai_diagnosis(period):
+        """Diagnostico del periodo: DeepSeek si hay clave; si no (o si falla),
+        el diagnostico interno por reglas."""
+        metrics = _metrics_for_period(period)
+        if not DEEPSEEK_API_KEY:
+            return {
+                "diagnosis": _fallback_diagnosis(metrics),
+                "source": "internal",
+            }
         try:
-            data = request.get_json() or {}
-            period = data.get('period') or _current_period()
-            metrics = _metrics_for_period(period)
-
-            if not DEEPSEEK_API_KEY:
-                return jsonify({
-                    "diagnosis": _fallback_diagnosis(metrics),
-                    "source": "internal",
-                })
-
             prompt = _build_ai_prompt(metrics)
 
             headers = {
@@ -491,26 +488,46 @@ def register_production_routes(app, db, logger, ProductionGoal, WorkOrder, Area,
                 'max_tokens': 500,
             }
 
-            r = requests.post(DEEPSEEK_URL, headers=headers, json=payload, timeout=60)
+            r = http_client.post('deepseek', DEEPSEEK_URL, headers=headers, json=payload)
             r.raise_for_status()
             j = r.json()
             answer = j['choices'][0]['message']['content'].strip()
 
-            return jsonify({
+            return {
                 "diagnosis": answer,
                 "source": "ai",
                 "metrics_snapshot": metrics['totals'],
-            })
+            }
         except Exception as e:
             logger.error(f"production_ai_diagnosis error: {e}")
-            try:
-                return jsonify({
-                    "diagnosis": _fallback_diagnosis(metrics),
-                    "source": "fallback",
-                    "error": str(e),
-                })
-            except Exception:
-                return jsonify({"error": str(e)}), 500
+            return {
+                "diagnosis": _fallback_diagnosis(metrics),
+                "source": "fallback",
+                "error": str(e),
+            }
+
+    # Sin reintentos: ante un fallo del LLM el resultado ya trae el fallback
+    @job_handler('production_ai_diagnosis', max_attempts=1, lease_seconds=300)
+    def _ai_diagnosis_job(app, payload):
+        return _ai_diagnosis(payload['period'])
+
+    @app.route('/api/production/ai-diagnosis', methods=['POST'])
+    def production_ai_diagnosis():
+        """Genera diagnóstico ejecutivo con DeepSeek sobre el estado actual.
+
+        Con {"async": true} (y DeepSeek configurado) encola el trabajo y
+        responde 202 con job_id; el resultado se consulta en /api/jobs/<job_id>.
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            period = data.get('period') or _current_period()
+            if data.get('async') and DEEPSEEK_API_KEY:
+                job_id = submit_job('production_ai_diagnosis', {'period': period})
+                return jsonify({"job_id": job_id, "status": STATUS_PENDING}), 202
+            return jsonify(_ai_diagnosis(period))
+        except Exception as e:
+            logger.error(f"production_ai_diagnosis error: {e}")
+            return jsonify({"error": str(e)}), 500
 
     def _build_ai_prompt(m):
         t = m['totals']
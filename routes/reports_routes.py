@@ -4,7 +4,7 @@ import datetime as dt
 from io import BytesIO
 
 import pandas as pd
-from flask import jsonify, request, send_file
+from flask import Response, jsonify, request, send_file, stream_with_context
 from flask_login import login_required
 
 from utils.audit import audit_log
@@ -47,113 +47,94 @@ def register_reports_routes(
         try:
             start_date = request.args.get('start_date')
             end_date = request.args.get('end_date')
-            area_id = request.args.get('area_id')
-            line_id = request.args.get('line_id')
-            
-            # Determine Level and Groups
+            area_id = request.args.get('area_id', type=int)
+            line_id = request.args.get('line_id', type=int)
+
+            # Determine Level and Groups (jerarquia del snapshot del proceso)
+            from utils.hierarchy import get_hierarchy
+            h = get_hierarchy()
             level = "area"
-            groups = [] # {id, name, children_ids}
-            
+            groups = [] # {id, name}
+
             if line_id:
                 level = "equipment"
-                parent = Line.query.get(line_id)
-                if not parent: return jsonify({"error": "Line not found"}), 404
-                
-                equips = Equipment.query.filter_by(line_id=line_id).all()
-                for e in equips:
-                    groups.append({"id": e.id, "name": e.name, "object": e})
-                    
+                if line_id not in h.lines: return jsonify({"error": "Line not found"}), 404
+                for eid in h.equipments_by_line.get(line_id, ()):
+                    groups.append({"id": eid, "name": h.equipments[eid].name})
+
             elif area_id:
                 level = "line"
-                parent = Area.query.get(area_id)
-                if not parent: return jsonify({"error": "Area not found"}), 404
-                
-                lines = Line.query.filter_by(area_id=area_id).all()
-                for l in lines:
-                    groups.append({"id": l.id, "name": l.name, "object": l})
-                    
+                if area_id not in h.areas: return jsonify({"error": "Area not found"}), 404
+                for lid in h.lines_by_area.get(area_id, ()):
+                    groups.append({"id": lid, "name": h.lines[lid].name})
+
             else:
                 level = "area"
-                areas = Area.query.all()
-                for a in areas:
-                    groups.append({"id": a.id, "name": a.name, "object": a})
+                for a in h.areas.values():
+                    groups.append({"id": a.id, "name": a.name})
 
             # Calculate KPIs for each group
             results = []
 
-            # Pre-load once — shared across all group iterations
-            _all_closed_ots = WorkOrder.query.filter_by(status='Cerrada').all()
-            _systems_map    = {s.id: s for s in System.query.all()}
-            _components_map = {c.id: c for c in Component.query.all()}
-
-            # Pre-build OT equipment_id for fast lookup
-            def _resolve_ot_equip_id(ot):
-                if ot.equipment_id:
-                    return ot.equipment_id
-                if ot.system_id:
-                    s = _systems_map.get(ot.system_id)
-                    if s:
-                        return s.equipment_id
-                if ot.component_id:
-                    c = _components_map.get(ot.component_id)
-                    if c:
-                        s = _systems_map.get(c.system_id)
-                        if s:
-                            return s.equipment_id
-                return None
-
-            _ot_equip_cache = {ot.id: _resolve_ot_equip_id(ot) for ot in _all_closed_ots}
-
-            # Helper to get all OTs for a hierarchy node
-            def get_ots_for_node(node, level):
-                equip_ids = set()
-
+            def _equips_for_node(node_id):
                 if level == 'equipment':
-                    equip_ids = {node.id}
-                elif level == 'line':
-                    equip_ids = {e.id for e in Equipment.query.filter_by(line_id=node.id).all()}
-                elif level == 'area':
-                    lines = Line.query.filter_by(area_id=node.id).all()
-                    for l in lines:
-                        for e in Equipment.query.filter_by(line_id=l.id).all():
-                            equip_ids.add(e.id)
-
-                if not equip_ids:
-                    return []
-
-                relevant_ots = []
-                for ot in _all_closed_ots:
-                    if start_date and ot.real_end_date and ot.real_end_date < start_date:
-                        continue
-                    if end_date and ot.real_end_date and ot.real_end_date > end_date:
-                        continue
-                    if _ot_equip_cache.get(ot.id) in equip_ids:
-                        relevant_ots.append(ot)
-
-                return relevant_ots
-
-            # Pre-load warehouse unit costs for fast lookup
-            _wh_cost_map = {w.id: float(w.unit_cost or 0) for w in WarehouseItem.query.with_entities(
-                WarehouseItem.id, WarehouseItem.unit_cost).all()}
+                    return {node_id}
+                if level == 'line':
+                    return set(h.equipment_ids_in(line_id=node_id))
+                return set(h.equipment_ids_in(area_id=node_id))
+
+            # Fallas y horas desde kpi_daily_equipment (ver utils/kpi_facts.py),
+            # sumadas por equipo en SQL para la ventana pedida. La ventana se
+            # aplica al dia del hecho (inicio real, o programado), no a
+            # real_end_date: una OT que arranca en un periodo y cierra en el
+            # siguiente cuenta en el periodo en que arranco, como en
+            # /api/dashboard-kpis.
+            from models import KpiDailyEquipment as F
+            d_start = _parse_date_flexible(start_date) if start_date else None
+            d_end = _parse_date_flexible(end_date) if end_date else None
+            fq = db.session.query(
+                F.equipment_id,
+                db.func.sum(F.corrective).label('failures'),
+                db.func.sum(F.corrective_repair_h).label('t_down'),
+                db.func.sum(F.preventive + F.corrective).label('ot_count'),
+            )
+            if d_start:
+                fq = fq.filter(F.day >= d_start)
+            if d_end:
+                fq = fq.filter(F.day <= d_end)
+            facts_by_equip = {r.equipment_id: r for r in fq.group_by(F.equipment_id).all()}
+
+            # Costo de materiales de almacen por equipo (resuelto como en los
+            # hechos: OT -> sistema -> componente), misma ventana
+            from utils.kpi_facts import ot_equipment_source
+            ot_from, ot_equipment = ot_equipment_source(WorkOrder.__table__)
+            ot_day = db.func.coalesce(WorkOrder.real_start_on, WorkOrder.scheduled_on)
+            cq = db.session.query(
+                ot_equipment,
+                db.func.sum(OTMaterial.quantity * db.func.coalesce(WarehouseItem.unit_cost, 0)),
+            ).select_from(ot_from
+            ).join(OTMaterial, OTMaterial.work_order_id == WorkOrder.id
+            ).join(WarehouseItem, WarehouseItem.id == OTMaterial.item_id
+            ).filter(
+                WorkOrder.status == 'Cerrada',
+                ot_equipment.isnot(None),
+                OTMaterial.item_type == 'warehouse',
+            )
+            if d_start:
+                cq = cq.filter(ot_day >= d_start)
+            if d_end:
+                cq = cq.filter(ot_day <= d_end)
+            cost_by_equip = dict(cq.group_by(ot_equipment).all())
 
             for g in groups:
-                ots = get_ots_for_node(g['object'], level)
-
-                # 1. Cost Calculation — batch load materials for all OTs in this group
-                total_cost = 0
-                if ots:
-                    _ot_ids = [ot.id for ot in ots]
-                    _mats = OTMaterial.query.filter(
-                        OTMaterial.work_order_id.in_(_ot_ids),
-                        OTMaterial.item_type == 'warehouse'
-                    ).all()
-                    for m in _mats:
-                        total_cost += _wh_cost_map.get(m.item_id, 0) * (m.quantity or 0)
-                
+                equip_ids = _equips_for_node(g['id'])
+                total_cost = sum(float(cost_by_equip.get(e) or 0) for e in equip_ids)
+                rows = [facts_by_equip[e] for e in equip_ids if e in facts_by_equip]
+
                 # 2. Reliability Calculation
-                failures = [ot for ot in ots if ot.maintenance_type == 'Correctivo']
-                n_failures = len(failures)
-                t_down = sum([(ot.real_duration or 0) for ot in failures])
+                n_failures = sum(int(r.failures or 0) for r in rows)
+                t_down = sum(float(r.t_down or 0) for r in rows)
+                ot_count = sum(int(r.ot_count or 0) for r in rows)
                 
                 # Total Time window (hours)
                 # Approximate if dates not set: 30 days
@@ -180,7 +161,7 @@ def register_reports_routes(
                     "mtbf": round(mtbf, 1),
                     "mttr": round(mttr, 1),
                     "availability": round(availability, 2),
-                    "ot_count": len(ots)
+                    "ot_count": ot_count
                 })
                 
             return jsonify({
@@ -1197,17 +1178,13 @@ def register_reports_routes(
         La logica vive en utils/powerbi_export.build_workbook() — esta ruta
         solo orquesta la respuesta HTTP."""
         try:
+            from utils.excel_stream import send_workbook
             from utils.powerbi_export import build_workbook
-            output = build_workbook()
+            wb = build_workbook()
             today = dt.date.today().isoformat()
             audit_log('EXPORT_MASS', module='reports',
                       detail=f"target=powerbi_workbook date={today}")
-            return send_file(
-                output,
-                as_attachment=True,
-                download_name=f"CMMS_PowerBI_{today}.xlsx",
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            )
+            return send_workbook(wb, f"CMMS_PowerBI_{today}.xlsx")
         except Exception as e:
             logger.exception("Power BI export error")
             return jsonify({"error": str(e)}), 500
@@ -1222,18 +1199,14 @@ def register_reports_routes(
         try:
             from utils.management_report import build_management_workbook
             payload = _collect_executive_payload()
-            output = build_management_workbook(payload)
+            from utils.excel_stream import send_workbook
+            wb = build_management_workbook(payload)
             meta = payload.get('meta', {})
             start = meta.get('start_date', 'inicio')
             end = meta.get('end_date', 'fin')
             audit_log('EXPORT_MASS', module='reports',
                       detail=f"target=management_report window={start}_{end}")
-            return send_file(
-                output,
-                as_attachment=True,
-                download_name=f"Reporte_Gerencial_{start}_a_{end}.xlsx",
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            )
+            return send_workbook(wb, f"Reporte_Gerencial_{start}_a_{end}.xlsx")
         except Exception as e:
             logger.exception("Management report export error")
             return jsonify({"error": str(e)}), 500
@@ -1249,17 +1222,59 @@ def register_reports_routes(
         return jsonify(list_endpoints())
 
     def _pb_response(builder_fn):
-        """Helper: ejecuta un builder con lookups precargados y devuelve JSON."""
-        from utils.powerbi_export import _build_lookups
+        """Helper: serializa el builder en streaming (arreglo JSON, o NDJSON con
+        ?format=ndjson). Filas de a lotes: memoria acotada sin importar el
+        tamano de la tabla. ?since= devuelve solo lo creado/modificado desde
+        esa fecha (sync incremental)."""
+        from utils.change_feed import parse_since
+        from utils.powerbi_export import _build_lookups, SinceNotSupported
+        ndjson = request.args.get('format') == 'ndjson'
+        try:
+            since = parse_since(request.args.get('since'))
+        except ValueError:
+            return jsonify({"error": "since invalido (ISO 8601)"}), 400
+
+        # La primera fila se calcula antes de responder: los errores de
+        # arranque (since no soportado, SQL) todavia pueden devolver 4xx/5xx.
         try:
-            data = builder_fn(_build_lookups())
+            rows = iter(builder_fn(_build_lookups(), since=since))
+            first = next(rows, None)
+        except SinceNotSupported as e:
             db.session.remove()
-            return jsonify(data)
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             db.session.remove()
             logger.exception("Power BI endpoint error")
             return jsonify({"error": str(e)}), 500
 
+        dumps = app.json.dumps
+
+        def generate():
+            sep = '\n' if ndjson else ','
+            buf = [] if ndjson else ['[']
+            try:
+                if first is not None:
+                    buf.append(dumps(first))
+                    for row in rows:
+                        buf.append(sep)
+                        buf.append(dumps(row))
+                        if len(buf) >= 1000:
+                            yield ''.join(buf)
+                            buf = []
+                if ndjson and first is not None:
+                    buf.append('\n')
+                if not ndjson:
+                    buf.append(']')
+                yield ''.join(buf)
+            except Exception:
+                # Con los headers ya enviados solo queda cortar y dejar rastro
+                logger.exception("Power BI stream error")
+            finally:
+                db.session.remove()
+
+        mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+        return Response(stream_with_context(generate()), mimetype=mimetype)
+
     @app.route('/api/powerbi/work-orders-v2', methods=['GET'])
     def powerbi_work_orders_v2():
         """OTs enriquecidas con scope/aviso/parada. Reemplaza work-orders."""
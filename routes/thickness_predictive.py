@@ -20,8 +20,8 @@ import os
 import datetime as dt
 import logging
 
-import requests
 from flask import jsonify, request, render_template
+from utils import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -150,7 +150,8 @@ def register_thickness_predictive_routes(app, db, logger,
                                          ThicknessReading, Equipment):
 
     def _load_equipment_data(equipment_id=None):
-        """Carga puntos + lecturas (con fecha de campaña) en bloque.
+        """Carga puntos + lecturas (con fecha de campaña) en un solo recorrido
+        ordenado: las lecturas de cada punto llegan en orden cronológico.
 
         Devuelve dict equipment_id -> {equipment, points: {point_id: {point, readings}}}
         """
@@ -169,7 +170,8 @@ def register_thickness_predictive_routes(app, db, logger,
             LEFT JOIN thickness_inspections i
                    ON i.id = r.inspection_id AND i.status = 'COMPLETA'
             WHERE p.is_active = TRUE {eq_filter}
-            ORDER BY p.equipment_id, p.group_name, p.section, p.order_index
+            ORDER BY p.equipment_id, p.group_name, p.section, p.order_index, p.id,
+                     i.inspection_date
         """), params).fetchall()
 
         data = {}
@@ -185,11 +187,20 @@ def register_thickness_predictive_routes(app, db, logger,
                 pt["readings"].append((insp_date, value))
         return data
 
-    def _campaigns_info(equipment_id):
-        insps = ThicknessInspection.query.filter_by(
-            equipment_id=equipment_id, status='COMPLETA').all()
-        dates = sorted({i.inspection_date for i in insps if i.inspection_date})
-        return len(dates), (dates[-1] if dates else None)
+    def _campaigns_info(equipment_id=None):
+        """{equipment_id: (n_campañas, última_fecha)} de las inspecciones
+        COMPLETA, en un GROUP BY para todos los equipos (o uno)."""
+        from sqlalchemy import func, select
+        q = select(ThicknessInspection.equipment_id,
+                   func.count(func.distinct(ThicknessInspection.inspection_date)),
+                   func.max(ThicknessInspection.inspection_date)) \
+            .where(ThicknessInspection.status == 'COMPLETA',
+                   ThicknessInspection.inspection_date.isnot(None),
+                   ThicknessInspection.inspection_date != '') \
+            .group_by(ThicknessInspection.equipment_id)
+        if equipment_id:
+            q = q.where(ThicknessInspection.equipment_id == equipment_id)
+        return {eq_id: (n, last) for eq_id, n, last in db.session.execute(q)}
 
     def _analyze_equipment(eq_id, eq_data):
         """Corre el forecast de todos los puntos de un equipo y agrega."""
@@ -231,14 +242,15 @@ def register_thickness_predictive_routes(app, db, logger,
     @app.route('/api/thickness/predictive/summary', methods=['GET'])
     def thickness_predictive_summary():
         try:
+            from utils.hierarchy import get_hierarchy
             data = _load_equipment_data()
-            eq_map = {e.id: e for e in Equipment.query.filter(
-                Equipment.id.in_(list(data.keys()))).all()} if data else {}
+            eq_map = get_hierarchy().equipments
+            campaigns = _campaigns_info() if data else {}
             out = []
             for eq_id, eq_data in data.items():
                 eq = eq_map.get(eq_id)
                 points, counts, worst, semaforo, n_interv = _analyze_equipment(eq_id, eq_data)
-                n_campaigns, last_date = _campaigns_info(eq_id)
+                n_campaigns, last_date = campaigns.get(eq_id, (0, None))
                 measured = [p for p in points if p.get("n_total")]
                 with_rate = [p for p in points if p.get("rate_mm_yr")]
                 out.append({
@@ -284,7 +296,7 @@ def register_thickness_predictive_routes(app, db, logger,
                 return jsonify({"error": "El equipo no tiene puntos de espesor"}), 404
             points, counts, worst, semaforo, n_interv = _analyze_equipment(
                 equipment_id, data[equipment_id])
-            n_campaigns, last_date = _campaigns_info(equipment_id)
+            n_campaigns, last_date = _campaigns_info(equipment_id).get(equipment_id, (0, None))
 
             zones = {}
             for p in points:
@@ -329,7 +341,7 @@ def register_thickness_predictive_routes(app, db, logger,
             "Si hay puntos ya bajo el espesor de retiro, dilo primero y con urgencia."
         )
         try:
-            r = requests.post(DEEPSEEK_URL, headers={
+            r = http_client.post('deepseek', DEEPSEEK_URL, headers={
                 'Authorization': f'Bearer {api_key}',
                 'Content-Type': 'application/json',
             }, json={
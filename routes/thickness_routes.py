@@ -28,14 +28,13 @@ def register_thickness_routes(
             return ('ALERTA', True, False)
         return ('NORMAL', False, False)
 
-    def _semaphore_for_equipment(equipment_id):
-        """Calcula el semáforo de la próxima inspección programada del equipo."""
-        last = ThicknessInspection.query.filter_by(equipment_id=equipment_id) \
-            .order_by(ThicknessInspection.inspection_date.desc()).first()
-        if not last or not last.next_due_date:
+    def _semaphore(next_due_date):
+        """Calcula el semáforo de la próxima inspección programada del equipo
+        (next_due_date de su última inspección)."""
+        if not next_due_date:
             return ('PENDIENTE', None)
         try:
-            due = dt.date.fromisoformat(last.next_due_date)
+            due = dt.date.fromisoformat(next_due_date)
             today = dt.date.today()
             days_left = (due - today).days
             if days_left < 0:
@@ -328,21 +327,50 @@ def register_thickness_routes(
     # ── DASHBOARD ──────────────────────────────────────────────────────────
     @app.route('/api/thickness/dashboard', methods=['GET'])
     def thickness_dashboard():
+        """Resumen por equipo con puntos catalogados. Consultas fijas (no una
+        tanda por equipo): conteos con GROUP BY, última inspección con
+        row_number() y nombres/tags del snapshot de jerarquía."""
+        from sqlalchemy import func, select
+        from utils.hierarchy import get_hierarchy
         try:
-            # Equipos con puntos catalogados
-            equipment_ids = db.session.query(ThicknessPoint.equipment_id).distinct().all()
-            equipment_ids = [e[0] for e in equipment_ids]
+            # Conteos por (equipo, activo, estado)
+            counts = {}
+            rows = db.session.execute(
+                select(ThicknessPoint.equipment_id, ThicknessPoint.is_active,
+                       ThicknessPoint.status, func.count())
+                .group_by(ThicknessPoint.equipment_id, ThicknessPoint.is_active,
+                          ThicknessPoint.status)
+            ).all()
+            for eq_id, is_active, status, n in rows:
+                c = counts.setdefault(eq_id, {"point_count": 0, "critical_count": 0, "alert_count": 0})
+                if not is_active:
+                    continue
+                c["point_count"] += n
+                if status == 'CRITICO':
+                    c["critical_count"] += n
+                elif status == 'ALERTA':
+                    c["alert_count"] += n
+
+            # Última inspección de cada equipo
+            rn = func.row_number().over(
+                partition_by=ThicknessInspection.equipment_id,
+                order_by=(ThicknessInspection.inspection_date.desc(), ThicknessInspection.id.desc()),
+            ).label('rn')
+            ranked = select(ThicknessInspection.equipment_id, ThicknessInspection.inspection_date,
+                            ThicknessInspection.next_due_date, rn).subquery()
+            last_by_eq = {r.equipment_id: r for r in db.session.execute(
+                select(ranked.c.equipment_id, ranked.c.inspection_date, ranked.c.next_due_date)
+                .where(ranked.c.rn == 1)
+            )}
+
+            equipments = get_hierarchy().equipments
             equipos = []
-            for eq_id in equipment_ids:
-                eq = Equipment.query.get(eq_id)
+            for eq_id, c in counts.items():
+                eq = equipments.get(eq_id)
                 if not eq:
                     continue
-                last = ThicknessInspection.query.filter_by(equipment_id=eq_id) \
-                    .order_by(ThicknessInspection.inspection_date.desc()).first()
-                semaphore, days_left = _semaphore_for_equipment(eq_id)
-                point_count = ThicknessPoint.query.filter_by(equipment_id=eq_id, is_active=True).count()
-                critical_count = ThicknessPoint.query.filter_by(equipment_id=eq_id, status='CRITICO', is_active=True).count()
-                alert_count = ThicknessPoint.query.filter_by(equipment_id=eq_id, status='ALERTA', is_active=True).count()
+                last = last_by_eq.get(eq_id)
+                semaphore, days_left = _semaphore(last.next_due_date if last else None)
                 equipos.append({
                     "equipment_id": eq_id,
                     "equipment_name": eq.name,
@@ -351,9 +379,7 @@ def register_thickness_routes(
                     "next_due_date": last.next_due_date if last else None,
                     "days_left": days_left,
                     "semaphore_status": semaphore,
-                    "point_count": point_count,
-                    "critical_count": critical_count,
-                    "alert_count": alert_count,
+                    **c,
                 })
             equipos.sort(key=lambda x: (x['equipment_tag'] or ''))
             return jsonify({"equipos": equipos, "total": len(equipos)})
@@ -5,6 +5,7 @@ import pandas as pd
 from flask import jsonify, request, send_file
 from flask_login import login_required
 
+from utils.excel_stream import new_workbook, send_workbook, write_sheet
 from utils.rate_limit import limit_export
 
 
@@ -88,12 +89,9 @@ def register_warehouse_routes(
     @limit_export
     def export_warehouse_excel():
         try:
-            items = WarehouseItem.query.all()
-            data = []
-
-            for i in items:
-                data.append(
-                    {
+            def rows():
+                for i in WarehouseItem.query.order_by(WarehouseItem.id).yield_per(500):
+                    yield {
                         'ID': i.id,
                         'Código': i.code,
                         'Nombre': i.name,
@@ -116,21 +114,10 @@ def register_warehouse_routes(
                         'Lote Mínimo': i.min_order_qty,
                         'Activo': 'Sí' if i.is_active else 'No',
                     }
-                )
-
-            df = pd.DataFrame(data)
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='Inventario')
 
-            output.seek(0)
-
-            return send_file(
-                output,
-                download_name="Inventario_Maestro_CMMS.xlsx",
-                as_attachment=True,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            )
+            wb = new_workbook()
+            write_sheet(wb, 'Inventario', rows())
+            return send_workbook(wb, "Inventario_Maestro_CMMS.xlsx")
 
         except Exception as e:
             logger.error(f"Warehouse Export Failed: {e}")
@@ -141,38 +128,28 @@ def register_warehouse_routes(
     @limit_export
     def export_kardex_excel():
         try:
-            movements = WarehouseMovement.query.order_by(WarehouseMovement.date.desc()).all()
-            data = []
-
-            for m in movements:
-                item_code = m.item.code if m.item else 'Unknown'
-                item_name = m.item.name if m.item else 'Unknown'
-
-                data.append(
-                    {
-                        'Fecha': m.date,
-                        'Tipo': m.movement_type,
-                        'Item': f"{item_code} - {item_name}",
-                        'Cantidad': m.quantity,
-                        'Razón': m.reason,
-                        'Referencia': m.reference_id,
-                    }
-                )
-
-            df = pd.DataFrame(data)
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='Kardex')
-
-            output.seek(0)
-
-            return send_file(
-                output,
-                download_name="Kardex_CMMS.xlsx",
-                as_attachment=True,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            query = (
+                db.session.query(WarehouseMovement, WarehouseItem.code, WarehouseItem.name)
+                .outerjoin(WarehouseItem, WarehouseItem.id == WarehouseMovement.item_id)
+                .order_by(WarehouseMovement.date.desc(), WarehouseMovement.id.desc())
             )
 
+            def rows():
+                for m, item_code, item_name in query.yield_per(500):
+                    yield (
+                        m.date,
+                        m.movement_type,
+                        f"{item_code or 'Unknown'} - {item_name or 'Unknown'}",
+                        m.quantity,
+                        m.reason,
+                        m.reference_id,
+                    )
+
+            wb = new_workbook()
+            write_sheet(wb, 'Kardex', rows(),
+                        columns=['Fecha', 'Tipo', 'Item', 'Cantidad', 'Razón', 'Referencia'])
+            return send_workbook(wb, "Kardex_CMMS.xlsx")
+
         except Exception as e:
             logger.error(f"Kardex Export Failed: {e}")
             return jsonify({"error": str(e)}), 500
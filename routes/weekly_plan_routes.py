@@ -299,10 +299,10 @@ def register_weekly_plan_routes(
 
             capacity_per_day = p.tech_count * p.hours_per_night
 
-            areas_all = Area.query.all()
-            line_map = {l.id: l for l in Line.query.all()}
-            equip_map = {e.id: e for e in Equipment.query.all()}
-            area_map = {a.id: a for a in areas_all}
+            from utils.hierarchy import get_hierarchy
+            h = get_hierarchy()
+            areas_all = list(h.areas.values())
+            line_map, equip_map, area_map = h.lines, h.equipments, h.areas
 
             open_ots = WorkOrder.query.filter(
                 WorkOrder.status.in_(['Abierta', 'Programada', 'En Progreso']),
@@ -12,7 +12,7 @@ autorizados en bot_whatsapp_users, con rol, areas visibles y grupo destino.
 import os
 import hmac
 
-from flask import jsonify, request
+from flask import Response, jsonify, request
 from flask_login import login_required, current_user
 from sqlalchemy import text
 
@@ -56,10 +56,13 @@ def register_whatsapp_routes(app, db, logger):
             return jsonify({"replies": ["⚠️ Error interno del CMMS procesando tu mensaje. Ya quedo registrado en los logs."]}), 200
 
     # ── Cola de salida: el gateway sondea y envía (RCA, notificaciones) ───
-    # Machine-to-machine (X-Gateway-Token). El gateway hace GET cada ~15 s,
-    # envía cada mensaje por WhatsApp con retardo humano y confirma con ack.
+    # Machine-to-machine (X-Gateway-Token). El gateway hace long-poll
+    # (?wait=<s>, max OUTBOX_MAX_WAIT_SECONDS): la request vuelve apenas se
+    # encola un mensaje, o vacia al vencer la espera. Envía cada mensaje por
+    # WhatsApp con retardo humano y confirma con ack.
     # Así Flask puede empujar mensajes proactivos SIN que el gateway abra
     # ningún puerto (sigue siendo cliente de Flask, seguro anti-baneo).
+    OUTBOX_MAX_WAIT_SECONDS = 25
 
     @app.route('/api/public/whatsapp/outbox', methods=['GET'])
     def whatsapp_outbox_pull():
@@ -67,9 +70,11 @@ def register_whatsapp_routes(app, db, logger):
         if auth_err:
             return auth_err
         try:
-            from bot.rca import claim_outbox
+            from bot.rca import wait_outbox
             limit = request.args.get('limit', default=5, type=int)
-            msgs = claim_outbox(app, limit=min(max(limit, 1), 10))
+            wait = request.args.get('wait', default=0, type=float)
+            msgs = wait_outbox(app, limit=min(max(limit, 1), 10),
+                               wait_seconds=min(max(wait, 0), OUTBOX_MAX_WAIT_SECONDS))
             return jsonify({"messages": msgs})
         except Exception as e:
             logger.error(f"whatsapp_outbox_pull error: {e}", exc_info=True)
@@ -89,6 +94,24 @@ def register_whatsapp_routes(app, db, logger):
             logger.error(f"whatsapp_outbox_ack error: {e}", exc_info=True)
             return jsonify({"ok": False}), 200
 
+    @app.route('/api/public/whatsapp/media/<token>', methods=['GET'])
+    def whatsapp_outbox_media(token):
+        """Media de un mensaje del outbox, en streaming desde el media store.
+        Sin X-Gateway-Token: el token de la URL (firmado, con vencimiento)
+        es la autorizacion."""
+        from bot.rca import outbox_media_id
+        from utils.media_store import open_media
+        mid = outbox_media_id(app, token)
+        if mid is None:
+            return jsonify({"error": "Enlace invalido o vencido"}), 403
+        row = db.session.execute(text(
+            "SELECT media_ref, media_mimetype FROM wa_outbox WHERE id = :id"), {"id": mid}).fetchone()
+        chunks = open_media(row[0]) if row and row[0] else None
+        if chunks is None:
+            return jsonify({"error": "Media no encontrada"}), 404
+        return Response(chunks, mimetype=row[1] or 'application/octet-stream',
+                        direct_passthrough=True)
+
     # ── Panel admin: usuarios del bot WhatsApp ────────────────────────────
 
     def _ensure_table():
@@ -1,12 +1,12 @@
 from datetime import datetime, timedelta
-from io import BytesIO
 
-import pandas as pd
-from flask import jsonify, request, send_file
+from flask import jsonify, request
 from flask_login import login_required
 
 from utils.audit import audit_log
+from utils.excel_stream import new_workbook, send_workbook, write_sheet
 from utils.rate_limit import limit_export
+from utils.reporting_helpers import _parse_date_flexible
 from utils.specialty_helpers import specialty_for_ot, infer_discipline_from_text
 
 
@@ -108,11 +108,40 @@ def register_work_orders_routes(
 
     # ── Generate Preventive OTs from overdue points ───────────────────────
 
+    _OPEN_NOTICE_STATUSES = ('Pendiente', 'En Tratamiento', 'En Progreso', 'Programado')
+    _OPEN_OT_STATUSES = ('Abierta', 'Programada', 'En Progreso')
+
+    def _open_source_pairs(source_types):
+        """(source_type, source_id) con aviso u OT abierta: dos consultas de
+        conjunto en vez de dos por fuente."""
+        from sqlalchemy import select
+        pairs = set()
+        for Model, statuses in ((MaintenanceNotice, _OPEN_NOTICE_STATUSES),
+                                (WorkOrder, _OPEN_OT_STATUSES)):
+            pairs.update((t, sid) for t, sid in db.session.execute(
+                select(Model.source_type, Model.source_id).distinct().where(
+                    Model.source_type.in_(source_types),
+                    Model.source_id.isnot(None),
+                    Model.status.in_(statuses),
+                )
+            ))
+        return pairs
+
     @app.route('/api/generate-preventive-ots', methods=['POST'])
     def generate_preventive_ots():
-        """Scan all overdue lub/insp/mon points and create preventive OTs."""
+        """Scan all overdue lub/insp/mon points and create preventive notices.
+
+        ?dry_run=1 (o {"dry_run": true}) devuelve lo que se crearia sin
+        escribir nada. Los avisos se insertan con un solo INSERT multi-fila
+        y los codigos AV-XXXX se asignan en lote despues.
+        """
         try:
+            from utils.date_shadows import with_date_shadows
+            from utils.hierarchy import get_hierarchy
             from utils.preventive_sources import collect_sources
+            body = request.get_json(silent=True) or {}
+            dry_run = str(request.args.get('dry_run', body.get('dry_run', ''))).lower() in (
+                '1', 'true', 'yes')
             created = []
             skipped = 0
 
@@ -125,70 +154,85 @@ def register_work_orders_routes(
                 only_overdue=True,
                 RotativeAsset=RotativeAsset,
             )
+            open_pairs = _open_source_pairs({s['source_type'] for s in sources}) if sources else set()
+            h = get_hierarchy()
+            today = datetime.now().strftime('%Y-%m-%d')
 
             # Create AVISOS (not OTs) for sources that don't already have an open aviso/OT
+            notices = []
             for src in sources:
-                # Check for existing open aviso with same source
-                existing_notice = MaintenanceNotice.query.filter(
-                    MaintenanceNotice.source_type == src['source_type'],
-                    MaintenanceNotice.source_id == src['source_id'],
-                    MaintenanceNotice.status.in_(['Pendiente', 'En Tratamiento', 'En Progreso', 'Programado']),
-                ).first()
-                if existing_notice:
+                key = (src['source_type'], src['source_id'])
+                if key in open_pairs:
                     skipped += 1
                     continue
-
-                # Also check for existing open OT with same source
-                existing_ot = WorkOrder.query.filter(
-                    WorkOrder.source_type == src['source_type'],
-                    WorkOrder.source_id == src['source_id'],
-                    WorkOrder.status.in_(['Abierta', 'Programada', 'En Progreso']),
-                ).first()
-                if existing_ot:
-                    skipped += 1
-                    continue
-
-                today = datetime.now().strftime('%Y-%m-%d')
+                open_pairs.add(key)
 
                 # Auto-resolve hierarchy from equipment if missing
                 eq_id = src['equipment_id']
                 ln_id = src['line_id']
                 ar_id = src['area_id']
-                if eq_id and not ln_id:
-                    eq = Equipment.query.get(eq_id)
-                    if eq:
-                        ln_id = eq.line_id
+                if eq_id and not ln_id and eq_id in h.equipments:
+                    ln_id = h.equipments[eq_id].line_id
                 if ln_id and not ar_id:
-                    ln = Line.query.get(ln_id)
-                    if ln:
-                        ar_id = ln.area_id
-
-                notice = MaintenanceNotice(
-                    reporter_name='Sistema CMMS',
-                    reporter_type='MANTENIMIENTO',
-                    description=src['description'],
-                    maintenance_type='Preventivo',
-                    priority='Media',
-                    status='Pendiente',
-                    request_date=today,
-                    area_id=ar_id,
-                    line_id=ln_id,
-                    equipment_id=eq_id,
-                    system_id=src['system_id'],
-                    component_id=src['component_id'],
-                    source_type=src['source_type'],
-                    source_id=src['source_id'],
-                )
-                db.session.add(notice)
-                db.session.flush()
-                notice.code = f"AV-{notice.id:04d}"
+                    ar_id = h.area_id_of_line(ln_id)
+
+                notices.append(with_date_shadows('maintenance_notices', {
+                    'reporter_name': 'Sistema CMMS',
+                    'reporter_type': 'MANTENIMIENTO',
+                    'description': src['description'],
+                    'maintenance_type': 'Preventivo',
+                    'priority': 'Media',
+                    'status': 'Pendiente',
+                    'request_date': today,
+                    'area_id': ar_id,
+                    'line_id': ln_id,
+                    'equipment_id': eq_id,
+                    'system_id': src['system_id'],
+                    'component_id': src['component_id'],
+                    'source_type': src['source_type'],
+                    'source_id': src['source_id'],
+                }))
                 created.append({
-                    'code': notice.code,
+                    'code': None,
                     'source': f"{src['code']} {src['name']}".strip(),
                     'type': src['source_type'],
                     'semaphore': src['semaphore'],
                 })
 
+            if dry_run:
+                for item, notice in zip(created, notices):
+                    item.update(description=notice['description'], equipment_id=notice['equipment_id'],
+                                area_id=notice['area_id'])
+                return jsonify({
+                    'dry_run': True,
+                    'created': len(created),
+                    'skipped': skipped,
+                    'items': created,
+                    'message': f'{len(created)} avisos preventivos se generarian.'
+                })
+
+            if notices:
+                # Un INSERT multi-fila (sin eventos ORM: las sombras DATE van
+                # en el dict) y un UPDATE executemany para los codigos.
+                from sqlalchemy import bindparam, insert, update
+                table = MaintenanceNotice.__table__
+                ids = {}
+                for i in range(0, len(notices), 500):   # tope de parametros por sentencia
+                    rows = db.session.execute(
+                        insert(table).values(notices[i:i + 500])
+                        .returning(table.c.id, table.c.source_type, table.c.source_id)
+                    ).all()
+                    ids.update({(r.source_type, r.source_id): r.id for r in rows})
+                codes = []
+                for item, notice in zip(created, notices):
+                    nid = ids[(notice['source_type'], notice['source_id'])]
+                    item['code'] = f"AV-{nid:04d}"
+                    codes.append({'b_id': nid, 'b_code': item['code']})
+                db.session.execute(
+                    update(table).where(table.c.id == bindparam('b_id'))
+                    .values(code=bindparam('b_code')),
+                    codes,
+                )
             db.session.commit()
             return jsonify({
                 'created': len(created),
@@ -948,8 +992,14 @@ def register_work_orders_routes(
                 logger.error(f"Error creating work order: {e}")
                 return jsonify({"error": str(e)}), 500
 
-        # Pagination support: ?page=1&per_page=50 (omit page for all)
+        # Paginacion:
+        #   ?limit=100[&cursor=<id>]  keyset por id (recomendada): devuelve
+        #       {items, next_cursor}; next_cursor = id para la siguiente pagina.
+        #   ?page=1&per_page=50       legado (OFFSET + COUNT).
+        #   sin parametros            todas las OTs (compat. con el frontend).
         page = request.args.get('page', type=int)
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor', type=int)
         query = WorkOrder.query.order_by(WorkOrder.id.desc())
 
         # Filtro opcional por parada (?shutdown_id=X)
@@ -957,6 +1007,35 @@ def register_work_orders_routes(
         if sh_id_filter:
             query = query.filter(WorkOrder.shutdown_id == sh_id_filter)
 
+        # Filtros de servidor. status/type aceptan varios valores separados
+        # por coma; el rango de fechas usa la sombra DATE de la fecha
+        # programada (o el inicio real si no tiene).
+        statuses = [x.strip() for x in (request.args.get('status') or '').split(',') if x.strip()]
+        if statuses:
+            query = query.filter(WorkOrder.status.in_(statuses))
+        mtypes = [x.strip() for x in (request.args.get('type') or request.args.get('maintenance_type') or '').split(',') if x.strip()]
+        if mtypes:
+            query = query.filter(WorkOrder.maintenance_type.in_(mtypes))
+        for arg, col in (('area_id', WorkOrder.area_id), ('line_id', WorkOrder.line_id),
+                         ('equipment_id', WorkOrder.equipment_id)):
+            val = request.args.get(arg, type=int)
+            if val:
+                query = query.filter(col == val)
+        list_day = db.func.coalesce(WorkOrder.scheduled_on, WorkOrder.real_start_on)
+        d_from = _parse_date_flexible(request.args.get('date_from'))
+        d_to = _parse_date_flexible(request.args.get('date_to'))
+        if d_from:
+            query = query.filter(list_day >= d_from)
+        if d_to:
+            query = query.filter(list_day <= d_to)
+        tech_filter = request.args.get('technician_id', type=int)
+        if tech_filter:
+            query = query.filter(db.or_(
+                WorkOrder.technician_id == str(tech_filter),
+                WorkOrder.id.in_(db.session.query(OTPersonnel.work_order_id)
+                                 .filter(OTPersonnel.technician_id == tech_filter)),
+            ))
+
         # Si el usuario es personal de campo (tecnico/mecanico/electricista),
         # restringir a sus OTs (asignado o en personnel)
         try:
@@ -985,16 +1064,38 @@ def register_work_orders_routes(
             logger.warning(f"Filtro por tecnico no aplicado: {_e}")
 
         pagination_meta = None
-        if page:
+        keyset_meta = None
+        if limit or cursor:
+            limit = max(1, min(limit or 100, 500))
+            if cursor:
+                query = query.filter(WorkOrder.id < cursor)
+            entries = query.limit(limit + 1).all()
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+            keyset_meta = {'limit': limit,
+                           'next_cursor': entries[-1].id if (has_more and entries) else None}
+        elif page:
             from utils.crud_helpers import paginate_query
             entries, pagination_meta = paginate_query(query)
         else:
             entries = query.all()
 
+        # ?fields=id,code,status  recorta cada fila a esas claves (id siempre
+        # va) y evita las precargas que no aporten ninguna.
+        fields = {f.strip() for f in (request.args.get('fields') or '').split(',') if f.strip()}
+        if fields:
+            fields.add('id')
+
+        def want(*keys):
+            return not fields or any(k in fields for k in keys)
+
         purchase_by_ot = {}
-        if entries:
+        if entries and want('purchase_requests_total', 'purchase_requests_pending',
+                            'purchase_status_count', 'has_logistics_block', 'purchase_tracking'):
             ot_ids = [wo.id for wo in entries]
-            reqs = PurchaseRequest.query.filter(PurchaseRequest.work_order_id.in_(ot_ids)).all()
+            from sqlalchemy.orm import selectinload
+            reqs = PurchaseRequest.query.options(selectinload(PurchaseRequest.purchase_order)) \
+                .filter(PurchaseRequest.work_order_id.in_(ot_ids)).all()
             for req in reqs:
                 purchase_by_ot.setdefault(req.work_order_id, []).append(req)
 
@@ -1022,6 +1123,11 @@ def register_work_orders_routes(
         syss_map   = {s.id: s for s in System.query.filter(System.id.in_(_sys_ids)).all()}        if _sys_ids   else {}
         comps_map  = {c.id: c for c in Component.query.filter(Component.id.in_(_comp_ids)).all()} if _comp_ids  else {}
         notices_map = {n.id: n for n in MaintenanceNotice.query.filter(MaintenanceNotice.id.in_(_notice_ids)).all()} if _notice_ids else {}
+        _ra_ids = {wo.rotative_asset_id for wo in entries if getattr(wo, 'rotative_asset_id', None)}
+        ras_map = {}
+        if _ra_ids and want('rotative_asset_name'):
+            from models import RotativeAsset
+            ras_map = {r.id: r for r in RotativeAsset.query.filter(RotativeAsset.id.in_(_ra_ids)).all()}
 
         # Enrich with hierarchy names
         results = []
@@ -1046,13 +1152,8 @@ def register_work_orders_routes(
             data['component_name'] = get_name(component)
 
             # Rotative asset name
-            ra_id = getattr(wo, 'rotative_asset_id', None)
-            if ra_id:
-                from models import RotativeAsset
-                ra = RotativeAsset.query.get(ra_id)
-                data['rotative_asset_name'] = f"{ra.code} {ra.name}" if ra else None
-            else:
-                data['rotative_asset_name'] = None
+            ra = ras_map.get(getattr(wo, 'rotative_asset_id', None))
+            data['rotative_asset_name'] = f"{ra.code} {ra.name}" if ra else None
 
             # Determine Criticality
             crit = '-'
@@ -1061,8 +1162,9 @@ def register_work_orders_routes(
             elif equip and equip.criticality:
                 crit = equip.criticality
             # Check notice linked criticality if not found in asset
-            if crit == '-' and wo.notice and wo.notice.criticality:
-                crit = wo.notice.criticality
+            _linked_notice = notices_map.get(wo.notice_id) if wo.notice_id else None
+            if crit == '-' and _linked_notice and _linked_notice.criticality:
+                crit = _linked_notice.criticality
 
             data['criticality'] = crit
 
@@ -1133,8 +1235,12 @@ def register_work_orders_routes(
             data['purchase_status_count'] = status_count
             data['has_logistics_block'] = blocking_count > 0
             data['purchase_tracking'] = ' | '.join(tracking_parts) if tracking_parts else ''
+            if fields:
+                data = {k: v for k, v in data.items() if k in fields}
             results.append(data)
 
+        if keyset_meta:
+            return jsonify({'items': results, **keyset_meta})
         if pagination_meta:
             return jsonify({'items': results, 'pagination': pagination_meta})
         return jsonify(results)
@@ -1144,69 +1250,61 @@ def register_work_orders_routes(
     @limit_export
     def export_work_orders_excel():
         try:
-            entries = WorkOrder.query.all()
-            data = []
-
-            # Pre-load all taxonomy and related objects in bulk
-            _area_ids     = {wo.area_id      for wo in entries if wo.area_id}
-            _line_ids     = {wo.line_id      for wo in entries if wo.line_id}
-            _equip_ids    = {wo.equipment_id for wo in entries if wo.equipment_id}
-            _sys_ids      = {wo.system_id    for wo in entries if wo.system_id}
-            _comp_ids     = {wo.component_id for wo in entries if wo.component_id}
-            _provider_ids = {wo.provider_id  for wo in entries if wo.provider_id}
-            _notice_ids   = {wo.notice_id    for wo in entries if wo.notice_id}
-            _areas_m  = {a.id: a for a in Area.query.filter(Area.id.in_(_area_ids)).all()}              if _area_ids     else {}
-            _lines_m  = {l.id: l for l in Line.query.filter(Line.id.in_(_line_ids)).all()}              if _line_ids     else {}
-            _equips_m = {e.id: e for e in Equipment.query.filter(Equipment.id.in_(_equip_ids)).all()}   if _equip_ids    else {}
-            _syss_m   = {s.id: s for s in System.query.filter(System.id.in_(_sys_ids)).all()}           if _sys_ids      else {}
-            _comps_m  = {c.id: c for c in Component.query.filter(Component.id.in_(_comp_ids)).all()}    if _comp_ids     else {}
-            _provs_m  = {p.id: p for p in Provider.query.filter(Provider.id.in_(_provider_ids)).all()}  if _provider_ids else {}
-            _nots_m   = {n.id: n for n in MaintenanceNotice.query.filter(MaintenanceNotice.id.in_(_notice_ids)).all()} if _notice_ids else {}
+            from sqlalchemy.orm import selectinload
+            from utils.hierarchy import get_hierarchy
+
+            h = get_hierarchy()
+            # Personal asignado y proveedor (disciplina) por lote; el aviso por
+            # JOIN. Las OTs se leen del cursor de a 500, sin materializar la tabla.
+            query = (
+                db.session.query(WorkOrder, MaintenanceNotice.code, MaintenanceNotice.reported_at,
+                                 MaintenanceNotice.request_date)
+                .outerjoin(MaintenanceNotice, MaintenanceNotice.id == WorkOrder.notice_id)
+                .options(selectinload(WorkOrder.assigned_personnel).selectinload(OTPersonnel.technician),
+                         selectinload(WorkOrder.provider))
+                .order_by(WorkOrder.id)
+            )
 
             def get_name(obj):
                 return obj.name if obj else '-'
 
-            for wo in entries:
-                area  = _areas_m.get(wo.area_id)       if wo.area_id      else None
-                line  = _lines_m.get(wo.line_id)       if wo.line_id      else None
-                equip = _equips_m.get(wo.equipment_id) if wo.equipment_id else None
-                sys   = _syss_m.get(wo.system_id)      if wo.system_id    else None
-                comp  = _comps_m.get(wo.component_id)  if wo.component_id else None
-
-                provider_name = _provs_m[wo.provider_id].name if wo.provider_id and wo.provider_id in _provs_m else '-'
-                _notice_obj   = _nots_m.get(wo.notice_id) if wo.notice_id else None
-                notice_code   = _notice_obj.code if _notice_obj else '-'
-                # Fecha de solicitud: preferimos reported_at (momento real del
-                # reporte) y caemos a request_date (registro en el CMMS).
-                fecha_solicitud = (
-                    getattr(_notice_obj, 'reported_at', None)
-                    or getattr(_notice_obj, 'request_date', None)
-                ) if _notice_obj else None
-
-                # Disciplina: 1) personal asignado / proveedor, 2) inferida del texto
-                discipline = specialty_for_ot(wo)
-                if discipline == 'SIN ASIGNAR':
-                    discipline = infer_discipline_from_text(
-                        wo.description, wo.failure_mode,
-                        equip.name if equip else None,
-                        comp.name if comp else None,
-                    )
+            def rows():
+                for wo, notice_code, reported_at, request_date in query.yield_per(500):
+                    area  = h.areas.get(wo.area_id)
+                    line  = h.lines.get(wo.line_id)
+                    equip = h.equipments.get(wo.equipment_id)
+                    sys   = h.systems.get(wo.system_id)
+                    comp  = h.components.get(wo.component_id)
+
+                    provider_name = wo.provider.name if wo.provider else '-'
+                    notice_code   = notice_code or '-'
+                    # Fecha de solicitud: preferimos reported_at (momento real del
+                    # reporte) y caemos a request_date (registro en el CMMS).
+                    fecha_solicitud = reported_at or request_date
+
+                    # Disciplina: 1) personal asignado / proveedor, 2) inferida del texto
+                    discipline = specialty_for_ot(wo)
+                    if discipline == 'SIN ASIGNAR':
+                        discipline = infer_discipline_from_text(
+                            wo.description, wo.failure_mode,
+                            equip.name if equip else None,
+                            comp.name if comp else None,
+                        )
 
-                # Conformidad e Informe solo aplican a OTs con proveedor
-                # (trabajo externo). En OTs internas (Alimencorp) se marca N/A
-                # para que el filtro de Excel no las cuente como "pendientes".
-                is_provider_ot = bool(wo.provider_id)
-                if is_provider_ot:
-                    conformidad_estado = 'Enviada' if (wo.conformity_doc_url or '').strip() else 'Pendiente'
-                    informe_estado = 'Recibido' if (wo.report_url or '').strip() else (
-                        (wo.report_status or 'Pendiente') if wo.report_required else 'No requerido'
-                    )
-                else:
-                    conformidad_estado = 'N/A (interno)'
-                    informe_estado = 'N/A (interno)'
+                    # Conformidad e Informe solo aplican a OTs con proveedor
+                    # (trabajo externo). En OTs internas (Alimencorp) se marca N/A
+                    # para que el filtro de Excel no las cuente como "pendientes".
+                    is_provider_ot = bool(wo.provider_id)
+                    if is_provider_ot:
+                        conformidad_estado = 'Enviada' if (wo.conformity_doc_url or '').strip() else 'Pendiente'
+                        informe_estado = 'Recibido' if (wo.report_url or '').strip() else (
+                            (wo.report_status or 'Pendiente') if wo.report_required else 'No requerido'
+                        )
+                    else:
+                        conformidad_estado = 'N/A (interno)'
+                        informe_estado = 'N/A (interno)'
 
-                data.append(
-                    {
+                    yield {
                         'Código': wo.code,
                         'Aviso Relacionado': notice_code,
                         'Disciplina': discipline,
@@ -1237,21 +1335,10 @@ def register_work_orders_routes(
                         'Fecha Conformidad': wo.conformity_uploaded_at or '',
                         'Link Conformidad': wo.conformity_doc_url or '',
                     }
-                )
-
-            df = pd.DataFrame(data)
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='OrdenesTrabajo')
 
-            output.seek(0)
-
-            return send_file(
-                output,
-                download_name="Reporte_OTs_Completo.xlsx",
-                as_attachment=True,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            )
+            wb = new_workbook()
+            write_sheet(wb, 'OrdenesTrabajo', rows())
+            return send_workbook(wb, "Reporte_OTs_Completo.xlsx")
 
         except Exception as e:
             logger.error(f"OT Export Error: {e}")
@@ -4,22 +4,32 @@
 
 Idempotente: usa upsert, asi que se puede correr multiples veces sin duplicar.
 Costo estimado: ~$0.0001 por cada 100 entidades (despreciable).
+
+Por paginas de PAGE_SIZE filas: un request de embeddings y un INSERT
+multi-fila por pagina (utils.embeddings.upsert_embeddings). Las entidades
+cuyo texto no cambio (content_hash) no se vuelven a mandar a OpenAI.
+
+Reanudable: el ultimo id confirmado por tipo queda en
+scripts/.index_history_progress.json; `--resume` sigue desde ahi.
+`--force` re-embebe todo aunque el texto no haya cambiado.
 """
 import os
 import sys
 import time
-import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
 
 load_dotenv()
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embeddings import upsert_embeddings, load_progress, save_progress
 
-DB_URL = os.getenv('DATABASE_URL')
+DB_URL = os.getenv('DATABASE_URL') or ''
+if DB_URL.startswith('postgres://'):
+    DB_URL = 'postgresql://' + DB_URL[len('postgres://'):]
 
-# Conectar via psycopg2 directo (mas rapido para bulk, sin overhead de Flask)
-import requests
-import json
+PAGE_SIZE = 200
+PROGRESS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.index_history_progress.json')
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 if not OPENAI_API_KEY:
@@ -27,49 +37,37 @@ if not OPENAI_API_KEY:
     sys.exit(1)
 
 
-def gen_embed(text):
-    r = requests.post(
-        'https://api.openai.com/v1/embeddings',
-        headers={'Authorization': f'Bearer {OPENAI_API_KEY}'},
-        json={'model': 'text-embedding-3-small', 'input': text[:8000]},
-        timeout=30,
-    )
-    if r.status_code != 200:
-        print(f"  ! OpenAI error {r.status_code}: {r.text[:150]}")
-        return None
-    return r.json()['data'][0]['embedding']
+def _paged(engine, sql, key='id'):
+    """Recorre `sql` (con filtro `{key} > :after`, ORDER BY y LIMIT :limit)
+    por paginas, devolviendo listas de filas como dict."""
+    def pages(after):
+        while True:
+            with engine.connect() as conn:
+                rows = [dict(r) for r in conn.execute(
+                    text(sql), {'after': after, 'limit': PAGE_SIZE}).mappings()]
+            if not rows:
+                return
+            yield rows
+            after = rows[-1][key]
+    return pages
 
 
-def vec_lit(vec):
-    return '[' + ','.join(repr(float(x)) for x in vec) + ']'
+def _index(engine, entity_type, label, pages, to_items, progress, force):
+    last_id = progress.get(entity_type, 0)
+    totals = {'total': 0, 'skipped': 0, 'embedded': 0, 'failed': 0}
+    print(f"\n{label} a indexar (id > {last_id})...")
+    for rows in pages(last_id):
+        with engine.begin() as conn:
+            stats = upsert_embeddings(conn, list(to_items(conn, rows)), force=force)
+        progress[entity_type] = rows[-1]['id']
+        save_progress(PROGRESS_FILE, progress)
+        for k in totals:
+            totals[k] += stats[k]
+        print(f"  ... hasta id {rows[-1]['id']}: {stats}")
+    print(f"{label} indexadas: {totals}")
 
 
-def main():
-    conn = psycopg2.connect(DB_URL)
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-    # ── OTs (cerradas o no) ───
-    cur.execute("""
-        SELECT wo.id, wo.code, wo.status, wo.description, wo.maintenance_type,
-               wo.failure_mode, wo.execution_comments, wo.real_duration,
-               wo.caused_downtime, wo.downtime_hours,
-               e.name AS eq_name, e.tag AS eq_tag,
-               a.name AS area_name, l.name AS line_name,
-               s.name AS sys_name, c.name AS comp_name,
-               n.code AS notice_code, n.description AS notice_desc
-        FROM work_orders wo
-        LEFT JOIN equipments e  ON wo.equipment_id  = e.id
-        LEFT JOIN areas a       ON wo.area_id       = a.id
-        LEFT JOIN lines l       ON wo.line_id       = l.id
-        LEFT JOIN systems s     ON wo.system_id     = s.id
-        LEFT JOIN components c  ON wo.component_id  = c.id
-        LEFT JOIN maintenance_notices n ON wo.notice_id = n.id
-        WHERE wo.status = 'Cerrada'  -- solo OTs cerradas (las de mas valor para RAG)
-    """)
-    ots = cur.fetchall()
-    print(f"OTs cerradas a indexar: {len(ots)}")
-
-    indexed = 0
+def _ot_items(conn, ots):
     for wo in ots:
         parts = [f"OT {wo['code'] or wo['id']} (cerrada)\n"]
         eq_lbl = f"[{wo['eq_tag'] or '-'}] {wo['eq_name'] or '-'}"
@@ -90,51 +88,16 @@ def main():
         if wo['notice_code']:
             parts.append(f"Aviso origen: {wo['notice_code']} — {wo['notice_desc'] or ''}\n")
 
-        text = ''.join(parts).strip()
-        emb = gen_embed(text)
-        if not emb:
-            continue
-
         meta = {
             'code': wo['code'],
             'equipment_tag': wo['eq_tag'],
             'equipment_name': wo['eq_name'],
             'failure_mode': wo['failure_mode'],
         }
-        cur.execute("""
-            INSERT INTO bot_embeddings (entity_type, entity_id, text_chunk, embedding, metadata, created_at, updated_at)
-            VALUES (%s, %s, %s, %s::vector, %s::jsonb, NOW(), NOW())
-            ON CONFLICT (entity_type, entity_id) DO UPDATE
-              SET text_chunk = EXCLUDED.text_chunk,
-                  embedding  = EXCLUDED.embedding,
-                  metadata   = EXCLUDED.metadata,
-                  updated_at = NOW()
-        """, ('work_order', wo['id'], text, vec_lit(emb), json.dumps(meta)))
-        indexed += 1
-        if indexed % 5 == 0:
-            conn.commit()
-            print(f"  ... {indexed}/{len(ots)} OTs indexadas")
+        yield ('work_order', wo['id'], ''.join(parts).strip(), meta)
 
-    conn.commit()
-    print(f"OTs indexadas: {indexed}/{len(ots)}")
 
-    # ── Avisos (todos, no solo cerrados) ────
-    cur.execute("""
-        SELECT n.id, n.code, n.description, n.failure_mode, n.failure_category,
-               n.blockage_object, n.criticality, n.status, n.free_location,
-               e.name AS eq_name, e.tag AS eq_tag,
-               a.name AS area_name, l.name AS line_name,
-               c.name AS comp_name
-        FROM maintenance_notices n
-        LEFT JOIN equipments e  ON n.equipment_id  = e.id
-        LEFT JOIN areas a       ON n.area_id       = a.id
-        LEFT JOIN lines l       ON n.line_id       = l.id
-        LEFT JOIN components c  ON n.component_id  = c.id
-    """)
-    avisos = cur.fetchall()
-    print(f"\nAvisos a indexar: {len(avisos)}")
-
-    indexed = 0
+def _notice_items(conn, avisos):
     for av in avisos:
         parts = [f"AVISO {av['code'] or 'AV-' + str(av['id'])}\n"]
         eq_lbl = f"[{av['eq_tag'] or '-'}] {av['eq_name'] or '-'}" if av['eq_name'] else (av['free_location'] or '-')
@@ -150,10 +113,6 @@ def main():
         if av['status']:           parts.append(f"Estado: {av['status']}\n")
         if av['description']:      parts.append(f"Descripcion: {av['description']}\n")
 
-        text = ''.join(parts).strip()
-        emb = gen_embed(text)
-        if not emb:
-            continue
         meta = {
             'code': av['code'],
             'equipment_tag': av['eq_tag'],
@@ -161,56 +120,33 @@ def main():
             'failure_mode': av['failure_mode'],
             'criticality': av['criticality'],
         }
-        cur.execute("""
-            INSERT INTO bot_embeddings (entity_type, entity_id, text_chunk, embedding, metadata, created_at, updated_at)
-            VALUES (%s, %s, %s, %s::vector, %s::jsonb, NOW(), NOW())
-            ON CONFLICT (entity_type, entity_id) DO UPDATE
-              SET text_chunk = EXCLUDED.text_chunk,
-                  embedding  = EXCLUDED.embedding,
-                  metadata   = EXCLUDED.metadata,
-                  updated_at = NOW()
-        """, ('notice', av['id'], text, vec_lit(emb), json.dumps(meta)))
-        indexed += 1
-        if indexed % 5 == 0:
-            conn.commit()
-            print(f"  ... {indexed}/{len(avisos)} avisos indexados")
-
-    conn.commit()
-    print(f"Avisos indexados: {indexed}/{len(avisos)}")
+        yield ('notice', av['id'], ''.join(parts).strip(), meta)
 
-    # ── Inspecciones de espesor (UT) — Mejora 4 ────────────────────
-    # Cada inspeccion = 1 embedding con resumen: fecha, equipo,
-    # total puntos, criticos/alerta, y lista de los peores puntos.
-    cur.execute("""
-        SELECT ti.id, ti.inspection_date, ti.inspector_name, ti.status,
-               ti.total_points, ti.critical_points, ti.alert_points,
-               ti.semaphore_status, ti.observations AS notes,
-               e.tag AS eq_tag, e.name AS eq_name,
-               a.name AS area_name
-        FROM thickness_inspections ti
-        LEFT JOIN equipments e ON ti.equipment_id = e.id
-        LEFT JOIN lines l ON e.line_id = l.id
-        LEFT JOIN areas a ON l.area_id = a.id
-    """)
-    inspections = cur.fetchall()
-    print(f"\nInspecciones de espesor a indexar: {len(inspections)}")
 
-    indexed = 0
-    for ti in inspections:
-        # Traer peores puntos de la inspeccion
-        cur.execute("""
-            SELECT tp.group_name, tp.section, tp.position,
+def _inspection_items(conn, inspections):
+    # Peores 5 lecturas de todas las inspecciones de la pagina en una consulta
+    worst = {}
+    for r in conn.execute(text("""
+        SELECT * FROM (
+            SELECT tr.inspection_id, tp.group_name, tp.section, tp.position,
                    tp.nominal_thickness, tr.value_mm,
-                   tr.is_critical, tr.is_alert
+                   tr.is_critical, tr.is_alert,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY tr.inspection_id
+                       ORDER BY tr.is_critical DESC, tr.is_alert DESC,
+                                (tr.value_mm / NULLIF(tp.nominal_thickness, 0)) ASC
+                   ) AS rn
             FROM thickness_readings tr
             JOIN thickness_points tp ON tr.point_id = tp.id
-            WHERE tr.inspection_id = %s
-            ORDER BY tr.is_critical DESC, tr.is_alert DESC,
-                     (tr.value_mm / NULLIF(tp.nominal_thickness, 0)) ASC
-            LIMIT 5
-        """, (ti['id'],))
-        readings = cur.fetchall()
+            WHERE tr.inspection_id = ANY(:ids)
+        ) t
+        WHERE rn <= 5
+        ORDER BY inspection_id, rn
+    """), {'ids': [ti['id'] for ti in inspections]}).mappings():
+        worst.setdefault(r['inspection_id'], []).append(r)
 
+    for ti in inspections:
+        readings = worst.get(ti['id'], [])
         parts = [f"INSPECCION UT del {ti['inspection_date']} (id {ti['id']})\n"]
         parts.append(f"Equipo: [{ti['eq_tag'] or '-'}] {ti['eq_name'] or '-'}\n")
         if ti['area_name']:
@@ -238,10 +174,6 @@ def main():
                     f"(nominal {r['nominal_thickness']}mm) [{flag}]\n"
                 )
 
-        text = ''.join(parts).strip()
-        emb = gen_embed(text)
-        if not emb:
-            continue
         meta = {
             'equipment_tag': ti['eq_tag'],
             'equipment_name': ti['eq_name'],
@@ -249,25 +181,75 @@ def main():
             'semaphore_status': ti['semaphore_status'],
             'critical_points': ti['critical_points'],
         }
-        cur.execute("""
-            INSERT INTO bot_embeddings (entity_type, entity_id, text_chunk, embedding, metadata, created_at, updated_at)
-            VALUES (%s, %s, %s, %s::vector, %s::jsonb, NOW(), NOW())
-            ON CONFLICT (entity_type, entity_id) DO UPDATE
-              SET text_chunk = EXCLUDED.text_chunk,
-                  embedding  = EXCLUDED.embedding,
-                  metadata   = EXCLUDED.metadata,
-                  updated_at = NOW()
-        """, ('thickness_inspection', ti['id'], text, vec_lit(emb), json.dumps(meta)))
-        indexed += 1
-        if indexed % 3 == 0:
-            conn.commit()
-            print(f"  ... {indexed}/{len(inspections)} inspecciones indexadas")
+        yield ('thickness_inspection', ti['id'], ''.join(parts).strip(), meta)
+
+
+def main():
+    force = '--force' in sys.argv
+    progress = load_progress(PROGRESS_FILE) if '--resume' in sys.argv else {}
+    if progress:
+        print(f"Reanudando desde {progress}")
+    engine = create_engine(DB_URL, pool_pre_ping=True)
 
-    conn.commit()
-    print(f"Inspecciones UT indexadas: {indexed}/{len(inspections)}")
+    # ── OTs (solo cerradas: las de mas valor para RAG) ───
+    _index(engine, 'work_order', 'OTs cerradas', _paged(engine, """
+        SELECT wo.id, wo.code, wo.status, wo.description, wo.maintenance_type,
+               wo.failure_mode, wo.execution_comments, wo.real_duration,
+               wo.caused_downtime, wo.downtime_hours,
+               e.name AS eq_name, e.tag AS eq_tag,
+               a.name AS area_name, l.name AS line_name,
+               s.name AS sys_name, c.name AS comp_name,
+               n.code AS notice_code, n.description AS notice_desc
+        FROM work_orders wo
+        LEFT JOIN equipments e  ON wo.equipment_id  = e.id
+        LEFT JOIN areas a       ON wo.area_id       = a.id
+        LEFT JOIN lines l       ON wo.line_id       = l.id
+        LEFT JOIN systems s     ON wo.system_id     = s.id
+        LEFT JOIN components c  ON wo.component_id  = c.id
+        LEFT JOIN maintenance_notices n ON wo.notice_id = n.id
+        WHERE wo.status = 'Cerrada' AND wo.id > :after
+        ORDER BY wo.id
+        LIMIT :limit
+    """), _ot_items, progress, force)
+
+    # ── Avisos (todos, no solo cerrados) ────
+    _index(engine, 'notice', 'Avisos', _paged(engine, """
+        SELECT n.id, n.code, n.description, n.failure_mode, n.failure_category,
+               n.blockage_object, n.criticality, n.status, n.free_location,
+               e.name AS eq_name, e.tag AS eq_tag,
+               a.name AS area_name, l.name AS line_name,
+               c.name AS comp_name
+        FROM maintenance_notices n
+        LEFT JOIN equipments e  ON n.equipment_id  = e.id
+        LEFT JOIN areas a       ON n.area_id       = a.id
+        LEFT JOIN lines l       ON n.line_id       = l.id
+        LEFT JOIN components c  ON n.component_id  = c.id
+        WHERE n.id > :after
+        ORDER BY n.id
+        LIMIT :limit
+    """), _notice_items, progress, force)
+
+    # ── Inspecciones de espesor (UT) — Mejora 4 ────────────────────
+    # Cada inspeccion = 1 embedding con resumen: fecha, equipo,
+    # total puntos, criticos/alerta, y lista de los peores puntos.
+    _index(engine, 'thickness_inspection', 'Inspecciones UT', _paged(engine, """
+        SELECT ti.id, ti.inspection_date, ti.inspector_name, ti.status,
+               ti.total_points, ti.critical_points, ti.alert_points,
+               ti.semaphore_status, ti.observations AS notes,
+               e.tag AS eq_tag, e.name AS eq_name,
+               a.name AS area_name
+        FROM thickness_inspections ti
+        LEFT JOIN equipments e ON ti.equipment_id = e.id
+        LEFT JOIN lines l ON e.line_id = l.id
+        LEFT JOIN areas a ON l.area_id = a.id
+        WHERE ti.id > :after
+        ORDER BY ti.id
+        LIMIT :limit
+    """), _inspection_items, progress, force)
 
-    cur.close()
-    conn.close()
+    engine.dispose()
+    if os.path.exists(PROGRESS_FILE):
+        os.remove(PROGRESS_FILE)
     print("\n=== INDEXADO COMPLETO ===")
 
 
@@ -0,0 +1,35 @@
+"""Aplica las migraciones de schema pendientes (ver utils/schema_migrations.py).
+
+    python scripts/migrate.py            # aplica las pendientes
+    python scripts/migrate.py --status   # lista version / aplicada / checksum
+
+Util en deploys con CMMS_AUTO_CREATE_TABLES=false: se migra una vez antes de
+levantar los workers y el arranque no toca el schema. Importa app.py con
+CMMS_MIGRATE_ONLY=1: sin migrar al importar ni arrancar hilos (job workers,
+keep-alive, bot de Telegram), asi `--status` no escribe nada.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['CMMS_MIGRATE_ONLY'] = '1'
+
+from app import app, logger, _MIGRATIONS
+
+with app.app_context():
+    from database import db
+    from utils.schema_migrations import apply_migrations, migration_status
+
+    if '--status' in sys.argv:
+        for row in migration_status(db, _MIGRATIONS):
+            if row['applied_at'] is None:
+                state = 'PENDIENTE'
+            elif row['checksum_ok']:
+                state = f"aplicada {row['applied_at']}"
+            else:
+                state = f"aplicada {row['applied_at']} (CHECKSUM DISTINTO)"
+            print(f"{row['version']:04d}  {row['name']:<32} {state}")
+        raise SystemExit(0)
+
+    applied = apply_migrations(db, _MIGRATIONS, logger=logger)
+    print(f"Aplicadas: {[repr(m) for m in applied]}" if applied else "Schema al dia.")
@@ -38,6 +38,7 @@ def main():
             text_chunk   TEXT NOT NULL,
             embedding    VECTOR(1536) NOT NULL,
             metadata     JSONB,
+            content_hash VARCHAR(64),
             created_at   TIMESTAMP DEFAULT NOW(),
             updated_at   TIMESTAMP DEFAULT NOW()
         )
@@ -51,18 +52,20 @@ def main():
     """)
     print("[+] Indice unico (entity_type, entity_id) creado")
 
-    # 4) Indice IVFFlat para busqueda rapida por similitud coseno
-    # Lists=100 funciona bien hasta ~10K filas. Subir a 200+ con mas datos.
+    # 4) Indice HNSW para busqueda rapida por similitud coseno. A diferencia
+    # de IVFFlat no necesita datos para entrenarse ni reconstruirse al crecer.
+    conn.commit()
     try:
         cur.execute("""
-            CREATE INDEX IF NOT EXISTS ix_bot_emb_vec_cosine
-            ON bot_embeddings USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = 50)
+            CREATE INDEX IF NOT EXISTS ix_bot_emb_vec_hnsw
+            ON bot_embeddings USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
         """)
-        print("[+] Indice IVFFlat creado (busqueda rapida por similitud)")
+        print("[+] Indice HNSW creado (busqueda rapida por similitud)")
     except Exception as e:
-        # Si la tabla esta vacia, IVFFlat puede fallar. No es critico.
-        print(f"[!] IVFFlat skip ({e})")
+        # pgvector < 0.5 no tiene HNSW: queda la busqueda exacta
+        conn.rollback()
+        print(f"[!] HNSW skip ({e})")
 
     conn.commit()
     cur.close()
@@ -1,12 +1,38 @@
 """Reindexa en bot_embeddings (SINCRONO):
   - Todos los DocumentLink existentes (manuales, planos, fichas, informes).
   - OTs cerradas existentes (para capturar URLs incrustadas en execution_comments).
+  - Todos los avisos.
 
-Ejecutar una sola vez despues del deploy. No duplica: usa ON CONFLICT.
+Ejecutar despues del deploy. No duplica: usa ON CONFLICT.
+
+Procesa por paginas de PAGE_SIZE entidades (orden por id): un request de
+embeddings y un INSERT multi-fila por pagina, y saltea las entidades cuyo
+texto no cambio desde el ultimo indexado (content_hash).
+
+Reanudable: el ultimo id confirmado por tipo queda en
+scripts/.reindex_rag_progress.json. Si se corta, `--resume` sigue desde ahi;
+al terminar completo el checkpoint se borra. Las entidades que fallaron
+(error de OpenAI) no frenan el avance: una corrida completa sin --resume
+las reintenta y saltea por hash todo lo demas.
+
+    python scripts/reindex_rag.py [--resume] [--force]
+
+--force re-embebe aunque el texto no haya cambiado (p.ej. cambio de modelo).
 """
 import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from app import app
 
+PAGE_SIZE = 200
+PROGRESS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.reindex_rag_progress.json')
+
+resume = '--resume' in sys.argv
+force = '--force' in sys.argv
+
 with app.app_context():
     from database import db
     from models import (
@@ -14,17 +40,31 @@ with app.app_context():
         System, Component, RotativeAsset,
     )
     from utils.embeddings import (
-        upsert_embedding, build_ot_text, build_document_link_text,
+        upsert_embeddings, build_ot_text, build_notice_text, build_document_link_text,
+        load_progress, save_progress,
     )
 
     if not os.getenv('OPENAI_API_KEY'):
         print("OPENAI_API_KEY no esta seteada. Aborto.")
         raise SystemExit(1)
 
-    # 1) DocumentLinks
-    docs = DocumentLink.query.all()
-    print(f"Indexando {len(docs)} DocumentLinks...")
-    for doc in docs:
+    progress = load_progress(PROGRESS_FILE) if resume else {}
+    if progress:
+        print(f"Reanudando desde {progress}")
+
+    # Maestros en memoria (copias planas: sobreviven a los commit por pagina)
+    # para no hacer un SELECT por entidad
+    def _snapshot(Model, *attrs):
+        return {r.id: SimpleNamespace(**{a: getattr(r, a) for a in attrs})
+                for r in Model.query.all()}
+
+    areas = _snapshot(Area, 'name')
+    lines = _snapshot(Line, 'name', 'area_id')
+    equipments = _snapshot(Equipment, 'name', 'tag', 'line_id')
+    systems = _snapshot(System, 'name')
+    components = _snapshot(Component, 'name')
+
+    def _doc_item(doc):
         parent_name = None; parent_tag = None
         category = None; brand = None; model = None
         area_name = None; line_name = None
@@ -36,13 +76,14 @@ with app.app_context():
                 area_name = ra.area.name if ra.area else None
                 line_name = ra.line.name if ra.line else None
         elif doc.entity_type == 'equipment':
-            eq = Equipment.query.get(doc.entity_id)
+            eq = equipments.get(doc.entity_id)
             if eq:
                 parent_name = eq.name; parent_tag = eq.tag
-                area_name = eq.area.name if getattr(eq, 'area', None) else None
-                line_name = eq.line.name if getattr(eq, 'line', None) else None
+                ln = lines.get(eq.line_id)
+                line_name = ln.name if ln else None
+                area_name = areas[ln.area_id].name if ln and ln.area_id in areas else None
         elif doc.entity_type == 'component':
-            co = Component.query.get(doc.entity_id)
+            co = components.get(doc.entity_id)
             if co:
                 parent_name = co.name
         text = build_document_link_text(
@@ -55,28 +96,67 @@ with app.app_context():
             'parent_type': doc.entity_type, 'parent_id': doc.entity_id,
             'parent_tag': parent_tag, 'parent_name': parent_name,
         }
-        ok = upsert_embedding(db.session, 'document_link', doc.id, text, metadata)
-        print(f"  [{doc.id}] {doc.title[:50]!r} -> {'OK' if ok else 'FAIL'}")
-    db.session.commit()
-
-    # 2) OTs cerradas (para reextraer URLs en bitacora)
-    wos = WorkOrder.query.filter_by(status='Cerrada').all()
-    print(f"Reindexando {len(wos)} OTs cerradas...")
-    for wo in wos:
-        eq = Equipment.query.get(wo.equipment_id) if wo.equipment_id else None
-        ar = Area.query.get(wo.area_id) if wo.area_id else None
-        ln = Line.query.get(wo.line_id) if wo.line_id else None
-        sy = System.query.get(wo.system_id) if wo.system_id else None
-        co = Component.query.get(wo.component_id) if wo.component_id else None
-        notice = MaintenanceNotice.query.get(wo.notice_id) if wo.notice_id else None
-        text = build_ot_text(wo.to_dict(), equipment=eq, area=ar, line=ln,
-                             system=sy, component=co, notice=notice)
-        metadata = {
-            'code': wo.code,
-            'equipment_tag': eq.tag if eq else None,
-            'failure_mode': wo.failure_mode,
-        }
-        ok = upsert_embedding(db.session, 'work_order', wo.id, text, metadata)
-        print(f"  [{wo.code}] -> {'OK' if ok else 'FAIL'}")
-    db.session.commit()
+        return ('document_link', doc.id, text, metadata)
+
+    def _ot_items(wos):
+        notice_ids = [wo.notice_id for wo in wos if wo.notice_id]
+        notices = ({n.id: n for n in MaintenanceNotice.query.filter(
+            MaintenanceNotice.id.in_(notice_ids))} if notice_ids else {})
+        for wo in wos:
+            eq = equipments.get(wo.equipment_id)
+            text = build_ot_text(
+                wo.to_dict(), equipment=eq, area=areas.get(wo.area_id),
+                line=lines.get(wo.line_id), system=systems.get(wo.system_id),
+                component=components.get(wo.component_id), notice=notices.get(wo.notice_id),
+            )
+            metadata = {
+                'code': wo.code,
+                'equipment_tag': eq.tag if eq else None,
+                'failure_mode': wo.failure_mode,
+            }
+            yield ('work_order', wo.id, text, metadata)
+
+    def _notice_items(notices):
+        for n in notices:
+            eq = equipments.get(n.equipment_id)
+            text = build_notice_text(
+                n, equipment=eq, area=areas.get(n.area_id), line=lines.get(n.line_id),
+                component=components.get(n.component_id),
+            )
+            metadata = {
+                'code': n.code,
+                'equipment_tag': eq.tag if eq else None,
+                'failure_mode': n.failure_mode,
+                'criticality': n.criticality,
+            }
+            yield ('notice', n.id, text, metadata)
+
+    def _reindex(entity_type, query, Model, to_items):
+        last_id = progress.get(entity_type, 0)
+        totals = {'total': 0, 'skipped': 0, 'embedded': 0, 'failed': 0}
+        print(f"Indexando {entity_type} (id > {last_id})...")
+        while True:
+            page = query.filter(Model.id > last_id).order_by(Model.id).limit(PAGE_SIZE).all()
+            if not page:
+                break
+            items = list(to_items(page))
+            last_id = page[-1].id
+            stats = upsert_embeddings(db.session, items, force=force)
+            db.session.commit()
+            progress[entity_type] = last_id
+            save_progress(PROGRESS_FILE, progress)
+            for k in totals:
+                totals[k] += stats[k]
+            print(f"  ... hasta id {last_id}: {stats}")
+            db.session.expunge_all()
+        print(f"  {entity_type}: {totals}")
+
+    _reindex('document_link', DocumentLink.query, DocumentLink,
+             lambda docs: (_doc_item(d) for d in docs))
+    # OTs cerradas (para reextraer URLs en bitacora)
+    _reindex('work_order', WorkOrder.query.filter_by(status='Cerrada'), WorkOrder, _ot_items)
+    _reindex('notice', MaintenanceNotice.query, MaintenanceNotice, _notice_items)
+
+    if os.path.exists(PROGRESS_FILE):
+        os.remove(PROGRESS_FILE)
     print("Listo.")
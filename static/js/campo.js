@@ -172,7 +172,7 @@ function otFilter(chip) {
 
 async function loadOts() {
     try {
-        const r = await fetch('/api/work-orders?page=1&per_page=200');
+        const r = await fetch('/api/work-orders?limit=200');
         const d = await r.json();
         if (!r.ok) { $('otList').innerHTML = `<div class="empty">${esc(d.error || 'Sin acceso a OTs')}</div>`; return; }
         OTS = d.items || d || [];
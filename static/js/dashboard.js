@@ -378,6 +378,12 @@ async function selectLevel(level, id, label) {
 // ── Generate Preventive OTs ──────────────────────────────────────────────────
 
 async function generatePreventiveOTs() {
+    // Vista previa (dry_run): confirmar antes de crear los avisos
+    const preview = await (await fetch('/api/generate-preventive-ots?dry_run=1', { method: 'POST' })).json();
+    if (preview.error) { alert('Error: ' + preview.error); return; }
+    if (preview.created > 0 &&
+        !confirm(`Se generaran ${preview.created} avisos preventivos. ¿Continuar?`)) return;
+
     const res = await fetch('/api/generate-preventive-ots', { method: 'POST' });
     const data = await res.json();
     if (data.error) { alert('Error: ' + data.error); return; }
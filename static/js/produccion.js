@@ -337,9 +337,12 @@ async function loadAiDiagnosis() {
         const r = await fetch('/api/production/ai-diagnosis', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ period: getSelectedPeriod() }),
+            body: JSON.stringify({ period: getSelectedPeriod(), async: true }),
         });
-        const j = await r.json();
+        let j = await r.json();
+        if (j.job_id) {
+            j = await waitForJob(j.job_id);
+        }
         body.textContent = j.diagnosis || 'Sin diagnóstico disponible.';
         src.textContent = '🤖 Análisis automático basado en datos del CMMS · ' + fmtDateTime(new Date());
     } catch (e) {
@@ -347,6 +350,19 @@ async function loadAiDiagnosis() {
     }
 }
 
+// Sondea la cola de trabajos hasta que el diagnostico termina (max ~3 min)
+async function waitForJob(jobId) {
+    for (let i = 0; i < 90; i++) {
+        await new Promise(res => setTimeout(res, 2000));
+        const r = await fetch(`/api/jobs/${jobId}`);
+        if (!r.ok) throw new Error('trabajo no encontrado');
+        const st = await r.json();
+        if (st.status === 'OK') return st.result || {};
+        if (st.status === 'ERROR') throw new Error(st.error || 'fallo el trabajo');
+    }
+    throw new Error('tiempo de espera agotado');
+}
+
 // ── Export Excel ────────────────────────────────────────────────────────
 function exportExcel() {
     const period = getSelectedPeriod();
@@ -273,36 +273,41 @@ function populateMultiSelectFilters() {
     const equips = [...new Set(allWorkOrders.map(ot => ot.equipment_name || '(Sin Equipo)').filter(x => x))].sort();
     const statuses = [...new Set(allWorkOrders.map(ot => ot.status).filter(x => x))].sort();
 
-    renderCheckboxList('area', areas);
-    renderCheckboxList('line', lines);
-    renderCheckboxList('equip', equips);
-    renderCheckboxList('status', statuses);
-
-    // Initialize activeFilters based on all checkboxes being checked by default
-    activeFilters.area = areas;
-    activeFilters.line = lines;
-    activeFilters.equip = equips;
-    activeFilters.status = statuses;
+    activeFilters.area = renderCheckboxList('area', areas);
+    activeFilters.line = renderCheckboxList('line', lines);
+    activeFilters.equip = renderCheckboxList('equip', equips);
+    activeFilters.status = renderCheckboxList('status', statuses);
 }
 
 function renderCheckboxList(type, items) {
     const container = document.getElementById(`list-${type}`);
-    if (!container) return;
+    if (!container) return items;
+
+    // La lista se rearma con cada pagina de OTs y en cada recarga: se
+    // conserva lo que el usuario ya marco o desmarco. Un valor nuevo entra
+    // marcado solo si "Seleccionar Todo" esta marcado (todo marcado la
+    // primera vez). Devuelve los valores marcados.
+    const prevAll = container.querySelector('input[value="ALL"]');
+    const allChecked = prevAll ? prevAll.checked : true;
+    const prev = new Map(Array.from(container.querySelectorAll('input:not([value="ALL"])'))
+        .map(cb => [cb.value, cb.checked]));
+    const isChecked = item => prev.has(item) ? prev.get(item) : allChecked;
 
     // Add "Select All" option
     let html = `
         <label>
-            <input type="checkbox" value="ALL" checked onchange="toggleSelectAll('${type}')"> Seleccionar Todo
+            <input type="checkbox" value="ALL" ${allChecked ? 'checked' : ''} onchange="toggleSelectAll('${type}')"> Seleccionar Todo
         </label>
         <div class="filter-divider"></div>
     `;
 
     html += items.map(item => `
         <label>
-            <input type="checkbox" value="${item}" checked onchange="applyFilters()"> ${item}
+            <input type="checkbox" value="${item}" ${isChecked(item) ? 'checked' : ''} onchange="applyFilters()"> ${item}
         </label>
     `).join('');
     container.innerHTML = html;
+    return items.filter(isChecked);
 }
 
 window.toggleFilter = (type) => {
@@ -440,16 +445,35 @@ async function createOrOpenDailyRound() {
     } catch (e) { console.error('daily-round:', e); alert('Error al abrir Ronda del Día'); }
 }
 
+// Paginas keyset de GET /api/work-orders (?limit=&cursor=, maximo 500)
+const WO_PAGE_SIZE = 500;
+let woLoadSeq = 0;
+
 async function loadWorkOrders() {
+    // La primera pagina se pinta apenas llega y el resto se va agregando;
+    // la promesa resuelve con la lista completa (los llamadores buscan OTs
+    // en allWorkOrders despues del await). Una recarga nueva corta la vieja.
+    // Los filtros se rearman por pagina conservando la seleccion del usuario.
+    const seq = ++woLoadSeq;
     try {
-        const res = await fetch('/api/work-orders');
-        allWorkOrders = await res.json();
-
-        // Initialize Multi-selects
-        populateMultiSelectFilters();
-
-        // Initially render all
-        applyFilters();
+        const loaded = [];
+        let cursor = null;
+        do {
+            const url = `/api/work-orders?limit=${WO_PAGE_SIZE}` + (cursor ? `&cursor=${cursor}` : '');
+            const res = await fetch(url);
+            if (!res.ok) throw new Error(`HTTP ${res.status}`);
+            const page = await res.json();
+            if (seq !== woLoadSeq) return;
+            loaded.push(...page.items);
+            cursor = page.next_cursor;
+            // Misma lista que se sigue llenando (sin copiarla por pagina);
+            // hasta la primera pagina se sigue viendo la carga anterior
+            allWorkOrders = loaded;
+
+            // Initialize Multi-selects
+            populateMultiSelectFilters();
+            applyFilters();
+        } while (cursor);
     } catch (e) { console.error(e); }
 }
 
@@ -2057,8 +2081,6 @@ async function confirmStartJob() {
 
     document.getElementById('startOTModal').close();
     await loadWorkOrders();
-    const res = await fetch('/api/work-orders');
-    allWorkOrders = await res.json();
     const updatedOT = allWorkOrders.find(o => o.id === activeExecutionOT.id);
     if (updatedOT) {
         activeExecutionOT = updatedOT;
@@ -1,27 +1,13 @@
 // CMMS PWA Service Worker
 // Estrategia: network-first para HTML/API, cache-first para assets estaticos.
-// El nombre del cache cambia con cada deploy para forzar refresh limpio.
-// Bump CACHE_NAME (ej v1 → v2) cuando cambien CSS/JS y necesites invalidar
-// los assets cacheados en clientes ya instalados.
-const CACHE_NAME = 'cmms-v27';
+// Se sirve por /sw.js (routes/core_routes.py), que reemplaza CACHE_NAME y
+// ASSET_PATHS con el manifiesto de utils/static_assets.py: el nombre del
+// cache cambia solo cuando cambia algun asset, y las URLs /assets/<hash>/...
+// son inmutables. No hace falta subir la version a mano.
+const CACHE_NAME = 'cmms-__ASSET_DIGEST__';
 
 // Assets estaticos que se pre-cachean al install (siempre disponibles offline)
-const ASSET_PATHS = [
-  '/static/css/style.css',
-  '/static/css/sidebar.css',
-  '/static/css/themes.css',
-  '/static/js/sidebar.js',
-  '/static/js/app.js',
-  '/static/js/lubrication.js',
-  '/static/js/inspections.js',
-  '/static/js/notices.js',
-  '/static/js/campo.js',
-  '/static/js/datetime_utils.js',
-  '/static/favicon.svg',
-  '/static/icon-192.png',
-  '/static/icon-512.png',
-  '/static/manifest.webmanifest',
-];
+const ASSET_PATHS = [] /* __ASSET_PATHS__ */;
 
 // Paginas criticas para uso en planta. Se intenta cachear al install para
 // que esten disponibles aunque no haya red al abrir la app.
@@ -92,8 +78,8 @@ self.addEventListener('fetch', (event) => {
     return;
   }
 
-  // Assets estaticos: cache-first
-  if (url.pathname.startsWith('/static/')) {
+  // Assets estaticos: cache-first (los /assets/<hash>/ nunca cambian)
+  if (url.pathname.startsWith('/assets/') || url.pathname.startsWith('/static/')) {
     event.respondWith(
       caches.match(req).then((hit) => hit || fetch(req).then((res) => {
         if (res.ok) {
@@ -1,4 +1,5 @@
 """Shared test fixtures for CMMS tests."""
+import contextlib
 import os
 import sys
 import pytest
@@ -39,6 +40,33 @@ def app():
     yield flask_app
 
 
+@pytest.fixture
+def count_queries(app):
+    """Junta las sentencias SQL ejecutadas dentro del bloque:
+
+        with count_queries() as stmts:
+            client.get('/api/...')
+        assert len(stmts) == 1
+    """
+    from sqlalchemy import event
+    from database import db
+    with app.app_context():
+        engine = db.engine
+
+    @contextlib.contextmanager
+    def _count():
+        statements = []
+
+        def before(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', before)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before)
+    return _count
+
+
 @pytest.fixture
 def client(app):
     return app.test_client()
@@ -61,6 +61,39 @@ def test_viewer_read_only(auth_viewer):
     assert r.status_code == 403
 
 
+def test_permission_change_applies_immediately(app, auth_supervisor):
+    """Cambiar la matriz sube permissions_version: el cache del rol se
+    invalida en el siguiente request, sin esperar el TTL."""
+    assert auth_supervisor.get('/api/notices').status_code == 200
+
+    admin = app.test_client()
+    admin.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    original = admin.get('/api/auth/permissions').json['permissions']['supervisor']['avisos']
+
+    r = admin.put('/api/auth/permissions', data=json.dumps({
+        'supervisor': {'avisos': {**original, 'view': False}}
+    }), content_type='application/json')
+    assert r.status_code == 200
+    assert auth_supervisor.get('/api/notices').status_code == 403
+
+    admin.put('/api/auth/permissions', data=json.dumps({
+        'supervisor': {'avisos': original}
+    }), content_type='application/json')
+    assert auth_supervisor.get('/api/notices').status_code == 200
+
+
+def test_permissions_version_es_token_unico(app):
+    """Dos bumps que parten de la misma version nunca dejan el mismo valor."""
+    from database import db
+    from utils.app_settings import bump_permissions_version
+    with app.app_context():
+        first = bump_permissions_version()
+        db.session.rollback()
+        second = bump_permissions_version()
+        db.session.rollback()
+    assert first != second and len(first) == 32
+
+
 def test_viewer_cannot_manage_users(auth_viewer):
     """Viewer cannot access user management."""
     r = auth_viewer.get('/api/auth/users')
@@ -0,0 +1,86 @@
+"""Pool de workers por chat del poller Telegram (bot/chat_pool.py)."""
+import threading
+import time
+
+from bot.chat_pool import ChatWorkerPool
+
+
+def _wait_until(cond, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_orden_por_chat_y_concurrencia_entre_chats():
+    pool = ChatWorkerPool(workers=3, max_pending=50).start()
+    log, lock = [], threading.Lock()
+    active = {}
+    overlap = {'same_chat': False, 'max_parallel': 0}
+
+    def job(chat, n):
+        def _run():
+            with lock:
+                if active.get(chat):
+                    overlap['same_chat'] = True
+                active[chat] = True
+                overlap['max_parallel'] = max(overlap['max_parallel'], sum(active.values()))
+            time.sleep(0.02)
+            with lock:
+                active[chat] = False
+                log.append((chat, n))
+        return _run
+
+    for n in range(5):
+        for chat in ('A', 'B', 'C'):
+            pool.submit(chat, job(chat, n))
+    assert _wait_until(lambda: len(log) == 15)
+    pool.stop()
+
+    for chat in ('A', 'B', 'C'):
+        assert [n for c, n in log if c == chat] == list(range(5))
+    assert not overlap['same_chat']
+    assert overlap['max_parallel'] > 1
+
+
+def test_backpressure_y_metricas():
+    done = []
+    gate = threading.Event()
+    pool = ChatWorkerPool(
+        workers=1, max_pending=2,
+        on_done=lambda *args: done.append(args),
+    ).start()
+
+    def boom():
+        raise RuntimeError('fallo LLM')
+
+    assert pool.submit(1, gate.wait)
+    assert pool.submit(2, boom)
+    # Cola llena: el poller queda frenado (aqui con timeout corto)
+    assert pool.submit(3, lambda: None, timeout=0.05) is False
+    assert pool.stats()['pending'] == 2
+
+    gate.set()
+    assert _wait_until(lambda: len(done) == 2)
+    pool.stop()
+    by_chat = {d[0]: d for d in done}
+    chat_id, wait_ms, run_ms, depth, status, error = by_chat[2]
+    assert status == 'error' and 'fallo LLM' in error
+    assert depth == 2 and wait_ms >= 0 and run_ms >= 0
+    assert by_chat[1][4] == 'success'
+
+
+def test_track_queue_persiste_en_bot_usage(app, auth_admin):
+    from bot.metrics import track_queue
+    track_queue(app, 777001, wait_ms=1500, run_ms=8200, depth=4)
+    with app.app_context():
+        from models import BotUsage
+        row = BotUsage.query.filter_by(chat_id=777001, service='queue').first()
+        assert (row.queue_wait_ms, row.latency_ms, row.queue_depth) == (1500, 8200, 4)
+
+    r = auth_admin.get('/api/admin/bot-usage?days=1')
+    data = r.get_json()
+    assert data['queue']['messages'] >= 1 and data['queue']['max_depth'] >= 4
+    assert all(s['service'] != 'queue' for s in data['by_service'])
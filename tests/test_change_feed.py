@@ -0,0 +1,124 @@
+"""updated_at + feed de cambios /api/changes (utils/change_feed.py)."""
+import datetime as dt
+import json
+import time
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _sin_margen(monkeypatch):
+    """Sin la marca de agua COMMIT_LAG los cambios se ven al instante."""
+    import utils.change_feed as change_feed
+    monkeypatch.setattr(change_feed, 'COMMIT_LAG', dt.timedelta(0))
+
+
+def _iso(ts):
+    return ts.isoformat()
+
+
+def _changes(client, **params):
+    qs = '&'.join(f'{k}={v}' for k, v in params.items())
+    r = client.get(f'/api/changes?{qs}')
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()
+
+
+def test_feed_ve_alta_edicion_y_borrado(auth_admin):
+    t0 = dt.datetime.utcnow()
+    r = auth_admin.post('/api/work-orders', data=json.dumps({
+        'description': 'OT feed cambios', 'status': 'Abierta',
+    }), content_type='application/json')
+    ot_id = r.get_json()['id']
+
+    feed = _changes(auth_admin, since=_iso(t0), tables='work_orders')
+    assert ot_id in feed['tables']['work_orders']['changed']
+
+    # Una edicion posterior mueve updated_at: aparece con since = until previo
+    time.sleep(0.01)
+    t1 = dt.datetime.utcnow()
+    feed = _changes(auth_admin, since=_iso(t1), tables='work_orders')
+    assert ot_id not in feed['tables']['work_orders']['changed']
+    r = auth_admin.put(f'/api/work-orders/{ot_id}', data=json.dumps({
+        'description': 'OT feed cambios (editada)',
+    }), content_type='application/json')
+    assert r.status_code == 200
+    feed = _changes(auth_admin, since=_iso(t1), tables='work_orders')
+    assert ot_id in feed['tables']['work_orders']['changed']
+
+    r = auth_admin.delete(f'/api/work-orders/{ot_id}')
+    assert r.status_code in (200, 204)
+    feed = _changes(auth_admin, since=_iso(t1), tables='work_orders')
+    assert ot_id in feed['tables']['work_orders']['deleted']
+    assert ot_id not in feed['tables']['work_orders']['changed']
+
+
+def test_feed_pagina_por_updated_at_e_id(app, auth_admin):
+    stamp = dt.datetime(2021, 1, 1, 12, 0)
+    with app.app_context():
+        from database import db
+        from models import Area
+        areas = [Area(name=f'AREA FEED {i}') for i in range(3)]
+        db.session.add_all(areas)
+        db.session.flush()
+        ids = [a.id for a in areas]
+        # Mismo instante para las tres (como deja el backfill del ALTER)
+        Area.query.filter(Area.id.in_(ids)).update({'updated_at': stamp}, synchronize_session=False)
+        db.session.commit()
+
+    seen, params = [], {'since': _iso(stamp), 'tables': 'areas', 'limit': 2}
+    while True:
+        page = _changes(auth_admin, **params)['tables']['areas']
+        seen += page['changed']
+        if not page['next']:
+            break
+        params.update(page['next'])
+    # Primero las tres del mismo instante (en orden de id), luego las posteriores
+    assert seen[:3] == sorted(ids)
+
+    with app.app_context():
+        from database import db
+        from models import Area
+        Area.query.filter(Area.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def test_feed_valida_parametros(auth_admin):
+    assert auth_admin.get('/api/changes').status_code == 400
+    assert auth_admin.get('/api/changes?since=ayer').status_code == 400
+    r = auth_admin.get('/api/changes?since=2024-01-01&tables=users')
+    assert r.status_code == 400 and 'users' in r.get_json()['error']
+
+
+def test_feed_retiene_cambios_recientes_hasta_la_marca_de_agua(auth_admin, monkeypatch):
+    import utils.change_feed as change_feed
+    monkeypatch.setattr(change_feed, 'COMMIT_LAG', dt.timedelta(seconds=60))
+    t0 = dt.datetime.utcnow() - dt.timedelta(minutes=5)
+    r = auth_admin.post('/api/notices', data=json.dumps({'description': 'Aviso marca de agua'}),
+                        content_type='application/json')
+    notice_id = r.get_json()['id']
+
+    # Todavia dentro del margen: no se sirve y `until` queda antes que la fila
+    feed = _changes(auth_admin, since=_iso(t0), tables='maintenance_notices')
+    assert notice_id not in feed['tables']['maintenance_notices']['changed']
+    assert dt.datetime.fromisoformat(feed['until']) <= dt.datetime.utcnow() - dt.timedelta(seconds=59)
+
+    # Pasado el margen (simulado acortandolo) aparece con el since = until anterior
+    monkeypatch.setattr(change_feed, 'COMMIT_LAG', dt.timedelta(0))
+    feed2 = _changes(auth_admin, since=feed['until'], tables='maintenance_notices')
+    assert notice_id in feed2['tables']['maintenance_notices']['changed']
+
+
+def test_feed_respeta_permisos_por_modulo(auth_admin, client):
+    auth_admin.post('/api/auth/users', data=json.dumps({
+        'username': 'testtecnico', 'password': 'tecnico123', 'role': 'tecnico',
+    }), content_type='application/json')
+    client.get('/logout')
+    client.post('/login', data={'username': 'testtecnico', 'password': 'tecnico123'})
+
+    # tecnico no ve almacen ni la configuracion de activos
+    r = client.get('/api/changes?since=2024-01-01&tables=warehouse_items')
+    assert r.status_code == 403
+    feed = _changes(client, since='2024-01-01')
+    assert 'warehouse_items' not in feed['tables'] and 'areas' not in feed['tables']
+    assert 'work_orders' in feed['tables']
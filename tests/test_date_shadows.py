@@ -0,0 +1,50 @@
+"""Sombras DATE de las fechas texto de OT/aviso (utils/date_shadows.py)."""
+import datetime as dt
+
+from sqlalchemy import text
+
+
+def test_orm_write_sincroniza_sombras_en_los_tres_formatos(app):
+    with app.app_context():
+        from database import db
+        from models import WorkOrder
+        ot = WorkOrder(code='OT-SHADOW-1', status='Cerrada',
+                       scheduled_date='2026-03-05',
+                       real_start_date='06/03/2026',
+                       real_end_date='2026-03-07T14:30')
+        db.session.add(ot)
+        db.session.commit()
+        assert ot.scheduled_on == dt.date(2026, 3, 5)
+        assert ot.real_start_on == dt.date(2026, 3, 6)
+        assert ot.real_end_on == dt.date(2026, 3, 7)
+
+        ot.real_end_date = 'no es fecha'
+        db.session.commit()
+        assert ot.real_end_on is None
+
+        # La sombra no viaja en el JSON de la API
+        assert 'real_end_on' not in ot.to_dict()
+        db.session.delete(ot)
+        db.session.commit()
+
+
+def test_backfill_completa_filas_escritas_por_sql_crudo(app):
+    with app.app_context():
+        from database import db
+        from models import MaintenanceNotice
+        from utils.date_shadows import backfill_date_shadows
+        db.session.execute(text(
+            "INSERT INTO maintenance_notices (code, request_date, status, scope) "
+            "VALUES ('AV-SHADOW-1', '12/31/2025', 'Pendiente', 'PLAN')"
+        ))
+        db.session.commit()
+
+        stats = backfill_date_shadows(db)
+        assert stats['maintenance_notices.request_on'] >= 1
+        n = MaintenanceNotice.query.filter_by(code='AV-SHADOW-1').one()
+        assert n.request_on == dt.date(2025, 12, 31)
+
+        # Idempotente: la segunda corrida ya no encuentra nada que completar
+        assert backfill_date_shadows(db)['maintenance_notices.request_on'] == 0
+        db.session.delete(n)
+        db.session.commit()
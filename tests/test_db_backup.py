@@ -0,0 +1,161 @@
+"""Backup / restauracion en streaming (utils/db_backup.py)."""
+import gzip
+import io
+import json
+
+from sqlalchemy import text
+
+from database import db
+from utils.db_backup import FORMAT, restore_dump
+from utils.job_queue import run_pending_jobs
+
+
+def _lines(raw):
+    return [json.loads(line) for line in gzip.decompress(raw).decode('utf-8').splitlines()]
+
+
+def test_dump_ndjson_por_tabla(auth_admin):
+    r = auth_admin.post('/api/notices', data=json.dumps({'description': 'Aviso para backup'}),
+                        content_type='application/json')
+    assert r.status_code == 201
+
+    r = auth_admin.get('/api/admin/backup/db-dump')
+    assert r.status_code == 200
+    assert r.is_streamed
+    assert '.ndjson.gz' in r.headers['Content-Disposition']
+    lines = _lines(r.data)
+    meta = lines[0]['meta']
+    assert meta['format'] == FORMAT
+    # Padres antes que hijos; sin las tablas FTS5 de SQLite
+    assert meta['tables'].index('areas') < meta['tables'].index('lines')
+    assert not any(t.startswith('search_fts') for t in meta['tables'])
+    assert 'summary' in lines[-1] and lines[-1]['summary']['failed_tables'] == []
+
+    start = lines.index(next(x for x in lines if isinstance(x, dict) and x.get('table') == 'maintenance_notices'))
+    columns = lines[start]['columns']
+    rows = []
+    for x in lines[start + 1:]:
+        if isinstance(x, dict):
+            assert x == {'end': 'maintenance_notices', 'rows': len(rows)}
+            break
+        rows.append(dict(zip(columns, x)))
+    assert any(row['description'] == 'Aviso para backup' for row in rows)
+
+
+def test_restore_en_cola_recupera_filas(auth_admin, app, monkeypatch, tmp_path):
+    import utils.media_store as media_store
+    monkeypatch.setattr(media_store, 'MEDIA_DIR', str(tmp_path))
+    r = auth_admin.post('/api/notices', data=json.dumps({'description': 'Aviso a restaurar'}),
+                        content_type='application/json')
+    notice_id = r.json['id']
+    dump = auth_admin.get('/api/admin/backup/db-dump?tables=maintenance_notices,app_settings').data
+    assert [x['table'] for x in _lines(dump) if isinstance(x, dict) and 'table' in x] == \
+        ['app_settings', 'maintenance_notices']
+
+    with app.app_context():
+        db.session.execute(text("DELETE FROM maintenance_notices WHERE id = :i"), {'i': notice_id})
+        db.session.commit()
+
+    r = auth_admin.post('/api/admin/backup/restore', data={'file': (io.BytesIO(b'no gzip'), 'x.gz')},
+                        content_type='multipart/form-data')
+    assert r.status_code == 400
+    r = auth_admin.post('/api/admin/backup/restore', data={'file': (io.BytesIO(dump), 'b.ndjson.gz')},
+                        content_type='multipart/form-data')
+    assert r.status_code == 202
+    job_id = r.json['job_id']
+    assert run_pending_jobs(app) == 1
+
+    st = auth_admin.get(f'/api/jobs/{job_id}').json
+    assert st['status'] == 'OK', st
+    tables = st['result']['tables']
+    assert tables['maintenance_notices']['rows'] >= 1 and 'error' not in tables['maintenance_notices']
+    assert list(tmp_path.rglob('*.gz')) == []  # el archivo subido se borra
+    with app.app_context():
+        row = db.session.execute(text("SELECT description, updated_at FROM maintenance_notices WHERE id = :i"),
+                                 {'i': notice_id}).first()
+        assert row is not None and row[0] == 'Aviso a restaurar' and row[1] is not None
+    # Vuelve a aparecer en la busqueda global (indice reconstruido)
+    r = auth_admin.get('/api/global-search?q=restaurar')
+    assert r.json['results']['avisos']
+
+
+def test_restore_formato_anterior_json(app):
+    legacy = {'meta': {'format': 'json.gz/v1'}, 'data': {
+        'app_settings': [{'key': 'backup_v1_test', 'value': '7'}],
+        'tabla_inexistente': [{'id': 1}],
+    }}
+    raw = gzip.compress(json.dumps(legacy).encode('utf-8'))
+    seen = []
+    with app.app_context():
+        out = restore_dump(db.engine, io.BytesIO(raw), progress=seen.append)
+        assert out['format'] == 'json.gz/v1'
+        assert out['tables']['app_settings'] == {'rows': 1}
+        assert 'skipped' in out['tables']['tabla_inexistente']
+        value = db.session.execute(text("SELECT value FROM app_settings WHERE key = 'backup_v1_test'")).scalar()
+        assert value == '7'
+    assert seen and seen[-1]['tables_done'] == 2
+
+
+def test_restore_con_wipe_revierte_todo_si_falla_un_lote(auth_admin, app):
+    r = auth_admin.post('/api/notices', data=json.dumps({'description': 'Aviso que debe sobrevivir'}),
+                        content_type='application/json')
+    notice_id = r.json['id']
+    dump = _lines(auth_admin.get('/api/admin/backup/db-dump?tables=app_settings,maintenance_notices').data)
+    # Un lote invalido en la segunda tabla (scope es NOT NULL)
+    start = next(i for i, x in enumerate(dump) if isinstance(x, dict) and x.get('table') == 'maintenance_notices')
+    scope = dump[start]['columns'].index('scope')
+    dump[start + 1][scope] = None
+    raw = gzip.compress('\n'.join(json.dumps(x) for x in dump).encode('utf-8'))
+
+    with app.app_context():
+        settings_before = db.session.execute(text("SELECT COUNT(*) FROM app_settings")).scalar()
+        out = restore_dump(db.engine, io.BytesIO(raw), wipe=True)
+        assert out['aborted'].startswith('maintenance_notices') and out['total_rows'] == 0
+        # El vaciado se revirtio: siguen las filas originales de ambas tablas
+        assert db.session.execute(text("SELECT description FROM maintenance_notices WHERE id = :i"),
+                                  {'i': notice_id}).scalar() == 'Aviso que debe sobrevivir'
+        assert db.session.execute(text("SELECT COUNT(*) FROM app_settings")).scalar() == settings_before
+
+
+def test_restore_con_wipe_no_toca_la_cola_de_trabajos(auth_admin, app, monkeypatch, tmp_path,
+                                                      count_queries):
+    import utils.media_store as media_store
+    monkeypatch.setattr(media_store, 'MEDIA_DIR', str(tmp_path))
+    monkeypatch.setenv('ALLOW_DB_RESET', 'true')
+    r = auth_admin.get('/api/admin/backup/db-dump')
+    dump = _lines(r.data)
+    assert not {'background_jobs', 'schema_migrations'} & set(dump[0]['meta']['tables'])
+    assert 'background_jobs' not in auth_admin.get('/api/admin/backup/tables').json['tables']
+
+    # Dump previo a la exclusion: trae un trabajo PENDIENTE que no debe volver a correr
+    dump = [x for x in dump if not (isinstance(x, dict) and 'summary' in x)]
+    dump[0]['meta']['tables'] = ['background_jobs', 'app_settings']
+    keep, current = [dump[0]], None
+    for x in dump[1:]:
+        if isinstance(x, dict) and 'table' in x:
+            current = x['table']
+        if current == 'app_settings':
+            keep.append(x)
+    keep[1:1] = [{'table': 'background_jobs', 'columns': ['id', 'job_key', 'kind', 'status']},
+                 [999999, 'job-del-dump', 'rca_generate', 'PENDIENTE'],
+                 {'end': 'background_jobs', 'rows': 1}]
+    raw = gzip.compress('\n'.join(json.dumps(x) for x in keep).encode('utf-8'))
+
+    r = auth_admin.post('/api/admin/backup/restore?wipe=1',
+                        data={'file': (io.BytesIO(raw), 'b.ndjson.gz')}, content_type='multipart/form-data')
+    assert r.status_code == 202
+    job_id = r.json['job_id']
+    with count_queries() as stmts:
+        assert run_pending_jobs(app) == 1
+    # En PostgreSQL un DELETE de background_jobs en la transaccion del wipe
+    # bloquea la fila del trabajo en curso: no debe emitirse ninguno
+    assert not [s for s in stmts if 'background_jobs' in s
+                and s.lstrip().upper().startswith(('DELETE', 'INSERT'))]
+
+    st = auth_admin.get(f'/api/jobs/{job_id}').json
+    assert st['status'] == 'OK', st
+    assert st['result']['tables']['background_jobs']['rows'] == 0
+    assert run_pending_jobs(app) == 0
+    with app.app_context():
+        assert db.session.execute(text(
+            "SELECT COUNT(*) FROM background_jobs WHERE job_key = 'job-del-dump'")).scalar() == 0
@@ -0,0 +1,180 @@
+"""Embeddings en lote + upsert multi-fila (utils/embeddings.py)."""
+import contextlib
+
+import pytest
+
+from utils import embeddings
+
+
+class _Resp:
+    status_code = 200
+
+    def __init__(self, inputs):
+        # OpenAI puede devolver los items en cualquier orden: se usa 'index'
+        self._data = [{'index': i, 'embedding': [float(len(t))]}
+                      for i, t in reversed(list(enumerate(inputs)))]
+
+    def json(self):
+        return {'data': self._data}
+
+
+def _fake_openai(monkeypatch):
+    calls = []
+
+    def post(service, url, json=None, **kw):
+        calls.append(json['input'])
+        return _Resp(json['input'])
+
+    monkeypatch.setattr(embeddings, 'OPENAI_API_KEY', 'sk-test')
+    monkeypatch.setattr(embeddings.http_client, 'post', post)
+    return calls
+
+
+def test_generate_embeddings_en_lotes_y_alineado(monkeypatch):
+    calls = _fake_openai(monkeypatch)
+    monkeypatch.setattr(embeddings, 'EMBED_BATCH_MAX_ITEMS', 3)
+    texts = ['a', '', 'bb', 'ccc', 'dddd', 'eeeee', '   ']
+    vecs = embeddings.generate_embeddings(texts)
+    assert vecs == [[1.0], None, [2.0], [3.0], [4.0], [5.0], None]
+    assert calls == [['a', 'bb', 'ccc'], ['dddd', 'eeeee']]
+
+    monkeypatch.setattr(embeddings, 'EMBED_BATCH_MAX_CHARS', 5)
+    calls.clear()
+    embeddings.generate_embeddings(['abc', 'de', 'f', 'ghijklmn'])
+    assert calls == [['abc', 'de'], ['f'], ['ghijklmn']]
+
+
+class _FakeSession:
+    """Registra los SQL; el SELECT de hashes devuelve `existing`."""
+
+    def __init__(self, existing, fail_insert=False):
+        self.existing = existing
+        self.inserts = []
+        self.fail_insert = fail_insert
+        self.savepoints = []   # 'ok' / 'rollback' por SAVEPOINT cerrado
+        self.depth = 0
+
+    @contextlib.contextmanager
+    def begin_nested(self):
+        self.depth += 1
+        try:
+            yield
+        except Exception:
+            self.savepoints.append('rollback')
+            raise
+        else:
+            self.savepoints.append('ok')
+        finally:
+            self.depth -= 1
+
+    def execute(self, stmt, params):
+        sql = str(stmt)
+        if sql.lstrip().startswith('SELECT'):
+            rows = [(eid, h) for (et, eid), h in self.existing.items()
+                    if et == params['et'] and eid in params['ids']]
+            return type('R', (), {'fetchall': lambda self: rows})()
+        assert self.depth, 'escritura fuera de SAVEPOINT'
+        if self.fail_insert:
+            raise RuntimeError('dimension del vector distinta')
+        self.inserts.append((sql, params))
+
+
+def test_upsert_embeddings_saltea_sin_cambios_y_un_insert(monkeypatch):
+    calls = _fake_openai(monkeypatch)
+    session = _FakeSession({('work_order', 1): embeddings.content_hash('OT 1')})
+    items = [
+        ('work_order', 1, 'OT 1', {}),           # igual que lo indexado
+        ('work_order', 2, 'OT 2', {'code': 'X'}),
+        ('notice', 5, 'AVISO 5 viejo', None),
+        ('notice', 5, 'AVISO 5', None),          # duplicado: gana el ultimo
+    ]
+    stats = embeddings.upsert_embeddings(session, items)
+    assert stats == {'total': 3, 'skipped': 1, 'embedded': 2, 'failed': 0}
+    assert calls == [['OT 2', 'AVISO 5']]
+    assert len(session.inserts) == 1
+    sql, params = session.inserts[0]
+    assert 'ON CONFLICT' in sql and params['txt1'] == 'AVISO 5'
+    assert params['h0'] == embeddings.content_hash('OT 2')
+
+    calls.clear()
+    stats = embeddings.upsert_embeddings(session, items[:1], force=True)
+    assert stats['embedded'] == 1 and calls == [['OT 1']]
+
+
+def test_upsert_embeddings_falla_en_savepoint(monkeypatch):
+    _fake_openai(monkeypatch)
+    session = _FakeSession({}, fail_insert=True)
+    stats = embeddings.upsert_embeddings(session, [('work_order', 1, 'OT 1', {}),
+                                                   ('work_order', 2, 'OT 2', {})])
+    # El error se cuenta y solo se revierte el SAVEPOINT, no la transaccion
+    assert stats == {'total': 2, 'skipped': 0, 'embedded': 0, 'failed': 2}
+    assert session.savepoints == ['ok', 'rollback']
+
+
+def test_checkpoint_de_progreso(tmp_path):
+    path = str(tmp_path / 'progress.json')
+    assert embeddings.load_progress(path) == {}
+    embeddings.save_progress(path, {'work_order': 120})
+    assert embeddings.load_progress(path) == {'work_order': 120}
+
+
+def _fake_openai_vectors(monkeypatch):
+    """Vectores por palabra clave: la similitud coseno tiene sentido."""
+    calls = []
+
+    def post(service, url, json=None, **kw):
+        calls.append(json['input'])
+        data = [{'index': i, 'embedding': [t.count('rodamiento'), t.count('bomba'), 0.1]}
+                for i, t in enumerate(json['input'])]
+        return type('R', (), {'status_code': 200, 'json': lambda self: {'data': data}})()
+
+    monkeypatch.setattr(embeddings, 'OPENAI_API_KEY', 'sk-test')
+    monkeypatch.setattr(embeddings.http_client, 'post', post)
+    return calls
+
+
+def test_cache_de_embeddings_persistente(app, monkeypatch):
+    from database import db
+    from models import EmbeddingCache
+    calls = _fake_openai_vectors(monkeypatch)
+    with app.app_context():
+        first = embeddings.generate_embeddings(['bomba sin caudal', 'bomba sin caudal', 'rodamiento'])
+        assert calls == [['bomba sin caudal', 'rodamiento']]  # repetidos: una vez
+        assert first[0] == first[1]
+        assert db.session.get(EmbeddingCache, embeddings.content_hash('bomba sin caudal')) is not None
+
+        # Otro proceso (memoria vacia): sale de embedding_cache, sin OpenAI
+        embeddings._memory_cache.clear()
+        calls.clear()
+        assert embeddings.generate_embedding('bomba sin caudal') == pytest.approx(first[0])
+        assert calls == []
+        embeddings.generate_embeddings(['bomba sin caudal'], use_cache=False)
+        assert calls == [['bomba sin caudal']]
+
+
+def test_busqueda_semantica_sin_pgvector(app, monkeypatch):
+    from database import db
+    _fake_openai_vectors(monkeypatch)
+    with app.app_context():
+        assert embeddings.vector_backend(db.session) == 'numpy'
+        stats = embeddings.upsert_embeddings(db.session, [
+            ('work_order', 1, 'OT cambio de rodamiento', {'code': 'OT-1'}),
+            ('work_order', 2, 'OT bomba con fuga', {'code': 'OT-2'}),
+            ('notice', 3, 'Aviso rodamiento de bomba', None),
+        ])
+        db.session.commit()
+        assert stats['embedded'] == 3
+
+        hits = embeddings.semantic_search(db.session, 'ruido en rodamiento', top_k=2)
+        assert [(h['entity_type'], h['entity_id']) for h in hits] == [('work_order', 1), ('notice', 3)]
+        assert hits[0]['metadata'] == {'code': 'OT-1'} and hits[0]['similarity'] > 0.99
+
+        hits = embeddings.semantic_search(db.session, 'rodamiento', entity_types=['work_order'])
+        assert [h['entity_id'] for h in hits] == [1, 2]
+
+        # La matriz se recarga cuando la tabla cambia
+        embeddings.upsert_embeddings(db.session, [('work_order', 2, 'OT rodamiento bomba', None)])
+        embeddings.delete_embedding(db.session, 'notice', 3)
+        db.session.commit()
+        hits = embeddings.semantic_search(db.session, 'rodamiento', top_k=5)
+        assert [(h['entity_type'], h['entity_id']) for h in hits] == [('work_order', 1), ('work_order', 2)]
@@ -0,0 +1,65 @@
+"""Exportaciones Excel en streaming (utils/excel_stream.py)."""
+import json
+from io import BytesIO
+
+from openpyxl import load_workbook
+
+from utils.excel_stream import new_workbook, spool_workbook, write_sheet
+
+
+def test_write_sheet_consume_en_streaming():
+    consumed = []
+
+    def rows():
+        for i in range(1000):
+            consumed.append(i)
+            yield {'ID': i, 'Nombre': f'item {i}', 'Extra': {'k': i}}
+
+    wb = new_workbook()
+    gen = rows()
+    assert consumed == []  # nada se lee antes de escribir la hoja
+    assert write_sheet(wb, 'Datos', gen, auto_width=True, freeze='A2') == 1000
+    assert write_sheet(wb, 'Vacia', iter(()), empty_row={'Info': 'Sin registros'}) == 0
+
+    tmp = spool_workbook(wb)
+    out = load_workbook(tmp)
+    tmp.close()
+    ws = out['Datos']
+    assert [c.value for c in ws[1]] == ['ID', 'Nombre', 'Extra']
+    assert ws.max_row == 1001
+    assert ws.cell(row=3, column=3).value == "{'k': 1}"
+    assert ws.freeze_panes == 'A2'
+    assert [[c.value for c in r] for r in out['Vacia'].iter_rows()] == [['Info'], ['Sin registros']]
+
+
+def test_export_ots_y_powerbi_por_bloques(auth_admin):
+    r = auth_admin.post('/api/work-orders', data=json.dumps({
+        'description': 'OT export streaming', 'maintenance_type': 'Correctivo', 'status': 'Abierta',
+    }), content_type='application/json')
+    assert r.status_code == 201
+
+    r = auth_admin.get('/api/export-ots')
+    assert r.status_code == 200
+    assert 'spreadsheet' in r.content_type
+    assert r.headers.get('Content-Length') is None  # enviado por bloques
+    assert 'Reporte_OTs_Completo.xlsx' in r.headers['Content-Disposition']
+    ws = load_workbook(BytesIO(r.data))['OrdenesTrabajo']
+    headers = [c.value for c in ws[1]]
+    assert headers[:3] == ['Código', 'Aviso Relacionado', 'Disciplina']
+    descs = [row[headers.index('Descripción OT')] for row in ws.iter_rows(min_row=2, values_only=True)]
+    assert 'OT export streaming' in descs
+
+    r = auth_admin.get('/api/reports/powerbi-export')
+    assert r.status_code == 200
+    wb = load_workbook(BytesIO(r.data))
+    assert 'OTs' in wb.sheetnames and wb.sheetnames[-1] == '_meta'
+    meta = list(wb['_meta'].iter_rows(values_only=True))
+    assert meta[0][:3] == ('generated_at', 'total_sheets', 'failed_sheets')
+    assert meta[1][2] == 0
+
+
+def test_export_kardex_con_encabezado_sin_movimientos(auth_admin):
+    r = auth_admin.get('/api/warehouse/export-kardex')
+    assert r.status_code == 200
+    ws = load_workbook(BytesIO(r.data))['Kardex']
+    assert [c.value for c in ws[1]] == ['Fecha', 'Tipo', 'Item', 'Cantidad', 'Razón', 'Referencia']
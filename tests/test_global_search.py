@@ -0,0 +1,107 @@
+"""Busqueda global indexada (utils/search_index.py)."""
+from sqlalchemy import text
+
+from database import db
+
+
+def _seed(app):
+    from models import Activity, MaintenanceNotice, WorkOrder
+    with app.app_context():
+        if MaintenanceNotice.query.filter_by(code='AV-7701').first():
+            return
+        db.session.add_all([
+            MaintenanceNotice(code='AV-7701', description='Vibración en rodamiento del ventilador',
+                              status='Pendiente'),
+            WorkOrder(code='OT-7702', description='Cambio de rodamiento ventilador tiro inducido',
+                      maintenance_type='Correctivo', status='Abierta'),
+            Activity(title='Inspección termográfica tableros', activity_type='Tarea',
+                     responsible='Electricistas', status='Pendiente'),
+        ])
+        db.session.commit()
+
+
+def test_busqueda_por_prefijo_sin_tildes_y_agrupada(auth_admin, app):
+    _seed(app)
+    r = auth_admin.get('/api/global-search?q=rodam')
+    assert r.status_code == 200
+    data = r.json
+    assert set(data['results']) == {'avisos', 'ots', 'equipos', 'actividades', 'compras', 'lubricacion'}
+    assert [x['label'] for x in data['results']['avisos']] == ['AV-7701']
+    assert [x['label'] for x in data['results']['ots']] == ['OT-7702']
+    assert data['results']['ots'][0]['href'].startswith('/ordenes#')
+    assert data['total'] == 2
+
+    # Sin tildes en la consulta, con tildes en el dato (y al reves)
+    r = auth_admin.get('/api/global-search?q=inspeccion termo')
+    assert [x['label'] for x in r.json['results']['actividades']] == ['Inspección termográfica tableros']
+    r = auth_admin.get('/api/global-search?q=vibración')
+    assert [x['label'] for x in r.json['results']['avisos']] == ['AV-7701']
+    # Fragmento de codigo
+    r = auth_admin.get('/api/global-search?q=7702')
+    assert [x['label'] for x in r.json['results']['ots']] == ['OT-7702']
+
+    assert auth_admin.get('/api/global-search?q=x').status_code == 400
+
+
+def test_indice_sigue_ediciones_orm_y_sql_crudo(auth_admin, app):
+    from models import MaintenanceNotice
+    from utils.search_index import search_documents, sync_search_index
+    with app.app_context():
+        n = MaintenanceNotice(code='AV-7801', description='Fuga de aceite reductor', status='Pendiente')
+        db.session.add(n)
+        db.session.commit()
+        assert [x['label'] for x in search_documents(db, 'reductor')['avisos']] == ['AV-7801']
+
+        n.description = 'Fuga de grasa en chumacera'
+        db.session.commit()
+        assert search_documents(db, 'reductor')['avisos'] == []
+        assert [x['label'] for x in search_documents(db, 'chumacera')['avisos']] == ['AV-7801']
+
+        # Escritura por SQL crudo (bot): la recoge el sync por updated_at
+        db.session.execute(text(
+            "INSERT INTO maintenance_notices (code, description, status, scope, updated_at) "
+            "VALUES ('AV-7802', 'Sensor de nivel descalibrado', 'Pendiente', 'PLAN', CURRENT_TIMESTAMP)"))
+        db.session.commit()
+        sync_search_index(db, force=True)
+        assert [x['label'] for x in search_documents(db, 'descalibrado')['avisos']] == ['AV-7802']
+
+        db.session.delete(n)
+        db.session.commit()
+        assert search_documents(db, 'chumacera')['avisos'] == []
+
+
+def test_busqueda_es_una_sola_consulta(auth_admin, app, count_queries):
+    from utils.search_index import search_documents
+    _seed(app)
+    with app.app_context():
+        search_documents(db, 'warmup')
+        with count_queries() as statements:
+            results = search_documents(db, 'ventilador')
+        assert results['avisos'] and results['ots']
+        assert len(statements) == 1
+
+
+def test_watermark_es_upsert_y_no_retrocede(app, count_queries):
+    from datetime import datetime, timedelta
+    from utils.search_index import _WATERMARK_KEY, _read_watermark, _write_watermark
+    ahead = datetime.utcnow() + timedelta(hours=1)
+    with app.app_context():
+        before = db.session.execute(text("SELECT value FROM app_settings WHERE key = :k"),
+                                    {'k': _WATERMARK_KEY}).scalar()
+        try:
+            with count_queries() as stmts:
+                with db.engine.begin() as conn:
+                    _write_watermark(conn, ahead)
+                # Otro worker que arranco antes termina despues: no pisa el nuevo
+                with db.engine.begin() as conn:
+                    _write_watermark(conn, ahead - timedelta(seconds=30))
+            # Una sola sentencia por escritura (sin DELETE + INSERT que choque con la PK)
+            assert len(stmts) == 2 and not any(s.lstrip().upper().startswith('DELETE') for s in stmts)
+            with db.engine.connect() as conn:
+                assert _read_watermark(conn) == ahead
+            assert db.session.execute(text("SELECT COUNT(*) FROM app_settings WHERE key = :k"),
+                                      {'k': _WATERMARK_KEY}).scalar() == 1
+        finally:
+            db.session.execute(text("UPDATE app_settings SET value = :v WHERE key = :k"),
+                               {'v': before, 'k': _WATERMARK_KEY})
+            db.session.commit()
@@ -0,0 +1,68 @@
+"""Importacion masiva de jerarquia (utils/hierarchy_import.py)."""
+import json
+
+
+def _paste(client, raw, url='/api/bulk-paste-hierarchy', **extra):
+    r = client.post(url, data=json.dumps(dict(raw_data=raw, **extra)),
+                    content_type='application/json')
+    return r.status_code, r.get_json()
+
+
+def test_bulk_paste_hierarchy_en_lote_y_validate_only(app, auth_admin, count_queries):
+    rows = []
+    for e in range(4):
+        for s in range(3):
+            for c in range(5):
+                rows.append(f"AREA IMP\tLINEA IMP\tEQUIPO {e}\tSISTEMA {s}\tCOMP {c}")
+    raw = "\n".join(rows + ["AREA IMP\tLINEA IMP\tSOLO TRES"])
+
+    # Validacion: mismas cuentas, nada escrito
+    status, body = _paste(auth_admin, raw, validate_only=True)
+    assert status == 200 and body['validate_only'] is True
+    assert body['stats']['created_components'] == 60
+    assert body['errors'] == [{'row': 61, 'error': 'faltan valores: area, line, equipment, system, component'}]
+    with app.app_context():
+        from models import Area
+        assert Area.query.filter_by(name='AREA IMP').first() is None
+
+    with count_queries() as statements:
+        status, body = _paste(auth_admin, raw)
+    assert status == 201
+    st = body['stats']
+    assert (st['created_areas'], st['created_lines'], st['created_equipments'],
+            st['created_systems'], st['created_components']) == (1, 1, 4, 12, 60)
+    assert st['rows_processed'] == 60 and st['rows_received'] == 61
+    inserts = [s for s in statements if s.lstrip().upper().startswith('INSERT INTO')
+               and any(t in s for t in ('areas', 'lines', 'equipments', 'systems', 'components'))]
+    # Un INSERT multi-fila por nivel, no uno por fila
+    assert len(inserts) == 5
+
+    # Reimportar: todo existe; el tag vacio se completa, la descripcion tambien
+    with app.app_context():
+        from database import db
+        from models import Equipment
+        eq = Equipment.query.filter_by(name='EQUIPO 0').first()
+        eq.tag = '-'
+        db.session.commit()
+    status, body = _paste(auth_admin, "AREA IMP\tLINEA IMP\tEQUIPO 0\tEQ-0\tSISTEMA 0\tCOMP 0\t\n"
+                                      "AREA IMP\tLINEA IMP\tEQUIPO 1\tSISTEMA 0\tCOMP 0")
+    st = body['stats']
+    assert st['created_components'] == 0 and st['updated_equipments'] == 1
+    assert st['skipped_existing'] == 2
+    with app.app_context():
+        from models import Equipment
+        assert Equipment.query.filter_by(name='EQUIPO 0').first().tag == 'EQ-0'
+
+
+def test_bulk_paste_por_entidad_no_crea_padres(app, auth_admin):
+    status, body = _paste(auth_admin, "AreaName\tName\nAREA NO EXISTE\tLINEA X\n",
+                          url='/api/bulk-paste', entity_type='Lines')
+    assert status == 201
+    assert body['stats']['created_lines'] == 0
+    assert body['errors'][0]['error'] == "no existe area 'AREA NO EXISTE'"
+
+    _paste(auth_admin, "Name\tDescription\nAREA PEGADA\tdesc\n", url='/api/bulk-paste',
+           entity_type='Areas')
+    status, body = _paste(auth_admin, "AreaName\tName\nAREA PEGADA\tLINEA X\nAREA PEGADA\tLINEA X\n",
+                          url='/api/bulk-paste', entity_type='Lines')
+    assert body['stats']['created_lines'] == 1 and body['stats']['skipped_existing'] == 1
@@ -0,0 +1,78 @@
+"""Snapshot de jerarquia por proceso (utils/hierarchy.py)."""
+import json
+
+
+def _post(client, url, payload):
+    r = client.post(url, data=json.dumps(payload), content_type='application/json')
+    assert r.status_code in (200, 201), r.get_json()
+    return r.get_json()['id']
+
+
+def _snapshot(app):
+    with app.test_request_context():
+        from utils.hierarchy import get_hierarchy
+        return get_hierarchy()
+
+
+def test_snapshot_resuelve_jerarquia_y_se_reutiliza(app, auth_admin):
+    area_id = _post(auth_admin, '/api/areas', {'name': 'AREA SNAP'})
+    line_id = _post(auth_admin, '/api/lines', {'name': 'LINEA SNAP', 'area_id': area_id})
+    eq_id = _post(auth_admin, '/api/equipments', {'name': 'BOMBA SNAP', 'tag': 'SNAP-01',
+                                                  'line_id': line_id})
+
+    h = _snapshot(app)
+    assert h.equipments[eq_id].tag == 'SNAP-01'
+    assert h.area_id_of_equipment(eq_id) == area_id
+    assert h.resolve_area_id(equipment_id=eq_id) == area_id
+    assert h.resolve_area_id(line_id=line_id) == area_id
+    assert eq_id in h.equipment_ids_in(area_id=area_id)
+    assert h.lines_by_area[area_id] == (line_id,)
+    assert eq_id in h.kpi_equipment_ids
+    # Sin cambios en la jerarquia: mismo snapshot, sin releer tablas
+    assert _snapshot(app) is h
+
+
+def test_escrituras_de_datos_maestros_invalidan(app, auth_admin):
+    area_id = _post(auth_admin, '/api/areas', {'name': 'AREA VIEJA'})
+    h1 = _snapshot(app)
+    assert h1.areas[area_id].name == 'AREA VIEJA'
+
+    r = auth_admin.put(f'/api/areas/{area_id}', data=json.dumps({'name': 'AREA NUEVA'}),
+                       content_type='application/json')
+    assert r.status_code == 200
+    h2 = _snapshot(app)
+    assert h2.version != h1.version
+    assert h2.areas[area_id].name == 'AREA NUEVA'
+
+    # Un cambio fuera de la jerarquia no invalida
+    _post(auth_admin, '/api/technicians', {'name': 'Tecnico snapshot'})
+    assert _snapshot(app) is h2
+
+    assert auth_admin.delete(f'/api/areas/{area_id}').status_code in (200, 204)
+    assert area_id not in _snapshot(app).areas
+
+
+def test_columnas_de_registro_no_invalidan(app, auth_admin):
+    import datetime as dt
+    from database import db
+    from models import Equipment
+    area_id = _post(auth_admin, '/api/areas', {'name': 'AREA REG'})
+    line_id = _post(auth_admin, '/api/lines', {'name': 'LINEA REG', 'area_id': area_id})
+    eq_id = _post(auth_admin, '/api/equipments', {'name': 'BOMBA REG', 'tag': 'REG-01',
+                                                  'line_id': line_id})
+    h = _snapshot(app)
+    assert not hasattr(h.equipments[eq_id], 'updated_at')
+
+    with app.app_context():
+        eq = db.session.get(Equipment, eq_id)
+        eq.updated_at = dt.datetime.utcnow()
+        eq.out_of_service_reason = 'revision'
+        eq.name = eq.name   # asignar el mismo valor no es un cambio
+        db.session.commit()
+    assert _snapshot(app) is h
+
+    with app.app_context():
+        db.session.get(Equipment, eq_id).in_service = False
+        db.session.commit()
+    h2 = _snapshot(app)
+    assert h2 is not h and h2.equipments[eq_id].in_service is False
@@ -0,0 +1,112 @@
+"""Cliente HTTP saliente compartido (utils/http_client.py)."""
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils import http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive
+    statuses = []
+    ports = set()
+    bodies = []
+
+    def do_POST(self):
+        type(self).bodies.append(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        type(self).ports.add(self.client_address[1])
+        status = type(self).statuses.pop(0) if type(self).statuses else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        if status in (429, 503):
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setitem(http_client.SERVICES, 'test', {
+        'timeout': (2, 5), 'retries': 2, 'backoff': 0.01, 'pool': 2,
+    })
+    http_client.reset_stats()
+    _Handler.statuses, _Handler.ports, _Handler.bodies = [], set(), []
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{srv.server_address[1]}/'
+    srv.shutdown()
+    http_client._sessions.pop('test', None)
+
+
+def test_reutiliza_conexion_y_registra_latencias(server):
+    for _ in range(5):
+        assert http_client.post('test', server, json={'n': 1}).json() == {'ok': True}
+    # Una sola conexion TCP para las 5 llamadas (pool keep-alive)
+    assert len(_Handler.ports) == 1
+    stats = http_client.http_stats()['test']
+    assert stats['calls'] == 5 and stats['errors'] == 0 and stats['retries'] == 0
+    assert sum(stats['histogram'].values()) == 5
+
+
+def test_reintenta_429_y_5xx_con_tope(server):
+    _Handler.statuses = [429, 503]
+    assert http_client.get('test', server).status_code == 200
+
+    _Handler.statuses = [502, 502, 502, 502]
+    assert http_client.get('test', server).status_code == 502
+    assert _Handler.statuses == [502]   # 1 intento + 2 reintentos
+
+    stats = http_client.http_stats()['test']
+    assert stats['calls'] == 2 and stats['retries'] == 4 and stats['errors'] == 1
+
+
+def test_post_solo_reintenta_si_no_se_proceso(server):
+    # 502: el servidor pudo haber ejecutado el POST, no se repite
+    _Handler.statuses = [502, 200]
+    assert http_client.post('test', server, json={}).status_code == 502
+    assert _Handler.statuses == [200]
+
+    # 429 y 503 con Retry-After: rechazado sin procesar
+    _Handler.statuses = [429, 503]
+    assert http_client.post('test', server, json={}).status_code == 200
+
+    # Opt-in explicito para POSTs que es seguro repetir
+    _Handler.statuses = [502]
+    assert http_client.post('test', server, json={}, idempotent=True).status_code == 200
+
+    # Conexion rechazada: el pedido nunca salio, se reintenta
+    import socket
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        closed = f'http://127.0.0.1:{s.getsockname()[1]}/'
+    http_client.reset_stats()
+    with pytest.raises(http_client.requests.ConnectionError):
+        http_client.post('test', closed, json={})
+    assert http_client.http_stats()['test']['retries'] == 2
+
+
+def test_reintento_rebobina_cuerpo_de_archivo(server):
+    _Handler.statuses = [429]
+    body = io.BytesIO(b'encabezado|' + b'x' * 100000)
+    body.read(11)
+    assert http_client.post('test', server, data=body).status_code == 200
+    # Ambos intentos mandan el archivo completo desde la posicion inicial
+    assert [len(b) for b in _Handler.bodies] == [100000, 100000]
+
+
+def test_http_stats_endpoint(auth_admin):
+    r = auth_admin.get('/api/admin/http-stats')
+    assert r.status_code == 200 and 'services' in r.get_json()
+
+
+def test_http_stats_solo_admin(auth_viewer):
+    assert auth_viewer.get('/api/admin/http-stats').status_code == 403
@@ -0,0 +1,133 @@
+"""Cola de trabajos persistente (utils/job_queue.py)."""
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from utils.job_queue import (
+    STATUS_ERROR, STATUS_OK, STATUS_PENDING, STATUS_RUNNING, claim_next, job_handler,
+    run_pending_jobs, submit_job,
+)
+
+_calls = []
+
+
+@job_handler('test_suma', max_attempts=3)
+def _suma(app, payload):
+    _calls.append(payload)
+    return {'total': payload['a'] + payload['b']}
+
+
+@job_handler('test_falla', max_attempts=2)
+def _falla(app, payload):
+    raise RuntimeError('proveedor caido')
+
+
+def _row(job_key):
+    from models import BackgroundJob
+    job = BackgroundJob.query.filter_by(job_key=job_key).one()
+    return job.status, job.attempts, job.run_after, job.error
+
+
+def test_submit_ejecuta_y_consulta_estado(app, auth_admin):
+    with app.app_context():
+        key = submit_job('test_suma', {'a': 2, 'b': 3})
+    r = auth_admin.get(f'/api/jobs/{key}')
+    assert r.status_code == 200 and r.get_json()['status'] == STATUS_PENDING
+
+    assert run_pending_jobs(app) == 1
+    body = auth_admin.get(f'/api/jobs/{key}').get_json()
+    assert body['status'] == STATUS_OK and body['result'] == {'total': 5}
+    assert body['attempts'] == 1 and body['finished_at']
+    assert run_pending_jobs(app) == 0
+    assert auth_admin.get('/api/jobs/noexiste').status_code == 404
+
+
+def test_reintentos_con_backoff_hasta_error(app):
+    with app.app_context():
+        key = submit_job('test_falla')
+    run_pending_jobs(app)
+    with app.app_context():
+        status, attempts, run_after, error = _row(key)
+        assert (status, attempts, error) == (STATUS_PENDING, 1, 'proveedor caido')
+        assert run_after > datetime.utcnow() + timedelta(seconds=20)
+    assert run_pending_jobs(app) == 0  # el backoff todavia no vence
+
+    with app.app_context():
+        from database import db
+        db.session.execute(text("UPDATE background_jobs SET run_after = :t WHERE job_key = :k"),
+                           {'t': datetime.utcnow() - timedelta(seconds=1), 'k': key})
+        db.session.commit()
+    assert run_pending_jobs(app) == 1
+    with app.app_context():
+        assert _row(key)[:2] == (STATUS_ERROR, 2)
+
+
+def test_lease_vencido_se_retoma(app):
+    from database import db
+    with app.app_context():
+        key = submit_job('test_suma', {'a': 1, 'b': 1})
+        claimed = claim_next(db, worker='worker-caido', kinds=['test_suma'])
+        assert claimed is not None and _row(key)[0] == STATUS_RUNNING
+        # Mientras el lease esta vigente nadie mas lo toma
+        assert claim_next(db, worker='otro', kinds=['test_suma']) is None
+        db.session.execute(text("UPDATE background_jobs SET locked_until = :t WHERE job_key = :k"),
+                           {'t': datetime.utcnow() - timedelta(seconds=1), 'k': key})
+        db.session.commit()
+    assert run_pending_jobs(app) == 1
+    with app.app_context():
+        assert _row(key)[:2] == (STATUS_OK, 2)
+
+
+def test_narrativa_se_consulta_desde_la_tabla(app, auth_admin, monkeypatch):
+    import bot.llm
+    from utils import http_client
+
+    class _Resp:
+        status_code = 200
+        text = ''
+
+        def json(self):
+            return {'choices': [{'message': {'content': 'RESUMEN EJECUTIVO\nTodo en orden'}}]}
+
+    monkeypatch.setattr(bot.llm, '_get_deepseek_config', lambda: ('k', 'http://llm.local'))
+    monkeypatch.setattr(http_client, 'post', lambda *a, **kw: _Resp())
+
+    r = auth_admin.post('/api/diagnostico/narrativa', data=json.dumps({'meta': {'label': 'Mes'}}),
+                        content_type='application/json')
+    assert r.status_code == 200
+    job_id = r.get_json()['job_id']
+    st = auth_admin.get(f'/api/diagnostico/narrativa/{job_id}').get_json()
+    assert st == {'status': STATUS_PENDING}
+
+    run_pending_jobs(app)
+    st = auth_admin.get(f'/api/diagnostico/narrativa/{job_id}').get_json()
+    assert st['status'] == STATUS_OK and st['narrativa'].startswith('RESUMEN EJECUTIVO')
+    assert auth_admin.get('/api/diagnostico/narrativa/otro').status_code == 404
+
+
+def test_rca_sin_contexto_y_narrativa_fallida_no_se_reintentan(app, auth_admin, monkeypatch):
+    import bot.llm
+    import bot.rca  # noqa: F401  registra rca_generate
+    from utils import http_client
+
+    class _Resp:
+        status_code = 500
+        text = 'caido'
+
+    monkeypatch.setattr(bot.llm, '_get_deepseek_config', lambda: ('k', 'http://llm.local'))
+    monkeypatch.setattr(http_client, 'post', lambda *a, **kw: _Resp())
+    with app.app_context():
+        rca_key = submit_job('rca_generate', {'notice_id': 987654, 'push': False})
+    r = auth_admin.post('/api/diagnostico/narrativa', data=json.dumps({'meta': {'label': 'Mes'}}),
+                        content_type='application/json')
+    nar_key = r.get_json()['job_id']
+
+    assert run_pending_jobs(app) == 2
+    with app.app_context():
+        from models import BackgroundJob
+        rca = BackgroundJob.query.filter_by(job_key=rca_key).one()
+        assert (rca.status, rca.attempts) == (STATUS_OK, 1)
+        assert json.loads(rca.result)['status'] == 'sin_contexto'
+        # Un solo intento: los reintentos HTTP ya los hace http_client
+        assert _row(nar_key)[:2] == (STATUS_ERROR, 1)
@@ -0,0 +1,183 @@
+"""Tabla de hechos kpi_daily_equipment (utils/kpi_facts.py)."""
+import datetime as dt
+import json
+
+import pytest
+
+
+@pytest.fixture
+def fact_env(app):
+    with app.app_context():
+        from database import db
+        from models import Area, Line, Equipment, KpiDailyEquipment
+        area = Area(name='AREA FACTS TEST')
+        db.session.add(area); db.session.flush()
+        line = Line(name='LINEA FACTS TEST', area_id=area.id)
+        db.session.add(line); db.session.flush()
+        eq = Equipment(name='EQUIPO FACTS TEST', tag='EQ-FACTS', line_id=line.id)
+        db.session.add(eq); db.session.flush()
+        # SQLite reutiliza ids: otros tests borran OTs con Query.delete()
+        # (sin eventos ORM) y pueden dejar celdas huerfanas con este id.
+        KpiDailyEquipment.query.filter_by(equipment_id=eq.id).delete()
+        db.session.commit()
+        env = {'area_id': area.id, 'line_id': line.id, 'equipment_id': eq.id}
+
+    yield env
+
+    with app.app_context():
+        from database import db
+        from models import Area, Line, Equipment, KpiDailyEquipment, WorkOrder
+        for ot in WorkOrder.query.filter_by(equipment_id=env['equipment_id']).all():
+            db.session.delete(ot)
+        KpiDailyEquipment.query.filter_by(equipment_id=env['equipment_id']).delete()
+        Equipment.query.filter_by(id=env['equipment_id']).delete()
+        Line.query.filter_by(id=env['line_id']).delete()
+        Area.query.filter_by(id=env['area_id']).delete()
+        db.session.commit()
+
+
+def _cells(equipment_id):
+    from models import KpiDailyEquipment
+    return {r.day: r for r in KpiDailyEquipment.query.filter_by(equipment_id=equipment_id)}
+
+
+def test_hechos_siguen_cierre_edicion_y_borrado_de_ot(app, auth_admin, fact_env):
+    day = dt.date.today() - dt.timedelta(days=5)
+    with app.app_context():
+        from database import db
+        from models import WorkOrder
+        ot = WorkOrder(code='OT-FACTS-1', status='Abierta', maintenance_type='Correctivo',
+                       equipment_id=fact_env['equipment_id'],
+                       scheduled_date=day.isoformat())
+        db.session.add(ot)
+        db.session.commit()
+        ot_id = ot.id
+        # Abierta: todavia no aporta
+        assert _cells(fact_env['equipment_id']) == {}
+
+    # Cierre por el PUT generico
+    r = auth_admin.put(f'/api/work-orders/{ot_id}', data=json.dumps({
+        'status': 'Cerrada', 'real_duration': 3.5, 'downtime_hours': 4,
+    }), content_type='application/json')
+    assert r.status_code == 200
+    with app.app_context():
+        cell = _cells(fact_env['equipment_id'])[day]
+        assert (cell.corrective, cell.failures_inherent, cell.preventive) == (1, 1, 0)
+        assert cell.repair_h == 3.5 and cell.downtime_h == 4
+
+    # Mover la fecha de programacion mueve la celda (la vieja desaparece)
+    new_day = day - dt.timedelta(days=2)
+    r = auth_admin.put(f'/api/work-orders/{ot_id}', data=json.dumps({
+        'scheduled_date': new_day.isoformat(), 'downtime_planned': True,
+    }), content_type='application/json')
+    assert r.status_code == 200
+    with app.app_context():
+        cells = _cells(fact_env['equipment_id'])
+        assert set(cells) == {new_day}
+        assert cells[new_day].failures_inherent == 0
+        assert cells[new_day].planned_down_h == 4
+
+    r = auth_admin.delete(f'/api/work-orders/{ot_id}')
+    assert r.status_code in (200, 204)
+    with app.app_context():
+        assert _cells(fact_env['equipment_id']) == {}
+
+
+def test_rebuild_y_dashboard_leen_los_mismos_hechos(app, auth_admin, fact_env):
+    day = dt.date.today() - dt.timedelta(days=10)
+    with app.app_context():
+        from database import db
+        from models import WorkOrder
+        from utils.kpi_facts import rebuild_kpi_facts
+        db.session.add_all([
+            WorkOrder(code='OT-FACTS-C', status='Cerrada', maintenance_type='Correctivo',
+                      equipment_id=fact_env['equipment_id'], real_start_date=day.isoformat(),
+                      real_duration=6, caused_downtime=True),
+            WorkOrder(code='OT-FACTS-P', status='Cerrada', maintenance_type='Preventivo',
+                      equipment_id=fact_env['equipment_id'], scheduled_date=day.isoformat(),
+                      real_duration=2),
+        ])
+        db.session.commit()
+        before = {d: (c.corrective, c.preventive, c.repair_h, c.downtime_h)
+                  for d, c in _cells(fact_env['equipment_id']).items()}
+
+        rebuild_kpi_facts(db, since=day.isoformat())
+        after = {d: (c.corrective, c.preventive, c.repair_h, c.downtime_h)
+                 for d, c in _cells(fact_env['equipment_id']).items()}
+        assert before == after == {day: (1, 1, 8.0, 6.0)}
+
+    r = auth_admin.get(f"/api/dashboard-kpis?days=30&line_id={fact_env['line_id']}")
+    assert r.status_code == 200
+    item = r.get_json()['items'][0]
+    assert (item['failures'], item['preventive'], item['downtime_hours']) == (1, 1, 6.0)
+    assert {o['code'] for o in item['ots']} == {'OT-FACTS-C', 'OT-FACTS-P'}
+
+    r = auth_admin.get(f"/api/reports/kpis?line_id={fact_env['line_id']}")
+    assert r.status_code == 200
+    grp = r.get_json()['groups'][0]
+    assert (grp['failures'], grp['ot_count'], grp['mttr']) == (1, 2, 6.0)
+
+
+def test_ot_por_sistema_o_componente_cuenta_para_su_equipo(app, auth_admin, fact_env):
+    day = dt.date.today() - dt.timedelta(days=3)
+    with app.app_context():
+        from database import db
+        from models import Component, System, WorkOrder
+        system = System(name='SISTEMA FACTS', equipment_id=fact_env['equipment_id'])
+        db.session.add(system); db.session.flush()
+        comp = Component(name='COMPONENTE FACTS', system_id=system.id)
+        db.session.add(comp); db.session.flush()
+        db.session.add_all([
+            WorkOrder(code='OT-FACTS-S', status='Cerrada', maintenance_type='Correctivo',
+                      system_id=system.id, scheduled_date=day.isoformat(), real_duration=2),
+            WorkOrder(code='OT-FACTS-K', status='Abierta', maintenance_type='Correctivo',
+                      component_id=comp.id, scheduled_date=day.isoformat(), real_duration=5),
+            # Solo 'Correctivo' exacto es falla
+            WorkOrder(code='OT-FACTS-M', status='Cerrada', maintenance_type='Mejora correctiva',
+                      component_id=comp.id, scheduled_date=day.isoformat(), real_duration=1),
+        ])
+        db.session.commit()
+        ot_k = WorkOrder.query.filter_by(code='OT-FACTS-K').one()
+        ot_k.status = 'Cerrada'
+        db.session.commit()
+        cell = _cells(fact_env['equipment_id'])[day]
+        assert (cell.corrective, cell.preventive, cell.repair_h) == (2, 1, 8.0)
+
+    r = auth_admin.get(f"/api/reports/kpis?line_id={fact_env['line_id']}")
+    grp = r.get_json()['groups'][0]
+    assert (grp['failures'], grp['ot_count'], grp['mttr']) == (2, 3, 3.5)
+    r = auth_admin.get(f"/api/dashboard-kpis?days=30&line_id={fact_env['line_id']}")
+    item = r.get_json()['items'][0]
+    assert {o['code'] for o in item['ots']} == {'OT-FACTS-S', 'OT-FACTS-K', 'OT-FACTS-M'}
+
+    with app.app_context():
+        from database import db
+        from models import System, WorkOrder
+        for ot in WorkOrder.query.filter(WorkOrder.code.in_(('OT-FACTS-S', 'OT-FACTS-K', 'OT-FACTS-M'))):
+            db.session.delete(ot)
+        db.session.commit()
+        assert _cells(fact_env['equipment_id']) == {}
+        db.session.delete(System.query.filter_by(name='SISTEMA FACTS').one())
+        db.session.commit()
+
+
+def test_ventana_de_reportes_usa_el_dia_de_inicio(app, auth_admin, fact_env):
+    """Una OT que arranca en un periodo y cierra en el siguiente cuenta en
+    el periodo de inicio (antes se filtraba por real_end_date)."""
+    start = dt.date(2025, 1, 30)
+    with app.app_context():
+        from database import db
+        from models import WorkOrder
+        db.session.add(WorkOrder(
+            code='OT-FACTS-W', status='Cerrada', maintenance_type='Correctivo',
+            equipment_id=fact_env['equipment_id'], real_start_date='2025-01-30 22:00',
+            real_end_date='2025-02-02 06:00', real_duration=56))
+        db.session.commit()
+        assert set(_cells(fact_env['equipment_id'])) == {start}
+
+    def _failures(d1, d2):
+        r = auth_admin.get(f"/api/reports/kpis?line_id={fact_env['line_id']}&start_date={d1}&end_date={d2}")
+        return r.get_json()['groups'][0]['failures']
+
+    assert _failures('2025-01-01', '2025-01-31') == 1
+    assert _failures('2025-02-01', '2025-02-28') == 0
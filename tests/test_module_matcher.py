@@ -0,0 +1,84 @@
+"""Matcher precompilado path -> modulo del guard de permisos (app.py)."""
+
+
+def _linear_scan(module_routes, path):
+    """Escaneo original (referencia): recorre todos los prefijos."""
+    best_match, best_len = None, 0
+    for mod_key, routes in module_routes.items():
+        for p in routes.get('pages', []):
+            if (path == p or path.startswith(p + '/')) and len(p) > best_len:
+                best_match, best_len = (mod_key, 'page'), len(p)
+        for a in routes.get('api', []):
+            if path.startswith(a) and len(a) > best_len:
+                best_match, best_len = (mod_key, 'api'), len(a)
+    return best_match if best_match else (None, None)
+
+
+def _sample_paths(module_routes):
+    paths = ['/', '/login', '/static/js/app.js', '/api/public/x', '/avisosx',
+             '/api/reports/powerbi-export/ots', '/api/equipment/12/history',
+             '/api/equipments/bulk-responsibility', '/ordenes/', '/usuariosx/1']
+    for routes in module_routes.values():
+        for p in routes.get('pages', []):
+            paths += [p, p + '/detalle/7', p + 'x']
+        for a in routes.get('api', []):
+            paths += [a, a + '/15', a + '-extra']
+    return paths
+
+
+def _with_extra_modules(base, n):
+    routes = dict(base)
+    for i in range(n):
+        routes[f'mod_bench_{i}'] = {
+            'pages': [f'/bench-page-{i}'],
+            'api': [f'/api/bench-{i}', f'/api/bench-{i}/sub-{i % 7}'],
+        }
+    return routes
+
+
+def test_matcher_equivale_al_escaneo_lineal(app):
+    from app import _MODULE_ROUTES, _compile_module_matcher
+    routes = _with_extra_modules(_MODULE_ROUTES, 50)
+    match = _compile_module_matcher(routes)
+    for path in _sample_paths(routes):
+        assert match(path) == _linear_scan(routes, path), path
+
+
+class _CountingPath(str):
+    """Path que cuenta los cortes path[:n]: uno por longitud de prefijo probada."""
+    probes = 0
+
+    def __getitem__(self, key):
+        type(self).probes += 1
+        return str.__getitem__(self, key)
+
+
+def test_costo_por_request_acotado_al_crecer_modulos(app):
+    """Cada lookup prueba a lo sumo una clave por longitud de prefijo, no
+    cada prefijo: con 500 modulos extra el trabajo casi no cambia."""
+    from app import _MODULE_ROUTES, _compile_module_matcher
+    worst = {}
+    for extra in (0, 500):
+        routes = _with_extra_modules(_MODULE_ROUTES, extra)
+        lengths = {len(p) for r in routes.values() for p in r.get('pages', []) + r.get('api', [])}
+        match = _compile_module_matcher(routes, cache_size=1)  # sin ayuda del LRU
+        worst[extra] = 0
+        for path in _sample_paths(routes):
+            _CountingPath.probes = 0
+            match(_CountingPath(path))
+            # Un corte por longitud + a lo sumo uno para revisar el '/' de pagina
+            assert _CountingPath.probes <= len(lengths) + 1, path
+            worst[extra] = max(worst[extra], _CountingPath.probes)
+    # 1500 prefijos nuevos solo suman las pocas longitudes nuevas
+    assert worst[500] - worst[0] <= 10, worst
+
+
+def test_lookup_repetido_sale_del_cache(app):
+    from app import _MODULE_ROUTES, _compile_module_matcher
+    match = _compile_module_matcher(_MODULE_ROUTES)
+    path = '/api/equipment/12/history'
+    first = match(_CountingPath(path))
+    _CountingPath.probes = 0
+    assert match(_CountingPath(path)) == first
+    assert _CountingPath.probes == 0
+    assert match.cache_info().hits == 1 and match.cache_info().misses == 1
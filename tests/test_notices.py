@@ -68,3 +68,64 @@ def test_update_notice(auth_admin):
     }), content_type='application/json')
     assert r2.status_code == 200
     assert r2.json['status'] == 'Anulado'
+
+
+def _seed_tree(app):
+    from database import db
+    from models import Area, Line, Equipment, System, Component, MaintenanceNotice, WorkOrder
+    with app.app_context():
+        area = Area(name='AREA LIST')
+        db.session.add(area)
+        db.session.flush()
+        line = Line(name='LINEA LIST', area_id=area.id)
+        db.session.add(line)
+        db.session.flush()
+        eq = Equipment(name='MOLINO LIST', tag='ML-01', line_id=line.id)
+        db.session.add(eq)
+        db.session.flush()
+        sy = System(name='TRANSMISION', equipment_id=eq.id)
+        db.session.add(sy)
+        db.session.flush()
+        co = Component(name='RODAMIENTO', system_id=sy.id)
+        db.session.add(co)
+        db.session.flush()
+        for _ in range(2):
+            db.session.add(WorkOrder(equipment_id=eq.id, maintenance_type='Correctivo', status='Cerrada'))
+        db.session.add(WorkOrder(equipment_id=eq.id, maintenance_type='Preventivo', status='Cerrada'))
+        ids = []
+        for i in range(12):
+            n = MaintenanceNotice(description=f'aviso list {i}', area_id=area.id, line_id=line.id,
+                                  component_id=co.id, status='Pendiente' if i % 2 else 'Cerrado')
+            db.session.add(n)
+            db.session.flush()
+            ids.append(n.id)
+        db.session.add(WorkOrder(notice_id=ids[-1], equipment_id=eq.id, failure_mode='Desgaste',
+                                 maintenance_type='Correctivo', status='Abierta'))
+        db.session.commit()
+        return area.id, ids
+
+
+def test_list_notices_consultas_constantes_y_filtros(app, auth_admin, count_queries):
+    area_id, ids = _seed_tree(app)
+
+    with count_queries() as statements:
+        r = auth_admin.get(f'/api/notices?area_id={area_id}')
+    rows = r.json
+    assert len(rows) == 12
+    # El equipo sale del sistema del componente; recurrencia = 2 correctivas cerradas
+    top = rows[0]
+    assert top['id'] == ids[-1]
+    assert (top['area_name'], top['line_name'], top['system_name'], top['component_name']) == \
+        ('AREA LIST', 'LINEA LIST', '-', 'RODAMIENTO')
+    assert top['failure_count'] == 2 and top['failure_mode'] == 'Desgaste'
+    assert rows[1]['failure_mode'] == '-' and rows[1]['equipment_name'] == '-'
+    selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+    assert len(selects) <= 4  # no crece con la cantidad de avisos
+
+    r = auth_admin.get(f'/api/notices?area_id={area_id}&status=Pendiente&limit=4')
+    body = r.json
+    assert [n['status'] for n in body['items']] == ['Pendiente'] * 4
+    assert body['next_cursor'] == body['items'][-1]['id']
+    r = auth_admin.get(f'/api/notices?area_id={area_id}&status=Pendiente&limit=4'
+                       f'&cursor={body["next_cursor"]}')
+    assert len(r.json['items']) == 2 and r.json['next_cursor'] is None
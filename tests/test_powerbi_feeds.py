@@ -0,0 +1,54 @@
+"""Feeds JSON de Power BI en streaming (/api/powerbi/*)."""
+import datetime as dt
+import json
+
+
+def _new_ot_with_log(auth_admin, app, logged_at):
+    r = auth_admin.post('/api/notices', data=json.dumps({
+        'description': 'Aviso feed PBI',
+    }), content_type='application/json')
+    notice = r.get_json()
+    r = auth_admin.post('/api/work-orders', data=json.dumps({
+        'notice_id': notice['id'], 'description': 'OT feed PBI', 'status': 'Abierta',
+    }), content_type='application/json')
+    ot = r.get_json()
+    with app.app_context():
+        from database import db
+        from models import OTLogEntry
+        db.session.add(OTLogEntry(work_order_id=ot['id'], log_date=logged_at.date().isoformat(),
+                                  comment='bitacora feed', created_at=logged_at))
+        db.session.commit()
+    return notice, ot
+
+
+def test_feed_json_y_ndjson_con_joins(app, auth_admin):
+    notice, ot = _new_ot_with_log(auth_admin, app, dt.datetime.utcnow())
+
+    r = auth_admin.get('/api/powerbi/work-orders-v2')
+    assert r.status_code == 200 and r.mimetype == 'application/json'
+    rows = json.loads(r.get_data(as_text=True))
+    row = next(x for x in rows if x['Codigo_OT'] == ot['code'])
+    assert row['Codigo_Aviso'] == notice['code']
+
+    r = auth_admin.get('/api/powerbi/ot-log?format=ndjson')
+    assert r.status_code == 200 and r.mimetype == 'application/x-ndjson'
+    lines = [json.loads(x) for x in r.get_data(as_text=True).splitlines()]
+    assert any(x['Codigo_OT'] == ot['code'] for x in lines)
+
+
+def test_feed_since_incremental(app, auth_admin):
+    old_at = dt.datetime(2020, 1, 1, 8, 0)
+    _n, old_ot = _new_ot_with_log(auth_admin, app, old_at)
+    _n, new_ot = _new_ot_with_log(auth_admin, app, dt.datetime.utcnow())
+
+    r = auth_admin.get('/api/powerbi/ot-log?since=2024-01-01T00:00:00Z')
+    assert r.status_code == 200
+    codes = {x['Codigo_OT'] for x in r.get_json()}
+    assert new_ot['code'] in codes and old_ot['code'] not in codes
+
+    # Tabla sin columna de cambios / fecha invalida -> 400, no un feed completo
+    assert auth_admin.get('/api/powerbi/equipments?since=2024-01-01').status_code == 400
+    # Solo created_at (las ediciones no se verian) -> 400 tambien
+    for feed in ('activities', 'purchases', 'thickness'):
+        assert auth_admin.get(f'/api/powerbi/{feed}?since=2024-01-01').status_code == 400, feed
+    assert auth_admin.get('/api/powerbi/ot-log?since=ayer').status_code == 400
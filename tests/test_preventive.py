@@ -42,3 +42,54 @@ def test_mark_notifications_read(auth_admin):
                         data=json.dumps({}),
                         content_type='application/json')
     assert r.status_code == 200
+
+
+def test_generate_preventive_dry_run_y_insert_en_lote(app, auth_admin, count_queries):
+    """dry_run no escribe; la generacion real inserta todos los avisos en un
+    solo INSERT y asigna AV-XXXX por id."""
+    import datetime as dt
+    from database import db
+    from models import Equipment, Line, Area, LubricationPoint, MaintenanceNotice
+
+    old = (dt.date.today() - dt.timedelta(days=90)).isoformat()
+    with app.app_context():
+        area = Area(name='AREA PREV LOTE')
+        db.session.add(area); db.session.flush()
+        line = Line(name='LINEA PREV LOTE', area_id=area.id)
+        db.session.add(line); db.session.flush()
+        eq = Equipment(name='BOMBA PREV LOTE', tag='PREV-LOTE', line_id=line.id)
+        db.session.add(eq); db.session.flush()
+        pts = [LubricationPoint(code=f'LUB-LOTE-{i}', name=f'Punto lote {i}', equipment_id=eq.id,
+                                frequency_days=30, warning_days=3, last_service_date=old)
+               for i in range(3)]
+        db.session.add_all(pts)
+        db.session.commit()
+        pt_ids = {p.id for p in pts}
+        area_id, line_id = area.id, line.id
+        n_notices = MaintenanceNotice.query.count()
+
+    r = auth_admin.post('/api/generate-preventive-ots?dry_run=1')
+    assert r.status_code == 200 and r.json['dry_run'] is True
+    mine = [i for i in r.json['items'] if i['source'].startswith('LUB-LOTE-')]
+    assert len(mine) == 3 and all(i['code'] is None for i in mine)
+    # Jerarquia resuelta desde el equipo (snapshot)
+    assert {i['area_id'] for i in mine} == {area_id}
+    with app.app_context():
+        assert MaintenanceNotice.query.count() == n_notices
+
+    with count_queries() as statements:
+        r = auth_admin.post('/api/generate-preventive-ots')
+    inserts = [s for s in statements
+               if s.lstrip().upper().startswith('INSERT INTO MAINTENANCE_NOTICES')]
+    assert r.status_code == 200 and r.json['created'] >= 3
+    assert len(inserts) == 1
+    with app.app_context():
+        created = MaintenanceNotice.query.filter(
+            MaintenanceNotice.source_type == 'lubrication',
+            MaintenanceNotice.source_id.in_(pt_ids)).all()
+        assert len(created) == 3
+        assert all(n.code == f'AV-{n.id:04d}' and n.line_id == line_id and n.request_on
+                   for n in created)
+
+    r = auth_admin.post('/api/generate-preventive-ots')
+    assert r.json['created'] == 0
@@ -8,6 +8,8 @@ Cubre:
   - Cola wa_outbox: enqueue -> claim (marca 'sending') -> ack (marca 'sent').
   - generate_rca: guarda en notice_rca, NO toca description, encola al grupo de
     mantenimiento si WHATSAPP_MAINT_GROUP_JID está configurado.
+  - Ack en lote (una sentencia) y long-poll que vuelve al encolar.
+  - Media del outbox en el media store (URL firmada), no en la tabla.
   - Endpoints outbox: 503 sin token, 403 token inválido, 200 con token.
   - GET /api/notices/<id> incluye la clave 'rca'.
 """
@@ -145,6 +147,102 @@ def test_outbox_ack_fallo_reintenta(app):
     assert st == 'pending'
 
 
+def test_outbox_ack_en_una_sentencia(app, count_queries):
+    from sqlalchemy import text
+    from bot.rca import enqueue_wa_message, claim_outbox, ack_outbox
+    from database import db
+    ok_id = enqueue_wa_message(app, '789@g.us', 'ok')
+    ko_id = enqueue_wa_message(app, '789@g.us', 'ko')
+    claimed = [m['id'] for m in claim_outbox(app, limit=10)]
+    assert ok_id in claimed and ko_id in claimed and claimed == sorted(claimed)
+
+    with count_queries() as statements:
+        ack_outbox(app, [{'id': ok_id, 'ok': True}, {'id': ko_id, 'ok': False}, {'id': 'x'}])
+    with app.app_context():
+        st = dict(db.session.execute(text(
+            "SELECT id, status FROM wa_outbox WHERE id IN (:a, :b)"), {"a": ok_id, "b": ko_id}).fetchall())
+    assert len([s for s in statements if s.lstrip().upper().startswith("UPDATE")]) == 1
+    assert st == {ok_id: 'sent', ko_id: 'pending'}
+
+
+def test_outbox_long_poll_vuelve_al_encolar(app):
+    import threading
+    import time
+    from bot.rca import enqueue_wa_message, claim_outbox, wait_outbox
+    claim_outbox(app, limit=50)  # vaciar pendientes de otros tests
+
+    t0 = time.monotonic()
+    assert wait_outbox(app, limit=5, wait_seconds=0.2) == []
+    assert time.monotonic() - t0 >= 0.2
+
+    timer = threading.Timer(0.3, lambda: enqueue_wa_message(app, '321@g.us', 'urgente'))
+    timer.start()
+    t0 = time.monotonic()
+    msgs = wait_outbox(app, limit=5, wait_seconds=4)
+    timer.join()
+    assert [m['body'] for m in msgs] == ['urgente']
+    assert time.monotonic() - t0 < 3  # no espero al re-chequeo
+
+
+def test_outbox_media_fuera_de_la_tabla(app, client, tmp_path, monkeypatch):
+    import os
+    from sqlalchemy import text
+    import utils.media_store as media_store
+    from bot.rca import enqueue_wa_message, claim_outbox, ack_outbox
+    from database import db
+    monkeypatch.delenv('SUPABASE_URL', raising=False)
+    monkeypatch.setattr(media_store, 'MEDIA_DIR', str(tmp_path))
+    claim_outbox(app, limit=50)
+
+    foto = b'\xff\xd8' + b'x' * 200_000
+    mid = enqueue_wa_message(app, '555@g.us', 'con foto', media_bytes=foto,
+                             media_type='image', mimetype='image/jpeg')
+    with app.app_context():
+        ref = db.session.execute(text("SELECT media_ref FROM wa_outbox WHERE id=:i"),
+                                 {"i": mid}).scalar()
+    assert ref.startswith('local:')
+
+    [m] = [x for x in claim_outbox(app, limit=10) if x['id'] == mid]
+    assert 'media_base64' not in m and len(json.dumps(m)) < 500
+    r = client.get(m['media_url'])
+    assert r.status_code == 200 and r.mimetype == 'image/jpeg' and r.data == foto
+    assert client.get('/api/public/whatsapp/media/falso').status_code == 403
+
+    ack_outbox(app, [{'id': mid, 'ok': True}])
+    with app.app_context():
+        assert db.session.execute(text("SELECT media_ref FROM wa_outbox WHERE id=:i"),
+                                  {"i": mid}).scalar() is None
+    assert not os.path.exists(os.path.join(str(tmp_path), ref.split(':', 1)[1]))
+    assert client.get(m['media_url']).status_code == 404
+
+
+def test_outbox_media_legacy_base64_se_migra(app, tmp_path, monkeypatch):
+    import base64
+    from sqlalchemy import text
+    import utils.media_store as media_store
+    from bot.rca import ensure_rca_tables, _upgrade_outbox_media
+    from database import db
+    monkeypatch.delenv('SUPABASE_URL', raising=False)
+    monkeypatch.setattr(media_store, 'MEDIA_DIR', str(tmp_path))
+    ensure_rca_tables(app)
+    with app.app_context():
+        cols = [r[1] for r in db.session.execute(text("PRAGMA table_info(wa_outbox)"))]
+        if 'media_base64' not in cols:
+            db.session.execute(text("ALTER TABLE wa_outbox ADD COLUMN media_base64 TEXT"))
+        ids = [db.session.execute(text(
+            "INSERT INTO wa_outbox (to_jid, body, media_base64, media_type, status) "
+            "VALUES ('1@g.us', 'legacy', :b, 'image', :st) RETURNING id"),
+            {"b": base64.b64encode(b'foto').decode(), "st": st}).scalar() for st in ('pending', 'sent')]
+        db.session.commit()
+        _upgrade_outbox_media(db, text)
+        rows = db.session.execute(text(
+            "SELECT media_base64, media_ref FROM wa_outbox WHERE id IN (:a, :b) ORDER BY id"),
+            {"a": ids[0], "b": ids[1]}).fetchall()
+    assert rows[0][0] is None and rows[0][1].startswith('local:')
+    assert rows[1] == (None, None)
+    assert b''.join(media_store.open_media(rows[0][1])) == b'foto'
+
+
 def _reset_maint_groups(app, *jids):
     from bot.rca import ensure_rca_tables
     from database import db
@@ -0,0 +1,98 @@
+"""Dashboards de lubricacion y monitoreo: semaforo/orden/paginado en SQL y
+cantidad de consultas fija (sin lazy loads por punto)."""
+import datetime as dt
+
+import pytest
+
+
+def _iso(days):
+    return (dt.date.today() + dt.timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def sched_env(app):
+    from database import db
+    from models import Area, Line, Equipment, LubricationPoint, MonitoringPoint
+    with app.app_context():
+        eq = Equipment.query.filter_by(tag='EQ-SCHED').first()
+        if eq is None:
+            area = Area(name='AREA SCHED')
+            db.session.add(area); db.session.flush()
+            line = Line(name='LINEA SCHED', area_id=area.id)
+            db.session.add(line); db.session.flush()
+            eq = Equipment(name='PRENSA SCHED', tag='EQ-SCHED', line_id=line.id)
+            db.session.add(eq); db.session.flush()
+            for code, due in (('LUB-SCH-R', _iso(-5)), ('LUB-SCH-A', _iso(2)),
+                              ('LUB-SCH-V', _iso(40)), ('LUB-SCH-P', None)):
+                db.session.add(LubricationPoint(
+                    code=code, name=code, equipment_id=eq.id, line_id=line.id,
+                    area_id=area.id, frequency_days=30, warning_days=3, next_due_date=due))
+            for code, due, sem in (('MON-SCH-1', _iso(-2), 'ROJO'), ('MON-SCH-2', _iso(0), ''),
+                                   ('MON-SCH-3', _iso(5), 'VERDE')):
+                db.session.add(MonitoringPoint(
+                    code=code, name=code, equipment_id=eq.id, line_id=line.id,
+                    area_id=area.id, frequency_days=7, warning_days=1,
+                    next_due_date=due, semaphore_status=sem))
+            db.session.commit()
+        return {'eq_id': eq.id, 'line_id': eq.line_id}
+
+
+def test_lubricacion_semaforo_orden_y_paginado(auth_admin, sched_env):
+    eq_id = sched_env['eq_id']
+    d = auth_admin.get(f'/api/lubrication/dashboard?equipment_id={eq_id}').get_json()
+    by_code = {i['code']: i for i in d['items']}
+    assert [by_code[c]['semaphore_status'] for c in ('LUB-SCH-R', 'LUB-SCH-A', 'LUB-SCH-V', 'LUB-SCH-P')] \
+        == ['ROJO', 'AMARILLO', 'VERDE', 'PENDIENTE']
+    # Orden por vencimiento; los sin fecha al final
+    assert [i['code'] for i in d['items']] == ['LUB-SCH-R', 'LUB-SCH-A', 'LUB-SCH-V', 'LUB-SCH-P']
+    assert by_code['LUB-SCH-R']['equipment_tag'] == 'EQ-SCHED'
+    assert by_code['LUB-SCH-R']['area_name'] == 'AREA SCHED'
+
+    d = auth_admin.get(f'/api/lubrication/dashboard?equipment_id={eq_id}'
+                       f'&semaphore=ROJO,AMARILLO&per_page=1&page=2').get_json()
+    assert [i['code'] for i in d['items']] == ['LUB-SCH-A']
+    assert d['pagination']['total'] == 2 and d['pagination']['pages'] == 2
+
+
+def test_dashboards_consultas_fijas(app, auth_admin, sched_env, count_queries):
+    from database import db
+    from models import LubricationPoint, MonitoringPoint
+
+    def both():
+        return (auth_admin.get('/api/lubrication/dashboard').get_json(),
+                auth_admin.get('/api/monitoring/dashboard').get_json())
+
+    both()
+    with count_queries() as stmts:
+        both()
+    n_before = len(stmts)
+    with app.app_context():
+        for i in range(5):
+            db.session.add(LubricationPoint(code=f'LUB-SCH-X{i}', name='extra',
+                                            equipment_id=sched_env['eq_id'],
+                                            next_due_date=_iso(-i)))
+            db.session.add(MonitoringPoint(code=f'MON-SCH-X{i}', name='extra',
+                                           equipment_id=sched_env['eq_id'],
+                                           next_due_date=_iso(-i)))
+        db.session.commit()
+    both()
+    with count_queries() as stmts:
+        both()
+    n_after = len(stmts)
+    assert n_after == n_before
+    with app.app_context():
+        LubricationPoint.query.filter(LubricationPoint.code.like('LUB-SCH-X%')).delete(
+            synchronize_session=False)
+        MonitoringPoint.query.filter(MonitoringPoint.code.like('MON-SCH-X%')).delete(
+            synchronize_session=False)
+        db.session.commit()
+
+
+def test_monitoreo_kpis_y_pendientes(auth_admin, sched_env):
+    d = auth_admin.get(f"/api/monitoring/dashboard?equipment_id={sched_env['eq_id']}").get_json()
+    k = d['kpi']
+    assert (k['total_points'], k['overdue'], k['due_today'], k['upcoming']) == (3, 1, 2, 1)
+    assert (k['red'], k['green'], k['yellow']) == (1, 1, 1)   # '' -> semaforo por fecha
+    assert [r['code'] for r in d['pending_rows']] == ['MON-SCH-1', 'MON-SCH-2']
+    assert d['pending_rows'][0]['equipment_name'] == 'PRENSA SCHED'
+    assert d['selected_point_id'] is not None
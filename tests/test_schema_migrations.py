@@ -0,0 +1,93 @@
+"""Ledger de migraciones (utils/schema_migrations.py)."""
+import logging
+
+from sqlalchemy import text
+
+
+def test_arranque_al_dia_es_un_solo_select(app, count_queries):
+    from app import _MIGRATIONS
+    from database import db
+    from utils.schema_migrations import apply_migrations, migration_status
+    with app.app_context():
+        status = migration_status(db, _MIGRATIONS)
+        assert [r['version'] for r in status] == list(range(1, len(_MIGRATIONS) + 1))
+        assert all(r['applied_at'] and r['checksum_ok'] for r in status)
+
+        with count_queries() as stmts:
+            assert apply_migrations(db, _MIGRATIONS) == []
+        assert len(stmts) == 1 and 'schema_migrations' in stmts[0]
+
+
+def test_migracion_nueva_se_aplica_una_vez(app, caplog):
+    from app import _MIGRATIONS
+    from database import db
+    from utils.schema_migrations import Migration, apply_migrations, applied_versions
+    calls = []
+    extra = Migration(9001, 'test_tabla', sql=[
+        "CREATE TABLE test_migr (id INTEGER PRIMARY KEY)",
+        "CREATE TABLE test_migr (id INTEGER PRIMARY KEY)",   # falla: se omite
+    ], func=lambda db: calls.append(1))
+    with app.app_context():
+        try:
+            applied = apply_migrations(db, _MIGRATIONS + [extra])
+            assert [m.version for m in applied] == [9001]
+            assert calls == [1]
+            assert applied_versions(db)[9001] == extra.checksum
+            db.session.execute(text("SELECT id FROM test_migr")).all()
+
+            assert apply_migrations(db, _MIGRATIONS + [extra]) == []
+            assert calls == [1]
+
+            # Cambiar una migracion ya aplicada: aviso, sin re-ejecutar
+            changed = Migration(9001, 'test_tabla', sql=["SELECT 1"])
+            with caplog.at_level(logging.WARNING):
+                assert apply_migrations(db, _MIGRATIONS + [changed]) == []
+            assert 'checksum distinto' in caplog.text
+        finally:
+            db.session.execute(text("DELETE FROM schema_migrations WHERE version = 9001"))
+            db.session.execute(text("DROP TABLE IF EXISTS test_migr"))
+            db.session.commit()
+
+
+def _paso(db):
+    pass
+
+
+def test_checksum_no_depende_del_codigo_fuente(app):
+    from database import db
+    from utils.schema_migrations import Migration, applied_versions, apply_migrations, migration_status
+    m = Migration(9002, 'test_legacy', sql=["SELECT 1"], func=_paso)
+    # Mismo paso con otro cuerpo (comentario, reformateo): mismo checksum
+    assert m.checksum == Migration(9002, 'test_legacy', sql=["SELECT   1"], func=_paso).checksum
+    assert m.checksum != Migration(9002, 'test_legacy', sql=["SELECT 1"], func=_paso, revision=2).checksum
+    assert m.legacy_checksum and m.legacy_checksum != m.checksum
+
+    with app.app_context():
+        try:
+            apply_migrations(db, [m])
+            # Ledger escrito con el formato anterior: se reconoce y se reescribe
+            db.session.execute(text("UPDATE schema_migrations SET checksum = :c WHERE version = 9002"),
+                               {'c': m.legacy_checksum})
+            db.session.commit()
+            assert migration_status(db, [m])[0]['checksum_ok'] is True
+            assert apply_migrations(db, [m]) == []
+            assert applied_versions(db)[9002] == m.checksum
+        finally:
+            db.session.execute(text("DELETE FROM schema_migrations WHERE version = 9002"))
+            db.session.commit()
+
+
+def test_migrate_status_no_toca_la_base(tmp_path):
+    import os
+    import subprocess
+    import sys
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    db_file = tmp_path / 'cmms.db'
+    env = dict(os.environ, DB_MODE='local', LOCAL_DATABASE_URL=f'sqlite:///{db_file}',
+               FLASK_ENV='development', CMMS_AUTO_CREATE_TABLES='true', TELEGRAM_TOKEN='')
+    out = subprocess.run([sys.executable, os.path.join(root, 'scripts', 'migrate.py'), '--status'],
+                         cwd=root, env=env, capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    assert 'PENDIENTE' in out.stdout
+    # Importar app para el CLI no aplico el schema
+    assert not db_file.exists() or db_file.stat().st_size == 0
@@ -39,7 +39,8 @@ def svc_env(app):
         pt.equipment_id = eq.id
         pt.is_active = True
         pt.last_service_date = old
-        pt.next_due_date = None
+        # El dashboard calcula el semaforo en SQL sobre next_due_date
+        pt.next_due_date = (dt.date.today() - dt.timedelta(days=60)).isoformat()
         pt.semaphore_status = 'ROJO'
         mot = _get_or_create(db, RotativeAsset, code='MOT-SVC-1', defaults={
             'name': 'MOTOR SVC TEST', 'category': 'MOTOR',
@@ -0,0 +1,55 @@
+"""Assets con huella, cache larga y precompresion (utils/static_assets.py)."""
+import gzip
+import os
+import re
+
+from utils.static_assets import asset_url, build_digest
+
+
+def _static(app, rel):
+    with open(os.path.join(app.static_folder, rel), 'rb') as f:
+        return f.read()
+
+
+def test_templates_usan_urls_con_huella(auth_admin):
+    r = auth_admin.get('/ordenes')
+    assert r.status_code == 200
+    html = r.get_data(as_text=True)
+    assert asset_url('js/work_orders.js') in html
+    assert re.search(r'/assets/[0-9a-f]{12}/css/style\.css', html)
+    assert '?v=' not in html
+    # HTML sin cache
+    assert 'no-store' in r.headers['Cache-Control']
+
+
+def test_asset_inmutable_y_precomprimido(client, app):
+    url = asset_url('js/work_orders.js')
+    r = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert r.status_code == 200
+    assert r.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert r.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in r.headers['Vary']
+    raw = _static(app, 'js/work_orders.js')
+    assert gzip.decompress(r.data) == raw and len(r.data) < len(raw) // 2
+
+    r2 = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': r.headers['ETag']})
+    assert r2.status_code == 304
+
+    r = client.get(url)
+    assert 'Content-Encoding' not in r.headers and r.data == raw
+
+    # Huella vieja (pagina previa a un deploy): contenido actual, sin cache larga
+    stale = url.replace(url.split('/')[2], '0' * 12)
+    r = client.get(stale)
+    assert r.status_code == 200 and r.headers['Cache-Control'] == 'no-cache'
+    assert client.get('/assets/abc/js/no_existe.js').status_code == 404
+
+
+def test_service_worker_desde_el_manifiesto(auth_admin):
+    r = auth_admin.get('/sw.js')
+    assert r.status_code == 200
+    body = r.get_data(as_text=True)
+    assert f"const CACHE_NAME = \"cmms-{build_digest()}\";" in body
+    assert asset_url('js/sidebar.js') in body
+    assert '__ASSET' not in body
+    assert 'no-store' in r.headers['Cache-Control']
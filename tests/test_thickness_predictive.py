@@ -172,3 +172,41 @@ def test_narrative_sin_api_key_da_503(auth_admin, thk_env, monkeypatch):
 def test_page_requires_login(client):
     r = client.get('/espesores/predictivo')
     assert r.status_code in (301, 302)  # redirect a login
+
+
+def test_dashboard_consultas_constantes(app, auth_admin, thk_env, count_queries):
+    from database import db
+    from models import Equipment, ThicknessPoint, ThicknessInspection
+
+    auth_admin.get('/api/thickness/dashboard')   # calienta snapshot / sesion
+    with count_queries() as stmts:
+        r = auth_admin.get('/api/thickness/dashboard')
+    n_before = len(stmts)
+    d = r.get_json()
+    eq = next(e for e in d['equipos'] if e['equipment_tag'] == 'DPRED')
+    assert eq['point_count'] == 2 and eq['critical_count'] == 0
+    assert eq['last_inspection_date'] == '2026-07-01'
+
+    # Un digestor mas con puntos e inspeccion: mismas consultas
+    with app.app_context():
+        if not Equipment.query.filter_by(tag='DPRED2').first():
+            base = Equipment.query.filter_by(tag='DPRED').first()
+            eq2 = Equipment(name='DIGESTOR PRED 2', tag='DPRED2', line_id=base.line_id)
+            db.session.add(eq2); db.session.flush()
+            db.session.add_all([
+                ThicknessPoint(equipment_id=eq2.id, group_name='CHAQUETA', position='A',
+                               status='CRITICO'),
+                ThicknessPoint(equipment_id=eq2.id, group_name='CHAQUETA', position='B',
+                               status='ALERTA'),
+                ThicknessInspection(equipment_id=eq2.id, inspection_date='2026-02-01',
+                                    next_due_date='2026-04-01'),
+            ])
+            db.session.commit()
+    auth_admin.get('/api/thickness/dashboard')
+    with count_queries() as stmts:
+        r = auth_admin.get('/api/thickness/dashboard')
+    n_after = len(stmts)
+    eq2 = next(e for e in r.get_json()['equipos'] if e['equipment_tag'] == 'DPRED2')
+    assert (eq2['critical_count'], eq2['alert_count']) == (1, 1)
+    assert eq2['semaphore_status'] == 'ROJO'
+    assert n_after == n_before
@@ -128,6 +128,34 @@ def test_pagination_work_orders(auth_admin):
     assert 'pagination' in data
 
 
+def test_keyset_filtros_y_fields_work_orders(auth_admin):
+    """?limit/cursor recorre por id sin repetir; filtros y fields= en servidor."""
+    ids = []
+    for i in range(5):
+        r = auth_admin.post('/api/work-orders', data=json.dumps({
+            'description': f'Keyset {i}', 'status': 'Programada',
+            'maintenance_type': 'Lubricacion-KS', 'scheduled_date': f'2031-01-0{i + 1}',
+        }), content_type='application/json')
+        ids.append(r.json['id'])
+
+    base = '/api/work-orders?type=Lubricacion-KS&status=Programada,Abierta&fields=id,code,status'
+    seen, cursor = [], None
+    while True:
+        r = auth_admin.get(base + '&limit=2' + (f'&cursor={cursor}' if cursor else ''))
+        assert r.status_code == 200
+        page = r.json
+        seen += [row['id'] for row in page['items']]
+        assert all(set(row) == {'id', 'code', 'status'} for row in page['items'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert seen == sorted(ids, reverse=True)
+
+    r = auth_admin.get('/api/work-orders?type=Lubricacion-KS&date_from=2031-01-02'
+                       '&date_to=2031-01-03&limit=50')
+    assert {row['id'] for row in r.json['items']} == set(ids[1:3])
+
+
 def test_ot_directa_asignar_arbol(auth_admin, app):
     """OT creada directa (sin aviso) puede recibir el arbol de equipos
     despues, via PUT — el flujo del modal Editar OT con los selects de
@@ -5,6 +5,7 @@ consultar la BD en cada request (los reportes leen week_start_day varias
 veces por pagina).
 """
 import time
+import uuid
 
 _cache = {}
 _CACHE_TTL = 60  # segundos
@@ -36,3 +37,69 @@ def get_week_start_day():
         return int(get_setting('week_start_day', '0')) % 7
     except (TypeError, ValueError):
         return 0
+
+
+# ── Versiones de caches por proceso ──────────────────────────────────────
+# Tokens en app_settings que cambian los endpoints que modifican
+# datos cacheados en memoria (matriz de permisos, jerarquia de activos).
+# Cada worker compara su cache contra este valor (una lectura por request y
+# clave, memorizada en flask.g), asi un cambio se aplica de inmediato en
+# todos los procesos en vez de esperar el TTL.
+PERMISSIONS_VERSION_KEY = 'permissions_version'
+
+
+def get_version(key):
+    """Version actual (str) de `key` leida de la BD, sin pasar por el cache
+    de 60s. Dentro de un request se consulta una sola vez (flask.g)."""
+    from flask import g
+    try:
+        return g._settings_versions[key]
+    except (AttributeError, KeyError, RuntimeError):
+        pass
+    try:
+        from models import AppSetting
+        s = AppSetting.query.get(key)
+        version = (s.value if s else None) or '0'
+    except Exception:
+        version = '0'
+    _memo_version(key, version)
+    return version
+
+
+def set_version(key, value, session=None):
+    """Graba la version en la sesion (el llamador hace commit). `session`
+    permite usarlo desde eventos de flush."""
+    from database import db
+    from models import AppSetting
+    session = session or db.session
+    with session.no_autoflush:
+        s = session.get(AppSetting, key)
+    if s:
+        s.value = value
+    else:
+        session.add(AppSetting(key=key, value=value))
+    _memo_version(key, value)
+    return value
+
+
+def _memo_version(key, value):
+    from flask import g
+    try:
+        if not hasattr(g, '_settings_versions'):
+            g._settings_versions = {}
+        g._settings_versions[key] = value
+    except RuntimeError:
+        pass
+
+
+def get_permissions_version():
+    """Version actual de la matriz de permisos."""
+    return get_version(PERMISSIONS_VERSION_KEY)
+
+
+def bump_permissions_version():
+    """Invalida el cache de permisos de todos los workers (en la sesion
+    actual; el llamador hace commit). Token unico como la version de la
+    jerarquia: leer-sumar-escribir dejaba el mismo numero con dos bumps
+    concurrentes y un worker se quedaba con la matriz vieja."""
+    return set_version(PERMISSIONS_VERSION_KEY, uuid.uuid4().hex)
@@ -0,0 +1,162 @@
+"""Feed de cambios incremental por tabla (GET /api/changes).
+
+Las tablas de `CHANGE_TRACKED_MODELS` (models.py) tienen `updated_at`
+indexado:
+  - ORM: default/onupdate de la columna (incluye Query.update() masivo).
+  - SQL crudo (bot, merges de admin): `updated_at = CURRENT_TIMESTAMP` en
+    el SET; los INSERT crudos caen en el server_default now(). Ambos asumen
+    la sesion de PostgreSQL en UTC (Supabase y el contenedor del VPS).
+  - Borrados: el evento after_delete deja una fila en change_tombstones
+    (`record_deletion` para los DELETE crudos). Query.delete() masivo no
+    dispara eventos: esos borrados solo los ve una carga completa.
+
+Consumidores (Power BI, mirror del VPS, re-indexado RAG): guardar el
+`until` de la respuesta y mandarlo como `since` en la siguiente llamada.
+
+`updated_at` se fija al hacer flush, no al commit: una transaccion que
+escribe antes que otra pero confirma despues deja su fila "detras" de un
+cursor que ya avanzo. Por eso `until` es una marca de agua COMMIT_LAG por
+detras del reloj y solo se sirven filas con updated_at < until: una
+transaccion mas corta que COMMIT_LAG siempre queda visible antes de que
+el cursor la pase. El filtro de `since` es inclusivo (>=): un cambio puede
+llegar dos veces.
+
+Cada tabla pertenece a un modulo de permisos (TABLE_MODULES): el feed solo
+muestra las tablas cuyo modulo el usuario puede ver.
+"""
+import datetime as dt
+import time
+
+from sqlalchemy import and_, or_, select
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+# Mayor que la transaccion de escritura mas larga esperada (los merges y
+# cierres masivos tardan segundos; restore/rebuild no pasan por el feed)
+COMMIT_LAG = dt.timedelta(seconds=60)
+TOMBSTONE_RETENTION_DAYS = 90
+_PRUNE_INTERVAL = 24 * 3600  # segundos
+
+_last_prune = None
+
+
+def parse_since(raw):
+    """`since` ISO 8601 (fecha o fecha-hora) -> datetime naive UTC, o None.
+    Con zona horaria se convierte a UTC. ValueError si no es ISO."""
+    raw = (raw or '').strip()
+    if not raw:
+        return None
+    since = dt.datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    if since.tzinfo is not None:
+        since = since.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return since
+
+
+# Modulo de _MODULE_ROUTES (app.py) cuyo permiso 'view' exige cada tabla
+TABLE_MODULES = {
+    'areas': 'activos_config', 'lines': 'activos_config', 'equipments': 'activos_config',
+    'work_orders': 'ordenes', 'ot_personnel': 'ordenes', 'ot_materials': 'ordenes',
+    'maintenance_notices': 'avisos',
+    'lubrication_points': 'lubricacion', 'lubrication_executions': 'lubricacion',
+    'monitoring_points': 'monitoreo', 'monitoring_readings': 'monitoreo',
+    'inspection_routes': 'inspecciones', 'inspection_executions': 'inspecciones',
+    'warehouse_items': 'almacen', 'warehouse_movements': 'almacen',
+    'shutdowns': 'paradas',
+}
+
+
+def tracked_tables():
+    """{tabla: modelo} de las tablas con change tracking."""
+    from models import CHANGE_TRACKED_MODELS
+    return {m.__tablename__: m for m in CHANGE_TRACKED_MODELS}
+
+
+def visible_tables(can_view):
+    """Tablas del feed cuyo modulo pasa `can_view(modulo)`."""
+    return {t for t in tracked_tables() if can_view(TABLE_MODULES.get(t))}
+
+
+def record_deletion(conn, table_name, row_id):
+    """Tombstone de un borrado, en la misma transaccion que el DELETE."""
+    from models import ChangeTombstone
+    conn.execute(ChangeTombstone.__table__.insert().values(
+        table_name=table_name, row_id=row_id, deleted_at=dt.datetime.utcnow(),
+    ))
+
+
+def record_tombstone(mapper, connection, target):
+    """Listener after_delete de los modelos con change tracking."""
+    record_deletion(connection, mapper.local_table.name, target.id)
+
+
+def changes_since(session, since, tables=None, limit=DEFAULT_LIMIT, after_id=None):
+    """Ids modificados y borrados por tabla desde `since` (datetime naive UTC).
+
+    Los modificados van ordenados por (updated_at, id) y topados en `limit`
+    por tabla; si quedan mas, `next` trae el {since, after_id} para seguir
+    con esa tabla. `after_id` desempata filas con el mismo updated_at que
+    `since` (el backfill inicial deja muchas en el mismo instante).
+    Solo entran filas con updated_at < until (marca de agua COMMIT_LAG
+    atras del reloj, ver docstring del modulo).
+    Lanza ValueError si se pide una tabla sin change tracking.
+    """
+    from models import ChangeTombstone
+
+    registry = tracked_tables()
+    names = list(tables) if tables else sorted(registry)
+    unknown = [t for t in names if t not in registry]
+    if unknown:
+        raise ValueError(f"Tablas sin change tracking: {', '.join(unknown)}")
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    until = dt.datetime.utcnow() - COMMIT_LAG
+
+    result = {}
+    for name in names:
+        Model = registry[name]
+        col = Model.updated_at
+        if after_id is None:
+            cond = col >= since
+        else:
+            cond = or_(col > since, and_(col == since, Model.id > after_id))
+        rows = session.execute(
+            select(Model.id, col).where(cond, col < until).order_by(col, Model.id).limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        deleted = session.execute(
+            select(ChangeTombstone.row_id).where(
+                ChangeTombstone.table_name == name, ChangeTombstone.deleted_at >= since,
+                ChangeTombstone.deleted_at < until,
+            ).order_by(ChangeTombstone.deleted_at)
+        ).scalars().all()
+        result[name] = {
+            'changed': [r[0] for r in rows],
+            'deleted': sorted(set(deleted)),
+            'next': ({'since': rows[-1][1].isoformat(), 'after_id': rows[-1][0]}
+                     if has_more else None),
+        }
+    return {'since': since.isoformat(), 'until': until.isoformat(), 'tables': result}
+
+
+def prune_tombstones(db, days=TOMBSTONE_RETENTION_DAYS, logger=None):
+    """Elimina tombstones mas viejos que `days` (los consumidores que no
+    sincronizan en ese plazo deben hacer una carga completa)."""
+    from models import ChangeTombstone
+    cutoff = dt.datetime.utcnow() - dt.timedelta(days=days)
+    n = ChangeTombstone.query.filter(ChangeTombstone.deleted_at < cutoff).delete(
+        synchronize_session=False)
+    db.session.commit()
+    if logger and n:
+        logger.info(f"change_tombstones: {n} tombstones anteriores a {cutoff:%Y-%m-%d} eliminados.")
+    return n
+
+
+def prune_tombstones_if_due(db, logger=None):
+    """prune_tombstones a lo sumo una vez por dia por proceso (lo llama el
+    propio feed; antes corria en cada arranque)."""
+    global _last_prune
+    now = time.monotonic()
+    if _last_prune is not None and now - _last_prune < _PRUNE_INTERVAL:
+        return None
+    _last_prune = now
+    return prune_tombstones(db, logger=logger)
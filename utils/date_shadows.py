@@ -0,0 +1,89 @@
+"""Columnas DATE "sombra" de las fechas guardadas como texto.
+
+WorkOrder.scheduled_date / real_start_date / real_end_date y
+MaintenanceNotice.request_date son String(20) (formatos mixtos: ISO,
+dd/mm/aaaa, mm/dd/aaaa, con o sin hora). Para poder filtrar ventanas de
+tiempo en SQL (y usar indices) cada una tiene una columna Date paralela
+que se mantiene sincronizada:
+
+  - ORM: eventos before_insert/before_update en models.py.
+  - SQL crudo (bot): `with_date_shadows(tabla, updates)` agrega las
+    columnas sombra al dict de parametros antes del UPDATE/INSERT.
+  - Historico: `backfill_date_shadows(db)` (idempotente, en lotes).
+
+La interpretacion del texto es la de `_parse_date_flexible`, asi que un
+filtro SQL sobre la sombra equivale al filtro Python que reemplaza.
+"""
+from sqlalchemy import text
+
+from utils.reporting_helpers import _parse_date_flexible
+
+# tabla -> ((columna texto, columna sombra), ...)
+DATE_SHADOWS = {
+    'work_orders': (
+        ('scheduled_date', 'scheduled_on'),
+        ('real_start_date', 'real_start_on'),
+        ('real_end_date', 'real_end_on'),
+    ),
+    'maintenance_notices': (
+        ('request_date', 'request_on'),
+    ),
+}
+
+SHADOW_COLUMNS = frozenset(
+    shadow for pairs in DATE_SHADOWS.values() for _src, shadow in pairs
+)
+
+
+def parse_shadow(value):
+    """Texto de fecha -> date (o None si vacio / no interpretable)."""
+    return _parse_date_flexible(value)
+
+
+def sync_date_shadows(obj, table):
+    """Recalcula las columnas sombra de una instancia ORM."""
+    for src, shadow in DATE_SHADOWS.get(table, ()):
+        setattr(obj, shadow, parse_shadow(getattr(obj, src, None)))
+
+
+def with_date_shadows(table, updates):
+    """Devuelve una copia de `updates` con las sombras de las fechas que
+    contenga. Para UPDATE/INSERT en SQL crudo:
+
+        updates = with_date_shadows('work_orders', {'scheduled_date': d})
+        set_clause = ', '.join(f"{k} = :{k}" for k in updates)
+    """
+    out = dict(updates)
+    for src, shadow in DATE_SHADOWS.get(table, ()):
+        if src in updates:
+            out[shadow] = parse_shadow(updates[src])
+    return out
+
+
+def backfill_date_shadows(db, batch_size=500, logger=None):
+    """Completa las sombras NULL cuyo texto si tiene valor.
+
+    Idempotente: solo toca filas con sombra NULL, por lo que despues de la
+    primera corrida solo revisa fechas que no se pudieron interpretar.
+    Devuelve {"tabla.columna": filas_actualizadas}.
+    """
+    stats = {}
+    for table, pairs in DATE_SHADOWS.items():
+        for src, shadow in pairs:
+            rows = db.session.execute(text(
+                f"SELECT id, {src} FROM {table} "
+                f"WHERE {shadow} IS NULL AND {src} IS NOT NULL AND {src} <> ''"
+            )).fetchall()
+            params = []
+            for row_id, raw in rows:
+                parsed = parse_shadow(raw)
+                if parsed is not None:
+                    params.append({"id": row_id, "v": parsed})
+            stmt = text(f"UPDATE {table} SET {shadow} = :v WHERE id = :id")
+            for i in range(0, len(params), batch_size):
+                db.session.execute(stmt, params[i:i + batch_size])
+                db.session.commit()
+            stats[f"{table}.{shadow}"] = len(params)
+            if logger and params:
+                logger.info(f"Backfill {table}.{shadow}: {len(params)} filas.")
+    return stats
@@ -0,0 +1,414 @@
+"""Backup y restauracion de la BD en streaming (Mantenimiento > Backup BD).
+
+Antes el dump armaba TODA la base en un dict, lo serializaba a JSON en
+memoria y recien ahi lo comprimia; la restauracion descomprimia el archivo
+entero y reinsertaba fila por fila. Con las tablas de historial creciendo,
+el worker se disparaba en RAM y superaba los timeouts.
+
+Formato ndjson.gz/v2 (gzip de lineas JSON, generado tabla por tabla):
+
+    {"meta": {"format": "ndjson.gz/v2", "tables": [padres -> hijos], ...}}
+    {"table": "areas", "columns": ["id", "name", ...]}
+    [1, "Molienda", ...]                    una linea por fila
+    {"end": "areas", "rows": 42}            (o "error" si la tabla fallo)
+    ...
+    {"summary": {"total_rows": N, "failed_tables": [...]}}
+
+  - `iter_dump` lee con cursor del lado servidor (`stream_results`) dentro
+    de una transaccion REPEATABLE READ de solo lectura en PostgreSQL (foto
+    consistente entre tablas) y entrega bloques gzip: memoria acotada a un
+    bloque de filas, sin importar el tamano de la base.
+  - `restore_dump` lee el archivo linea a linea e inserta en lotes de
+    RESTORE_BATCH_ROWS con ON CONFLICT DO NOTHING, una transaccion por
+    tabla. Con `wipe` el vaciado (hijos primero) y la carga van en UNA sola
+    transaccion: si falla cualquier lote se revierte todo y la base queda
+    como estaba. En PostgreSQL re-sincroniza las secuencias de `id` al
+    terminar cada tabla.
+    Acepta tambien los dumps json.gz/v1 anteriores.
+
+Valores: fechas en ISO, Decimal como texto y binarios como {"$b64": ...}.
+Las columnas generadas (p.ej. search_documents.tsv) no se exportan.
+
+Las tablas de control (CONTROL_TABLES: cola de trabajos y ledger de
+migraciones) ni se respaldan ni se restauran. La restauracion corre como un
+trabajo de background_jobs: vaciarla dentro de la transaccion del wipe
+bloquea la fila del propio trabajo (set_job_progress, desde otra conexion,
+queda esperando para siempre en PostgreSQL) y reinsertar trabajos
+PENDIENTE/EN_CURSO de un dump los volveria a ejecutar (pushes de WhatsApp,
+llamadas a OpenAI repetidas).
+"""
+import base64
+import gzip
+import io
+import json
+import logging
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from sqlalchemy import MetaData, Table, inspect, text
+from sqlalchemy.sql import sqltypes
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'ndjson.gz/v2'
+DUMP_CHUNK_ROWS = 2000
+RESTORE_BATCH_ROWS = 1000
+_GZIP_BLOCK_BYTES = 256 * 1024
+CONTROL_TABLES = frozenset({'background_jobs', 'schema_migrations'})
+
+
+# ── Tablas ───────────────────────────────────────────────────────────────
+
+def _virtual_tables(conn):
+    """Tablas FTS5 de SQLite y sus tablas sombra (no se respaldan)."""
+    if conn.dialect.name != 'sqlite':
+        return set(), ()
+    names = {r[0] for r in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%'"))}
+    return names, tuple(f"{n}_" for n in names)
+
+
+def list_tables(engine):
+    """Tablas respaldables de la base, padres antes que hijos (orden de las
+    FK). Sin las tablas virtuales de SQLite ni CONTROL_TABLES."""
+    with engine.connect() as conn:
+        virtual, shadow_prefixes = _virtual_tables(conn)
+        ordered = [t for t, _ in inspect(conn).get_sorted_table_and_fkc_names() if t]
+    return [t for t in ordered if t not in virtual and t not in CONTROL_TABLES
+            and not t.startswith(shadow_prefixes)]
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'$b64': base64.b64encode(bytes(value)).decode('ascii')}
+    return value
+
+
+def _json_line(obj):
+    return json.dumps(obj, ensure_ascii=False, default=str, separators=(',', ':')) + '\n'
+
+
+# ── Dump ─────────────────────────────────────────────────────────────────
+
+def iter_dump(engine, tables=None, progress=None):
+    """Genera el dump como bloques de bytes gzip.
+
+    tables: subconjunto opcional (nombres). progress(tabla, filas) se llama
+    al terminar cada tabla.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip
+    pending = []
+    pending_bytes = 0
+
+    def _emit(obj):
+        nonlocal pending_bytes
+        line = _json_line(obj).encode('utf-8')
+        pending.append(line)
+        pending_bytes += len(line)
+        if pending_bytes >= _GZIP_BLOCK_BYTES:
+            return _drain()
+        return b''
+
+    def _drain():
+        nonlocal pending_bytes
+        out = compressor.compress(b''.join(pending))
+        pending.clear()
+        pending_bytes = 0
+        return out
+
+    names = list_tables(engine)
+    if tables:
+        wanted = set(tables)
+        names = [t for t in names if t in wanted]
+    preparer = engine.dialect.identifier_preparer
+    total_rows, failed = 0, []
+
+    with engine.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn = conn.execution_options(isolation_level='REPEATABLE READ')
+        with conn.begin():
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text("SET TRANSACTION READ ONLY"))
+            chunk = _emit({'meta': {
+                'format': FORMAT,
+                'generated_at': datetime.utcnow().isoformat() + 'Z',
+                'dialect': conn.dialect.name,
+                'tables': names,
+            }})
+            if chunk:
+                yield chunk
+            insp = inspect(conn)
+            for t in names:
+                columns = [c['name'] for c in insp.get_columns(t) if not c.get('computed')]
+                rows = 0
+                chunk = _emit({'table': t, 'columns': columns})
+                if chunk:
+                    yield chunk
+                try:
+                    with conn.begin_nested():
+                        cols_sql = ', '.join(preparer.quote(c) for c in columns)
+                        result = conn.execute(
+                            text(f"SELECT {cols_sql} FROM {preparer.quote(t)}"),
+                            execution_options={'stream_results': True, 'yield_per': DUMP_CHUNK_ROWS})
+                        for part in result.partitions(DUMP_CHUNK_ROWS):
+                            for r in part:
+                                chunk = _emit([_encode(v) for v in r])
+                                if chunk:
+                                    yield chunk
+                            rows += len(part)
+                    chunk = _emit({'end': t, 'rows': rows})
+                except Exception as e:
+                    logger.warning(f"backup: tabla {t} fallo: {e}")
+                    failed.append(t)
+                    chunk = _emit({'end': t, 'rows': rows, 'error': str(e)[:500]})
+                if chunk:
+                    yield chunk
+                total_rows += rows
+                if progress:
+                    progress(t, rows)
+    _emit({'summary': {'total_rows': total_rows, 'tables': len(names), 'failed_tables': failed}})
+    yield _drain() + compressor.flush()
+
+
+# ── Restauracion ─────────────────────────────────────────────────────────
+
+def _converter(col_type):
+    """Convierte el valor JSON al tipo de la columna destino (o None)."""
+    if isinstance(col_type, sqltypes.DateTime):
+        return datetime.fromisoformat
+    if isinstance(col_type, sqltypes.Date):
+        return lambda v: date.fromisoformat(v[:10])
+    if isinstance(col_type, sqltypes.Time):
+        return time.fromisoformat
+    return None
+
+
+def _decode(value, convert):
+    if isinstance(value, dict) and set(value) == {'$b64'}:
+        return base64.b64decode(value['$b64'])
+    if convert is not None and isinstance(value, str):
+        return convert(value)
+    return value
+
+
+class _TableLoader:
+    """Inserta una tabla en lotes dentro de su propia transaccion, o en la
+    transaccion de `conn` si se pasa (restauracion con wipe)."""
+
+    def __init__(self, engine, name, columns, on_batch=None, conn=None):
+        self.name = name
+        self.rows = 0
+        self.error = None
+        self.on_batch = on_batch
+        self.batch = []
+        self.owns_conn = conn is None
+        self.conn = engine.connect() if conn is None else conn
+        self.trans = self.conn.begin() if conn is None else None
+        table = Table(name, MetaData(), autoload_with=self.conn)
+        insertable = {c.name: c for c in table.columns if c.computed is None}
+        self.columns = list(columns)
+        self.ignored = [c for c in self.columns if c not in insertable]
+        self.converters = {c: _converter(insertable[c].type) for c in self.columns if c in insertable}
+        self.table = table
+        self.stmt = self._insert(table)
+
+    def _insert(self, table):
+        dialect = self.conn.dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return table.insert()
+        return insert(table).on_conflict_do_nothing()
+
+    def add(self, row):
+        if self.error is not None:
+            return
+        if isinstance(row, list):
+            row = dict(zip(self.columns, row))
+        self.batch.append({k: _decode(v, self.converters[k]) for k, v in row.items()
+                           if k in self.converters})
+        if len(self.batch) >= RESTORE_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self.batch or self.error is not None:
+            return
+        try:
+            self.conn.execute(self.stmt, self.batch)
+            self.rows += len(self.batch)
+        except Exception as e:
+            self.error = str(e).splitlines()[0][:500]
+            if self.trans is not None:
+                self.trans.rollback()
+        self.batch = []
+        if self.on_batch and self.error is None:
+            self.on_batch(self.name, self.rows)
+
+    def finish(self):
+        """Commit (o rollback si fallo un lote). Devuelve el resultado.
+
+        Con conexion compartida no confirma nada: eso lo decide restore_dump."""
+        try:
+            self._flush()
+            if self.error is not None:
+                if self.trans is not None and self.trans.is_active:
+                    self.trans.rollback()
+            else:
+                if self.conn.dialect.name == 'postgresql' and 'id' in self.table.c:
+                    self._sync_sequence()
+                if self.trans is not None:
+                    self.trans.commit()
+        except Exception as e:
+            self.error = str(e).splitlines()[0][:500]
+            if self.trans is not None and self.trans.is_active:
+                self.trans.rollback()
+        finally:
+            if self.owns_conn:
+                self.conn.close()
+        out = {'rows': self.rows if self.error is None else 0}
+        if self.ignored:
+            out['ignored_columns'] = self.ignored
+        if self.error is not None:
+            out['error'] = self.error
+        return out
+
+    def _sync_sequence(self):
+        # Las filas entran con id explicito: la secuencia quedaria atras
+        quoted = self.conn.dialect.identifier_preparer.quote(self.name)
+        self.conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence(:t, 'id'), GREATEST(MAX(id), 1)) FROM {quoted}"),
+            {'t': quoted})
+
+
+class RestoreAborted(Exception):
+    """Fallo una tabla en una restauracion con wipe: se revierte todo."""
+
+
+def _wipe(conn, tables):
+    """Vacia las tablas (hijos primero) en la transaccion abierta de conn."""
+    preparer = conn.dialect.identifier_preparer
+    for t in reversed(tables):
+        conn.execute(text(f"DELETE FROM {preparer.quote(t)}"))
+
+
+def _legacy_tables(head):
+    """Dump json.gz/v1: {'meta', 'data': {tabla: [dicts]}} ya cargado."""
+    for t, rows in (head.get('data') or {}).items():
+        if not isinstance(rows, list):
+            yield t, None, 'no es lista'
+            continue
+        yield t, [r for r in rows if isinstance(r, dict)], None
+
+
+def restore_dump(engine, fileobj, wipe=False, progress=None):
+    """Restaura un dump (v2 en streaming, o v1) desde un archivo binario gzip.
+
+    progress(dict) recibe {table, tables_done, tables_total, rows} al
+    terminar cada lote y cada tabla. Devuelve {format, wipe, tables, total_rows}.
+
+    Con wipe todo corre en una transaccion: si una tabla falla se revierte
+    el vaciado y lo ya cargado, y el resultado trae `aborted` (sin filas).
+    """
+    lines = io.TextIOWrapper(gzip.GzipFile(fileobj=fileobj), encoding='utf-8')
+    head = json.loads(lines.readline() or '{}')
+    existing = set(list_tables(engine))
+    results, state = {}, {'done': 0, 'rows': 0}
+    meta = head.get('meta') or {}
+    legacy = 'data' in head
+    names = list((head.get('data') or {}).keys()) if legacy else list(meta.get('tables') or [])
+    if not legacy and meta.get('format') != FORMAT:
+        raise ValueError("Formato de dump desconocido")
+
+    def _report(table, rows_in_table):
+        if progress:
+            progress({'table': table, 'tables_done': state['done'], 'tables_total': len(names),
+                      'rows': state['rows'] + rows_in_table})
+
+    def _open(t, columns):
+        if t in CONTROL_TABLES:
+            # Dumps previos a la exclusion: se ignoran
+            results[t] = {'skipped': 'tabla de control, no se restaura', 'rows': 0}
+            return None
+        if t not in existing:
+            results[t] = {'skipped': 'tabla no existe en BD destino', 'rows': 0}
+            return None
+        return _TableLoader(engine, t, columns, on_batch=_report, conn=shared)
+
+    def _close(t, loader):
+        if loader is not None:
+            results[t] = loader.finish()
+            state['rows'] += results[t]['rows']
+            if shared is not None and 'error' in results[t]:
+                raise RestoreAborted(f"{t}: {results[t]['error']}")
+        state['done'] += 1
+        _report(t, 0)
+
+    shared = engine.connect() if wipe else None
+    outer = shared.begin() if wipe else None
+    try:
+        if wipe:
+            _wipe(shared, [t for t in list_tables(engine) if t in set(names)])
+        _load(head, lines, legacy, results, _open, _close, state)
+    except RestoreAborted as e:
+        outer.rollback()
+        logger.warning(f"restore con wipe revertido: {e}")
+        return {'format': 'json.gz/v1' if legacy else FORMAT, 'wipe': wipe,
+                'tables': results, 'total_rows': 0, 'aborted': str(e)}
+    except Exception:
+        if outer is not None:
+            outer.rollback()
+        raise
+    else:
+        if outer is not None:
+            outer.commit()
+    finally:
+        if shared is not None:
+            shared.close()
+
+    return {'format': 'json.gz/v1' if legacy else FORMAT, 'wipe': wipe,
+            'tables': results, 'total_rows': state['rows']}
+
+
+def _load(head, lines, legacy, results, open_table, close_table, state):
+    """Recorre el dump (v1 ya cargado o v2 linea a linea) tabla por tabla."""
+    if legacy:
+        for t, rows, skipped in _legacy_tables(head):
+            if skipped:
+                results[t] = {'skipped': skipped, 'rows': 0}
+                state['done'] += 1
+                continue
+            columns = list(dict.fromkeys(k for r in rows for k in r))
+            loader = open_table(t, columns)
+            for r in rows if loader else ():
+                loader.add(r)
+            close_table(t, loader)
+    else:
+        loader, current = None, None
+        for line in lines:
+            if not line.strip():
+                continue
+            obj = json.loads(line)
+            if isinstance(obj, list):
+                if loader is not None:
+                    loader.add(obj)
+            elif 'table' in obj:
+                current = obj['table']
+                loader = open_table(current, obj.get('columns') or [])
+            elif 'end' in obj:
+                if obj.get('error') and loader is not None:
+                    loader.error = f"dump incompleto: {obj['error']}"
+                close_table(current, loader)
+                loader, current = None, None
+        if loader is not None:
+            # Archivo cortado a mitad de una tabla: se descarta esa tabla
+            loader.error = 'dump truncado'
+            close_table(current, loader)
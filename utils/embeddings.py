@@ -2,17 +2,38 @@
 
 Funciones principales:
   - generate_embedding(text): llama a OpenAI y devuelve list[float] de 1536 dim
+  - generate_embeddings(texts): idem en lote (varios textos por request)
   - upsert_embedding(entity_type, entity_id, text, metadata=None): inserta/actualiza
+  - upsert_embeddings(items): idem en lote, salteando textos sin cambios
   - semantic_search(query_text, top_k=5, entity_types=None): busca casos similares
 
+Cada fila guarda `content_hash` (sha256 de modelo + texto): si el texto que
+arman build_*_text no cambio, el re-indexado no vuelve a llamar a OpenAI.
+El mismo hash es la clave de `embedding_cache`: antes de cada llamada a
+OpenAI se busca el vector en memoria (LRU del proceso) y en esa tabla, asi
+la misma pregunta del bot o la misma falla del RCA no se vuelve a pagar.
+
+Busqueda: en PostgreSQL con pgvector, indice HNSW (migracion 15) sobre
+bot_embeddings. Sin pgvector (SQLite, despliegues offline) los vectores
+van a `bot_embeddings_local` y la busqueda es fuerza bruta con numpy sobre
+una matriz que se recarga solo cuando la tabla cambia.
+
 Costos: text-embedding-3-small ~ $0.02 por millon de tokens (muy barato).
 Un OT cerrado tipico = ~80 tokens = $0.0000016 cada uno.
 """
 import os
 import re
 import json
+import hashlib
 import logging
-import requests
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select, text as sql_text
+
+from utils import http_client
 
 _URL_RE = re.compile(r'https?://[^\s)\]}<>"\'`,]+', re.IGNORECASE)
 
@@ -39,34 +60,202 @@ EMBED_MODEL = 'text-embedding-3-small'  # 1536 dim, barato y bueno
 EMBED_DIM = 1536
 
 
-def generate_embedding(text):
-    """Genera el embedding de un texto. Devuelve list[float] o None si falla."""
-    if not OPENAI_API_KEY:
-        logger.warning("OPENAI_API_KEY no esta seteada — embedding deshabilitado")
-        return None
-    if not text or not text.strip():
+# Limites por request de embeddings (OpenAI: 2048 inputs y ~300K tokens).
+# Con ~4 caracteres por token quedamos muy por debajo.
+EMBED_BATCH_MAX_ITEMS = 128
+EMBED_BATCH_MAX_CHARS = 200_000
+MAX_TEXT_CHARS = 8000  # safety: limitar tokens por texto
+
+# Cache de vectores: LRU en memoria + tabla embedding_cache
+EMBED_CACHE_MEMORY = 512
+EMBED_CACHE_DAYS = 180
+# ef_search de HNSW: mas alto cuando se filtra por entity_type (el filtro
+# se aplica despues del recorrido del indice)
+HNSW_EF_SEARCH = 40
+HNSW_EF_SEARCH_FILTERED = 100
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+_backends = {}  # engine -> 'pgvector' | 'numpy'
+_local_index = {'sig': None}
+_local_lock = threading.Lock()
+
+
+def _clip(text):
+    return (text or '')[:MAX_TEXT_CHARS]
+
+
+def content_hash(text):
+    """Hash del texto a indexar (incluye el modelo: cambiarlo re-indexa todo)."""
+    return hashlib.sha256(f"{EMBED_MODEL}\n{_clip(text)}".encode('utf-8')).hexdigest()
+
+
+def _iter_batches(texts):
+    """Parte `texts` en lotes de (offset, [textos]) dentro de los limites."""
+    start, chars = 0, 0
+    for i, t in enumerate(texts):
+        n = len(t)
+        if i > start and (i - start >= EMBED_BATCH_MAX_ITEMS or chars + n > EMBED_BATCH_MAX_CHARS):
+            yield start, texts[start:i]
+            start, chars = i, 0
+        chars += n
+    if start < len(texts):
+        yield start, texts[start:]
+
+
+def _pack(vec):
+    return np.asarray(vec, dtype='<f4').tobytes()
+
+
+def _unpack(blob):
+    return np.frombuffer(blob, dtype='<f4').tolist()
+
+
+def _cache_engine():
+    """Engine de la app si hay contexto (scripts sin app: solo memoria)."""
+    from flask import has_app_context
+    if not has_app_context():
         return None
+    from database import db
+    return db.engine
+
+
+def _remember(vectors):
+    with _memory_lock:
+        for h, vec in vectors.items():
+            _memory_cache[h] = vec
+            _memory_cache.move_to_end(h)
+        while len(_memory_cache) > EMBED_CACHE_MEMORY:
+            _memory_cache.popitem(last=False)
+
+
+def _cache_lookup(hashes):
+    """{hash: vector} de los que ya estan en memoria o en embedding_cache."""
+    found = {}
+    with _memory_lock:
+        for h in hashes:
+            if h in _memory_cache:
+                _memory_cache.move_to_end(h)
+                found[h] = _memory_cache[h]
+    missing = [h for h in hashes if h not in found]
+    engine = _cache_engine() if missing else None
+    if engine is None:
+        return found
+    try:
+        from models import EmbeddingCache
+        t = EmbeddingCache.__table__
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            rows = conn.execute(select(t.c.content_hash, t.c.embedding, t.c.used_at)
+                                .where(t.c.content_hash.in_(missing))).fetchall()
+            # used_at se refresca como mucho una vez por dia (lo usa la purga)
+            stale = [r[0] for r in rows if r[2] is None or r[2] < now - timedelta(days=1)]
+            if stale:
+                conn.execute(t.update().where(t.c.content_hash.in_(stale)).values(used_at=now))
+        loaded = {h: _unpack(blob) for h, blob, _ in rows}
+        _remember(loaded)
+        found.update(loaded)
+    except Exception as e:
+        logger.warning(f"embedding_cache lookup error: {e}")
+    return found
+
+
+def _cache_store(vectors):
+    """Guarda los vectores nuevos (otro worker pudo guardarlos antes)."""
+    _remember(vectors)
+    engine = _cache_engine()
+    if engine is None or not vectors:
+        return
     try:
-        r = requests.post(
-            OPENAI_EMBED_URL,
-            headers={
-                'Authorization': f'Bearer {OPENAI_API_KEY}',
-                'Content-Type': 'application/json',
-            },
-            json={
-                'model': EMBED_MODEL,
-                'input': text[:8000],  # safety: limitar tokens
-            },
-            timeout=30,
-        )
-        if r.status_code != 200:
-            logger.warning(f"OpenAI embeddings error {r.status_code}: {r.text[:200]}")
-            return None
-        data = r.json()
-        return data['data'][0]['embedding']
+        from models import EmbeddingCache
+        t = EmbeddingCache.__table__
+        now = datetime.utcnow()
+        rows = [{'content_hash': h, 'embedding': _pack(v), 'created_at': now, 'used_at': now}
+                for h, v in vectors.items()]
+        if engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif engine.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            insert = None
+        with engine.begin() as conn:
+            if insert is not None:
+                conn.execute(insert(t).on_conflict_do_nothing(), rows)
+            else:
+                conn.execute(t.delete().where(t.c.content_hash.in_(list(vectors))))
+                conn.execute(t.insert(), rows)
     except Exception as e:
-        logger.warning(f"generate_embedding error: {e}")
+        logger.warning(f"embedding_cache store error: {e}")
+
+
+def prune_embedding_cache(db, days=EMBED_CACHE_DAYS):
+    """Borra los vectores cacheados sin uso hace mas de `days` dias."""
+    from models import EmbeddingCache
+    t = EmbeddingCache.__table__
+    res = db.session.execute(t.delete().where(t.c.used_at < datetime.utcnow() - timedelta(days=days)))
+    db.session.commit()
+    return res.rowcount or 0
+
+
+def generate_embeddings(texts, use_cache=True):
+    """Embeddings de varios textos, pocos requests a OpenAI.
+
+    Devuelve una lista alineada con `texts`: list[float] o None (texto vacio
+    o lote que fallo). Los textos ya embebidos (mismo content_hash) salen del
+    cache sin llamar a OpenAI; los repetidos dentro de `texts` se piden una
+    sola vez.
+    """
+    out = [None] * len(texts)
+    idx = [i for i, t in enumerate(texts) if t and t.strip()]
+    if not idx:
+        return out
+    hashes = {i: content_hash(texts[i]) for i in idx}
+    cached = _cache_lookup(set(hashes.values())) if use_cache else {}
+    pending = {}  # hash -> texto recortado, en orden de aparicion
+    for i in idx:
+        if hashes[i] in cached:
+            out[i] = cached[hashes[i]]
+        else:
+            pending.setdefault(hashes[i], _clip(texts[i]))
+    if not pending:
+        return out
+    if not OPENAI_API_KEY:
+        logger.warning("OPENAI_API_KEY no esta seteada — embedding deshabilitado")
+        return out
+    keys = list(pending)
+    fetched = {}
+    for offset, batch in _iter_batches(list(pending.values())):
+        try:
+            r = http_client.post(
+                'openai', OPENAI_EMBED_URL,
+                headers={
+                    'Authorization': f'Bearer {OPENAI_API_KEY}',
+                    'Content-Type': 'application/json',
+                },
+                json={'model': EMBED_MODEL, 'input': batch},
+                # Solo calcula vectores: repetir el POST es seguro
+                idempotent=True,
+            )
+            if r.status_code != 200:
+                logger.warning(f"OpenAI embeddings error {r.status_code}: {r.text[:200]}")
+                continue
+            for item in r.json()['data']:
+                fetched[keys[offset + item['index']]] = item['embedding']
+        except Exception as e:
+            logger.warning(f"generate_embeddings error: {e}")
+    if fetched:
+        _cache_store(fetched)
+    for i in idx:
+        if out[i] is None:
+            out[i] = fetched.get(hashes[i])
+    return out
+
+
+def generate_embedding(text):
+    """Genera el embedding de un texto. Devuelve list[float] o None si falla."""
+    if not text or not text.strip():
         return None
+    return generate_embeddings([text])[0]
 
 
 def _vec_literal(vec):
@@ -74,33 +263,248 @@ def _vec_literal(vec):
     return '[' + ','.join(repr(float(x)) for x in vec) + ']'
 
 
+def vector_backend(db_session):
+    """'pgvector' si la BD tiene la extension y bot_embeddings; si no 'numpy'
+    (bot_embeddings_local + fuerza bruta en el proceso). Se resuelve una vez
+    por engine."""
+    try:
+        bind = db_session if hasattr(db_session, 'dialect') else db_session.get_bind()
+    except Exception:
+        # Sesion sin bind conocido: comportamiento historico (PostgreSQL)
+        return 'pgvector'
+    engine = getattr(bind, 'engine', bind)
+    if engine in _backends:
+        return _backends[engine]
+    backend = 'numpy'
+    if engine.dialect.name == 'postgresql':
+        try:
+            with engine.connect() as conn:
+                ok = conn.execute(sql_text(
+                    "SELECT to_regclass('bot_embeddings') IS NOT NULL "
+                    "AND EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'vector')")).scalar()
+            backend = 'pgvector' if ok else 'numpy'
+        except Exception as e:
+            logger.warning(f"vector_backend: no se pudo detectar pgvector ({e})")
+    if backend == 'numpy':
+        from models import LocalEmbedding
+        LocalEmbedding.__table__.create(engine, checkfirst=True)
+    _backends[engine] = backend
+    return backend
+
+
+def _existing_hashes(db_session, keys):
+    """{(entity_type, entity_id): content_hash} de las filas ya indexadas."""
+    by_type = {}
+    for et, eid in keys:
+        by_type.setdefault(et, []).append(eid)
+    local = vector_backend(db_session) == 'numpy'
+    if local:
+        from models import LocalEmbedding
+        t = LocalEmbedding.__table__
+    found = {}
+    for et, ids in by_type.items():
+        if local:
+            rows = db_session.execute(select(t.c.entity_id, t.c.content_hash)
+                                      .where(t.c.entity_type == et, t.c.entity_id.in_(ids))).fetchall()
+        else:
+            rows = db_session.execute(sql_text(
+                "SELECT entity_id, content_hash FROM bot_embeddings "
+                "WHERE entity_type = :et AND entity_id = ANY(:ids)"
+            ), {"et": et, "ids": ids}).fetchall()
+        found.update({(et, r[0]): r[1] for r in rows})
+    return found
+
+
+def _upsert_local(db_session, rows):
+    """Escribe en bot_embeddings_local (borrar + insertar: portable)."""
+    from models import LocalEmbedding
+    t = LocalEmbedding.__table__
+    by_type = {}
+    for r in rows:
+        by_type.setdefault(r['entity_type'], []).append(r['entity_id'])
+    for et, ids in by_type.items():
+        db_session.execute(t.delete().where(t.c.entity_type == et, t.c.entity_id.in_(ids)))
+    db_session.execute(t.insert(), rows)
+
+
+def upsert_embeddings(db_session, items, force=False):
+    """Inserta/actualiza embeddings en lote.
+
+    items: iterable de (entity_type, entity_id, text, metadata).
+    Saltea las entidades cuyo content_hash no cambio (salvo `force`), pide
+    los embeddings en lotes y escribe con un solo INSERT ... ON CONFLICT
+    multi-fila. No hace commit. db_session puede ser una Session o una
+    Connection de SQLAlchemy. La escritura va en un SAVEPOINT: si falla se
+    cuenta como `failed` y la transaccion del llamador sigue usable.
+
+    Devuelve {'total', 'skipped', 'embedded', 'failed'}.
+    """
+    # Ultima version por entidad: ON CONFLICT no admite la misma fila dos veces
+    pending = {}
+    for et, eid, txt, meta in items:
+        if txt and et and eid is not None:
+            pending[(et, eid)] = (txt, meta)
+    stats = {'total': len(pending), 'skipped': 0, 'embedded': 0, 'failed': 0}
+    if not pending:
+        return stats
+
+    hashes = {key: content_hash(txt) for key, (txt, _) in pending.items()}
+    if not force:
+        try:
+            # SAVEPOINT: si falla (p.ej. falta content_hash) no aborta la transaccion
+            with db_session.begin_nested():
+                existing = _existing_hashes(db_session, list(pending))
+        except Exception as e:
+            logger.warning(f"upsert_embeddings: no se pudieron leer hashes ({e})")
+            existing = {}
+        for key in [k for k in pending if existing.get(k) == hashes[k]]:
+            del pending[key]
+            stats['skipped'] += 1
+    if not pending:
+        return stats
+
+    keys = list(pending)
+    vectors = generate_embeddings([pending[k][0] for k in keys], use_cache=not force)
+    if vector_backend(db_session) == 'numpy':
+        now = datetime.utcnow()
+        rows = [{'entity_type': key[0], 'entity_id': key[1], 'text_chunk': _clip(pending[key][0]),
+                 'embedding': _pack(vec), 'metadata_json': json.dumps(pending[key][1] or {}),
+                 'content_hash': hashes[key], 'created_at': now, 'updated_at': now}
+                for key, vec in zip(keys, vectors) if vec is not None]
+        stats['failed'] += len(keys) - len(rows)
+        if rows:
+            try:
+                with db_session.begin_nested():
+                    _upsert_local(db_session, rows)
+                stats['embedded'] += len(rows)
+            except Exception as e:
+                logger.warning(f"upsert_embeddings error: {e}")
+                stats['failed'] += len(rows)
+        return stats
+    values, params = [], {}
+    for n, (key, vec) in enumerate(zip(keys, vectors)):
+        if vec is None:
+            stats['failed'] += 1
+            continue
+        txt, meta = pending[key]
+        values.append(f"(:et{n}, :eid{n}, :txt{n}, CAST(:vec{n} AS vector), "
+                      f"CAST(:meta{n} AS jsonb), :h{n}, NOW(), NOW())")
+        params.update({
+            f"et{n}": key[0], f"eid{n}": key[1], f"txt{n}": _clip(txt),
+            f"vec{n}": _vec_literal(vec), f"meta{n}": json.dumps(meta or {}),
+            f"h{n}": hashes[key],
+        })
+    if not values:
+        return stats
+    try:
+        # SAVEPOINT: en PostgreSQL un error aborta la transaccion del llamador
+        with db_session.begin_nested():
+            db_session.execute(sql_text(f"""
+                INSERT INTO bot_embeddings (entity_type, entity_id, text_chunk, embedding, metadata,
+                                            content_hash, created_at, updated_at)
+                VALUES {', '.join(values)}
+                ON CONFLICT (entity_type, entity_id) DO UPDATE
+                  SET text_chunk   = EXCLUDED.text_chunk,
+                      embedding    = EXCLUDED.embedding,
+                      metadata     = EXCLUDED.metadata,
+                      content_hash = EXCLUDED.content_hash,
+                      updated_at   = NOW()
+            """), params)
+        stats['embedded'] += len(values)
+    except Exception as e:
+        logger.warning(f"upsert_embeddings error: {e}")
+        stats['failed'] += len(values)
+    return stats
+
+
 def upsert_embedding(db_session, entity_type, entity_id, text, metadata=None):
-    """Inserta o actualiza el embedding para una entidad. Devuelve True/False.
+    """Inserta o actualiza el embedding para una entidad. Devuelve True/False
+    (True tambien si el texto no cambio y no hizo falta re-indexar).
 
     db_session: la sesion SQLAlchemy ya activa.
     """
     if not text or not entity_type or entity_id is None:
         return False
-    vec = generate_embedding(text)
-    if vec is None:
-        return False
-    vec_lit = _vec_literal(vec)
-    meta_json = json.dumps(metadata or {})
+    stats = upsert_embeddings(db_session, [(entity_type, entity_id, text, metadata)])
+    return stats['failed'] == 0
+
+
+def load_progress(path):
+    """Checkpoint de un re-indexado: {entity_type: ultimo_id_confirmado}."""
     try:
-        from sqlalchemy import text as sql_text
-        db_session.execute(sql_text("""
-            INSERT INTO bot_embeddings (entity_type, entity_id, text_chunk, embedding, metadata, created_at, updated_at)
-            VALUES (:et, :eid, :txt, CAST(:vec AS vector), CAST(:meta AS jsonb), NOW(), NOW())
-            ON CONFLICT (entity_type, entity_id) DO UPDATE
-              SET text_chunk = EXCLUDED.text_chunk,
-                  embedding  = EXCLUDED.embedding,
-                  metadata   = EXCLUDED.metadata,
-                  updated_at = NOW()
-        """), {"et": entity_type, "eid": entity_id, "txt": text[:8000], "vec": vec_lit, "meta": meta_json})
-        return True
-    except Exception as e:
-        logger.warning(f"upsert_embedding error: {e}")
-        return False
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_progress(path, state):
+    """Guarda el checkpoint de forma atomica (un corte no lo deja a medias)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _load_local_index(db_session):
+    """Matriz normalizada de bot_embeddings_local, recargada solo si la tabla
+    cambio (firma: cantidad, ultimo updated_at y ultimo id)."""
+    from models import LocalEmbedding
+    t = LocalEmbedding.__table__
+    sig = tuple(db_session.execute(select(func.count(), func.max(t.c.updated_at), func.max(t.c.id))).first())
+    with _local_lock:
+        if _local_index['sig'] == sig:
+            return _local_index
+    rows = db_session.execute(select(t.c.entity_type, t.c.entity_id, t.c.text_chunk,
+                                     t.c.metadata_json, t.c.embedding)).fetchall()
+    vecs = [np.frombuffer(r[4], dtype='<f4') for r in rows]
+    # Un solo largo de vector (el del modelo vigente)
+    dim = Counter(len(v) for v in vecs).most_common(1)[0][0] if vecs else 0
+    keep = [i for i, v in enumerate(vecs) if len(v) == dim]
+    matrix = np.vstack([vecs[i] for i in keep]) if keep else np.zeros((0, dim), dtype='<f4')
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    index = {
+        'sig': sig, 'matrix': matrix,
+        'types': np.array([rows[i][0] for i in keep], dtype=object),
+        'rows': [rows[i][:4] for i in keep],
+    }
+    with _local_lock:
+        _local_index.clear()
+        _local_index.update(index)
+    return index
+
+
+def _local_search(db_session, vec, top_k, entity_types):
+    index = _load_local_index(db_session)
+    matrix = index['matrix']
+    q = np.asarray(vec, dtype='<f4')
+    if not len(matrix) or matrix.shape[1] != len(q):
+        return []
+    q = q / (np.linalg.norm(q) or 1)
+    sims = matrix @ q
+    if entity_types:
+        sims = np.where(np.isin(index['types'], list(entity_types)), sims, -np.inf)
+    k = min(top_k, int(np.isfinite(sims).sum()))
+    if k <= 0:
+        return []
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top])]
+    results = []
+    for i in top:
+        et, eid, chunk, meta = index['rows'][i]
+        try:
+            meta = json.loads(meta) if meta else {}
+        except ValueError:
+            meta = {}
+        results.append({
+            'entity_type': et,
+            'entity_id': eid,
+            'text_chunk': chunk,
+            'metadata': meta if isinstance(meta, dict) else {},
+            'similarity': float(sims[i]),
+        })
+    return results
 
 
 def semantic_search(db_session, query_text, top_k=5, entity_types=None):
@@ -114,15 +518,21 @@ def semantic_search(db_session, query_text, top_k=5, entity_types=None):
     vec = generate_embedding(query_text)
     if vec is None:
         return []
-    vec_lit = _vec_literal(vec)
     try:
-        from sqlalchemy import text as sql_text
+        if vector_backend(db_session) == 'numpy':
+            return _local_search(db_session, vec, top_k, entity_types)
+        vec_lit = _vec_literal(vec)
         if entity_types:
             type_filter = "AND entity_type = ANY(:types)"
             params = {"vec": vec_lit, "k": top_k, "types": list(entity_types)}
+            ef_search = HNSW_EF_SEARCH_FILTERED
         else:
             type_filter = ""
             params = {"vec": vec_lit, "k": top_k}
+            ef_search = HNSW_EF_SEARCH
+        # Solo para esta transaccion (is_local = true)
+        db_session.execute(sql_text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+                           {"ef": str(max(ef_search, top_k))})
         sql = f"""
             SELECT entity_type, entity_id, text_chunk, metadata,
                    1 - (embedding <=> CAST(:vec AS vector)) AS similarity
@@ -151,9 +561,9 @@ def semantic_search(db_session, query_text, top_k=5, entity_types=None):
 def delete_embedding(db_session, entity_type, entity_id):
     """Elimina el embedding de una entidad (cuando se borra del sistema)."""
     try:
-        from sqlalchemy import text as sql_text
+        table = 'bot_embeddings_local' if vector_backend(db_session) == 'numpy' else 'bot_embeddings'
         db_session.execute(sql_text(
-            "DELETE FROM bot_embeddings WHERE entity_type = :et AND entity_id = :eid"
+            f"DELETE FROM {table} WHERE entity_type = :et AND entity_id = :eid"
         ), {"et": entity_type, "eid": entity_id})
         return True
     except Exception as e:
@@ -0,0 +1,185 @@
+"""Exportaciones Excel en streaming (memoria constante).
+
+Antes cada export armaba una lista con todas las filas, un DataFrame de
+pandas y el libro completo en memoria (openpyxl normal guarda cada celda
+como objeto) dentro de un BytesIO: el Excel master de Power BI llevaba a un
+worker de gunicorn cerca de su limite. Aca:
+
+  - `new_workbook()`: libro openpyxl `write_only`; cada hoja se escribe fila
+    a fila y openpyxl la vuelca a disco al vuelo.
+  - `write_sheet(wb, titulo, filas, ...)`: consume un iterable (generador
+    sobre un cursor con yield_per, normalmente) de dicts o secuencias. Solo
+    se retienen las primeras AUTO_WIDTH_SAMPLE filas para calcular anchos
+    de columna (en write_only los anchos van antes de la primera fila).
+  - `send_workbook(wb, nombre)`: guarda el libro en un archivo temporal y
+    lo envia por bloques (sin Content-Length: transferencia chunked). El
+    archivo se borra al cerrar la respuesta.
+
+Limitaciones de write_only: no hay celdas combinadas ni acceso aleatorio a
+celdas ya escritas; encabezados, estilos y formatos se fijan al agregar
+cada fila (`styled_row`).
+"""
+import tempfile
+from datetime import datetime
+
+from flask import Response
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+AUTO_WIDTH_SAMPLE = 200
+_SEND_CHUNK = 64 * 1024
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def new_workbook():
+    return Workbook(write_only=True)
+
+
+def _cell_value(value):
+    """Valor aceptado por openpyxl (lo que pandas convertia solo)."""
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub('', value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    if isinstance(value, (dict, list, tuple, set)):
+        return str(value)
+    return value
+
+
+def styled_row(ws, values, font=None, fill=None, alignment=None, number_formats=None):
+    """Lista de WriteOnlyCell con estilo comun; number_formats: {col (1-based): formato}
+    aplicado solo a valores numericos."""
+    cells = []
+    for col, val in enumerate(values, start=1):
+        cell = WriteOnlyCell(ws, value=_cell_value(val))
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        if alignment is not None:
+            cell.alignment = alignment
+        if number_formats and col in number_formats and isinstance(val, (int, float)) \
+                and not isinstance(val, bool):
+            cell.number_format = number_formats[col]
+        cells.append(cell)
+    return cells
+
+
+def _auto_widths(columns, sample, min_width=10, max_width=45):
+    widths = []
+    for idx, col in enumerate(columns):
+        longest = len(str(col))
+        for row in sample:
+            v = row[idx] if idx < len(row) else None
+            if v is not None:
+                longest = max(longest, len(str(v)))
+        widths.append(min(max_width, max(min_width, longest + 2)))
+    return widths
+
+
+def write_sheet(wb, title, rows, columns=None, empty_row=None, widths=None, auto_width=False,
+                header_style=None, number_formats=None, zebra_fill=None, freeze=None,
+                autofilter=False):
+    """Agrega una hoja y escribe `rows` en streaming. Devuelve la cantidad
+    de filas de datos escritas.
+
+    - rows: iterable de dicts (columnas = claves de la primera fila, si no
+      se pasan `columns`) o de secuencias (requieren `columns`).
+    - empty_row: dict o secuencia a escribir si no hubo filas (p.ej.
+      {'Info': 'Sin registros'}); reemplaza tambien al encabezado si es dict.
+    - header_style: dict con font/fill/alignment para el encabezado.
+    - widths: anchos fijos; auto_width: calculados con las primeras
+      AUTO_WIDTH_SAMPLE filas.
+    """
+    ws = wb.create_sheet(title[:31])
+    it = iter(rows)
+
+    # Muestra inicial: define columnas (filas dict) y anchos automaticos
+    sample = []
+    need_sample = auto_width or columns is None
+    for row in it:
+        sample.append(row)
+        if not need_sample or len(sample) >= AUTO_WIDTH_SAMPLE:
+            break
+
+    if not sample and empty_row is not None:
+        if isinstance(empty_row, dict):
+            columns, sample = list(empty_row), [empty_row]
+        else:
+            sample = [empty_row]
+    if columns is None:
+        columns = list(sample[0]) if sample and isinstance(sample[0], dict) else []
+
+    def _values(row):
+        if isinstance(row, dict):
+            return [row.get(c) for c in columns]
+        return list(row)
+
+    sample_values = [_values(r) for r in sample]
+    if auto_width and columns:
+        widths = _auto_widths(columns, sample_values)
+    for idx, width in enumerate(widths or (), start=1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
+    if freeze:
+        ws.freeze_panes = freeze
+
+    if columns:
+        ws.append(styled_row(ws, columns, **(header_style or {})))
+
+    written = 0
+
+    def _append(values):
+        nonlocal written
+        fill = zebra_fill if zebra_fill is not None and written % 2 == 1 else None
+        if fill is not None or number_formats:
+            ws.append(styled_row(ws, values, fill=fill, number_formats=number_formats))
+        else:
+            ws.append([_cell_value(v) for v in values])
+        written += 1
+
+    for values in sample_values:
+        _append(values)
+    for row in it:
+        _append(_values(row))
+
+    if autofilter and columns and written:
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{written + 1}"
+    if sample and sample[0] is empty_row:
+        return 0
+    return written
+
+
+def spool_workbook(wb):
+    """Guarda el libro en un archivo temporal (se borra al cerrarlo) y lo
+    devuelve posicionado al inicio."""
+    tmp = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        wb.save(tmp)
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return tmp
+
+
+def send_workbook(wb, download_name):
+    """Respuesta Flask que envia el libro por bloques desde el temporal."""
+    tmp = spool_workbook(wb)
+
+    def generate():
+        try:
+            while True:
+                chunk = tmp.read(_SEND_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            tmp.close()
+
+    response = Response(generate(), mimetype=XLSX_MIMETYPE, direct_passthrough=True)
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    response.call_on_close(tmp.close)
+    return response
@@ -0,0 +1,198 @@
+"""Snapshot en memoria de la jerarquia de activos (Area > Linea > Equipo >
+Sistema > Componente), compartido por todos los reportes del proceso.
+
+Antes cada endpoint analitico releia las cinco tablas maestras y armaba sus
+propios `{a.id: a for a in Area.query.all()}` y resolvers OT -> area. Aca se
+arma una sola vez por worker:
+
+  - `areas`, `lines`, `equipments`, `systems`, `components`: {id: registro}
+    de solo lectura. Los registros son namedtuples con las columnas del
+    modelo (e.name, e.tag, e.line_id, e.capacity_tm...), asi reemplazan a
+    los objetos ORM en los maps sin tocar el codigo que los lee. No tienen
+    relaciones (e.line) ni metodos (to_dict), ni las columnas de registro
+    de _BOOKKEEPING_COLUMNS (updated_at, motivo/fecha de fuera de servicio).
+  - Cadenas de padres y resolvers O(1): `area_id_of_equipment`,
+    `resolve_area_id(area_id, line_id, equipment_id)`, `area_id_for(ot)`,
+    `resolve_equipment_id(...)`.
+  - Indices de hijos: `lines_by_area`, `equipments_by_line`,
+    `equipments_by_area`, `systems_by_equipment`, `components_by_system`.
+  - Flags de KPI: `kpi_area_ids`, `kpi_equipment_ids`.
+
+Invalidacion: `hierarchy_version` en app_settings. El evento before_flush
+(models.py) la cambia en la misma transaccion cuando se inserta o borra una
+fila de las cinco tablas por ORM, o cambia una columna que el snapshot
+guarda (rutas de datos maestros, importaciones, bulk-paste). Escribir solo
+columnas de registro no toca app_settings: no serializa escrituras
+concurrentes de equipos en esa fila ni obliga a recargar el snapshot. Las escrituras por SQL crudo llaman a
+`bump_hierarchy_version()`. Cada worker compara su snapshot con esa version
+una vez por request; el TTL queda solo como red para cambios hechos directo
+en la BD.
+"""
+import collections
+import threading
+import time
+import uuid
+from types import MappingProxyType
+
+from sqlalchemy import select
+
+HIERARCHY_VERSION_KEY = 'hierarchy_version'
+_SNAPSHOT_TTL = 600  # segundos
+# Columnas de registro: ningun lector del snapshot las usa
+_BOOKKEEPING_COLUMNS = frozenset({'updated_at', 'out_of_service_since', 'out_of_service_reason'})
+
+_lock = threading.Lock()
+_current = None
+_record_types = {}
+
+
+def _record_type(Model):
+    """namedtuple con las columnas mapeadas del modelo (una por modelo)."""
+    rt = _record_types.get(Model)
+    if rt is None:
+        from sqlalchemy import inspect as sa_inspect
+        keys = [a.key for a in sa_inspect(Model).column_attrs if a.key not in _BOOKKEEPING_COLUMNS]
+        rt = collections.namedtuple(f'{Model.__name__}Rec', keys)
+        _record_types[Model] = rt
+    return rt
+
+
+def _load(session, Model):
+    rt = _record_type(Model)
+    cols = [getattr(Model, k) for k in rt._fields]
+    rows = session.execute(select(*cols).order_by(Model.id)).all()
+    return {r.id: rt(*r) for r in rows}
+
+
+def _group(records, attr):
+    out = collections.defaultdict(list)
+    for r in records.values():
+        out[getattr(r, attr)].append(r.id)
+    return MappingProxyType({k: tuple(v) for k, v in out.items()})
+
+
+class HierarchySnapshot:
+    """Jerarquia inmutable en una version dada. Ver docstring del modulo."""
+
+    def __init__(self, version, areas, lines, equipments, systems, components):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.areas = MappingProxyType(areas)
+        self.lines = MappingProxyType(lines)
+        self.equipments = MappingProxyType(equipments)
+        self.systems = MappingProxyType(systems)
+        self.components = MappingProxyType(components)
+
+        line_area = {l.id: l.area_id for l in lines.values()}
+        self.equipment_area = MappingProxyType({
+            e.id: line_area.get(e.line_id) for e in equipments.values()
+        })
+        self.lines_by_area = _group(lines, 'area_id')
+        self.equipments_by_line = _group(equipments, 'line_id')
+        self.systems_by_equipment = _group(systems, 'equipment_id')
+        self.components_by_system = _group(components, 'system_id')
+        by_area = collections.defaultdict(list)
+        for eid, aid in self.equipment_area.items():
+            by_area[aid].append(eid)
+        self.equipments_by_area = MappingProxyType({k: tuple(v) for k, v in by_area.items()})
+
+        self.kpi_area_ids = frozenset(a.id for a in areas.values() if a.include_in_kpi)
+        self.kpi_equipment_ids = frozenset(e.id for e in equipments.values() if e.include_in_kpi)
+
+    # ── Resolvers ────────────────────────────────────────────────────────
+    def area_id_of_line(self, line_id):
+        ln = self.lines.get(line_id)
+        return ln.area_id if ln else None
+
+    def area_id_of_equipment(self, equipment_id):
+        return self.equipment_area.get(equipment_id)
+
+    def resolve_area_id(self, area_id=None, line_id=None, equipment_id=None):
+        """Area directa, o via linea, o via equipo -> linea."""
+        if area_id:
+            return area_id
+        if line_id and line_id in self.lines:
+            return self.lines[line_id].area_id
+        if equipment_id:
+            return self.equipment_area.get(equipment_id)
+        return None
+
+    def area_id_for(self, obj):
+        """resolve_area_id sobre un objeto con area_id/line_id/equipment_id (OT, aviso...)."""
+        return self.resolve_area_id(getattr(obj, 'area_id', None), getattr(obj, 'line_id', None),
+                                    getattr(obj, 'equipment_id', None))
+
+    def resolve_equipment_id(self, equipment_id=None, system_id=None, component_id=None):
+        """Equipo directo, o via sistema, o via componente -> sistema."""
+        if equipment_id:
+            return equipment_id
+        if system_id and system_id in self.systems:
+            return self.systems[system_id].equipment_id
+        if component_id and component_id in self.components:
+            sys_ = self.systems.get(self.components[component_id].system_id)
+            return sys_.equipment_id if sys_ else None
+        return None
+
+    def equipment_ids_in(self, area_id=None, line_id=None):
+        """Equipos de una linea, de un area, o todos."""
+        if line_id:
+            return self.equipments_by_line.get(line_id, ())
+        if area_id:
+            return self.equipments_by_area.get(area_id, ())
+        return tuple(self.equipments)
+
+
+def build_snapshot(session=None, version='0'):
+    from database import db
+    from models import Area, Line, Equipment, System, Component
+    session = session or db.session
+    return HierarchySnapshot(
+        version,
+        _load(session, Area), _load(session, Line), _load(session, Equipment),
+        _load(session, System), _load(session, Component),
+    )
+
+
+def get_hierarchy():
+    """Snapshot vigente; lo reconstruye si cambio la version o vencio el TTL."""
+    global _current
+    from utils.app_settings import get_version
+    version = get_version(HIERARCHY_VERSION_KEY)
+    snap = _current
+    if snap is not None and snap.version == version and time.monotonic() - snap.built_at < _SNAPSHOT_TTL:
+        return snap
+    with _lock:
+        snap = _current
+        if snap is None or snap.version != version or time.monotonic() - snap.built_at >= _SNAPSHOT_TTL:
+            snap = build_snapshot(version=version)
+            _current = snap
+    return snap
+
+
+def bump_hierarchy_version(session=None):
+    """Invalida los snapshots de todos los workers (en la sesion; el llamador
+    hace commit). Token unico: dos bumps concurrentes nunca dejan la misma
+    version para datos distintos."""
+    global _current
+    from utils.app_settings import set_version
+    _current = None
+    return set_version(HIERARCHY_VERSION_KEY, uuid.uuid4().hex, session=session)
+
+
+def _snapshot_fields_changed(obj):
+    """True si cambio alguna columna que el snapshot guarda."""
+    from sqlalchemy import inspect as sa_inspect
+    attrs = sa_inspect(obj).attrs
+    return any(attrs[k].history.has_changes() for k in _record_type(type(obj))._fields)
+
+
+def mark_hierarchy_changed(session, flush_context, instances):
+    """Listener before_flush: si el flush inserta o borra filas de la
+    jerarquia, o cambia columnas del snapshot, cambia la version en la misma
+    transaccion."""
+    from models import HIERARCHY_MODELS
+    touched = any(isinstance(o, HIERARCHY_MODELS) for o in session.new) or \
+        any(isinstance(o, HIERARCHY_MODELS) for o in session.deleted) or \
+        any(isinstance(o, HIERARCHY_MODELS) and _snapshot_fields_changed(o) for o in session.dirty)
+    if touched:
+        bump_hierarchy_version(session)
@@ -0,0 +1,259 @@
+"""Motor de importacion masiva de jerarquia (Area > Linea > Equipo > Sistema >
+Componente) para /api/upload-excel, /api/bulk-paste y /api/bulk-paste-hierarchy.
+
+Antes cada fila hacia hasta cinco `filter_by(...).first()` y cinco flush()
+(un round-trip por nivel y por fila: minutos para una planta de miles de
+componentes). Aca:
+
+  1. Se precargan las claves existentes de los cinco niveles: un SELECT
+     angosto por tabla. Cada nodo se identifica por su ruta de nombres,
+     p.ej. ('COCCION', 'LINEA 1', 'DIGESTOR 1') para un equipo.
+  2. Se resuelven todas las filas en memoria: nodos existentes, nodos a
+     crear (la primera fila que los menciona define sus datos) y relleno
+     de campos vacios (tag de equipo, descripcion/criticidad de componente).
+  3. Se escribe por nivel en orden de dependencias: un INSERT multi-fila
+     ... RETURNING por lote (el RETURNING trae (padre, nombre) para mapear
+     ids sin depender del orden) y un UPDATE executemany para los rellenos.
+
+`validate_only=True` corre solo los pasos 1 y 2: mismos `stats` y errores
+por fila, sin escribir nada. Los INSERT/UPDATE son Core (no pasan por el
+before_flush): se llama a `bump_hierarchy_version()` en la misma sesion.
+"""
+from sqlalchemy import bindparam, insert, select, update
+
+from utils.hierarchy import bump_hierarchy_version
+
+LEVELS = ('area', 'line', 'equipment', 'system', 'component')
+_LEVEL_LABELS = {
+    'area': 'area', 'line': 'linea', 'equipment': 'equipo',
+    'system': 'sistema', 'component': 'componente',
+}
+INSERT_CHUNK = 500
+
+
+def default_tag(equipment_name, line_name):
+    eq = "".join(ch for ch in (equipment_name or "").upper() if ch.isalnum())[:4] or "EQ"
+    ln = "".join(ch for ch in (line_name or "").upper() if ch.isalnum())[:4] or "LN"
+    return f"{eq}-{ln}"
+
+
+def _blank_tag(tag):
+    return not tag or tag.strip() in {"", "-"}
+
+
+def empty_stats(rows_received=0):
+    return {
+        "rows_received": rows_received,
+        "rows_processed": 0,
+        "created_areas": 0,
+        "created_lines": 0,
+        "created_equipments": 0,
+        "created_systems": 0,
+        "created_components": 0,
+        "updated_equipments": 0,
+        "updated_components": 0,
+        "skipped_existing": 0,
+    }
+
+
+class HierarchyImporter:
+    """Una importacion. `models`: dict nivel -> modelo. `create_parents`:
+    si False (bulk-paste por entidad) solo se crea el ultimo nivel de cada
+    fila y un padre inexistente es error de la fila."""
+
+    def __init__(self, session, models, create_parents=True):
+        self.session = session
+        self.models = models
+        self.create_parents = create_parents
+        # nivel -> {ruta: id} de lo que ya existe (con nombres repetidos gana
+        # el id mas bajo, como el .first() de antes)
+        self.ids = {lvl: {} for lvl in LEVELS}
+        # nivel -> {ruta: dict de columnas} a crear (orden de aparicion)
+        self.new = {lvl: {} for lvl in LEVELS}
+        # equipo/componente existente -> valores actuales y relleno pendiente
+        self.current = {'equipment': {}, 'component': {}}
+        self.updates = {'equipment': {}, 'component': {}}
+
+    # ── 1. Precarga ──────────────────────────────────────────────────────
+    def _preload(self):
+        m = self.models
+        ex = self.session.execute
+        paths = {aid: (name,) for aid, name in ex(
+            select(m['area'].id, m['area'].name).order_by(m['area'].id))}
+        self.ids['area'] = {p: i for i, p in reversed(paths.items())}
+
+        parent_paths, paths = paths, {}
+        for lid, name, aid in ex(select(m['line'].id, m['line'].name, m['line'].area_id)
+                                 .order_by(m['line'].id)):
+            if aid in parent_paths:
+                paths[lid] = parent_paths[aid] + (name,)
+        self.ids['line'] = {p: i for i, p in reversed(paths.items())}
+
+        parent_paths, paths = paths, {}
+        for eid, name, lid, tag in ex(select(m['equipment'].id, m['equipment'].name,
+                                             m['equipment'].line_id, m['equipment'].tag)
+                                      .order_by(m['equipment'].id)):
+            if lid in parent_paths:
+                paths[eid] = parent_paths[lid] + (name,)
+                self.current['equipment'][eid] = {'tag': tag}
+        self.ids['equipment'] = {p: i for i, p in reversed(paths.items())}
+
+        parent_paths, paths = paths, {}
+        for sid, name, eid in ex(select(m['system'].id, m['system'].name, m['system'].equipment_id)
+                                 .order_by(m['system'].id)):
+            if eid in parent_paths:
+                paths[sid] = parent_paths[eid] + (name,)
+        self.ids['system'] = {p: i for i, p in reversed(paths.items())}
+
+        parent_paths, paths = paths, {}
+        for cid, name, sid, desc, crit in ex(select(
+                m['component'].id, m['component'].name, m['component'].system_id,
+                m['component'].description, m['component'].criticality).order_by(m['component'].id)):
+            if sid in parent_paths:
+                paths[cid] = parent_paths[sid] + (name,)
+                self.current['component'][cid] = {'description': desc, 'criticality': crit}
+        self.ids['component'] = {p: i for i, p in reversed(paths.items())}
+
+    # ── 2. Resolucion en memoria ─────────────────────────────────────────
+    def _new_values(self, level, row):
+        if level == 'area':
+            return {'name': row['area'], 'description': row.get('area_description') or ''}
+        if level == 'line':
+            return {'name': row['line'], 'description': row.get('line_description') or ''}
+        if level == 'equipment':
+            return {'name': row['equipment'],
+                    'tag': row.get('equipment_tag') or default_tag(row['equipment'], row['line']),
+                    'description': row.get('equipment_description') or ''}
+        if level == 'system':
+            return {'name': row['system']}
+        return {'name': row['component'],
+                'description': row.get('component_description') or '',
+                'criticality': row.get('component_criticality') or 'Media'}
+
+    def _fill_equipment(self, path, row, stats):
+        tag = row.get('equipment_tag')
+        if not tag:
+            return
+        eid = self.ids['equipment'].get(path)
+        if eid is None:
+            return  # creado en esta importacion: su tag ya viene de la primera fila
+        cur = self.current['equipment'][eid]
+        if _blank_tag(cur['tag']):
+            cur['tag'] = tag
+            self.updates['equipment'][eid] = {'tag': tag}
+            stats["updated_equipments"] += 1
+
+    def _fill_component(self, path, row, stats):
+        cid = self.ids['component'].get(path)
+        cur = self.current['component'][cid] if cid is not None else self.new['component'][path]
+        touched = False
+        for field in ('description', 'criticality'):
+            value = row.get(f'component_{field}')
+            if value and not (cur[field] or '').strip():
+                cur[field] = value
+                touched = True
+                if cid is not None:
+                    self.updates['component'].setdefault(cid, {})[field] = value
+        if touched:
+            stats["updated_components"] += 1
+        else:
+            stats["skipped_existing"] += 1
+
+    def _resolve_row(self, row, leaf, stats):
+        depth = LEVELS.index(leaf) + 1
+        missing = [lvl for lvl in LEVELS[:depth] if not row.get(lvl)]
+        if missing:
+            return f"faltan valores: {', '.join(missing)}"
+
+        names = tuple(row[lvl] for lvl in LEVELS[:depth])
+        if not self.create_parents:
+            for i, lvl in enumerate(LEVELS[:depth - 1]):
+                path = names[:i + 1]
+                if path not in self.ids[lvl] and path not in self.new[lvl]:
+                    return f"no existe {_LEVEL_LABELS[lvl]} '{names[i]}'"
+
+        for i, lvl in enumerate(LEVELS[:depth]):
+            path = names[:i + 1]
+            exists = path in self.ids[lvl] or path in self.new[lvl]
+            if not exists:
+                self.new[lvl][path] = self._new_values(lvl, row)
+                stats[f"created_{lvl}s"] += 1
+                continue
+            if lvl == 'equipment':
+                self._fill_equipment(path, row, stats)
+            if lvl == leaf:
+                if lvl == 'component':
+                    self._fill_component(path, row, stats)
+                else:
+                    stats["skipped_existing"] += 1
+        return None
+
+    # ── 3. Escritura por nivel ───────────────────────────────────────────
+    def _insert_level(self, level, parent_col):
+        pending = self.new[level]
+        if not pending:
+            return
+        Model = self.models[level]
+        table = Model.__table__
+        parent_level = LEVELS[LEVELS.index(level) - 1] if parent_col else None
+        batch = []
+        for path, values in pending.items():
+            row = dict(values)
+            if parent_col:
+                row[parent_col] = self.ids[parent_level][path[:-1]]
+            batch.append((path, row))
+
+        ids = self.ids[level]
+        for start in range(0, len(batch), INSERT_CHUNK):
+            chunk = batch[start:start + INSERT_CHUNK]
+            by_key = {(r.get(parent_col), r['name']): p for p, r in chunk}
+            returning = [table.c.id, table.c.name] + ([table.c[parent_col]] if parent_col else [])
+            result = self.session.execute(
+                insert(table).values([r for _p, r in chunk]).returning(*returning))
+            for rec in result:
+                key = (rec[2] if parent_col else None, rec[1])
+                ids[by_key[key]] = rec[0]
+
+    def _update_level(self, level):
+        pending = self.updates[level]
+        if not pending:
+            return
+        table = self.models[level].__table__
+        # Agrupado por conjunto de columnas: un executemany por forma
+        by_fields = {}
+        for pk, values in pending.items():
+            by_fields.setdefault(tuple(sorted(values)), []).append(
+                dict({f'b_{k}': v for k, v in values.items()}, b_id=pk))
+        for fields, params in by_fields.items():
+            stmt = (update(table).where(table.c.id == bindparam('b_id'))
+                    .values({f: bindparam(f'b_{f}') for f in fields}))
+            self.session.execute(stmt, params)
+
+    def _write(self):
+        self._insert_level('area', None)
+        self._insert_level('line', 'area_id')
+        self._insert_level('equipment', 'line_id')
+        self._insert_level('system', 'equipment_id')
+        self._insert_level('component', 'system_id')
+        self._update_level('equipment')
+        self._update_level('component')
+
+    def run(self, rows, leaf='component', validate_only=False):
+        """Importa `rows` (dicts con claves de LEVELS + row_num y opcionales
+        equipment_tag, *_description, component_criticality). Devuelve
+        (stats, errors); no hace commit."""
+        stats = empty_stats(len(rows))
+        errors = []
+        self._preload()
+        for row in rows:
+            error = self._resolve_row(row, leaf, stats)
+            if error:
+                errors.append({"row": row.get("row_num"), "error": error})
+            else:
+                stats["rows_processed"] += 1
+
+        dirty = any(self.new.values()) or any(self.updates.values())
+        if not validate_only and dirty:
+            self._write()
+            bump_hierarchy_version(self.session)
+        return stats, errors
@@ -0,0 +1,206 @@
+"""Cliente HTTP saliente compartido (Telegram, DeepSeek, OpenAI, Supabase Storage).
+
+Antes cada llamada hacia `requests.post(...)` suelto: conexion TCP + TLS
+nueva por request. Un mensaje del bot dispara varias (sendChatAction,
+DeepSeek, sendMessage), asi que el handshake se pagaba varias veces.
+
+Aca hay una `requests.Session` por servicio, con pool keep-alive por host
+(HTTPAdapter), timeout por defecto del servicio, reintentos con backoff
+exponencial + jitter, e histograma de latencias en memoria
+(GET /api/admin/http-stats).
+
+Uso:
+    from utils import http_client
+    r = http_client.post('deepseek', DEEPSEEK_URL, headers=..., json=...)
+
+Devuelve el `requests.Response` de siempre y deja pasar las excepciones de
+requests (Timeout, ConnectionError), asi los `except` existentes siguen
+valiendo. Un `timeout=` explicito pisa el del servicio.
+
+Reintentos segun el metodo:
+  - GET/HEAD/OPTIONS/PUT/DELETE (idempotentes): ante 429/5xx y errores de
+    conexion.
+  - POST/PATCH: solo cuando es seguro que el servidor no proceso el pedido:
+    429, 503 con Retry-After y fallas al abrir la conexion (ConnectTimeout,
+    conexion rechazada, DNS). Un 500/502/504 o una conexion cortada a mitad
+    de camino pudieron haber ejecutado el pedido (un sendMessage duplicado,
+    un DeepSeek cobrado dos veces, una OT creada dos veces). Un POST que es
+    seguro repetir (p.ej. embeddings) lo declara con `idempotent=True`.
+Nunca se reintentan los ReadTimeout.
+
+Un cuerpo `data=` de tipo archivo se rebobina a su posicion inicial antes
+de cada reintento (si no, el reintento mandaria lo que quedo sin leer).
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+MAX_RETRY_AFTER = 30          # segundos; un Retry-After mayor no se espera
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# timeout: (connect, read) en segundos. retries: reintentos extra (no intentos).
+SERVICES = {
+    'telegram': {'timeout': (5, 30), 'retries': 2, 'backoff': 0.5, 'pool': 10},
+    'deepseek': {'timeout': (5, 60), 'retries': 2, 'backoff': 1.0, 'pool': 10},
+    'openai': {'timeout': (5, 60), 'retries': 2, 'backoff': 1.0, 'pool': 5},
+    'supabase': {'timeout': (5, 60), 'retries': 2, 'backoff': 0.5, 'pool': 5},
+    'default': {'timeout': (5, 30), 'retries': 1, 'backoff': 0.5, 'pool': 5},
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _config(service):
+    return SERVICES.get(service) or SERVICES['default']
+
+
+def get_session(service):
+    """Session keep-alive del servicio (una por proceso, thread-safe)."""
+    session = _sessions.get(service)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(service)
+        if session is None:
+            pool = _config(service)['pool']
+            session = requests.Session()
+            # Los reintentos los maneja request() (con jitter y metricas)
+            adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[service] = session
+    return session
+
+
+def _backoff_delay(cfg, attempt, response=None):
+    """Espera antes del reintento `attempt` (0-based): Retry-After si el
+    servidor lo manda, si no backoff * 2^attempt con jitter completo."""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+    return random.uniform(0, cfg['backoff'] * (2 ** attempt))
+
+
+def _connect_failed(err):
+    """True si la excepcion ocurrio antes de mandar el pedido (no hubo
+    conexion): seguro de reintentar para cualquier metodo."""
+    if isinstance(err, requests.ConnectTimeout):
+        return True
+    reason = getattr(err.args[0], 'reason', None) if err.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _retryable_status(resp, idempotent):
+    if resp.status_code not in RETRY_STATUSES:
+        return False
+    if idempotent or resp.status_code == 429:
+        return True
+    return resp.status_code == 503 and bool(resp.headers.get('Retry-After'))
+
+
+def _record(service, elapsed_ms, status, retries):
+    with _stats_lock:
+        s = _stats.get(service)
+        if s is None:
+            s = _stats[service] = {
+                'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        s['calls'] += 1
+        s['retries'] += retries
+        if status == 'error':
+            s['errors'] += 1
+        s['total_ms'] += elapsed_ms
+        s['max_ms'] = max(s['max_ms'], elapsed_ms)
+        s['buckets'][bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+
+def request(service, method, url, idempotent=None, **kwargs):
+    """Request con la Session, timeout y politica de reintentos del servicio.
+    `idempotent` pisa la deteccion por metodo (ver docstring del modulo)."""
+    cfg = _config(service)
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    kwargs.setdefault('timeout', cfg['timeout'])
+    session = get_session(service)
+    body = kwargs.get('data')
+    body_start = body.tell() if callable(getattr(body, 'seekable', None)) and body.seekable() else None
+    attempt = 0
+    started = time.monotonic()
+    while True:
+        if body_start is not None:
+            body.seek(body_start)
+        try:
+            resp = session.request(method, url, **kwargs)
+        except requests.ConnectionError as e:
+            # ReadTimeout no hereda de aca y no se reintenta nunca
+            if attempt >= cfg['retries'] or not (idempotent or _connect_failed(e)):
+                _record(service, (time.monotonic() - started) * 1000, 'error', attempt)
+                raise
+            delay = _backoff_delay(cfg, attempt)
+            logger.warning(f"HTTP {service}: {type(e).__name__}, reintento en {delay:.1f}s")
+        except requests.RequestException:
+            _record(service, (time.monotonic() - started) * 1000, 'error', attempt)
+            raise
+        else:
+            if not _retryable_status(resp, idempotent) or attempt >= cfg['retries']:
+                status = 'error' if resp.status_code >= 400 else 'success'
+                _record(service, (time.monotonic() - started) * 1000, status, attempt)
+                return resp
+            delay = _backoff_delay(cfg, attempt, resp)
+            logger.warning(f"HTTP {service}: {resp.status_code}, reintento en {delay:.1f}s")
+            resp.close()
+        attempt += 1
+        time.sleep(delay)
+
+
+def get(service, url, **kwargs):
+    return request(service, 'GET', url, **kwargs)
+
+
+def post(service, url, **kwargs):
+    return request(service, 'POST', url, **kwargs)
+
+
+def delete(service, url, **kwargs):
+    return request(service, 'DELETE', url, **kwargs)
+
+
+def http_stats():
+    """Latencias por servicio desde el arranque del proceso. `histogram` es
+    {'<=50ms': n, ..., '>60000ms': n}; incluye el tiempo de los reintentos."""
+    labels = [f'<={b}ms' for b in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+    with _stats_lock:
+        out = {}
+        for service, s in sorted(_stats.items()):
+            out[service] = {
+                'calls': s['calls'],
+                'errors': s['errors'],
+                'retries': s['retries'],
+                'avg_ms': int(s['total_ms'] / s['calls']) if s['calls'] else 0,
+                'max_ms': int(s['max_ms']),
+                'histogram': dict(zip(labels, s['buckets'])),
+            }
+        return out
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
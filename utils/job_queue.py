@@ -0,0 +1,354 @@
+"""Cola de trabajos en segundo plano respaldada por la BD (tabla background_jobs).
+
+Antes la narrativa del diagnostico guardaba sus trabajos en un dict del
+proceso servido por un hilo suelto: se perdian al reiniciar y el otro worker
+de gunicorn respondia "Trabajo no encontrado" al sondeo. RCA, indexado RAG y
+el diagnostico IA de produccion lanzaban cada uno sus propios hilos, sin
+limite. Ahora:
+
+  - `@job_handler('tipo', max_attempts=3, lease_seconds=600)` registra la
+    funcion `fn(app, payload) -> resultado` (JSON serializable) del tipo.
+  - `submit_job('tipo', payload)` inserta la fila y despierta a los workers
+    locales. Devuelve el `job_key` (id publico para sondear).
+  - `get_job(job_key)`: estado desde cualquier worker (GET /api/jobs/<key>).
+  - Workers: CMMS_JOB_WORKERS hilos por proceso (default 2), arrancados con
+    el primer request (`init_job_queue(app)`). Esa es la concurrencia maxima:
+    una rafaga de narrativas espera en la tabla, no abre hilos.
+  - Claim con lease: en PostgreSQL `UPDATE ... WHERE id = (SELECT ... FOR
+    UPDATE SKIP LOCKED) RETURNING`; en SQLite un compare-and-set por id. Un
+    trabajo EN_CURSO con el lease vencido (worker muerto) se vuelve a tomar.
+  - Reintentos con backoff exponencial (30s, 60s, 120s...) hasta
+    max_attempts; despues queda ERROR con el ultimo mensaje.
+  - Los trabajos terminados se purgan a los JOB_RETENTION_DAYS.
+  - Un handler largo puede llamar `set_job_progress({...})`: el avance sale
+    en `result` mientras esta EN_CURSO y el lease se renueva.
+
+En tests (TESTING) no arrancan hilos: `run_pending_jobs(app)` ejecuta en
+linea lo que haya en cola.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+_logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'PENDIENTE'
+STATUS_RUNNING = 'EN_CURSO'
+STATUS_OK = 'OK'
+STATUS_ERROR = 'ERROR'
+
+JOB_WORKERS = int(os.getenv('CMMS_JOB_WORKERS', '2'))
+JOB_POLL_SECONDS = float(os.getenv('CMMS_JOB_POLL_SECONDS', '5'))
+JOB_RETENTION_DAYS = 7
+_BACKOFF_BASE_SECONDS = 30
+
+_handlers = {}
+_wake = threading.Condition()
+_started = set()
+_start_lock = threading.Lock()
+_last_prune = 0.0
+_current = threading.local()  # (id, worker, lease_seconds) del trabajo en curso
+
+
+class _Handler:
+    def __init__(self, fn, max_attempts, lease_seconds):
+        self.fn = fn
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+
+
+def job_handler(kind, max_attempts=3, lease_seconds=600):
+    """Decorador: registra `fn(app, payload)` como ejecutor de `kind`."""
+    def deco(fn):
+        _handlers[kind] = _Handler(fn, max_attempts, lease_seconds)
+        return fn
+    return deco
+
+
+def _worker_id():
+    return f"{socket.gethostname()[:40]}:{os.getpid()}:{threading.get_ident() % 100000}"
+
+
+def submit_job(kind, payload=None, session=None, max_attempts=None, delay_seconds=0):
+    """Encola un trabajo y despierta a los workers locales. Devuelve el job_key.
+
+    Sin `session` el INSERT va en su propia transaccion (no commitea el
+    trabajo en curso del llamador); con `session` queda en esa transaccion
+    y el llamador hace commit. Requiere app context."""
+    from database import db
+    from models import BackgroundJob
+    if kind not in _handlers:
+        raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+    now = datetime.utcnow()
+    job_key = uuid.uuid4().hex[:16]
+    stmt = BackgroundJob.__table__.insert().values(
+        job_key=job_key,
+        kind=kind,
+        payload=json.dumps(payload or {}, default=str),
+        status=STATUS_PENDING,
+        attempts=0,
+        max_attempts=max_attempts or _handlers[kind].max_attempts,
+        run_after=now + timedelta(seconds=delay_seconds),
+        created_at=now,
+    )
+    if session is not None:
+        session.execute(stmt)
+    else:
+        with db.engine.begin() as conn:
+            conn.execute(stmt)
+    with _wake:
+        _wake.notify()
+    return job_key
+
+
+def _job_dict(row):
+    return {
+        'job_id': row.job_key,
+        'kind': row.kind,
+        'status': row.status,
+        'attempts': row.attempts,
+        'result': json.loads(row.result) if row.result else None,
+        'error': row.error,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'finished_at': row.finished_at.isoformat() if row.finished_at else None,
+    }
+
+
+def get_job(job_key, kind=None):
+    """Estado del trabajo como dict (o None si no existe / no es de `kind`)."""
+    from models import BackgroundJob
+    if not job_key:
+        return None
+    row = BackgroundJob.query.filter_by(job_key=job_key).first()
+    if row is None or (kind and row.kind != kind):
+        return None
+    return _job_dict(row)
+
+
+# ── Claim / ejecucion ────────────────────────────────────────────────────
+_CLAIMABLE = ("((status = :pending AND run_after <= :now) "
+              "OR (status = :running AND locked_until < :now AND attempts < max_attempts))")
+
+
+def claim_next(db, worker=None, kinds=None):
+    """Toma un trabajo listo y lo marca EN_CURSO con lease. Devuelve
+    (id, kind, payload, attempts, max_attempts) o None."""
+    worker = worker or _worker_id()
+    now = datetime.utcnow()
+    kinds = tuple(kinds or _handlers)
+    if not kinds:
+        return None
+    params = {'pending': STATUS_PENDING, 'running': STATUS_RUNNING, 'now': now, 'w': worker}
+    kind_binds = ', '.join(f':k{i}' for i in range(len(kinds)))
+    params.update({f'k{i}': k for i, k in enumerate(kinds)})
+    # Lease provisorio; se ajusta al lease del tipo apenas se conoce el kind
+    params['until'] = now + timedelta(seconds=max(h.lease_seconds for h in _handlers.values()))
+    pick = (f"SELECT id FROM background_jobs WHERE {_CLAIMABLE} AND kind IN ({kind_binds}) "
+            f"ORDER BY run_after, id LIMIT 1")
+    update = ("UPDATE background_jobs SET status = :running, locked_by = :w, "
+              "locked_until = :until, attempts = attempts + 1 ")
+    returning = " RETURNING id, kind, payload, attempts, max_attempts"
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            row = db.session.execute(text(
+                update + f"WHERE id = ({pick} FOR UPDATE SKIP LOCKED)" + returning), params).fetchone()
+        else:
+            # Compare-and-set: si otro worker lo tomo entre el SELECT y el
+            # UPDATE, la condicion ya no se cumple y rowcount es 0
+            row = None
+            cand = db.session.execute(text(pick), params).fetchone()
+            if cand is not None:
+                params['id'] = cand[0]
+                row = db.session.execute(text(
+                    update + f"WHERE id = :id AND {_CLAIMABLE}" + returning), params).fetchone()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if row is None:
+        return None
+    handler = _handlers.get(row[1])
+    if handler is not None:
+        db.session.execute(text(
+            "UPDATE background_jobs SET locked_until = :until WHERE id = :id"),
+            {'until': now + timedelta(seconds=handler.lease_seconds), 'id': row[0]})
+        db.session.commit()
+    return tuple(row)
+
+
+def _finish(db, job_id, worker, status, result=None, error=None, retry_at=None):
+    """Cierra el trabajo si este worker todavia tiene el lease."""
+    params = {'id': job_id, 'w': worker, 'running': STATUS_RUNNING, 'status': status,
+              'result': json.dumps(result, default=str) if result is not None else None,
+              'error': (error or '')[:2000] or None, 'now': datetime.utcnow(),
+              'run_after': retry_at}
+    if retry_at is not None:
+        sql = ("UPDATE background_jobs SET status = :status, error = :error, run_after = :run_after, "
+               "locked_by = NULL, locked_until = NULL WHERE id = :id AND locked_by = :w AND status = :running")
+    else:
+        sql = ("UPDATE background_jobs SET status = :status, result = :result, error = :error, "
+               "finished_at = :now, locked_by = NULL, locked_until = NULL "
+               "WHERE id = :id AND locked_by = :w AND status = :running")
+    db.session.execute(text(sql), params)
+    db.session.commit()
+
+
+def run_one(app, worker=None):
+    """Toma y ejecuta un trabajo. Devuelve True si habia alguno."""
+    from database import db
+    worker = worker or _worker_id()
+    with app.app_context():
+        claimed = claim_next(db, worker)
+        if claimed is None:
+            return False
+        job_id, kind, payload, attempts, max_attempts = claimed
+    handler = _handlers.get(kind)
+    try:
+        if handler is None:
+            raise RuntimeError(f"Sin handler para '{kind}' en este proceso")
+        _current.job = (job_id, worker, handler.lease_seconds)
+        try:
+            with app.app_context():
+                result = handler.fn(app, json.loads(payload) if payload else {})
+        finally:
+            _current.job = None
+        status, error, retry_at = STATUS_OK, None, None
+    except Exception as e:
+        _logger.warning(f"job {kind}#{job_id} intento {attempts}/{max_attempts} fallo: {e}")
+        result, error = None, str(e)
+        if attempts < max_attempts:
+            status = STATUS_PENDING
+            retry_at = datetime.utcnow() + timedelta(
+                seconds=_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+        else:
+            status, retry_at = STATUS_ERROR, None
+    with app.app_context():
+        _finish(db, job_id, worker, status, result=result, error=error, retry_at=retry_at)
+    return True
+
+
+def set_job_progress(progress):
+    """Desde un handler: publica `progress` (JSON) como resultado parcial y
+    renueva el lease. Best-effort; fuera de un trabajo no hace nada."""
+    job = getattr(_current, 'job', None)
+    if job is None:
+        return False
+    job_id, worker, lease_seconds = job
+    from database import db
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE background_jobs SET result = :result, locked_until = :until "
+                "WHERE id = :id AND locked_by = :w AND status = :running"),
+                {'result': json.dumps(progress, default=str), 'id': job_id, 'w': worker,
+                 'running': STATUS_RUNNING,
+                 'until': datetime.utcnow() + timedelta(seconds=lease_seconds)})
+        return True
+    except Exception as e:
+        _logger.warning(f"job_queue: progreso omitido: {e}")
+        return False
+
+
+def run_pending_jobs(app, limit=None):
+    """Ejecuta en linea lo que haya listo en la cola (tests / scripts)."""
+    done = 0
+    while limit is None or done < limit:
+        if not run_one(app, worker='inline'):
+            break
+        done += 1
+    return done
+
+
+def prune_finished_jobs(db, days=JOB_RETENTION_DAYS):
+    """Cierra como ERROR los trabajos cuyo worker murio en el ultimo intento
+    y borra los terminados hace mas de `days` dias."""
+    now = datetime.utcnow()
+    db.session.execute(text(
+        "UPDATE background_jobs SET status = :err, error = :msg, finished_at = :now, "
+        "locked_by = NULL, locked_until = NULL "
+        "WHERE status = :running AND locked_until < :now AND attempts >= max_attempts"),
+        {'err': STATUS_ERROR, 'running': STATUS_RUNNING, 'now': now,
+         'msg': 'Lease vencido en el ultimo intento (worker caido)'})
+    res = db.session.execute(text(
+        "DELETE FROM background_jobs WHERE status IN (:ok, :err) AND finished_at < :cutoff"),
+        {'ok': STATUS_OK, 'err': STATUS_ERROR, 'cutoff': now - timedelta(days=days)})
+    db.session.commit()
+    return res.rowcount or 0
+
+
+def _maybe_prune(app):
+    global _last_prune
+    if time.monotonic() - _last_prune < 3600:
+        return
+    _last_prune = time.monotonic()
+    from database import db
+    from utils.embeddings import prune_embedding_cache
+    try:
+        with app.app_context():
+            prune_finished_jobs(db)
+            prune_embedding_cache(db)
+    except Exception as e:
+        _logger.warning(f"job_queue: purga omitida: {e}")
+
+
+def _worker_loop(app):
+    worker = _worker_id()
+    while True:
+        try:
+            ran = run_one(app, worker)
+        except Exception as e:
+            _logger.warning(f"job_queue: error en el loop del worker: {e}")
+            ran = False
+        if not ran:
+            _maybe_prune(app)
+            with _wake:
+                _wake.wait(JOB_POLL_SECONDS)
+
+
+# Modulos que registran handlers al importarse (los de rutas se registran
+# al armar la app): se importan antes de arrancar los workers para que este
+# proceso pueda tomar esos tipos.
+_HANDLER_MODULES = ('bot.rca', 'bot.telegram_bot')
+
+
+def _import_handler_modules():
+    import importlib
+    for name in _HANDLER_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            _logger.warning(f"job_queue: no se pudo importar {name}: {e}")
+
+
+def start_job_workers(app, workers=None):
+    """Arranca los hilos del proceso (una vez por app). No-op en TESTING."""
+    if app.config.get('TESTING'):
+        return False
+    workers = JOB_WORKERS if workers is None else workers
+    if workers <= 0:
+        return False
+    with _start_lock:
+        if id(app) in _started:
+            return False
+        _started.add(id(app))
+    _import_handler_modules()
+    for i in range(workers):
+        threading.Thread(target=_worker_loop, args=(app,), name=f'job-worker-{i}', daemon=True).start()
+    _logger.info(f"job_queue: {workers} workers iniciados")
+    return True
+
+
+def init_job_queue(app):
+    """Arranca los workers con el primer request (asi TESTING ya esta
+    configurado y los trabajos pendientes de un reinicio se retoman)."""
+    @app.before_request
+    def _start_job_workers_once():
+        if id(app) not in _started:
+            start_job_workers(app)
@@ -0,0 +1,314 @@
+"""Tabla de hechos diaria para KPIs de confiabilidad (kpi_daily_equipment).
+
+Una fila por (equipo, dia) con los acumulados de las OTs CERRADAS de ese
+equipo atribuidas a ese dia (fecha de inicio real, o la programada si no
+hay inicio; misma regla que /api/dashboard-kpis). Las rutas de KPI suman
+unas pocas miles de filas en vez de recorrer toda la tabla work_orders.
+
+El equipo de la OT es equipment_id, o el del sistema (system_id), o el del
+sistema de su componente (component_id): las OTs cargadas a nivel sistema
+o componente cuentan para su equipo igual que en /api/reports/kpis.
+
+Mantenimiento:
+  - ORM: eventos after_insert/after_update/after_delete de WorkOrder (y
+    after_update de Shutdown cuando cambia is_planned) en models.py. Se
+    recalculan solo las celdas (equipo, dia) afectadas, dentro de la misma
+    transaccion que la OT.
+  - SQL crudo (bot): `refresh_kpi_facts_for_ot(conn, ot_id)` despues del
+    UPDATE.
+  - Historico: `rebuild_kpi_facts(db, since=None)` (admin:
+    POST /api/admin/kpi-facts/rebuild). `ensure_kpi_facts` lo corre al
+    arrancar si la tabla esta vacia.
+
+Ambos modos de disponibilidad (operativa / inherente ISO 14224) se guardan
+pre-calculados: `failures_inherent` y `downtime_inherent_h` son la parte
+que cuenta en la inherente y `planned_down_h` el paro planificado que se
+descuenta de su base de tiempo.
+"""
+import datetime as dt
+import logging
+
+from sqlalchemy import func, inspect, select
+
+from utils.reporting_helpers import _parse_date_flexible
+
+logger = logging.getLogger(__name__)
+
+# Campos de la OT que alteran su aporte a la tabla de hechos
+_FACT_FIELDS = (
+    'status', 'equipment_id', 'system_id', 'component_id', 'scheduled_on', 'real_start_on',
+    'maintenance_type', 'real_duration', 'real_start_date', 'real_end_date',
+    'downtime_hours', 'caused_downtime', 'downtime_planned', 'shutdown_id',
+)
+
+# Acumulados por celda (columnas numericas de KpiDailyEquipment)
+FACT_MEASURES = (
+    'preventive', 'corrective', 'failures_inherent',
+    'repair_h', 'corrective_repair_h',
+    'downtime_h', 'downtime_inherent_h', 'planned_down_h',
+)
+
+
+def _duration_hours(value):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def ot_repair_hours(ot):
+    """Horas de reparacion: real_duration; si falta, diferencia de fechas."""
+    repair_h = _duration_hours(ot.real_duration)
+    if not repair_h:
+        rs = _parse_date_flexible(ot.real_start_date)
+        re = _parse_date_flexible(ot.real_end_date)
+        if rs and re:
+            repair_h = round((re - rs).total_seconds() / 3600, 2)
+    return repair_h or 0
+
+
+def is_corrective_type(maintenance_type):
+    """Falla = tipo exacto 'Correctivo' (criterio de /api/reports/kpis)."""
+    return maintenance_type == 'Correctivo'
+
+
+def ot_contribution(ot, unplanned_shutdown_ids):
+    """Aporte de una OT cerrada a su celda (dict con FACT_MEASURES)."""
+    is_corrective = is_corrective_type(ot.maintenance_type)
+
+    # Averia (cuenta en inherente): manda downtime_planned de la OT; si es
+    # NULL, correctivo sin parada vinculada o con parada no planificada.
+    if ot.downtime_planned is not None:
+        qualifies_inherent = not ot.downtime_planned
+    else:
+        qualifies_inherent = is_corrective and (
+            not ot.shutdown_id or ot.shutdown_id in unplanned_shutdown_ids
+        )
+
+    repair_h = ot_repair_hours(ot)
+    eff_dh = 0
+    if ot.downtime_hours:
+        eff_dh = ot.downtime_hours
+    elif ot.caused_downtime and repair_h:
+        eff_dh = repair_h
+    elif is_corrective and repair_h:
+        eff_dh = repair_h
+
+    return {
+        'preventive': 0 if is_corrective else 1,
+        'corrective': 1 if is_corrective else 0,
+        'failures_inherent': 1 if (is_corrective and qualifies_inherent) else 0,
+        'repair_h': repair_h,
+        'corrective_repair_h': (_duration_hours(ot.real_duration) or 0) if is_corrective else 0,
+        'downtime_h': eff_dh,
+        'downtime_inherent_h': eff_dh if qualifies_inherent else 0,
+        'planned_down_h': 0 if qualifies_inherent else eff_dh,
+    }
+
+
+def _tables():
+    from models import KpiDailyEquipment, WorkOrder
+    return KpiDailyEquipment.__table__, WorkOrder.__table__
+
+
+def ot_equipment_source(wo):
+    """(from_obj, expr): work_orders con sus sistema/componente y la
+    expresion del equipo resuelto (OT -> sistema -> componente)."""
+    from models import Component, System
+    sys_t = System.__table__.alias('ot_system')
+    comp_t = Component.__table__.alias('ot_component')
+    comp_sys_t = System.__table__.alias('ot_component_system')
+    from_obj = (wo.outerjoin(sys_t, sys_t.c.id == wo.c.system_id)
+                  .outerjoin(comp_t, comp_t.c.id == wo.c.component_id)
+                  .outerjoin(comp_sys_t, comp_sys_t.c.id == comp_t.c.system_id))
+    expr = func.coalesce(wo.c.equipment_id, sys_t.c.equipment_id, comp_sys_t.c.equipment_id)
+    return from_obj, expr
+
+
+def _resolve_equipment(conn, equipment_id, system_id, component_id):
+    """Equipo de una OT a partir de sus ids (para las claves de los eventos)."""
+    if equipment_id or not (system_id or component_id):
+        return equipment_id
+    from models import Component, System
+    sys_t, comp_t = System.__table__, Component.__table__
+    if system_id:
+        eq = conn.execute(select(sys_t.c.equipment_id).where(sys_t.c.id == system_id)).scalar()
+        if eq:
+            return eq
+    if component_id:
+        return conn.execute(select(sys_t.c.equipment_id).select_from(
+            comp_t.join(sys_t, sys_t.c.id == comp_t.c.system_id)
+        ).where(comp_t.c.id == component_id)).scalar()
+    return None
+
+
+def _ot_columns(wo, equipment):
+    return (
+        wo.c.id, equipment.label('equipment_id'), wo.c.maintenance_type, wo.c.real_duration,
+        wo.c.real_start_date, wo.c.real_end_date, wo.c.downtime_hours,
+        wo.c.caused_downtime, wo.c.downtime_planned, wo.c.shutdown_id,
+        func.coalesce(wo.c.real_start_on, wo.c.scheduled_on).label('fact_day'),
+    )
+
+
+def _unplanned_shutdown_ids(conn):
+    from models import Shutdown
+    sd = Shutdown.__table__
+    return {r[0] for r in conn.execute(select(sd.c.id).where(sd.c.is_planned.is_(False)))}
+
+
+def _accumulate(rows, unplanned, cells=None):
+    cells = {} if cells is None else cells
+    for ot in rows:
+        if not ot.equipment_id or not ot.fact_day:
+            continue
+        cell = cells.setdefault((ot.equipment_id, ot.fact_day),
+                                dict.fromkeys(FACT_MEASURES, 0))
+        for k, v in ot_contribution(ot, unplanned).items():
+            cell[k] += v
+    return cells
+
+
+def _cell_rows(cells):
+    now = dt.datetime.utcnow()
+    return [
+        {'equipment_id': eq, 'day': day, 'updated_at': now, **vals}
+        for (eq, day), vals in cells.items()
+    ]
+
+
+def refresh_kpi_facts(conn, keys):
+    """Recalcula las celdas (equipment_id, day) indicadas desde work_orders.
+
+    `conn` es una Connection en la transaccion actual (la del flush en los
+    eventos ORM, o `db.session.connection()`). Devuelve celdas recalculadas.
+    """
+    keys = {(eq, day) for eq, day in keys if eq and day}
+    if not keys:
+        return 0
+    facts, wo = _tables()
+    from_obj, equipment = ot_equipment_source(wo)
+    unplanned = _unplanned_shutdown_ids(conn)
+    fact_day = func.coalesce(wo.c.real_start_on, wo.c.scheduled_on)
+    for eq, day in keys:
+        conn.execute(facts.delete().where(facts.c.equipment_id == eq, facts.c.day == day))
+        rows = conn.execute(select(*_ot_columns(wo, equipment)).select_from(from_obj).where(
+            wo.c.status == 'Cerrada', fact_day == day, equipment == eq,
+        )).fetchall()
+        cells = _accumulate(rows, unplanned)
+        if cells:
+            conn.execute(facts.insert(), _cell_rows(cells))
+    return len(keys)
+
+
+def refresh_kpi_facts_guarded(conn, keys):
+    """refresh_kpi_facts en un SAVEPOINT: si falla, la OT se guarda igual y
+    la celda queda desfasada hasta el proximo rebuild (se deja en el log)."""
+    if not keys:
+        return 0
+    try:
+        with conn.begin_nested():
+            return refresh_kpi_facts(conn, keys)
+    except Exception as e:
+        logger.warning(f"kpi_daily_equipment: no se pudo refrescar {sorted(keys, key=str)}: {e}")
+        return 0
+
+
+def refresh_kpi_facts_for_ot(conn, ot_id, old_key=None):
+    """Para escrituras por SQL crudo: recalcula la celda actual de la OT
+    (y `old_key` si se capturo antes del UPDATE)."""
+    key = ot_fact_key(conn, ot_id)
+    keys = {key} if key else set()
+    if old_key:
+        keys.add(tuple(old_key))
+    return refresh_kpi_facts_guarded(conn, keys)
+
+
+def ot_fact_key(conn, ot_id):
+    """(equipment_id, day) actual de una OT, para capturarlo antes de un UPDATE crudo."""
+    _facts, wo = _tables()
+    from_obj, equipment = ot_equipment_source(wo)
+    row = conn.execute(select(
+        equipment, func.coalesce(wo.c.real_start_on, wo.c.scheduled_on),
+    ).select_from(from_obj).where(wo.c.id == ot_id)).fetchone()
+    return tuple(row) if row else None
+
+
+def _old_value(state, name):
+    hist = state.attrs[name].history
+    if hist.added or hist.deleted:
+        return hist.deleted[0] if hist.deleted else None
+    return getattr(state.object, name)
+
+
+def work_order_fact_keys(conn, target, deleted=False):
+    """Celdas afectadas por el flush de una OT (valores previos y nuevos)."""
+    state = inspect(target)
+    if not deleted and state.has_identity and not any(
+        state.attrs[f].history.has_changes() for f in _FACT_FIELDS
+    ):
+        return set()
+    keys = set()
+    if _old_value(state, 'status') == 'Cerrada':
+        keys.add((_resolve_equipment(conn, _old_value(state, 'equipment_id'),
+                                     _old_value(state, 'system_id'),
+                                     _old_value(state, 'component_id')),
+                  _old_value(state, 'real_start_on') or _old_value(state, 'scheduled_on')))
+    if not deleted and target.status == 'Cerrada':
+        keys.add((_resolve_equipment(conn, target.equipment_id, target.system_id, target.component_id),
+                  target.real_start_on or target.scheduled_on))
+    return keys
+
+
+def shutdown_fact_keys(conn, shutdown_id):
+    """Celdas de las OTs cerradas vinculadas a una parada."""
+    _facts, wo = _tables()
+    from_obj, equipment = ot_equipment_source(wo)
+    rows = conn.execute(select(
+        equipment, func.coalesce(wo.c.real_start_on, wo.c.scheduled_on),
+    ).select_from(from_obj).where(wo.c.shutdown_id == shutdown_id, wo.c.status == 'Cerrada').distinct())
+    return {tuple(r) for r in rows}
+
+
+def rebuild_kpi_facts(db, since=None, batch_size=500, logger=None):
+    """Reconstruye la tabla de hechos desde work_orders (todo, o desde `since`).
+
+    Idempotente. Devuelve {"ots": OTs leidas, "rows": celdas escritas}.
+    """
+    facts, wo = _tables()
+    from_obj, equipment = ot_equipment_source(wo)
+    since = _parse_date_flexible(since) if since else None
+    fact_day = func.coalesce(wo.c.real_start_on, wo.c.scheduled_on)
+
+    delete = facts.delete()
+    query = select(*_ot_columns(wo, equipment)).select_from(from_obj).where(
+        wo.c.status == 'Cerrada', equipment.isnot(None), fact_day.isnot(None),
+    )
+    if since:
+        delete = delete.where(facts.c.day >= since)
+        query = query.where(fact_day >= since)
+
+    conn = db.session.connection()
+    conn.execute(delete)
+    rows = conn.execute(query).fetchall()
+    cells = _accumulate(rows, _unplanned_shutdown_ids(conn))
+    payload = _cell_rows(cells)
+    for i in range(0, len(payload), batch_size):
+        conn.execute(facts.insert(), payload[i:i + batch_size])
+    db.session.commit()
+    if logger:
+        logger.info(f"kpi_daily_equipment: {len(payload)} celdas desde {len(rows)} OTs.")
+    return {'ots': len(rows), 'rows': len(payload)}
+
+
+def ensure_kpi_facts(db, logger=None):
+    """Primera carga: reconstruye si la tabla esta vacia y hay OTs cerradas."""
+    facts, wo = _tables()
+    conn = db.session.connection()
+    if conn.execute(select(facts.c.id).limit(1)).first() is not None:
+        return None
+    if conn.execute(select(wo.c.id).where(wo.c.status == 'Cerrada').limit(1)).first() is None:
+        return None
+    return rebuild_kpi_facts(db, logger=logger)
@@ -6,16 +6,20 @@ completa de tiempos (solicitud -> programada -> inicio real -> fin real).
 
 Usa el mismo payload que el endpoint /api/reports/executive, por lo que
 los numeros del Excel siempre coinciden con lo que se ve en pantalla.
+
+El libro es write_only (utils/excel_stream.py): las hojas se escriben fila
+a fila y el detalle de OTs sale de un cursor, sin cargar la tabla entera.
 """
 
 from datetime import date, datetime
-from io import BytesIO
 
-from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.chart import BarChart, LineChart, PieChart, Reference
 from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.utils import get_column_letter
 
+from utils.excel_stream import new_workbook, styled_row
+
 # Paleta alineada al theme Industrial_Dark del proyecto Power BI
 NAVY = '1F3864'
 CYAN = '0A84FF'
@@ -30,47 +34,56 @@ KPI_VALUE_FONT = Font(color=NAVY, bold=True, size=12)
 ZEBRA_FILL = PatternFill('solid', fgColor='F2F6FC')
 
 
-def _write_header_row(ws, row, headers, widths=None):
-    """Escribe la fila de encabezado con estilo corporativo."""
-    for col, text in enumerate(headers, start=1):
-        cell = ws.cell(row=row, column=col, value=text)
-        cell.fill = HEADER_FILL
-        cell.font = HEADER_FONT
-        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    if widths:
-        for col, width in enumerate(widths, start=1):
-            ws.column_dimensions[get_column_letter(col)].width = width
+def _set_widths(ws, widths):
+    """Anchos de columna (en write_only, antes de la primera fila)."""
+    for col, width in enumerate(widths or (), start=1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+
+def _write_header_row(ws, headers):
+    """Agrega la fila de encabezado con estilo corporativo."""
+    ws.append(styled_row(ws, headers, font=HEADER_FONT, fill=HEADER_FILL,
+                         alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)))
 
 
 def _write_rows(ws, start_row, rows, number_formats=None):
-    """Escribe filas de datos con zebra striping. Devuelve la ultima fila usada."""
+    """Agrega filas de datos con zebra striping. Devuelve la ultima fila usada."""
     r = start_row - 1
     for i, row_vals in enumerate(rows):
         r = start_row + i
-        for col, val in enumerate(row_vals, start=1):
-            cell = ws.cell(row=r, column=col, value=val)
-            if i % 2 == 1:
-                cell.fill = ZEBRA_FILL
-            if number_formats and col in number_formats and isinstance(val, (int, float)):
-                cell.number_format = number_formats[col]
+        ws.append(styled_row(ws, row_vals, fill=ZEBRA_FILL if i % 2 == 1 else None,
+                             number_formats=number_formats))
     return r
 
 
+def _cell(ws, value, font=None, fill=None, number_format=None, alignment=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if font is not None:
+        cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if number_format:
+        cell.number_format = number_format
+    if alignment is not None:
+        cell.alignment = alignment
+    return cell
+
+
 def _sheet_resumen(wb, payload):
     summary = payload.get('summary', {})
     meta = payload.get('meta', {})
 
-    ws = wb.active
-    ws.title = 'Resumen'
+    ws = wb.create_sheet('Resumen')
     ws.sheet_view.showGridLines = False
+    _set_widths(ws, [34, 16, 52])
 
-    ws.merge_cells('A1:E1')
-    ws['A1'] = 'REPORTE GERENCIAL DE MANTENIMIENTO'
-    ws['A1'].font = TITLE_FONT
-    ws.merge_cells('A2:E2')
-    ws['A2'] = (f"Periodo: {meta.get('start_date', '-')} a {meta.get('end_date', '-')} "
-                f"({meta.get('window_days', '-')} dias) | Generado: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    ws['A2'].font = SUBTITLE_FONT
+    # Titulo y subtitulo en A1/A2 (sin combinar: write_only no admite
+    # celdas combinadas; el texto desborda igual sobre B:E vacias)
+    ws.append([_cell(ws, 'REPORTE GERENCIAL DE MANTENIMIENTO', font=TITLE_FONT)])
+    ws.append([_cell(ws, (f"Periodo: {meta.get('start_date', '-')} a {meta.get('end_date', '-')} "
+                          f"({meta.get('window_days', '-')} dias) | Generado: "
+                          f"{datetime.now().strftime('%Y-%m-%d %H:%M')}"), font=SUBTITLE_FONT)])
+    ws.append([])
 
     kpis = [
         ('Cumplimiento Programado (%)', summary.get('compliance_percent', 0), 'OTs cerradas / OTs programadas en el periodo'),
@@ -86,29 +99,24 @@ def _sheet_resumen(wb, payload):
         ('Costo de Materiales (S/)', summary.get('cost', 0), 'Materiales de almacen consumidos en OTs'),
     ]
 
-    _write_header_row(ws, 4, ['Indicador', 'Valor', 'Observacion'], widths=[34, 16, 52])
+    _write_header_row(ws, ['Indicador', 'Valor', 'Observacion'])  # fila 4
     for i, (label, value, note) in enumerate(kpis):
-        r = 5 + i
-        ws.cell(row=r, column=1, value=label).font = KPI_LABEL_FONT
-        vcell = ws.cell(row=r, column=2, value=value)
-        vcell.font = KPI_VALUE_FONT
-        vcell.number_format = '#,##0.00' if isinstance(value, float) else '#,##0'
-        vcell.alignment = Alignment(horizontal='center')
-        ws.cell(row=r, column=3, value=note).font = SUBTITLE_FONT
-        if i % 2 == 1:
-            for c in range(1, 4):
-                ws.cell(row=r, column=c).fill = ZEBRA_FILL
+        fill = ZEBRA_FILL if i % 2 == 1 else None
+        ws.append([
+            _cell(ws, label, font=KPI_LABEL_FONT, fill=fill),
+            _cell(ws, value, font=KPI_VALUE_FONT, fill=fill,
+                  number_format='#,##0.00' if isinstance(value, float) else '#,##0',
+                  alignment=Alignment(horizontal='center')),
+            _cell(ws, note, font=SUBTITLE_FONT, fill=fill),
+        ])
 
     # Mini-tabla + dona Preventivo vs Correctivo
     base = 5 + len(kpis) + 2
-    ws.cell(row=base, column=1, value='Tipo').fill = HEADER_FILL
-    ws.cell(row=base, column=1).font = HEADER_FONT
-    ws.cell(row=base, column=2, value='Cantidad').fill = HEADER_FILL
-    ws.cell(row=base, column=2).font = HEADER_FONT
-    ws.cell(row=base + 1, column=1, value='Preventivo')
-    ws.cell(row=base + 1, column=2, value=summary.get('preventive_count', 0))
-    ws.cell(row=base + 2, column=1, value='Correctivo')
-    ws.cell(row=base + 2, column=2, value=summary.get('corrective_count', 0))
+    ws.append([])
+    ws.append([])
+    ws.append(styled_row(ws, ['Tipo', 'Cantidad'], font=HEADER_FONT, fill=HEADER_FILL))
+    ws.append(['Preventivo', summary.get('preventive_count', 0)])
+    ws.append(['Correctivo', summary.get('corrective_count', 0)])
 
     if (summary.get('preventive_count', 0) + summary.get('corrective_count', 0)) > 0:
         pie = PieChart()
@@ -128,7 +136,8 @@ def _sheet_tendencia(wb, payload):
 
     headers = ['Periodo', 'OTs Programadas', 'OTs Cerradas', 'Cumplimiento %',
                'Preventivos', 'Correctivos', 'Horas Paro', 'Disponibilidad %']
-    _write_header_row(ws, 1, headers, widths=[12, 16, 14, 15, 12, 12, 12, 16])
+    _set_widths(ws, [12, 16, 14, 15, 12, 12, 12, 16])
+    _write_header_row(ws, headers)
     rows = [[t.get('period'), t.get('planned_total'), t.get('planned_closed'),
              t.get('compliance_percent'), t.get('preventive_count'), t.get('corrective_count'),
              t.get('downtime_hours'), t.get('availability')] for t in trend]
@@ -163,7 +172,8 @@ def _sheet_areas(wb, payload):
 
     headers = ['Area', 'Programadas', 'Cerradas', 'Cumplimiento %', 'Preventivos',
                'Correctivos', 'Horas Paro', 'Disponibilidad %', 'MTBF (h)', 'MTTR (h)', 'Costo (S/)']
-    _write_header_row(ws, 1, headers, widths=[26, 13, 11, 15, 12, 12, 12, 16, 11, 11, 13])
+    _set_widths(ws, [26, 13, 11, 15, 12, 12, 12, 16, 11, 11, 13])
+    _write_header_row(ws, headers)
     rows = [[a.get('name'), a.get('planned_total'), a.get('planned_closed'),
              a.get('compliance_percent'), a.get('preventive_count'), a.get('corrective_count'),
              a.get('downtime_hours'), a.get('availability'), a.get('mtbf'), a.get('mttr'),
@@ -187,7 +197,8 @@ def _sheet_pareto(wb, payload):
     ws = wb.create_sheet('Pareto Fallas')
 
     headers = ['Modo de Falla', 'Eventos', 'Horas Paro', '% del Paro', '% Acumulado', 'Costo (S/)']
-    _write_header_row(ws, 1, headers, widths=[34, 10, 12, 12, 13, 13])
+    _set_widths(ws, [34, 10, 12, 12, 13, 13])
+    _write_header_row(ws, headers)
 
     total_down = sum(float(c.get('downtime_hours') or 0) for c in causes) or 1.0
     acum = 0.0
@@ -222,69 +233,61 @@ def _sheet_pareto(wb, payload):
 def _sheet_eventos(wb, payload):
     events = payload.get('downtime_events', []) or []
     ws = wb.create_sheet('Eventos de Paro')
+    ws.freeze_panes = 'A2'
 
     headers = ['OT', 'Fecha', 'Area', 'Linea', 'Equipo', 'Modo de Falla',
                'Duracion (h)', 'Costo (S/)', 'Descripcion']
-    _write_header_row(ws, 1, headers, widths=[11, 11, 18, 18, 26, 22, 12, 12, 60])
+    _set_widths(ws, [11, 11, 18, 18, 26, 22, 12, 12, 60])
+    _write_header_row(ws, headers)
     rows = [[e.get('ot_code'), e.get('date'), e.get('area'), e.get('line'), e.get('equipment'),
              e.get('failure_mode'), e.get('duration_hours'), e.get('cost'),
              e.get('description')] for e in events]
     last = _write_rows(ws, 2, rows, number_formats={7: '0.00', 8: '#,##0.00'})
     if rows:
         ws.auto_filter.ref = f'A1:I{last}'
-    ws.freeze_panes = 'A2'
     return ws
 
 
-def _collect_ot_detail(meta):
-    """OTs del periodo con la cronologia completa de tiempos.
+def _iter_ot_detail(meta):
+    """OTs del periodo con la cronologia completa de tiempos (generador).
 
     Replica la ventana y filtros del reporte ejecutivo: una OT entra si su
     fecha de evento (fin real > inicio real > programada) cae en el rango.
+    La ventana se filtra en SQL sobre las columnas sombra de fecha, el aviso
+    viene por JOIN y la jerarquia del snapshot del proceso; las filas se
+    leen en lotes (yield_per) ya ordenadas por fecha programada y codigo.
     """
-    from models import (Area, Component, Equipment, Line, MaintenanceNotice,
-                        Provider, System, Technician, WorkOrder)
+    from database import db
+    from models import MaintenanceNotice, Provider, Technician, WorkOrder
+    from utils.hierarchy import get_hierarchy
 
     start = date.fromisoformat(meta['start_date'])
     end = date.fromisoformat(meta['end_date'])
     filters = meta.get('filters') or {}
     f_area, f_line, f_equip = filters.get('area_id'), filters.get('line_id'), filters.get('equipment_id')
 
-    areas = {a.id: a for a in Area.query.all()}
-    lines = {l.id: l for l in Line.query.all()}
-    equips = {e.id: e for e in Equipment.query.all()}
-    systems = {s.id: s for s in System.query.all()}
-    comps = {c.id: c for c in Component.query.all()}
-    techs = {t.id: t for t in Technician.query.all()}
-    provs = {p.id: p for p in Provider.query.all()}
-    notices = {n.id: n for n in MaintenanceNotice.query.all()}
-
-    def _d(v):
-        try:
-            return date.fromisoformat(str(v)[:10])
-        except (TypeError, ValueError):
-            return None
+    h = get_hierarchy()
+    techs = {t.id: t.name for t in Technician.query.all()}
+    provs = {p.id: p.name for p in Provider.query.all()}
 
     def _fmt(v):
         return str(v).replace('T', ' ') if v else '-'
 
-    rows = []
-    for o in WorkOrder.query.order_by(WorkOrder.id).all():
-        event = _d(o.real_end_date) or _d(o.real_start_date) or _d(o.scheduled_date)
-        if not event or event < start or event > end:
-            continue
-
+    event_day = db.func.coalesce(WorkOrder.real_end_on, WorkOrder.real_start_on, WorkOrder.scheduled_on)
+    query = (
+        db.session.query(WorkOrder, MaintenanceNotice.code, MaintenanceNotice.reported_at,
+                         MaintenanceNotice.request_date)
+        .outerjoin(MaintenanceNotice, MaintenanceNotice.id == WorkOrder.notice_id)
+        .filter(event_day >= start, event_day <= end)
+        .order_by(db.func.coalesce(WorkOrder.scheduled_date, '-'),
+                  db.func.coalesce(WorkOrder.code, ''), WorkOrder.id)
+    )
+    for o, notice_code, reported_at, request_date in query.yield_per(500):
         # Resolver jerarquia (mismo criterio que el reporte ejecutivo)
-        eq_id = o.equipment_id
-        if not eq_id and o.system_id and o.system_id in systems:
-            eq_id = systems[o.system_id].equipment_id
-        if not eq_id and o.component_id and o.component_id in comps:
-            sys_ = systems.get(comps[o.component_id].system_id)
-            if sys_:
-                eq_id = sys_.equipment_id
-        eq = equips.get(eq_id)
+        eq_id = h.resolve_equipment_id(o.equipment_id, o.system_id, o.component_id)
+        eq = h.equipments.get(eq_id)
         line_id = o.line_id or (eq.line_id if eq else None)
-        ln = lines.get(line_id)
+        ln = h.lines.get(line_id)
         area_id = o.area_id or (ln.area_id if ln else None)
 
         if f_equip and eq_id != f_equip:
@@ -294,67 +297,60 @@ def _collect_ot_detail(meta):
         if f_area and area_id != f_area:
             continue
 
-        nt = notices.get(o.notice_id) if o.notice_id else None
-        solicitud = (getattr(nt, 'reported_at', None) or getattr(nt, 'request_date', None)) if nt else None
-
         tech = None
         try:
             tech = techs.get(int(o.technician_id))
         except (TypeError, ValueError):
             pass
 
-        rows.append([
+        yield [
             o.code or f'OT-{o.id}',
-            nt.code if nt else '-',
+            notice_code or '-',
             o.status,
             o.maintenance_type,
-            areas[area_id].name if area_id in areas else '-',
+            h.areas[area_id].name if area_id in h.areas else '-',
             ln.name if ln else '-',
             eq.name if eq else '-',
             eq.tag if eq else '-',
-            _fmt(solicitud),
+            _fmt(reported_at or request_date),
             o.scheduled_date or '-',
             _fmt(o.real_start_date),
             _fmt(o.real_end_date),
             o.real_duration,
             o.estimated_duration,
-            tech.name if tech else (o.technician_id or '-'),
-            provs[o.provider_id].name if o.provider_id in provs else '-',
+            tech or (o.technician_id or '-'),
+            provs.get(o.provider_id, '-'),
             o.failure_mode or '-',
             o.description or '-',
-        ])
-    rows.sort(key=lambda r: (str(r[9]), str(r[0])))
-    return rows
+        ]
 
 
 def _sheet_detalle(wb, payload):
     ws = wb.create_sheet('Detalle OTs')
+    ws.freeze_panes = 'C2'
     headers = ['Codigo OT', 'Aviso', 'Estado', 'Tipo Mtto', 'Area', 'Linea', 'Equipo', 'TAG',
                'F. Solicitud', 'F. Programada', 'Inicio Real', 'Fin Real',
                'Duracion Real (h)', 'Duracion Est (h)', 'Tecnico', 'Proveedor',
                'Modo de Falla', 'Descripcion']
     widths = [11, 11, 11, 11, 18, 18, 24, 12, 17, 14, 17, 17, 15, 14, 18, 18, 20, 60]
-    _write_header_row(ws, 1, headers, widths=widths)
+    _set_widths(ws, widths)
+    _write_header_row(ws, headers)
 
-    rows = _collect_ot_detail(payload.get('meta', {}))
-    last = _write_rows(ws, 2, rows, number_formats={13: '0.00', 14: '0.00'})
-    if rows:
+    last = _write_rows(ws, 2, _iter_ot_detail(payload.get('meta', {})),
+                       number_formats={13: '0.00', 14: '0.00'})
+    if last > 1:
         ws.auto_filter.ref = f'A1:R{last}'
-    ws.freeze_panes = 'C2'
     return ws
 
 
 def build_management_workbook(payload):
-    """Construye el Excel gerencial completo y devuelve BytesIO."""
-    wb = Workbook()
+    """Construye el Excel gerencial completo (Workbook write_only, listo
+    para utils.excel_stream.send_workbook)."""
+    wb = new_workbook()
     _sheet_resumen(wb, payload)
     _sheet_tendencia(wb, payload)
     _sheet_areas(wb, payload)
     _sheet_pareto(wb, payload)
     _sheet_eventos(wb, payload)
     _sheet_detalle(wb, payload)
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
+    return wb
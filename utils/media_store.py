@@ -0,0 +1,165 @@
+"""Almacen de binarios fuera de la BD (media de la cola wa_outbox, archivos
+de restauracion de backups).
+
+Antes `enqueue_wa_message` guardaba la imagen en base64 dentro de
+wa_outbox.media_base64 y cada sondeo del gateway la volvia a leer: la tabla,
+su TOAST, los dumps de backup y cada respuesta del outbox cargaban el blob.
+Ahora el binario se escribe una vez aca y la fila solo guarda una
+referencia (`media_ref`):
+
+  - Supabase Storage (bucket privado CMMS_MEDIA_BUCKET, default
+    'cmms-wa-media') si hay SUPABASE_URL + SUPABASE_SERVICE_KEY:
+    ref = 'supabase:<bucket>/<ruta>'.
+  - Si no, disco local bajo CMMS_MEDIA_DIR (default ./media_store):
+    ref = 'local:<ruta>'.
+
+`open_media(ref)` devuelve un iterador de bloques (streaming, sin cargar el
+archivo entero) para servirlo por el endpoint firmado del gateway.
+"""
+import io
+import os
+import shutil
+import tempfile
+import uuid
+import logging
+from datetime import datetime
+
+from utils import http_client
+
+logger = logging.getLogger(__name__)
+
+MEDIA_BUCKET = os.getenv('CMMS_MEDIA_BUCKET', 'cmms-wa-media')
+MEDIA_DIR = os.getenv('CMMS_MEDIA_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media_store')
+_CHUNK = 64 * 1024
+_EXTENSIONS = {'image': 'jpg', 'video': 'mp4', 'audio': 'ogg', 'backup': 'gz'}
+
+
+def _supabase_credentials():
+    url = os.getenv('SUPABASE_URL')
+    key = os.getenv('SUPABASE_SERVICE_KEY')
+    return (url, key) if url and key else (None, None)
+
+
+def _new_path(prefix, media_type):
+    ext = _EXTENSIONS.get(media_type or '', 'bin')
+    return f"{prefix}/{datetime.now().strftime('%Y%m')}/{uuid.uuid4().hex}.{ext}"
+
+
+def _local_path(rel):
+    path = os.path.realpath(os.path.join(MEDIA_DIR, rel))
+    if not path.startswith(os.path.realpath(MEDIA_DIR) + os.sep):
+        raise ValueError(f"Referencia de media invalida: {rel}")
+    return path
+
+
+def put_media(data, media_type=None, mimetype=None, prefix='wa'):
+    """Guarda `data` (bytes o archivo binario abierto, que se copia por
+    bloques) y devuelve la referencia para la BD."""
+    rel = _new_path(prefix, media_type)
+    url, key = _supabase_credentials()
+    if url:
+        if hasattr(data, 'read') and not (hasattr(data, 'seekable') and data.seekable()):
+            # http_client rebobina el cuerpo antes de cada reintento: un stream
+            # no rebobinable se reenviaria vacio o cortado
+            spooled = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+            shutil.copyfileobj(data, spooled, _CHUNK)
+            spooled.seek(0)
+            data = spooled
+        resp = http_client.post('supabase', f"{url}/storage/v1/object/{MEDIA_BUCKET}/{rel}", headers={
+            'Authorization': f'Bearer {key}',
+            'Content-Type': mimetype or 'application/octet-stream',
+        }, data=data)
+        if resp.status_code not in (200, 201):
+            raise Exception(f"Supabase Storage error: {resp.status_code} {resp.text[:200]}")
+        return f"supabase:{MEDIA_BUCKET}/{rel}"
+    path = _local_path(rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        if hasattr(data, 'read'):
+            shutil.copyfileobj(data, f, _CHUNK)
+        else:
+            f.write(data)
+    return f"local:{rel}"
+
+
+def open_media(ref):
+    """Iterador de bloques del binario `ref`, o None si no existe."""
+    backend, _, rel = (ref or '').partition(':')
+    if backend == 'local':
+        path = _local_path(rel)
+        if not os.path.isfile(path):
+            return None
+
+        def _read():
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(_CHUNK)
+                    if not chunk:
+                        break
+                    yield chunk
+        return _read()
+    if backend == 'supabase':
+        url, key = _supabase_credentials()
+        if not url:
+            return None
+        resp = http_client.get('supabase', f"{url}/storage/v1/object/{rel}",
+                               headers={'Authorization': f'Bearer {key}'}, stream=True)
+        if resp.status_code != 200:
+            resp.close()
+            return None
+
+        def _stream():
+            try:
+                yield from resp.iter_content(_CHUNK)
+            finally:
+                resp.close()
+        return _stream()
+    return None
+
+
+class _ChunkReader(io.RawIOBase):
+    """Archivo de solo lectura sobre el iterador de bloques de open_media."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buf = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            try:
+                self._buf = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def open_media_file(ref):
+    """Como open_media pero como archivo binario (para gzip, json...)."""
+    chunks = open_media(ref)
+    return io.BufferedReader(_ChunkReader(chunks), _CHUNK) if chunks is not None else None
+
+
+def delete_media(ref):
+    """Borra el binario (best-effort: un fallo solo deja basura en el storage)."""
+    backend, _, rel = (ref or '').partition(':')
+    try:
+        if backend == 'local':
+            path = _local_path(rel)
+            if os.path.isfile(path):
+                os.remove(path)
+        elif backend == 'supabase':
+            url, key = _supabase_credentials()
+            if url:
+                bucket, _, path = rel.partition('/')
+                http_client.delete('supabase', f"{url}/storage/v1/object/{bucket}", headers={
+                    'Authorization': f'Bearer {key}', 'Content-Type': 'application/json',
+                }, json={"prefixes": [path]})
+    except Exception as e:
+        logger.warning(f"delete_media({ref}) fallo: {e}")
@@ -6,7 +6,7 @@ import logging
 from datetime import datetime
 
 from PIL import Image
-import requests
+from utils import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -63,7 +63,7 @@ def upload_to_supabase_storage(file_bytes, filename, bucket='cmms-photos'):
         'Content-Type': 'image/jpeg',
     }
 
-    resp = requests.post(upload_url, headers=headers, data=file_bytes)
+    resp = http_client.post('supabase', upload_url, headers=headers, data=file_bytes)
     if resp.status_code not in (200, 201):
         raise Exception(f"Supabase Storage error: {resp.status_code} {resp.text}")
 
@@ -95,7 +95,7 @@ def delete_from_supabase_storage(public_url, bucket='cmms-photos'):
         'Content-Type': 'application/json',
     }
 
-    resp = requests.delete(delete_url, headers=headers, json={"prefixes": [storage_path]})
+    resp = http_client.delete('supabase', delete_url, headers=headers, json={"prefixes": [storage_path]})
     if resp.status_code in (200, 201):
         logger.info(f"Photo deleted from storage: {storage_path}")
     else:
@@ -3,8 +3,10 @@
 Centraliza toda la logica de extraccion para Power BI en un solo
 modulo. Consumido por routes/reports_routes.py:
 
-- build_workbook() -> BytesIO con el Excel multi-hoja
-- query_*(lookups) -> lista de dicts lista para jsonify o pd.DataFrame
+- build_workbook() -> Workbook write_only con el Excel multi-hoja
+- query_*(lookups, since=None) -> generador de dicts (una fila por item).
+  Los feeds JSON lo serializan en streaming; build_workbook lo vuelca
+  hoja por hoja, tambien en streaming.
 - get_kpis() -> dict de indicadores resumidos
 - list_endpoints() -> directorio para descubrimiento desde Power BI
 
@@ -12,32 +14,74 @@ Ningun query toca request/response: son funciones puras que reciben
 SQLAlchemy session/models y devuelven datos. Esto facilita testing
 y reutilizacion (por ejemplo para tareas programadas o scripts).
 """
-from io import BytesIO
-
 
 # ────────────────────────────────────────────────────────────────
 # Helpers
 # ────────────────────────────────────────────────────────────────
 
+_STREAM_BATCH = 500
+
+
+class SinceNotSupported(ValueError):
+    """El feed no tiene columna de cambios para filtrar por `since`."""
+
+
+class _Lookups(dict):
+    """Maps de referencia (tablas maestras chicas) cargados al primer uso:
+    cada feed solo paga los que realmente consulta. La jerarquia de activos
+    sale del snapshot del proceso (utils/hierarchy.py), sin releer tablas.
+    OTs y avisos NO van aqui; los builders los resuelven con JOIN."""
+
+    _HIERARCHY = {'areas': 'areas', 'lines': 'lines', 'equips': 'equipments',
+                  'systems': 'systems', 'comps': 'components'}
+
+    def __missing__(self, key):
+        from models import Technician, Provider, Shutdown, WarehouseItem
+        if key in self._HIERARCHY:
+            from utils.hierarchy import get_hierarchy
+            self[key] = getattr(get_hierarchy(), self._HIERARCHY[key])
+            return self[key]
+        models = {
+            'techs': Technician, 'provs': Provider, 'shutdowns': Shutdown,
+            'wh_items': WarehouseItem,
+        }
+        if key not in models:
+            raise KeyError(key)
+        self[key] = {o.id: o for o in models[key].query.all()}
+        return self[key]
+
+
 def _build_lookups():
-    """Precarga maps de referencia. Llamar una sola vez por request."""
-    from models import (
-        Area, Line, Equipment, System, Component, Technician, Provider,
-        Shutdown, MaintenanceNotice, WorkOrder, WarehouseItem,
-    )
-    return {
-        'areas':     {a.id: a for a in Area.query.all()},
-        'lines':     {l.id: l for l in Line.query.all()},
-        'equips':    {e.id: e for e in Equipment.query.all()},
-        'systems':   {s.id: s for s in System.query.all()},
-        'comps':     {c.id: c for c in Component.query.all()},
-        'techs':     {t.id: t for t in Technician.query.all()},
-        'provs':     {p.id: p for p in Provider.query.all()},
-        'shutdowns': {s.id: s for s in Shutdown.query.all()},
-        'notices':   {n.id: n for n in MaintenanceNotice.query.all()},
-        'wos':       {o.id: o for o in WorkOrder.query.all()},
-        'wh_items':  {w.id: w for w in WarehouseItem.query.all()},
-    }
+    """Maps de referencia perezosos. Crear uno por request."""
+    return _Lookups()
+
+
+# Tablas de solo alta (sin edicion): created_at alcanza como columna de
+# cambios. En las demas created_at no ve las ediciones de filas viejas.
+_APPEND_ONLY = frozenset({'ot_log_entries'})
+
+
+def _apply_since(query, Model, since):
+    """Filtra por updated_at del modelo (created_at solo en _APPEND_ONLY).
+    Sin columna de cambios confiable el feed no es incremental."""
+    if since is None:
+        return query
+    col = getattr(Model, 'updated_at', None)
+    if col is None and Model.__tablename__ in _APPEND_ONLY:
+        col = Model.created_at
+    if col is None:
+        raise SinceNotSupported(f"{Model.__tablename__} no tiene updated_at: pedir el feed completo")
+    return query.filter(col >= since)
+
+
+def _no_since(since, feed):
+    if since is not None:
+        raise SinceNotSupported(f"{feed} no soporta since")
+
+
+def _stream(query):
+    """Itera en lotes con cursor de servidor (memoria acotada)."""
+    return query.yield_per(_STREAM_BATCH)
 
 
 def _name(d, key):
@@ -68,17 +112,21 @@ def _safe_duration_hours(value):
 # Domain queries — devuelven listas de dicts
 # ────────────────────────────────────────────────────────────────
 
-def query_work_orders(lookups):
+def query_work_orders(lookups, since=None):
     """Ordenes de Trabajo enriquecidas con jerarquia, aviso vinculado
     y datos de parada (shutdown)."""
-    from models import WorkOrder
+    from models import WorkOrder, MaintenanceNotice
+    from database import db
     from datetime import datetime
 
-    rows = []
-    for o in WorkOrder.query.order_by(WorkOrder.id).all():
+    q = db.session.query(
+        WorkOrder, MaintenanceNotice.code, MaintenanceNotice.reported_at,
+        MaintenanceNotice.request_date,
+    ).outerjoin(MaintenanceNotice, MaintenanceNotice.id == WorkOrder.notice_id)
+    q = _apply_since(q, WorkOrder, since).order_by(WorkOrder.id)
+    for o, nt_code, nt_reported_at, nt_request_date in _stream(q):
         eq = lookups['equips'].get(o.equipment_id)
         sh = lookups['shutdowns'].get(getattr(o, 'shutdown_id', None))
-        nt = lookups['notices'].get(o.notice_id) if o.notice_id else None
 
         duration_h = _safe_duration_hours(o.real_duration)
         # On-time flag
@@ -106,9 +154,9 @@ def query_work_orders(lookups):
             conformidad_estado = 'N/A (interno)'
             informe_estado = 'N/A (interno)'
 
-        rows.append({
+        yield {
             'Codigo_OT': o.code,
-            'Codigo_Aviso': nt.code if nt else None,
+            'Codigo_Aviso': nt_code,
             'Aviso_ID': o.notice_id,
             'Estado': o.status,
             'Tipo_Mantenimiento': o.maintenance_type,
@@ -126,7 +174,7 @@ def query_work_orders(lookups):
             'Proveedor': _name(lookups['provs'], o.provider_id),
             # Fecha de solicitud: momento real del reporte (reported_at) o
             # registro en el CMMS (request_date) del aviso vinculado.
-            'Fecha_Solicitud': (getattr(nt, 'reported_at', None) or getattr(nt, 'request_date', None)) if nt else None,
+            'Fecha_Solicitud': nt_reported_at or nt_request_date,
             'Fecha_Programada': o.scheduled_date,
             'Fecha_Inicio_Real': o.real_start_date,
             'Fecha_Fin_Real': o.real_end_date,
@@ -150,8 +198,7 @@ def query_work_orders(lookups):
             'Conformidad': conformidad_estado,
             'Fecha_Conformidad': getattr(o, 'conformity_uploaded_at', None) or '',
             'Link_Conformidad': getattr(o, 'conformity_doc_url', None) or '',
-        })
-    return rows
+        }
 
 
 def _safe_int(value):
@@ -161,13 +208,13 @@ def _safe_int(value):
         return None
 
 
-def query_notices(lookups):
+def query_notices(lookups, since=None):
     """Avisos enriquecidos con scope, free_location, failure_*, etc."""
     from models import MaintenanceNotice
     from datetime import datetime
 
-    rows = []
-    for n in MaintenanceNotice.query.order_by(MaintenanceNotice.id).all():
+    q = _apply_since(MaintenanceNotice.query, MaintenanceNotice, since)
+    for n in _stream(q.order_by(MaintenanceNotice.id)):
         eq = lookups['equips'].get(n.equipment_id)
 
         # Dias de respuesta (request -> treatment)
@@ -190,7 +237,7 @@ def query_notices(lookups):
         except Exception:
             pass
 
-        rows.append({
+        yield {
             'Codigo_Aviso': n.code,
             'Estado': n.status,
             'Alcance': getattr(n, 'scope', 'PLAN'),
@@ -222,31 +269,31 @@ def query_notices(lookups):
             'Motivo_Cancelacion': n.cancellation_reason,
             'Origen_Tipo': getattr(n, 'source_type', None),
             'Origen_ID': getattr(n, 'source_id', None),
-        })
-    return rows
+        }
 
 
-def query_ot_personnel(lookups):
-    from models import OTPersonnel
-    rows = []
-    for p in OTPersonnel.query.order_by(OTPersonnel.id).all():
-        wo = lookups['wos'].get(p.work_order_id)
-        rows.append({
-            'Codigo_OT': wo.code if wo else None,
+def query_ot_personnel(lookups, since=None):
+    from models import OTPersonnel, WorkOrder
+    from database import db
+    q = db.session.query(OTPersonnel, WorkOrder.code).outerjoin(
+        WorkOrder, WorkOrder.id == OTPersonnel.work_order_id)
+    for p, wo_code in _stream(_apply_since(q, OTPersonnel, since).order_by(OTPersonnel.id)):
+        yield {
+            'Codigo_OT': wo_code,
             'OT_ID': p.work_order_id,
             'Tecnico': _name(lookups['techs'], p.technician_id),
             'Especialidad': p.specialty,
             'Horas_Asignadas': p.hours_assigned,
             'Horas_Trabajadas': p.hours_worked,
-        })
-    return rows
+        }
 
 
-def query_ot_materials(lookups):
-    from models import OTMaterial
-    rows = []
-    for m in OTMaterial.query.order_by(OTMaterial.id).all():
-        wo = lookups['wos'].get(m.work_order_id)
+def query_ot_materials(lookups, since=None):
+    from models import OTMaterial, WorkOrder
+    from database import db
+    q = db.session.query(OTMaterial, WorkOrder.code).outerjoin(
+        WorkOrder, WorkOrder.id == OTMaterial.work_order_id)
+    for m, wo_code in _stream(_apply_since(q, OTMaterial, since).order_by(OTMaterial.id)):
         item_name = m.item_name_free or '-'
         item_code = '-'
         unit_cost = 0
@@ -256,8 +303,8 @@ def query_ot_materials(lookups):
                 item_name = item_name if item_name and item_name != '-' else wi.name
                 item_code = wi.code or '-'
                 unit_cost = wi.unit_cost or 0
-        rows.append({
-            'Codigo_OT': wo.code if wo else None,
+        yield {
+            'Codigo_OT': wo_code,
             'OT_ID': m.work_order_id,
             'Tipo_Item': m.item_type,
             'Subtipo': getattr(m, 'subtype', None),
@@ -268,37 +315,36 @@ def query_ot_materials(lookups):
             'Costo_Unitario': unit_cost,
             'Costo_Total': round((m.quantity or 0) * (unit_cost or 0), 2),
             'Instalado': _yn(getattr(m, 'is_installed', True)),
-        })
-    return rows
+        }
 
 
-def query_ot_log_entries(lookups):
+def query_ot_log_entries(lookups, since=None):
     """Bitacora de OTs."""
     try:
-        from models import OTLogEntry
+        from models import OTLogEntry, WorkOrder
     except ImportError:
-        return []
-    rows = []
-    for e in OTLogEntry.query.order_by(OTLogEntry.id.desc()).all():
-        wo = lookups['wos'].get(e.work_order_id)
-        rows.append({
-            'Codigo_OT': wo.code if wo else f'OT-{e.work_order_id}',
+        return
+    from database import db
+    q = db.session.query(OTLogEntry, WorkOrder.code).outerjoin(
+        WorkOrder, WorkOrder.id == OTLogEntry.work_order_id)
+    for e, wo_code in _stream(_apply_since(q, OTLogEntry, since).order_by(OTLogEntry.id.desc())):
+        yield {
+            'Codigo_OT': wo_code or f'OT-{e.work_order_id}',
             'OT_ID': e.work_order_id,
             'Fecha': getattr(e, 'log_date', None) or getattr(e, 'entry_date', None),
             'Tipo': getattr(e, 'log_type', None) or getattr(e, 'entry_type', None),
             'Autor': getattr(e, 'author', None),
             'Comentario': getattr(e, 'comment', None),
             'Creado': e.created_at.isoformat() if e.created_at else None,
-        })
-    return rows
+        }
 
 
-def query_lubrication_points(lookups):
+def query_lubrication_points(lookups, since=None):
     from models import LubricationPoint
-    rows = []
-    for p in LubricationPoint.query.order_by(LubricationPoint.id).all():
+    q = _apply_since(LubricationPoint.query, LubricationPoint, since)
+    for p in _stream(q.order_by(LubricationPoint.id)):
         eq = lookups['equips'].get(p.equipment_id)
-        rows.append({
+        yield {
             'Codigo': p.code,
             'Nombre': p.name,
             'Activo': _yn(p.is_active),
@@ -315,18 +361,17 @@ def query_lubrication_points(lookups):
             'Ultimo_Servicio': p.last_service_date,
             'Proximo_Vencimiento': p.next_due_date,
             'Semaforo': p.semaphore_status,
-        })
-    return rows
+        }
 
 
-def query_lubrication_executions(lookups):
+def query_lubrication_executions(lookups, since=None):
     from models import LubricationExecution, LubricationPoint
     point_map = {p.id: p for p in LubricationPoint.query.all()}
-    rows = []
-    for e in LubricationExecution.query.order_by(LubricationExecution.id).all():
+    q = _apply_since(LubricationExecution.query, LubricationExecution, since)
+    for e in _stream(q.order_by(LubricationExecution.id)):
         p = point_map.get(e.point_id)
         eq = lookups['equips'].get(p.equipment_id) if p else None
-        rows.append({
+        yield {
             'Codigo_Punto': p.code if p else None,
             'Nombre_Punto': p.name if p else None,
             'TAG': eq.tag if eq else None,
@@ -341,16 +386,15 @@ def query_lubrication_executions(lookups):
             'Anomalia': _yn(e.anomaly_detected),
             'Comentario': e.comments,
             'Aviso_Generado_ID': e.created_notice_id,
-        })
-    return rows
+        }
 
 
-def query_monitoring_points(lookups):
+def query_monitoring_points(lookups, since=None):
     from models import MonitoringPoint
-    rows = []
-    for p in MonitoringPoint.query.order_by(MonitoringPoint.id).all():
+    q = _apply_since(MonitoringPoint.query, MonitoringPoint, since)
+    for p in _stream(q.order_by(MonitoringPoint.id)):
         eq = lookups['equips'].get(p.equipment_id)
-        rows.append({
+        yield {
             'Codigo': p.code,
             'Nombre': p.name,
             'Activo': _yn(p.is_active),
@@ -371,18 +415,17 @@ def query_monitoring_points(lookups):
             'Ultima_Medicion': p.last_measurement_date,
             'Proximo_Vencimiento': p.next_due_date,
             'Semaforo': p.semaphore_status,
-        })
-    return rows
+        }
 
 
-def query_monitoring_readings(lookups):
+def query_monitoring_readings(lookups, since=None):
     from models import MonitoringReading, MonitoringPoint
     point_map = {p.id: p for p in MonitoringPoint.query.all()}
-    rows = []
-    for r in MonitoringReading.query.order_by(MonitoringReading.id).all():
+    q = _apply_since(MonitoringReading.query, MonitoringReading, since)
+    for r in _stream(q.order_by(MonitoringReading.id)):
         p = point_map.get(r.point_id)
         eq = lookups['equips'].get(p.equipment_id) if p else None
-        rows.append({
+        yield {
             'Codigo_Punto': p.code if p else None,
             'Nombre_Punto': p.name if p else None,
             'TAG': eq.tag if eq else None,
@@ -394,16 +437,15 @@ def query_monitoring_readings(lookups):
             'Regularizacion': _yn(r.is_regularization),
             'Notas': r.notes,
             'Aviso_Generado_ID': r.created_notice_id,
-        })
-    return rows
+        }
 
 
-def query_inspection_routes(lookups):
+def query_inspection_routes(lookups, since=None):
     from models import InspectionRoute
-    rows = []
-    for r in InspectionRoute.query.order_by(InspectionRoute.id).all():
+    q = _apply_since(InspectionRoute.query, InspectionRoute, since)
+    for r in _stream(q.order_by(InspectionRoute.id)):
         eq = lookups['equips'].get(r.equipment_id)
-        rows.append({
+        yield {
             'Codigo': r.code,
             'Nombre': r.name,
             'Descripcion': r.description,
@@ -416,22 +458,25 @@ def query_inspection_routes(lookups):
             'Ultima_Ejecucion': r.last_execution_date,
             'Proximo_Vencimiento': r.next_due_date,
             'Semaforo': r.semaphore_status,
-        })
-    return rows
+        }
 
 
-def query_inspection_executions(lookups):
+def query_inspection_executions(lookups, since=None):
     """Una fila por resultado de item (no agregado por ejecucion)."""
     from models import InspectionExecution, InspectionResult, InspectionRoute, InspectionItem
+    from database import db
     route_map = {r.id: r for r in InspectionRoute.query.all()}
     item_map = {i.id: i for i in InspectionItem.query.all()}
-    rows = []
-    for e in InspectionExecution.query.order_by(InspectionExecution.id).all():
+    # LEFT JOIN ejecucion-resultado: una pasada, sin query por ejecucion
+    q = db.session.query(InspectionExecution, InspectionResult).outerjoin(
+        InspectionResult, InspectionResult.execution_id == InspectionExecution.id)
+    q = _apply_since(q, InspectionExecution, since).order_by(
+        InspectionExecution.id, InspectionResult.id)
+    for e, res in _stream(q):
         r = route_map.get(e.route_id)
         eq = lookups['equips'].get(r.equipment_id) if r else None
-        results = InspectionResult.query.filter_by(execution_id=e.id).all()
-        if not results:
-            rows.append({
+        if res is None:
+            yield {
                 'Codigo_Ruta': r.code if r else None,
                 'Nombre_Ruta': r.name if r else None,
                 'TAG': eq.tag if eq else None,
@@ -444,113 +489,112 @@ def query_inspection_executions(lookups):
                 'Valor': None, 'Texto': None, 'Observacion': None,
                 'Aviso_Generado_ID': e.created_notice_id,
                 'Comentario': e.comments,
-            })
+            }
         else:
-            for res in results:
-                it = item_map.get(res.item_id)
-                rows.append({
-                    'Codigo_Ruta': r.code if r else None,
-                    'Nombre_Ruta': r.name if r else None,
-                    'TAG': eq.tag if eq else None,
-                    'Equipo': eq.name if eq else None,
-                    'Fecha_Ejecucion': e.execution_date,
-                    'Inspector': e.executed_by,
-                    'Resultado_General': e.overall_result,
-                    'Hallazgos': e.findings_count,
-                    'Item': it.description if it else None,
-                    'Tipo_Item': it.item_type if it else None,
-                    'Resultado_Item': res.result,
-                    'Valor': res.value,
-                    'Texto': res.text_value,
-                    'Observacion': res.observation,
-                    'Aviso_Generado_ID': e.created_notice_id,
-                    'Comentario': e.comments,
-                })
-    return rows
+            it = item_map.get(res.item_id)
+            yield {
+                'Codigo_Ruta': r.code if r else None,
+                'Nombre_Ruta': r.name if r else None,
+                'TAG': eq.tag if eq else None,
+                'Equipo': eq.name if eq else None,
+                'Fecha_Ejecucion': e.execution_date,
+                'Inspector': e.executed_by,
+                'Resultado_General': e.overall_result,
+                'Hallazgos': e.findings_count,
+                'Item': it.description if it else None,
+                'Tipo_Item': it.item_type if it else None,
+                'Resultado_Item': res.result,
+                'Valor': res.value,
+                'Texto': res.text_value,
+                'Observacion': res.observation,
+                'Aviso_Generado_ID': e.created_notice_id,
+                'Comentario': e.comments,
+            }
 
 
-def query_thickness(lookups):
+def query_thickness(lookups, since=None):
     """Inspecciones de espesores con lecturas planas (1 fila por punto)."""
     try:
         from models import ThicknessInspection, ThicknessPoint, ThicknessReading
     except ImportError:
-        return []
+        return
+    from database import db
     point_map = {p.id: p for p in ThicknessPoint.query.all()}
-    rows = []
-    for ins in ThicknessInspection.query.order_by(ThicknessInspection.id).all():
-        readings = ThicknessReading.query.filter_by(inspection_id=ins.id).all()
+    q = db.session.query(ThicknessInspection, ThicknessReading).outerjoin(
+        ThicknessReading, ThicknessReading.inspection_id == ThicknessInspection.id)
+    q = _apply_since(q, ThicknessInspection, since).order_by(
+        ThicknessInspection.id, ThicknessReading.id)
+    for ins, rd in _stream(q):
         eq = lookups['equips'].get(ins.equipment_id)
         # Linea/Area derivadas del equipo
         line = lookups['lines'].get(eq.line_id) if eq else None
         area = lookups['areas'].get(line.area_id) if line else None
 
-        if not readings:
-            rows.append({
-                'Inspeccion_ID': ins.id,
-                'Fecha_Inspeccion': ins.inspection_date,
-                'Proxima_Inspeccion': ins.next_due_date,
-                'Inspector': ins.inspector_name,
-                'Estado_Inspeccion': ins.status,
-                'Semaforo': ins.semaphore_status,
-                'Total_Puntos': ins.total_points,
-                'Puntos_Criticos': ins.critical_points,
-                'Puntos_Alerta': ins.alert_points,
-                'Equipo': eq.name if eq else None,
-                'TAG': eq.tag if eq else None,
-                'Area': area.name if area else None,
-                'Linea': line.name if line else None,
-                'Observaciones': ins.observations,
-                'PDF_URL': ins.pdf_url,
-                'Punto_Grupo': None, 'Punto_Posicion': None,
-                'Espesor_mm': None, 'Espesor_Nominal_mm': None,
-                'Espesor_Alarma_mm': None, 'Espesor_Scrap_mm': None,
-                'Desgaste_mm': None, 'Estado_Punto': None,
-            })
+        if rd is None:
+            yield {
+            'Inspeccion_ID': ins.id,
+            'Fecha_Inspeccion': ins.inspection_date,
+            'Proxima_Inspeccion': ins.next_due_date,
+            'Inspector': ins.inspector_name,
+            'Estado_Inspeccion': ins.status,
+            'Semaforo': ins.semaphore_status,
+            'Total_Puntos': ins.total_points,
+            'Puntos_Criticos': ins.critical_points,
+            'Puntos_Alerta': ins.alert_points,
+            'Equipo': eq.name if eq else None,
+            'TAG': eq.tag if eq else None,
+            'Area': area.name if area else None,
+            'Linea': line.name if line else None,
+            'Observaciones': ins.observations,
+            'PDF_URL': ins.pdf_url,
+            'Punto_Grupo': None, 'Punto_Posicion': None,
+            'Espesor_mm': None, 'Espesor_Nominal_mm': None,
+            'Espesor_Alarma_mm': None, 'Espesor_Scrap_mm': None,
+            'Desgaste_mm': None, 'Estado_Punto': None,
+            }
             continue
-        for rd in readings:
-            pt = point_map.get(rd.point_id)
-            nominal = getattr(pt, 'nominal_thickness', None) if pt else None
-            current = rd.value
-            wear = (nominal - current) if (nominal is not None and current is not None) else None
-            rows.append({
-                'Inspeccion_ID': ins.id,
-                'Fecha_Inspeccion': ins.inspection_date,
-                'Proxima_Inspeccion': ins.next_due_date,
-                'Inspector': ins.inspector_name,
-                'Estado_Inspeccion': ins.status,
-                'Semaforo': ins.semaphore_status,
-                'Total_Puntos': ins.total_points,
-                'Puntos_Criticos': ins.critical_points,
-                'Puntos_Alerta': ins.alert_points,
-                'Equipo': eq.name if eq else None,
-                'TAG': eq.tag if eq else None,
-                'Area': area.name if area else None,
-                'Linea': line.name if line else None,
-                'Observaciones': ins.observations,
-                'PDF_URL': ins.pdf_url,
-                'Punto_Grupo': pt.group_name if pt else None,
-                'Punto_Posicion': pt.position if pt else None,
-                'Espesor_mm': current,
-                'Espesor_Nominal_mm': nominal,
-                'Espesor_Alarma_mm': pt.alarm_thickness if pt else None,
-                'Espesor_Scrap_mm': pt.scrap_thickness if pt else None,
-                'Desgaste_mm': round(wear, 2) if wear is not None else None,
-                'Estado_Punto': pt.status if pt else None,
-            })
-    return rows
+        pt = point_map.get(rd.point_id)
+        nominal = getattr(pt, 'nominal_thickness', None) if pt else None
+        current = rd.value
+        wear = (nominal - current) if (nominal is not None and current is not None) else None
+        yield {
+            'Inspeccion_ID': ins.id,
+            'Fecha_Inspeccion': ins.inspection_date,
+            'Proxima_Inspeccion': ins.next_due_date,
+            'Inspector': ins.inspector_name,
+            'Estado_Inspeccion': ins.status,
+            'Semaforo': ins.semaphore_status,
+            'Total_Puntos': ins.total_points,
+            'Puntos_Criticos': ins.critical_points,
+            'Puntos_Alerta': ins.alert_points,
+            'Equipo': eq.name if eq else None,
+            'TAG': eq.tag if eq else None,
+            'Area': area.name if area else None,
+            'Linea': line.name if line else None,
+            'Observaciones': ins.observations,
+            'PDF_URL': ins.pdf_url,
+            'Punto_Grupo': pt.group_name if pt else None,
+            'Punto_Posicion': pt.position if pt else None,
+            'Espesor_mm': current,
+            'Espesor_Nominal_mm': nominal,
+            'Espesor_Alarma_mm': pt.alarm_thickness if pt else None,
+            'Espesor_Scrap_mm': pt.scrap_thickness if pt else None,
+            'Desgaste_mm': round(wear, 2) if wear is not None else None,
+            'Estado_Punto': pt.status if pt else None,
+        }
 
 
-def query_shutdowns(lookups):
+def query_shutdowns(lookups, since=None):
     """Cabecera de paradas."""
     from models import Shutdown
-    rows = []
-    for s in Shutdown.query.order_by(Shutdown.id).all():
+    q = _apply_since(Shutdown.query, Shutdown, since)
+    for s in _stream(q.order_by(Shutdown.id)):
         # Areas afectadas (M2M via shutdown_areas)
         try:
             area_names = ', '.join(sa.area.name for sa in s.areas if sa.area)
         except Exception:
             area_names = None
-        rows.append({
+        yield {
             'ID': s.id,
             'Codigo_Parada': s.code,
             'Nombre': s.name,
@@ -563,18 +607,17 @@ def query_shutdowns(lookups):
             'Responsable': getattr(s, 'created_by', None),
             'Requerimientos_Produccion': getattr(s, 'production_requirements', None),
             'Observaciones': getattr(s, 'observations', None),
-        })
-    return rows
+        }
 
 
-def query_shutdown_ots(lookups):
+def query_shutdown_ots(lookups, since=None):
     """OTs ligadas a paradas — para cumplimiento por parada."""
     from models import WorkOrder
-    rows = []
-    for o in WorkOrder.query.filter(WorkOrder.shutdown_id.isnot(None)).order_by(WorkOrder.id).all():
+    q = WorkOrder.query.filter(WorkOrder.shutdown_id.isnot(None))
+    for o in _stream(_apply_since(q, WorkOrder, since).order_by(WorkOrder.id)):
         sh = lookups['shutdowns'].get(o.shutdown_id)
         eq = lookups['equips'].get(o.equipment_id)
-        rows.append({
+        yield {
             'Parada_Codigo': sh.code if sh else None,
             'Parada_Nombre': sh.name if sh else None,
             'Parada_Fecha': sh.shutdown_date if sh else None,
@@ -591,22 +634,29 @@ def query_shutdown_ots(lookups):
             'Horas_Estimadas': o.estimated_duration,
             'Horas_Reales': o.real_duration,
             'Cerrada': _yn(o.status == 'Cerrada'),
-        })
-    return rows
+        }
 
 
-def query_purchases(lookups):
+def query_purchases(lookups, since=None):
     """Requisiciones de compra (PurchaseRequest) con info de la OC vinculada
     cuando existe. La fuente principal es PurchaseRequest porque es el
     detalle por item; PurchaseOrder es la cabecera del proveedor."""
-    rows = []
     try:
-        from models import PurchaseRequest
+        from models import PurchaseRequest, WorkOrder
     except ImportError:
-        return rows
-
-    for pr in PurchaseRequest.query.order_by(PurchaseRequest.id).all():
-        wo = lookups['wos'].get(pr.work_order_id) if pr.work_order_id else None
+        return
+    from database import db
+    from sqlalchemy.orm import joinedload
+
+    q = db.session.query(PurchaseRequest, WorkOrder.code, WorkOrder.status).outerjoin(
+        WorkOrder, WorkOrder.id == PurchaseRequest.work_order_id,
+    ).options(
+        joinedload(PurchaseRequest.purchase_order),
+        joinedload(PurchaseRequest.warehouse_item),
+        joinedload(PurchaseRequest.spare_part),
+    )
+    q = _apply_since(q, PurchaseRequest, since).order_by(PurchaseRequest.id)
+    for pr, wo_code, wo_status in _stream(q):
         po = pr.purchase_order
         item_name = None
         item_code = None
@@ -616,7 +666,7 @@ def query_purchases(lookups):
         elif pr.spare_part_id and pr.spare_part:
             item_name = pr.spare_part.name
             item_code = pr.spare_part.code
-        rows.append({
+        yield {
             'Codigo_Requisicion': pr.req_code,
             'Estado_Requisicion': pr.status,
             'Tipo_Item': pr.item_type,
@@ -624,25 +674,24 @@ def query_purchases(lookups):
             'Nombre_Item': item_name,
             'Descripcion': pr.description,
             'Cantidad': pr.quantity,
-            'OT_Codigo': wo.code if wo else None,
-            'OT_Estado': wo.status if wo else None,
+            'OT_Codigo': wo_code,
+            'OT_Estado': wo_status,
             'OC_Codigo': po.po_code if po else None,
             'OC_Estado': po.status if po else None,
             'OC_Proveedor': po.provider_name if po else None,
             'OC_Fecha_Emision': po.issue_date.isoformat() if (po and po.issue_date) else None,
             'OC_Fecha_Entrega': po.delivery_date.isoformat() if (po and po.delivery_date) else None,
             'Fecha_Creacion': pr.created_at.isoformat() if pr.created_at else None,
-        })
-    return rows
+        }
 
 
-def query_warehouse(lookups):
+def query_warehouse(lookups, since=None):
     """Stock actual del almacen."""
     from models import WarehouseItem
-    rows = []
-    for w in WarehouseItem.query.order_by(WarehouseItem.id).all():
+    q = _apply_since(WarehouseItem.query, WarehouseItem, since)
+    for w in _stream(q.order_by(WarehouseItem.id)):
         unit_cost = w.unit_cost or 0
-        rows.append({
+        yield {
             'Codigo': w.code,
             'Nombre': w.name,
             'Categoria': w.category,
@@ -664,23 +713,24 @@ def query_warehouse(lookups):
             'Valor_Total': round((w.stock or 0) * unit_cost, 2),
             'Ubicacion': w.location,
             'Activo': _yn(w.is_active),
-        })
-    return rows
+        }
 
 
-def query_warehouse_movements(lookups):
+def query_warehouse_movements(lookups, since=None):
     """Movimientos de almacen (entradas/salidas)."""
     try:
-        from models import WarehouseMovement
+        from models import WarehouseMovement, WorkOrder
     except ImportError:
-        return []
-    rows = []
-    for m in WarehouseMovement.query.order_by(WarehouseMovement.id.desc()).all():
+        return
+    from database import db
+    # reference_id puede apuntar a una OT
+    q = db.session.query(WarehouseMovement, WorkOrder.code).outerjoin(
+        WorkOrder, WorkOrder.id == WarehouseMovement.reference_id)
+    q = _apply_since(q, WarehouseMovement, since).order_by(WarehouseMovement.id.desc())
+    for m, ref_wo_code in _stream(q):
         wi = lookups['wh_items'].get(m.item_id)
-        # reference_id puede apuntar a una OT
-        ref_wo = lookups['wos'].get(m.reference_id) if m.reference_id else None
         unit_cost = (wi.unit_cost or 0) if wi else 0
-        rows.append({
+        yield {
             'ID': m.id,
             'Fecha': m.date,
             'Tipo': m.movement_type,
@@ -690,17 +740,17 @@ def query_warehouse_movements(lookups):
             'Costo_Unitario': unit_cost,
             'Total': round((m.quantity or 0) * unit_cost, 2),
             'Referencia_ID': m.reference_id,
-            'OT_Codigo': ref_wo.code if ref_wo else None,
+            'OT_Codigo': ref_wo_code,
             'Motivo': m.reason,
-        })
-    return rows
+        }
 
 
-def query_equipment_tree(lookups):
+def query_equipment_tree(lookups, since=None):
     """Arbol completo Area > Linea > Equipo > Sistema > Componente."""
     from models import Component
     from sqlalchemy import text as _t
     from database import db
+    _no_since(since, 'equipment-tree')
     rows = db.session.execute(_t("""
         SELECT a.name AS area, l.name AS linea, e.name AS equipo, e.tag,
                e.criticality AS equipo_criticidad,
@@ -718,17 +768,18 @@ def query_equipment_tree(lookups):
     return [dict(zip(cols, r)) for r in rows]
 
 
-def query_activities(lookups):
+def query_activities(lookups, since=None):
     """Seguimiento de actividades + hitos (un fila por hito)."""
     from models import Activity
-    rows = []
-    for a in Activity.query.order_by(Activity.id.desc()).all():
+    from sqlalchemy.orm import selectinload
+    q = _apply_since(Activity.query, Activity, since).options(selectinload(Activity.milestones))
+    for a in _stream(q.order_by(Activity.id.desc())):
         ms_list = [m for m in (a.milestones or []) if getattr(m, 'is_active', True)]
         done = sum(1 for m in ms_list if m.status == 'COMPLETADO')
         total = len(ms_list)
         progress = round((done / total) * 100) if total > 0 else 0
         if not ms_list:
-            rows.append({
+            yield {
                 'ID_Actividad': a.id,
                 'Titulo': a.title,
                 'Tipo': a.activity_type,
@@ -744,10 +795,10 @@ def query_activities(lookups):
                 'Hito_Completado': None,
                 'Hito_Estado': None,
                 'Hito_Comentario': None,
-            })
+            }
         else:
             for m in ms_list:
-                rows.append({
+                yield {
                     'ID_Actividad': a.id,
                     'Titulo': a.title,
                     'Tipo': a.activity_type,
@@ -763,18 +814,17 @@ def query_activities(lookups):
                     'Hito_Completado': m.completion_date,
                     'Hito_Estado': m.status,
                     'Hito_Comentario': m.comment,
-                })
-    return rows
+                }
 
 
-def query_rotative_assets(lookups):
+def query_rotative_assets(lookups, since=None):
     """Activos rotativos + BOM (1 fila por componente del BOM)."""
     try:
         from models import RotativeAsset, RotativeAssetBOM
     except ImportError:
-        return []
-    rows = []
-    for a in RotativeAsset.query.order_by(RotativeAsset.id).all():
+        return
+    q = _apply_since(RotativeAsset.query, RotativeAsset, since)
+    for a in _stream(q.order_by(RotativeAsset.id)):
         loc = ' / '.join(filter(None, [
             a.area.name if a.area else None,
             a.line.name if a.line else None,
@@ -782,7 +832,7 @@ def query_rotative_assets(lookups):
         ]))
         bom_items = RotativeAssetBOM.query.filter_by(asset_id=a.id).all() if RotativeAssetBOM else []
         if not bom_items:
-            rows.append({
+            yield {
                 'Codigo_Activo': a.code,
                 'Nombre_Activo': a.name,
                 'Categoria': a.category,
@@ -796,10 +846,10 @@ def query_rotative_assets(lookups):
                 'Repuesto_Categoria': None,
                 'Repuesto_Cantidad': None,
                 'Repuesto_Nota': None,
-            })
+            }
         else:
             for b in bom_items:
-                rows.append({
+                yield {
                     'Codigo_Activo': a.code,
                     'Nombre_Activo': a.name,
                     'Categoria': a.category,
@@ -813,12 +863,12 @@ def query_rotative_assets(lookups):
                     'Repuesto_Categoria': b.category,
                     'Repuesto_Cantidad': b.quantity,
                     'Repuesto_Nota': b.notes,
-                })
-    return rows
+                }
 
 
-def query_equipos_flat(lookups):
+def query_equipos_flat(lookups, since=None):
     """Tabla plana de equipos para filtros en Power BI."""
+    _no_since(since, 'equipments')
     rows = []
     for e in lookups['equips'].values():
         line = lookups['lines'].get(e.line_id)
@@ -889,6 +939,10 @@ def list_endpoints():
             'url': '/api/reports/powerbi-export',
             'description': 'Excel multi-hoja con todos los datos del CMMS para Power BI',
         },
+        'params': {
+            'since':  'ISO 8601; solo filas creadas/modificadas desde esa fecha (400 si el feed no lo soporta)',
+            'format': 'json (arreglo, por defecto) | ndjson (una fila por linea)',
+        },
         'json': {
             'work_orders':            {'url': '/api/powerbi/work-orders',            'description': 'OTs con jerarquia y aviso vinculado'},
             'notices':                {'url': '/api/powerbi/notices',                'description': 'Avisos enriquecidos (scope, modo falla, fechas)'},
@@ -922,12 +976,19 @@ def list_endpoints():
 # ────────────────────────────────────────────────────────────────
 
 def build_workbook():
-    """Construye el Excel master con todas las hojas y devuelve BytesIO.
-    Cada query corre aislada: si una hoja falla, el resto del libro se genera
-    igual y la hoja problematica queda con una fila '_error' que indica el
-    motivo. Esto evita que un solo dato corrupto rompa toda la exportacion."""
+    """Construye el Excel master con todas las hojas en un libro write_only
+    (utils/excel_stream.py): cada feed se escribe fila a fila desde su cursor,
+    sin listas ni DataFrames. Devuelve el Workbook; la ruta lo envia con
+    send_workbook (archivo temporal + envio por bloques).
+
+    Cada hoja corre aislada: si un feed falla, el resto del libro se genera
+    igual. Si fallo antes de la primera fila la hoja queda con una fila
+    '_error'; si fallo a mitad de camino conserva lo escrito y termina con
+    una fila '_error: ...'. Las fallas se listan en la hoja '_meta'."""
     import logging
-    import pandas as pd
+    from datetime import datetime as _dt
+
+    from utils.excel_stream import new_workbook, write_sheet
 
     logger = logging.getLogger('cmms.powerbi_export')
 
@@ -958,31 +1019,31 @@ def build_workbook():
         ('Activos_Rotativos',   query_rotative_assets),
     ]
 
-    output = BytesIO()
     failures = []
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        for sheet_name, queryfn in sheet_specs:
-            try:
-                rows = queryfn(lookups)
-                df = pd.DataFrame(rows or [])
-                if df.empty:
-                    df = pd.DataFrame([{'_empty': '(sin datos)'}])
-            except Exception as e:
-                logger.exception(f"powerbi_export: error en hoja {sheet_name}")
-                failures.append({'sheet': sheet_name, 'error': str(e)})
-                df = pd.DataFrame([{'_error': str(e)[:200]}])
-            df.to_excel(writer, index=False, sheet_name=sheet_name[:31])
-
-        # Hoja meta con el listado de fallas (si las hubo) — util para diagnostico
-        from datetime import datetime as _dt
-        meta = [{
-            'generated_at': _dt.utcnow().isoformat() + 'Z',
-            'total_sheets': len(sheet_specs),
-            'failed_sheets': len(failures),
-        }]
-        if failures:
-            meta.extend(failures)
-        pd.DataFrame(meta).to_excel(writer, index=False, sheet_name='_meta')
-
-    output.seek(0)
-    return output
+
+    def _guarded(sheet_name, queryfn):
+        yielded = False
+        try:
+            for row in queryfn(lookups):
+                yielded = True
+                yield row
+        except Exception as e:
+            logger.exception(f"powerbi_export: error en hoja {sheet_name}")
+            failures.append({'sheet': sheet_name, 'error': str(e)})
+            yield [f'_error: {str(e)[:200]}'] if yielded else {'_error': str(e)[:200]}
+
+    wb = new_workbook()
+    for sheet_name, queryfn in sheet_specs:
+        write_sheet(wb, sheet_name, _guarded(sheet_name, queryfn),
+                    empty_row={'_empty': '(sin datos)'})
+
+    # Hoja meta con el listado de fallas (si las hubo) — util para diagnostico
+    meta = [{
+        'generated_at': _dt.utcnow().isoformat() + 'Z',
+        'total_sheets': len(sheet_specs),
+        'failed_sheets': len(failures),
+    }]
+    meta.extend(failures)
+    columns = ['generated_at', 'total_sheets', 'failed_sheets'] + (['sheet', 'error'] if failures else [])
+    write_sheet(wb, '_meta', meta, columns=columns)
+    return wb
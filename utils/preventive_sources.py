@@ -132,16 +132,13 @@ def collect_sources(
         source_types = {'lubrication', 'inspection', 'monitoring', 'megado', 'motor_medicion'}
     exclude = exclude or set()
 
-    # Mapas por defecto si no se pasan (permite reutilizar fuera)
-    if line_map is None and enrich_names:
-        from models import Line
-        line_map = {l.id: l for l in Line.query.all()}
-    if equip_map is None and enrich_names:
-        from models import Equipment
-        equip_map = {e.id: e for e in Equipment.query.all()}
-    if area_map is None and enrich_names:
-        from models import Area
-        area_map = {a.id: a for a in Area.query.all()}
+    # Mapas por defecto si no se pasan: snapshot de jerarquia del proceso
+    if enrich_names and None in (line_map, equip_map, area_map):
+        from utils.hierarchy import get_hierarchy
+        h = get_hierarchy()
+        line_map = h.lines if line_map is None else line_map
+        equip_map = h.equipments if equip_map is None else equip_map
+        area_map = h.areas if area_map is None else area_map
     line_map = line_map or {}
     equip_map = equip_map or {}
     area_map = area_map or {}
@@ -48,6 +48,31 @@ def _calculate_monitoring_schedule(last_measurement, frequency_days, warning_day
     return due_date.isoformat(), status
 
 
+def schedule_semaphore_case(due_col, warning_col, warning_values, today=None):
+    """Semaforo de _calculate_*_schedule como CASE SQL sobre next_due_date.
+
+    next_due_date es texto ISO (lo escriben las rutas y el bot al registrar
+    una ejecucion/lectura), asi que se compara como string. El umbral
+    AMARILLO depende de warning_days de cada fila: se arma un termino por
+    cada valor distinto (`warning_values`, normalmente 2 o 3).
+    """
+    from sqlalchemy import and_, case, or_
+
+    today = today or dt.date.today()
+    yellow = []
+    for w in set(warning_values):
+        limit = (today + dt.timedelta(days=max(0, int(w or 0)))).isoformat()
+        match = warning_col.is_(None) if w is None else warning_col == w
+        yellow.append(and_(match, due_col <= limit))
+    whens = [
+        (or_(due_col.is_(None), due_col == ''), 'PENDIENTE'),
+        (due_col < today.isoformat(), 'ROJO'),
+    ]
+    if yellow:
+        whens.append((or_(*yellow), 'AMARILLO'))
+    return case(*whens, else_='VERDE')
+
+
 def _monitoring_semaphore_for_value(point, value):
     try:
         val = float(value)
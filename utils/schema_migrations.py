@@ -0,0 +1,227 @@
+"""Ledger de migraciones de schema (tabla schema_migrations).
+
+Antes cada worker de gunicorn, en cada arranque, corria create_all, ~60
+CREATE INDEX / ALTER, ~100 intentos de ADD COLUMN y varios backfills, cada
+uno en su propia transaccion contra Supabase. Ahora:
+
+  - Las migraciones son `Migration(version, name, sql=[...], func=...)`
+    numeradas, registradas en `app.py` (`_MIGRATIONS`). `sql` son sentencias
+    tolerantes (si una falla se registra y se sigue: columna ya existente,
+    sintaxis solo-PostgreSQL en SQLite); `func(db)` es un paso Python que
+    corre despues del SQL. Las tablas nuevas se crean con
+    `Model.__table__.create(db.engine, checkfirst=True)` en su migracion.
+  - Cada migracion aplicada deja una fila (version, name, checksum,
+    applied_at, duration_ms). El checksum es un sha256 de version, nombre,
+    SQL normalizado, nombre calificado de `func` y `revision` (no del codigo
+    fuente: un comentario o un reformateo no debe disparar avisos, y el
+    codigo puede no estar disponible en un build empaquetado). Si cambia una
+    migracion ya aplicada se avisa en el log, no se vuelve a correr. Los
+    cambios nuevos van SIEMPRE en una migracion nueva. Los ledgers escritos
+    con el checksum anterior (basado en el codigo de `func`) se reescriben
+    la primera vez que se detectan.
+  - Arranque: un solo SELECT al ledger. Si falta alguna version, se toma un
+    advisory lock de PostgreSQL (los demas workers esperan), se relee el
+    ledger y se aplican solo las pendientes, en orden.
+
+    python scripts/migrate.py [--status]
+
+aplica (o lista) las migraciones fuera del arranque, p.ej. en un deploy con
+CMMS_AUTO_CREATE_TABLES desactivado.
+"""
+import hashlib
+import inspect
+import logging
+import textwrap
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+LEDGER_TABLE = 'schema_migrations'
+# Clave del pg_advisory_lock ('CMMS' en ASCII)
+ADVISORY_LOCK_KEY = 0x434D4D53
+
+_logger = logging.getLogger(__name__)
+
+
+class Migration:
+    """Paso de schema numerado. `sql`: sentencias tolerantes; `func(db)`:
+    paso Python opcional que corre despues del SQL. `revision` se incrementa
+    solo si se cambia a proposito lo que hace `func` (queda como aviso de
+    drift en los ledgers donde ya se aplico)."""
+
+    def __init__(self, version, name, sql=(), func=None, revision=1):
+        self.version = version
+        self.name = name
+        self.sql = tuple(sql)
+        self.func = func
+        self.revision = revision
+
+    def _hash_head(self):
+        h = hashlib.sha256()
+        h.update(f'{self.version}:{self.name}\n'.encode())
+        for stmt in self.sql:
+            h.update(' '.join(stmt.split()).encode() + b'\n')
+        return h
+
+    @property
+    def checksum(self):
+        h = self._hash_head()
+        if self.func is not None:
+            h.update(f'{self.func.__module__}.{self.func.__qualname__}\n'.encode())
+        h.update(f'rev:{self.revision}'.encode())
+        return h.hexdigest()
+
+    @property
+    def legacy_checksum(self):
+        """Checksum del formato anterior (SQL + codigo de `func`); None si el
+        codigo no esta disponible. Solo para reconocer ledgers viejos."""
+        h = self._hash_head()
+        if self.func is not None:
+            try:
+                src = textwrap.dedent(inspect.getsource(self.func))
+            except (OSError, TypeError):
+                return None
+            h.update(src.encode())
+        return h.hexdigest()
+
+    def matches(self, checksum):
+        return checksum in (self.checksum, self.legacy_checksum)
+
+    def __repr__(self):
+        return f'<Migration {self.version:04d} {self.name}>'
+
+
+def _ensure_ledger(db):
+    db.session.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} (
+            version     INTEGER PRIMARY KEY,
+            name        VARCHAR(120) NOT NULL,
+            checksum    VARCHAR(64) NOT NULL,
+            applied_at  TIMESTAMP NOT NULL,
+            duration_ms INTEGER
+        )
+    """))
+    db.session.commit()
+
+
+def applied_versions(db):
+    """{version: checksum} del ledger; {} si la tabla aun no existe."""
+    try:
+        rows = db.session.execute(text(f"SELECT version, checksum FROM {LEDGER_TABLE}")).all()
+    except Exception:
+        db.session.rollback()
+        return {}
+    return {int(v): c for v, c in rows}
+
+
+def pending_migrations(migrations, applied):
+    return [m for m in sorted(migrations, key=lambda m: m.version) if m.version not in applied]
+
+
+def _check_drift(db, migrations, applied, logger):
+    for m in migrations:
+        if m.version not in applied or applied[m.version] == m.checksum:
+            continue
+        if applied[m.version] == m.legacy_checksum:
+            # Ledger escrito con el checksum anterior: se pasa al formato actual
+            db.session.execute(text(
+                f"UPDATE {LEDGER_TABLE} SET checksum = :c WHERE version = :v"),
+                {'c': m.checksum, 'v': m.version})
+            db.session.commit()
+            applied[m.version] = m.checksum
+        else:
+            logger.warning(
+                f"schema_migrations: {m!r} cambio despues de aplicada (checksum distinto). "
+                f"No se re-ejecuta: agregar una migracion nueva.")
+
+
+def _apply_one(db, m, logger):
+    t0 = time.perf_counter()
+    skipped = 0
+    for stmt in m.sql:
+        try:
+            db.session.execute(text(stmt))
+            db.session.commit()
+        except Exception as err:
+            # En PostgreSQL un error aborta la transaccion: rollback por sentencia
+            db.session.rollback()
+            skipped += 1
+            logger.debug(f"{m!r}: sentencia omitida ({err.__class__.__name__}): {stmt[:80]}")
+    if m.func is not None:
+        m.func(db)
+        db.session.commit()
+    duration_ms = int((time.perf_counter() - t0) * 1000)
+    db.session.execute(text(f"""
+        INSERT INTO {LEDGER_TABLE} (version, name, checksum, applied_at, duration_ms)
+        VALUES (:v, :n, :c, :at, :ms)
+    """), {'v': m.version, 'n': m.name, 'c': m.checksum,
+           'at': datetime.utcnow(), 'ms': duration_ms})
+    db.session.commit()
+    logger.info(f"schema_migrations: {m!r} aplicada en {duration_ms} ms"
+                + (f" ({skipped} sentencias omitidas)." if skipped else "."))
+
+
+class _AdvisoryLock:
+    """pg_advisory_lock en una conexion propia (se libera al salir). En
+    SQLite es un no-op: un solo proceso por archivo en desarrollo/tests."""
+
+    def __init__(self, db):
+        self.db = db
+        self.conn = None
+
+    def __enter__(self):
+        engine = self.db.engine
+        if engine.dialect.name == 'postgresql':
+            self.conn = engine.connect()
+            self.conn.execute(text("SELECT pg_advisory_lock(:k)"), {'k': ADVISORY_LOCK_KEY})
+        return self
+
+    def __exit__(self, *exc):
+        if self.conn is not None:
+            try:
+                self.conn.execute(text("SELECT pg_advisory_unlock(:k)"), {'k': ADVISORY_LOCK_KEY})
+            finally:
+                self.conn.close()
+        return False
+
+
+def apply_migrations(db, migrations, logger=None):
+    """Aplica las migraciones pendientes. Devuelve la lista aplicada ([] si
+    el ledger ya estaba al dia: el caso normal, un solo SELECT)."""
+    logger = logger or _logger
+    applied = applied_versions(db)
+    if not pending_migrations(migrations, applied):
+        _check_drift(db, migrations, applied, logger)
+        return []
+
+    with _AdvisoryLock(db):
+        _ensure_ledger(db)
+        # Otro worker pudo aplicarlas mientras se esperaba el lock
+        applied = applied_versions(db)
+        _check_drift(db, migrations, applied, logger)
+        done = []
+        for m in pending_migrations(migrations, applied):
+            _apply_one(db, m, logger)
+            done.append(m)
+    return done
+
+
+def migration_status(db, migrations):
+    """[{version, name, applied_at, checksum_ok}] para scripts/migrate.py."""
+    try:
+        rows = db.session.execute(text(
+            f"SELECT version, checksum, applied_at FROM {LEDGER_TABLE}")).all()
+    except Exception:
+        db.session.rollback()
+        rows = []
+    by_version = {int(v): (c, at) for v, c, at in rows}
+    out = []
+    for m in sorted(migrations, key=lambda m: m.version):
+        checksum, at = by_version.get(m.version, (None, None))
+        out.append({
+            'version': m.version, 'name': m.name,
+            'applied_at': str(at) if at else None,
+            'checksum_ok': None if checksum is None else m.matches(checksum),
+        })
+    return out
@@ -0,0 +1,432 @@
+"""Indice de la barra de busqueda global (GET /api/global-search).
+
+Antes la busqueda corria `ILIKE '%q%'` sin ancla sobre seis modelos: cada
+tecla del autocompletado recorria secuencialmente avisos, OTs, equipos,
+actividades, OCs y puntos de lubricacion. Ahora cada registro tiene su fila
+en `search_documents` (label/subtitulo/enlace ya armados + texto normalizado
+en minusculas y sin tildes) y la consulta es UNA sola sentencia indexada que
+devuelve los mejores `per_section` de cada seccion (ROW_NUMBER por seccion):
+
+  - PostgreSQL: columna generada `tsv` (to_tsvector 'spanish', GIN) con
+    prefijos `palabra:*` para el autocompletado, mas un indice GIN trigram
+    (pg_trgm) sobre search_text para coincidencias dentro de codigos
+    ("0012" en "av-0012"). Orden: ts_rank + bonus si el label empieza por q.
+  - SQLite: tabla FTS5 `search_fts` (external content, mantenida por
+    triggers), orden por bm25.
+  - Sin FTS disponible (extension o permisos): LIKE sobre search_text.
+
+Mantenimiento:
+  - ORM: listener after_flush (`index_search_documents`) reescribe el
+    documento en la misma transaccion.
+  - SQL crudo (bot, merges de admin): `sync_search_index` re-indexa por
+    updated_at las fuentes con change tracking y borra por tombstones desde
+    el watermark guardado en app_settings; corre antes de buscar, como
+    maximo cada SYNC_SECONDS por proceso.
+  - `rebuild_search_index`: carga completa (migracion 14).
+"""
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect, select, text
+
+SECTIONS = ('avisos', 'ots', 'equipos', 'actividades', 'compras', 'lubricacion')
+PER_SECTION = 8
+SYNC_SECONDS = 15
+# Margen hacia atras del watermark (relojes de app y BD, transacciones largas)
+_SYNC_OVERLAP = timedelta(minutes=2)
+_REBUILD_CHUNK = 1000
+
+_schema_lock = threading.Lock()
+_mode = None            # 'pg' | 'fts5' | 'like'
+_last_sync = 0.0
+# Watermark del sync incremental, compartido por todos los workers
+_WATERMARK_KEY = 'search_index_synced_at'
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(value):
+    """Minusculas sin tildes (lo mismo se aplica al indexar y al buscar)."""
+    value = unicodedata.normalize('NFKD', value or '')
+    return ''.join(ch for ch in value if not unicodedata.combining(ch)).lower()
+
+
+# ── Fuentes: tabla -> documento ──────────────────────────────────────────
+# Cada builder recibe la fila (instancia ORM o Row con los nombres de
+# columna) y los textos extra precargados; devuelve el documento o None.
+
+def _doc_notice(r, extra):
+    return dict(section='avisos', label=r.code or f"AV-{r.id}",
+                subtitle=(r.description or '')[:80], badge=r.status,
+                href=f'/avisos#{r.id}', texts=[r.description])
+
+
+def _doc_work_order(r, extra):
+    return dict(section='ots', label=r.code or f"OT-{r.id}",
+                subtitle=(r.description or '')[:80], badge=r.status,
+                href=f'/ordenes#{r.id}', texts=[r.description])
+
+
+def _doc_equipment(r, extra):
+    return dict(section='equipos', label=f"{r.tag or ''} — {r.name}",
+                subtitle=r.description or '', badge=r.criticality or '',
+                href=f'/equipo-historial?id={r.id}', texts=[])
+
+
+def _doc_activity(r, extra):
+    return dict(section='actividades', label=r.title,
+                subtitle=f"{r.activity_type} · {r.responsible or '-'}", badge=r.status,
+                href=f'/seguimiento#{r.id}', texts=[r.description, r.responsible])
+
+
+def _doc_purchase_order(r, extra):
+    # Tambien se encuentra por los RQ/items que contiene
+    return dict(section='compras', label=r.po_code,
+                subtitle=f"{r.provider_name}{' · RQ ' + r.external_rq_code if r.external_rq_code else ''}",
+                badge=r.status, href='/compras',
+                texts=[r.external_rq_code, r.provider_name] + list(extra or ()))
+
+
+def _doc_lubrication_point(r, extra):
+    return dict(section='lubricacion', label=r.code or f"LUB-{r.id}", subtitle=r.name,
+                badge=r.semaphore_status or '', href='/lubricacion',
+                texts=[r.name], active=bool(r.is_active))
+
+
+def _po_items(conn, po_ids):
+    """{po_id: [req_code, descripcion, ...]} de los RQ de esas OCs."""
+    from models import PurchaseRequest
+    out = {}
+    if not po_ids:
+        return out
+    pr = PurchaseRequest.__table__
+    for chunk in _chunks(sorted(po_ids), 500):
+        rows = conn.execute(select(pr.c.purchase_order_id, pr.c.req_code, pr.c.description)
+                            .where(pr.c.purchase_order_id.in_(chunk)))
+        for po_id, code, desc in rows:
+            out.setdefault(po_id, []).extend([code, desc])
+    return out
+
+
+def _sources():
+    """{tabla: (modelo, builder, precarga de textos extra o None)}."""
+    from models import (Activity, Equipment, LubricationPoint, MaintenanceNotice,
+                        PurchaseOrder, WorkOrder)
+    return {
+        MaintenanceNotice.__tablename__: (MaintenanceNotice, _doc_notice, None),
+        WorkOrder.__tablename__: (WorkOrder, _doc_work_order, None),
+        Equipment.__tablename__: (Equipment, _doc_equipment, None),
+        Activity.__tablename__: (Activity, _doc_activity, None),
+        PurchaseOrder.__tablename__: (PurchaseOrder, _doc_purchase_order, _po_items),
+        LubricationPoint.__tablename__: (LubricationPoint, _doc_lubrication_point, None),
+    }
+
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _build(entity_type, row, builder, extra):
+    doc = builder(row, extra)
+    if doc is None:
+        return None
+    texts = doc.pop('texts')
+    now = datetime.utcnow()
+    return {
+        'entity_type': entity_type, 'entity_id': row.id, 'section': doc['section'],
+        'label': (doc['label'] or '')[:255], 'subtitle': (doc['subtitle'] or '')[:255],
+        'badge': (doc['badge'] or '')[:50], 'href': doc['href'],
+        'search_text': fold(' '.join(str(t) for t in [doc['label']] + texts if t)),
+        'active': doc.get('active', True), 'indexed_at': now,
+    }
+
+
+def _delete_docs(conn, entity_type, ids):
+    from models import SearchDocument
+    t = SearchDocument.__table__
+    for chunk in _chunks(sorted(ids), 500):
+        conn.execute(t.delete().where(t.c.entity_type == entity_type, t.c.entity_id.in_(chunk)))
+
+
+def _write_docs(conn, entity_type, docs):
+    """Reemplaza los documentos (borrar + insertar: portable PG/SQLite)."""
+    from models import SearchDocument
+    if not docs:
+        return
+    _delete_docs(conn, entity_type, [d['entity_id'] for d in docs])
+    conn.execute(SearchDocument.__table__.insert(), docs)
+
+
+def _reindex_rows(conn, entity_type, rows):
+    model, builder, prefetch = _sources()[entity_type]
+    extra = prefetch(conn, {r.id for r in rows}) if prefetch else {}
+    docs = [d for d in (_build(entity_type, r, builder, extra.get(r.id)) for r in rows) if d]
+    _write_docs(conn, entity_type, docs)
+
+
+def _reindex_ids(conn, entity_type, ids):
+    """Re-indexa por id leyendo la tabla (SQL crudo, OCs de un RQ editado)."""
+    if not ids:
+        return
+    model = _sources()[entity_type][0]
+    t = model.__table__
+    rows = []
+    for chunk in _chunks(sorted(ids), 500):
+        rows.extend(conn.execute(select(t).where(t.c.id.in_(chunk))).fetchall())
+    _reindex_rows(conn, entity_type, rows)
+    missing = set(ids) - {r.id for r in rows}
+    if missing:
+        _delete_docs(conn, entity_type, missing)
+
+
+def index_search_documents(session, flush_context):
+    """Listener after_flush: documentos de las fuentes tocadas por el flush."""
+    from models import PurchaseOrder, PurchaseRequest
+    sources = _sources()
+    models = tuple(m for m, _, _ in sources.values())
+    changed, deleted, po_ids = {}, {}, set()
+    for obj in session.new:
+        if isinstance(obj, models):
+            changed.setdefault(obj.__tablename__, []).append(obj)
+        elif isinstance(obj, PurchaseRequest) and obj.purchase_order_id:
+            po_ids.add(obj.purchase_order_id)
+    for obj in session.dirty:
+        if isinstance(obj, models) and session.is_modified(obj):
+            changed.setdefault(obj.__tablename__, []).append(obj)
+        elif isinstance(obj, PurchaseRequest) and session.is_modified(obj):
+            # El RQ pudo cambiar de OC: re-indexar la anterior y la nueva
+            po_ids.update(i for i in _history_values(obj, 'purchase_order_id') if i)
+    for obj in session.deleted:
+        if isinstance(obj, models):
+            deleted.setdefault(obj.__tablename__, set()).add(obj.id)
+        elif isinstance(obj, PurchaseRequest) and obj.purchase_order_id:
+            po_ids.add(obj.purchase_order_id)
+    if not (changed or deleted or po_ids):
+        return
+    conn = session.connection()
+    for entity_type, objs in changed.items():
+        _reindex_rows(conn, entity_type, objs)
+    for entity_type, ids in deleted.items():
+        _delete_docs(conn, entity_type, ids)
+    po_table = PurchaseOrder.__tablename__
+    po_ids -= {o.id for o in changed.get(po_table, ())} | deleted.get(po_table, set())
+    _reindex_ids(conn, po_table, po_ids)
+
+
+def _history_values(obj, attr):
+    """Valores actual y anterior de un atributo (para el listener)."""
+    hist = inspect(obj).attrs[attr].history
+    return list(hist.added or ()) + list(hist.deleted or ()) + list(hist.unchanged or ())
+
+
+# ── Esquema por motor ────────────────────────────────────────────────────
+
+_PG_DDL = (
+    ('tsv', "ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS tsv tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('spanish', coalesce(search_text, ''))) STORED"),
+    ('tsv', "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents USING gin (tsv)"),
+    ('trgm', "CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    ('trgm', "CREATE INDEX IF NOT EXISTS ix_search_documents_trgm "
+             "ON search_documents USING gin (search_text gin_trgm_ops)"),
+)
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(search_text, "
+    "content='search_documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO search_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+)
+
+
+def ensure_search_schema(db, logger=None):
+    """Crea (idempotente) las estructuras FTS del motor y fija el modo de
+    busqueda del proceso. Cada sentencia va en su propia transaccion."""
+    global _mode
+    if _mode is not None:
+        return _mode
+    with _schema_lock:
+        if _mode is not None:
+            return _mode
+        from models import SearchDocument
+        SearchDocument.__table__.create(db.engine, checkfirst=True)
+        mode = 'like'
+        if db.engine.dialect.name == 'postgresql':
+            failed = set()
+            for feature, sql in _PG_DDL:
+                if feature in failed:
+                    continue
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(text(sql))
+                except Exception as e:
+                    failed.add(feature)
+                    if logger:
+                        logger.warning(f"search_index: {feature} no disponible: {e}")
+            if 'tsv' not in failed:
+                mode = 'pg'
+        elif db.engine.dialect.name == 'sqlite':
+            try:
+                with db.engine.begin() as conn:
+                    existed = conn.execute(text(
+                        "SELECT 1 FROM sqlite_master WHERE name = 'search_fts'")).first()
+                    for sql in _SQLITE_DDL:
+                        conn.execute(text(sql))
+                    if not existed:
+                        # Documentos escritos antes de existir la tabla FTS
+                        conn.execute(text("INSERT INTO search_fts(search_fts) VALUES ('rebuild')"))
+                mode = 'fts5'
+            except Exception as e:
+                if logger:
+                    logger.warning(f"search_index: FTS5 no disponible: {e}")
+        _mode = mode
+        return _mode
+
+
+# ── Carga completa y sincronizacion incremental ─────────────────────────
+
+def _read_watermark(conn):
+    from models import AppSetting
+    t = AppSetting.__table__
+    raw = conn.execute(select(t.c.value).where(t.c.key == _WATERMARK_KEY)).scalar()
+    try:
+        return datetime.fromisoformat(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def _write_watermark(conn, value):
+    """Upsert de la fila del watermark. Dos workers sincronizan a la vez a
+    menudo: con DELETE + INSERT, en READ COMMITTED el segundo no ve la fila
+    recien insertada por el primero y su INSERT choca con la PK. Nunca
+    retrocede (ISO ordena como texto): si otro worker ya escribio uno mas
+    nuevo, se queda ese."""
+    from models import AppSetting
+    t = AppSetting.__table__
+    dialect = conn.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(t).values(key=_WATERMARK_KEY, value=value.isoformat())
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[t.c.key], set_={'value': stmt.excluded.value},
+            where=t.c.value < stmt.excluded.value))
+        return
+    updated = conn.execute(t.update().where(t.c.key == _WATERMARK_KEY, t.c.value < value.isoformat())
+                           .values(value=value.isoformat())).rowcount
+    if not updated and _read_watermark(conn) is None:
+        conn.execute(t.insert().values(key=_WATERMARK_KEY, value=value.isoformat()))
+
+
+def rebuild_search_index(db):
+    """Regenera todos los documentos (por bloques, memoria acotada)."""
+    from models import SearchDocument
+    started = datetime.utcnow()
+    with db.engine.begin() as conn:
+        conn.execute(SearchDocument.__table__.delete())
+        for entity_type, (model, builder, prefetch) in _sources().items():
+            t = model.__table__
+            rows = conn.execution_options(yield_per=_REBUILD_CHUNK).execute(select(t).order_by(t.c.id))
+            for chunk in rows.partitions(_REBUILD_CHUNK):
+                extra = prefetch(conn, {r.id for r in chunk}) if prefetch else {}
+                docs = [d for d in (_build(entity_type, r, builder, extra.get(r.id)) for r in chunk) if d]
+                if docs:
+                    conn.execute(SearchDocument.__table__.insert(), docs)
+        _write_watermark(conn, started)
+
+
+def sync_search_index(db, force=False):
+    """Recoge las escrituras por SQL crudo: re-indexa las filas con
+    updated_at posterior al watermark y borra las que dejaron tombstone.
+    Sin watermark (base nueva o previa al indice) hace la carga completa."""
+    global _last_sync
+    if not force and time.monotonic() - _last_sync < SYNC_SECONDS:
+        return
+    _last_sync = time.monotonic()
+    from models import ChangeTombstone
+    started = datetime.utcnow()
+    with db.engine.begin() as conn:
+        synced_at = _read_watermark(conn)
+        if synced_at is not None:
+            since = synced_at - _SYNC_OVERLAP
+            tomb = ChangeTombstone.__table__
+            gone = conn.execute(select(tomb.c.table_name, tomb.c.row_id)
+                                .where(tomb.c.deleted_at >= since,
+                                       tomb.c.table_name.in_(list(_sources())))).fetchall()
+            for entity_type, (model, _, _) in _sources().items():
+                t = model.__table__
+                ids = {g[1] for g in gone if g[0] == entity_type}
+                if 'updated_at' in t.c:
+                    ids.update(r[0] for r in conn.execute(select(t.c.id).where(t.c.updated_at >= since)))
+                # Los ids con tombstone se releen: solo se borra el documento
+                # si la fila ya no existe (SQLite reutiliza ids)
+                _reindex_ids(conn, entity_type, ids)
+            _write_watermark(conn, started)
+    if synced_at is None:
+        rebuild_search_index(db)
+
+
+# ── Consulta ─────────────────────────────────────────────────────────────
+
+_RANKED = """
+    SELECT section, label, subtitle, badge, href FROM (
+        SELECT section, label, subtitle, badge, href,
+               ROW_NUMBER() OVER (PARTITION BY section ORDER BY score DESC, entity_id DESC) AS rn
+        FROM ({hits}) hits
+    ) ranked
+    WHERE rn <= :k
+    ORDER BY section, rn
+"""
+
+_HITS = {
+    'pg': ("SELECT d.section, d.label, d.subtitle, d.badge, d.href, d.entity_id, "
+           "ts_rank(d.tsv, to_tsquery('spanish', :tsq)) "
+           "+ CASE WHEN d.search_text LIKE :prefix ESCAPE '\\' THEN 1 ELSE 0 END AS score "
+           "FROM search_documents d WHERE d.active "
+           "AND (d.tsv @@ to_tsquery('spanish', :tsq) OR d.search_text LIKE :like ESCAPE '\\')"),
+    'fts5': ("SELECT d.section, d.label, d.subtitle, d.badge, d.href, d.entity_id, "
+             "-bm25(search_fts) + CASE WHEN d.search_text LIKE :prefix ESCAPE '\\' THEN 1 ELSE 0 END AS score "
+             "FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid "
+             "WHERE search_fts MATCH :match AND d.active"),
+    'like': ("SELECT d.section, d.label, d.subtitle, d.badge, d.href, d.entity_id, "
+             "CASE WHEN d.search_text LIKE :prefix ESCAPE '\\' THEN 1 ELSE 0 END AS score "
+             "FROM search_documents d WHERE d.active AND d.search_text LIKE :like ESCAPE '\\'"),
+}
+
+
+def search_documents(db, q, per_section=PER_SECTION, logger=None):
+    """Resultados agrupados por seccion ({seccion: [{label, subtitle, badge,
+    href}]}, todas las secciones presentes) en una sola consulta."""
+    mode = ensure_search_schema(db, logger=logger)
+    try:
+        sync_search_index(db)
+    except Exception as e:
+        # La sincronizacion es best-effort: se busca sobre el indice actual
+        if logger:
+            logger.warning(f"search_index: sync fallo: {e}")
+    results = {s: [] for s in SECTIONS}
+    folded = fold(q).strip()
+    tokens = _TOKEN_RE.findall(folded)
+    if not tokens:
+        return results
+    escaped = folded.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    params = {
+        'k': per_section,
+        'like': f"%{escaped}%",
+        'prefix': f"{escaped}%",
+        'tsq': ' & '.join(f"{t}:*" for t in tokens),
+        'match': ' '.join(f'"{t}"*' for t in tokens),
+    }
+    rows = db.session.execute(text(_RANKED.format(hits=_HITS[mode])), params).fetchall()
+    for section, label, subtitle, badge, href in rows:
+        results.setdefault(section, []).append(
+            {'label': label, 'subtitle': subtitle, 'badge': badge, 'href': href})
+    return results
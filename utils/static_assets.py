@@ -0,0 +1,186 @@
+"""Assets estaticos con huella de contenido y cache larga.
+
+Antes cada template pedia `/static/js/x.js?v={{ v }}` (v = hora de arranque)
+y `add_build_header` marcaba TODO con no-store: cada navegacion volvia a
+bajar work_orders.js (~190 KB), sidebar.js, los CSS... y la cache del PWA
+solo se invalidaba subiendo `cmms-vNN` a mano en sw.js.
+
+Ahora:
+  - Al arrancar se calcula el sha256 (12 hex) de cada archivo de static/.
+  - `asset('js/x.js')` (global de Jinja) -> `/assets/<hash>/js/x.js`. Esa
+    URL cambia solo cuando cambia el contenido, asi que se sirve con
+    `Cache-Control: public, max-age=31536000, immutable`. Un hash viejo
+    (pagina abierta antes de un deploy) recibe el contenido actual sin
+    cache larga.
+  - Variantes precomprimidas (gzip siempre; brotli si esta el paquete
+    `brotli`) de los tipos de texto, calculadas una vez por archivo y
+    servidas segun Accept-Encoding.
+  - `/sw.js` se arma con el mismo manifiesto: CACHE_NAME deriva del hash
+    global y la lista de pre-cache usa las URLs con huella.
+
+HTML y API siguen sin cache (add_build_header en app.py); /static/ sin
+huella queda en no-cache (revalida con ETag, responde 304).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, request
+
+try:
+    import brotli
+except ImportError:  # opcional: sin el paquete solo se ofrece gzip
+    brotli = None
+
+ASSET_PREFIX = '/assets'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+_COMPRESSIBLE = ('.js', '.css', '.svg', '.json', '.webmanifest', '.html', '.txt')
+_MIN_COMPRESS_BYTES = 1024
+# Archivos que no se sirven con huella (sw.js va por /sw.js en la raiz)
+_EXCLUDED = {'sw.js'}
+
+# Assets pre-cacheados por el service worker (siempre disponibles offline)
+SW_PRECACHE = (
+    'css/style.css', 'css/sidebar.css', 'css/themes.css',
+    'js/sidebar.js', 'js/app.js', 'js/lubrication.js', 'js/inspections.js',
+    'js/notices.js', 'js/campo.js', 'js/datetime_utils.js',
+    'favicon.svg', 'icon-192.png', 'icon-512.png', 'manifest.webmanifest',
+)
+
+_manifest = {}       # ruta relativa -> hash
+_build_digest = ''
+_variants = {}       # (ruta, encoding) -> bytes
+_variants_lock = threading.Lock()
+_static_dir = None
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+def build_manifest(static_dir):
+    """{ruta relativa con '/': hash} de todos los archivos de static_dir."""
+    out = {}
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            if rel in _EXCLUDED or name.startswith('.'):
+                continue
+            out[rel] = _file_hash(path)
+    return out
+
+
+def load_manifest(static_dir):
+    global _manifest, _build_digest, _static_dir
+    _static_dir = static_dir
+    _manifest = build_manifest(static_dir)
+    _build_digest = hashlib.sha256(
+        json.dumps(_manifest, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    with _variants_lock:
+        _variants.clear()
+    return _manifest
+
+
+def asset_url(filename):
+    """URL con huella de un archivo de static/ (sin huella si no existe)."""
+    filename = filename.lstrip('/')
+    digest = _manifest.get(filename)
+    if digest is None:
+        return f"/static/{filename}"
+    return f"{ASSET_PREFIX}/{digest}/{filename}"
+
+
+def build_digest():
+    """Hash del manifiesto completo (cambia si cambia cualquier asset)."""
+    return _build_digest
+
+
+def _variant(filename, encoding):
+    key = (filename, encoding)
+    with _variants_lock:
+        if key in _variants:
+            return _variants[key]
+    with open(os.path.join(_static_dir, filename), 'rb') as f:
+        raw = f.read()
+    if encoding == 'br':
+        data = brotli.compress(raw, quality=11)
+    elif encoding == 'gzip':
+        data = gzip.compress(raw, compresslevel=9, mtime=0)
+    else:
+        data = raw
+    with _variants_lock:
+        _variants[key] = data
+    return data
+
+
+def _pick_encoding(filename):
+    if not filename.endswith(_COMPRESSIBLE):
+        return None
+    if os.path.getsize(os.path.join(_static_dir, filename)) < _MIN_COMPRESS_BYTES:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def serve_asset(digest, filename):
+    if filename not in _manifest:
+        abort(404)
+    encoding = _pick_encoding(filename)
+    data = _variant(filename, encoding or 'identity')
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if filename.endswith('.webmanifest'):
+        mimetype = 'application/manifest+json'
+    resp = Response(data, mimetype=mimetype)
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Vary'] = 'Accept-Encoding'
+    current = _manifest[filename]
+    if digest == current:
+        resp.headers['Cache-Control'] = IMMUTABLE_CACHE
+    else:
+        # Huella vieja: contenido actual, sin cache larga
+        resp.headers['Cache-Control'] = 'no-cache'
+    resp.set_etag(f"{current}-{encoding or 'identity'}")
+    return resp.make_conditional(request)
+
+
+def render_service_worker(source):
+    """sw.js con CACHE_NAME y la lista de pre-cache del manifiesto."""
+    urls = [asset_url(p) for p in SW_PRECACHE if p in _manifest]
+    return (source
+            .replace("'cmms-__ASSET_DIGEST__'", json.dumps(f"cmms-{_build_digest}"))
+            .replace('[] /* __ASSET_PATHS__ */', json.dumps(urls, indent=2)))
+
+
+def _mtimes(static_dir):
+    return tuple(sorted((os.path.join(root, n), os.path.getmtime(os.path.join(root, n)))
+                        for root, _, files in os.walk(static_dir) for n in files))
+
+
+def init_static_assets(app):
+    """Manifiesto, ruta /assets/<hash>/<archivo> y global `asset` de Jinja."""
+    load_manifest(app.static_folder)
+    app.add_url_rule(f'{ASSET_PREFIX}/<digest>/<path:filename>', 'static_asset', serve_asset)
+    app.add_template_global(asset_url, 'asset')
+    if app.debug:
+        # Desarrollo: los archivos cambian sin reiniciar
+        seen = [_mtimes(app.static_folder)]
+
+        @app.before_request
+        def _reload_static_manifest():
+            current = _mtimes(app.static_folder)
+            if current != seen[0]:
+                seen[0] = current
+                load_manifest(app.static_folder)
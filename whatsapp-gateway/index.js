@@ -37,7 +37,10 @@ const MAX_MEDIA_BYTES = 16 * 1024 * 1024 // 16 MB
 // Asi el gateway NO abre ningun puerto: sigue siendo cliente de Flask.
 const OUTBOX_URL = WEBHOOK_URL.replace(/\/webhook$/, '/outbox')
 const OUTBOX_ACK_URL = WEBHOOK_URL.replace(/\/webhook$/, '/outbox/ack')
-const OUTBOX_POLL_MS = Number(process.env.OUTBOX_POLL_MS || 15000)
+const OUTBOX_POLL_MS = Number(process.env.OUTBOX_POLL_MS || 15000) // espera tras un error
+// Long-poll: Flask retiene la request hasta OUTBOX_WAIT_S segundos y responde
+// apenas se encola un mensaje (0 = sondeo clasico cada OUTBOX_POLL_MS)
+const OUTBOX_WAIT_S = Number(process.env.OUTBOX_WAIT_S ?? 20)
 
 const logger = pino({ level: 'warn' })
 
@@ -280,29 +283,40 @@ async function handleMessage(sock, msg) {
 
 // ── Cola de salida (mensajes proactivos: pre-diagnostico IA, avisos) ────────
 
+// La media no viaja en el sondeo: se baja por una URL firmada (relativa a Flask)
+async function fetchOutboxMedia(mediaUrl) {
+  const res = await fetch(new URL(mediaUrl, WEBHOOK_URL), { signal: AbortSignal.timeout(60000) })
+  if (!res.ok) throw new Error(`media HTTP ${res.status}`)
+  const buf = Buffer.from(await res.arrayBuffer())
+  if (buf.length > MAX_MEDIA_BYTES) throw new Error('media demasiado grande')
+  return buf
+}
+
+// Devuelve true si Flask respondio (se puede volver a sondear de inmediato)
 async function pollOutboxOnce() {
-  if (!currentSock) return
+  if (!currentSock) return false
   let messages = []
   try {
-    const res = await fetch(OUTBOX_URL, {
+    const url = OUTBOX_WAIT_S > 0 ? `${OUTBOX_URL}?wait=${OUTBOX_WAIT_S}` : OUTBOX_URL
+    const res = await fetch(url, {
       headers: { 'X-Gateway-Token': GATEWAY_TOKEN },
-      signal: AbortSignal.timeout(30000),
+      signal: AbortSignal.timeout(30000 + OUTBOX_WAIT_S * 1000),
     })
-    if (!res.ok) return
+    if (!res.ok) return false
     const data = await res.json()
     messages = data?.messages || []
   } catch (e) {
-    return // Flask no disponible: reintentar en el proximo ciclo
+    return false // Flask no disponible: reintentar en el proximo ciclo
   }
-  if (!messages.length) return
+  if (!messages.length) return true
 
   const results = []
   for (const m of messages) {
     if (!m?.to || !m?.body) { results.push({ id: m?.id, ok: false }); continue }
     try {
       await humanDelay()
-      if (m.media_base64) {
-        const buf = Buffer.from(m.media_base64, 'base64')
+      if (m.media_url) {
+        const buf = await fetchOutboxMedia(m.media_url)
         const content = m.media_type === 'video'
           ? { video: buf, caption: m.body }
           : m.media_type === 'image'
@@ -330,12 +344,15 @@ async function pollOutboxOnce() {
   } catch (e) {
     console.warn('Outbox ack fallo:', e.message) // el reclaim de Flask lo recupera
   }
+  return true
 }
 
 async function outboxLoop() {
   for (;;) {
-    try { await pollOutboxOnce() } catch (e) { console.warn('outboxLoop:', e.message) }
-    await sleep(OUTBOX_POLL_MS)
+    let ok = false
+    try { ok = await pollOutboxOnce() } catch (e) { console.warn('outboxLoop:', e.message) }
+    // Con long-poll la espera la hace Flask; tras un error (o sin long-poll) se duerme
+    if (!ok || OUTBOX_WAIT_S <= 0) await sleep(OUTBOX_POLL_MS)
   }
 }
 